@@ -8,6 +8,9 @@ import sys
 # Add your project root to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 
+# Importing settings loads .env, so DATABASE_URL set there is honoured
+from app.core.config import settings
+
 # Import your models
 from app.db.base import Base
 from app.models.organization import Organization
@@ -20,12 +23,17 @@ from app.models.activity import Activity
 from app.models.crop_specific_data import CropSpecificData
 from app.models.spray_product import SprayProduct
 from app.models.financial_transaction import FinancialTransaction
+from app.models.gps_track import GPSFix, BlockVisit
+from app.models.callback_outbox import CallbackOutbox
+from app.models.vine_yield import VineYield
+from app.models.dashboard_aggregate import DashboardAggregate
+from app.models.activity_rollup import ActivityTypeRollup
 
 # this is the Alembic Config object
 config = context.config
 
-# Set the database URL from environment
-config.set_main_option('sqlalchemy.url', os.getenv('DATABASE_URL', 'postgresql://postgres:@localhost:5432/vigneron_backend'))
+# Set the database URL from environment (or .env)
+config.set_main_option('sqlalchemy.url', settings.DATABASE_URL)
 
 # Interpret the config file for Python logging
 if config.config_file_name is not None:
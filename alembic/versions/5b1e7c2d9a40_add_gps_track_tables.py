@@ -0,0 +1,61 @@
+"""add_gps_track_tables
+
+Revision ID: 5b1e7c2d9a40
+Revises: e62448293245
+Create Date: 2025-08-04 10:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e7c2d9a40'
+down_revision: Union[str, None] = 'e62448293245'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Daily partitions of gps_fixes are created on demand by the ingestor.
+    op.create_table('gps_fixes',
+    sa.Column('recorded_on', sa.Date(), nullable=False),
+    sa.Column('device_id', sa.String(length=64), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('org_id', sa.Integer(), nullable=True),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('accuracy_m', sa.Float(), nullable=True),
+    sa.Column('speed_mps', sa.Float(), nullable=True),
+    sa.Column('heading_deg', sa.SmallInteger(), nullable=True),
+    sa.Column('block_id', sa.Integer(), nullable=True),
+    sa.Column('row_id', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('recorded_on', 'device_id', 'recorded_at'),
+    postgresql_partition_by='RANGE (recorded_on)'
+    )
+    op.create_index('ix_gps_fixes_block_recorded_at', 'gps_fixes', ['block_id', 'recorded_at'], unique=False)
+    op.create_table('block_visits',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('org_id', sa.Integer(), nullable=True),
+    sa.Column('device_id', sa.String(length=64), nullable=False),
+    sa.Column('block_id', sa.Integer(), nullable=False),
+    sa.Column('last_row_id', sa.Integer(), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('ended_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('fix_count', sa.Integer(), nullable=False),
+    sa.Column('distance_m', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_block_visits_block_started_at', 'block_visits', ['block_id', 'started_at'], unique=False)
+    op.create_index('ix_block_visits_device_started_at', 'block_visits', ['device_id', 'started_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_block_visits_device_started_at', table_name='block_visits')
+    op.drop_index('ix_block_visits_block_started_at', table_name='block_visits')
+    op.drop_table('block_visits')
+    op.drop_index('ix_gps_fixes_block_recorded_at', table_name='gps_fixes')
+    op.drop_table('gps_fixes')
@@ -0,0 +1,125 @@
+"""partition_tenant_tables_by_org
+
+Revision ID: 5d2a8f1c3e60
+Revises: c41f7e2a9b63
+Create Date: 2025-09-09 14:12:37.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2a8f1c3e60'
+down_revision: Union[str, None] = 'c41f7e2a9b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('activities', 'crop_specific_data', 'financial_transactions', 'individual_vines')
+
+BLOCK_ORG = "(SELECT p.org_id FROM blocks b JOIN properties p ON p.id = b.property_id WHERE b.id = {table}.block_id)"
+
+
+def upgrade() -> None:
+    op.add_column('activities', sa.Column('org_id', sa.Integer(), nullable=True))
+    op.add_column('crop_specific_data', sa.Column('org_id', sa.Integer(), nullable=True))
+    op.add_column('individual_vines', sa.Column('org_id', sa.Integer(), nullable=True))
+
+    # Backfill the partition key from the hierarchy
+    op.execute(f"UPDATE activities SET org_id = {BLOCK_ORG.format(table='activities')}")
+    op.execute(
+        "UPDATE crop_specific_data SET org_id = coalesce("
+        f"{BLOCK_ORG.format(table='crop_specific_data')}, "
+        "(SELECT u.org_id FROM users u WHERE u.id = crop_specific_data.user_id))"
+    )
+    op.execute(
+        "UPDATE individual_vines SET org_id = (SELECT p.org_id FROM rows r "
+        "JOIN blocks b ON b.id = r.block_id JOIN properties p ON p.id = b.property_id "
+        "WHERE r.id = individual_vines.row_id)"
+    )
+
+    op.drop_index('uq_activities_user_id_client_key', table_name='activities')
+    op.create_index('uq_activities_user_id_client_key', 'activities', ['user_id', 'client_key', 'org_id'], unique=True)
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # A foreign key cannot point at a partitioned table's id alone.
+    op.drop_constraint('vine_yields_vine_id_fkey', 'vine_yields', type_='foreignkey')
+    for table in TABLES:
+        _partition(table)
+
+
+def _definitions(bind, table: str):
+    """Foreign keys and secondary indexes of ``table``, as SQL."""
+    foreign_keys = bind.execute(sa.text(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'"
+    ), {'table': table}).all()
+    indexes = bind.execute(sa.text(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = :table AND indexname <> :pkey"
+    ), {'table': table, 'pkey': f'{table}_pkey'}).scalars().all()
+    return foreign_keys, indexes
+
+
+def _recreate(table: str, foreign_keys, indexes) -> None:
+    # Read before the rename, so the definitions already name ``table``.
+    for name, definition in foreign_keys:
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+    for definition in indexes:
+        op.execute(definition)
+
+
+def _partition(table: str) -> None:
+    bind = op.get_bind()
+    orphans = bind.execute(sa.text(f"SELECT count(*) FROM {table} WHERE org_id IS NULL")).scalar()
+    if orphans:
+        raise RuntimeError(f"{orphans} rows of {table} belong to no organization; fix or remove them first")
+    foreign_keys, indexes = _definitions(bind, table)
+    old = f"{table}_unpartitioned"
+    op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey")
+    for name, _ in foreign_keys:
+        op.execute(f"ALTER TABLE {old} DROP CONSTRAINT {name}")
+
+    op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY LIST (org_id)")
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN org_id SET NOT NULL")
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, org_id)")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    for (org_id,) in bind.execute(sa.text("SELECT id FROM organizations ORDER BY id")):
+        op.execute(f"CREATE TABLE {table}_org_{org_id} PARTITION OF {table} FOR VALUES IN ({org_id})")
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+    op.execute(f"DROP TABLE {old}")
+    _recreate(table, foreign_keys, indexes)
+
+
+def _unpartition(table: str) -> None:
+    bind = op.get_bind()
+    foreign_keys, indexes = _definitions(bind, table)
+    partitioned = f"{table}_partitioned"
+    op.execute(f"ALTER TABLE {table} RENAME TO {partitioned}")
+    op.execute(f"ALTER TABLE {partitioned} RENAME CONSTRAINT {table}_pkey TO {partitioned}_pkey")
+    for name, _ in foreign_keys:
+        op.execute(f"ALTER TABLE {partitioned} DROP CONSTRAINT {name}")
+
+    op.execute(f"CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS)")
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.execute(f"INSERT INTO {table} SELECT * FROM {partitioned}")
+    op.execute(f"DROP TABLE {partitioned}")
+    _recreate(table, foreign_keys, indexes)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in TABLES:
+            _unpartition(table)
+        op.create_foreign_key('vine_yields_vine_id_fkey', 'vine_yields', 'individual_vines', ['vine_id'], ['id'], ondelete='CASCADE')
+
+    op.drop_index('uq_activities_user_id_client_key', table_name='activities')
+    op.create_index('uq_activities_user_id_client_key', 'activities', ['user_id', 'client_key'], unique=True)
+    op.drop_column('individual_vines', 'org_id')
+    op.drop_column('crop_specific_data', 'org_id')
+    op.drop_column('activities', 'org_id')
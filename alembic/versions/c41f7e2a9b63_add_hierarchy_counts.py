@@ -0,0 +1,56 @@
+"""add_hierarchy_counts
+
+Revision ID: c41f7e2a9b63
+Revises: 3b8d6a1e5c27
+Create Date: 2025-09-02 10:41:18.502617
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f7e2a9b63'
+down_revision: Union[str, None] = '3b8d6a1e5c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('properties', sa.Column('block_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('properties', sa.Column('row_total', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('properties', sa.Column('vine_total', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('properties', sa.Column('block_acres', sa.DECIMAL(precision=10, scale=2), server_default='0', nullable=False))
+    op.add_column('blocks', sa.Column('row_total', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('blocks', sa.Column('vine_total', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('rows', sa.Column('vine_total', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the existing child records
+    op.execute(
+        "UPDATE rows SET vine_total = "
+        "(SELECT count(*) FROM individual_vines v WHERE v.row_id = rows.id)"
+    )
+    op.execute(
+        "UPDATE blocks SET "
+        "row_total = (SELECT count(*) FROM rows r WHERE r.block_id = blocks.id), "
+        "vine_total = (SELECT coalesce(sum(r.vine_total), 0) FROM rows r WHERE r.block_id = blocks.id)"
+    )
+    op.execute(
+        "UPDATE properties SET "
+        "block_count = (SELECT count(*) FROM blocks b WHERE b.property_id = properties.id), "
+        "row_total = (SELECT coalesce(sum(b.row_total), 0) FROM blocks b WHERE b.property_id = properties.id), "
+        "vine_total = (SELECT coalesce(sum(b.vine_total), 0) FROM blocks b WHERE b.property_id = properties.id), "
+        "block_acres = (SELECT coalesce(sum(b.acres), 0) FROM blocks b WHERE b.property_id = properties.id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('rows', 'vine_total')
+    op.drop_column('blocks', 'vine_total')
+    op.drop_column('blocks', 'row_total')
+    op.drop_column('properties', 'block_acres')
+    op.drop_column('properties', 'vine_total')
+    op.drop_column('properties', 'row_total')
+    op.drop_column('properties', 'block_count')
@@ -1,7 +1,10 @@
 from fastapi import APIRouter
 from app.api.api_v1.endpoints import health, models 
 from app.api.api_v1.endpoints import organizations, properties, blocks
-from app.api.api_v1.endpoints import mobile
+from app.api.api_v1.endpoints import mobile, tracks
+from app.api.api_v1.endpoints import uploads, spray_management
+from app.api.api_v1.endpoints import analytics, activities, live
+from app.core.config import settings
 
 
 api_router = APIRouter()
@@ -25,3 +28,22 @@ api_router.include_router(
     tags=["blocks"]
 )
 api_router.include_router(mobile.router, prefix="/mobile", tags=["mobile"])
+api_router.include_router(tracks.router, prefix="/tracks", tags=["tracks"])
+api_router.include_router(uploads.router, prefix="/uploads", tags=["uploads"])
+api_router.include_router(spray_management.router, prefix="/spray", tags=["spray"])
+api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
+api_router.include_router(activities.router, prefix="/activities", tags=["activities"])
+api_router.include_router(live.router, prefix="/live", tags=["live"])
+
+# Tenant reads passed through to Supabase, for the tables allowed explicitly
+if settings.SUPABASE_DATA_TABLES:
+    from app.api.api_v1.endpoints import data
+
+    api_router.include_router(data.router, prefix="/data", tags=["data"])
+
+# Operational endpoints (and the profiling store behind them) are only
+# imported when an admin token is configured; without one they 404 anyway.
+if settings.ADMIN_TOKEN:
+    from app.api.api_v1.endpoints import admin
+
+    api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
\ No newline at end of file
@@ -0,0 +1,81 @@
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.api import deps
+from app.schemas.activity import (
+    ActivityBatch,
+    ActivityBatchResponse,
+    ActivityPage,
+    ActivitySummary,
+)
+from app.services import activity_log
+
+router = APIRouter()
+
+
+@router.get("/", response_model=ActivityPage)
+def list_activities(
+    block_id: Optional[int] = Query(None),
+    user_id: Optional[int] = Query(None),
+    property_id: Optional[int] = Query(None),
+    activity_type: List[str] = Query([], description="Repeat to match several types"),
+    since: Optional[date] = Query(None),
+    until: Optional[date] = Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=activity_log.MAX_PAGE_SIZE),
+    db: Session = Depends(deps.get_read_db)
+):
+    """Activity timeline, newest first, paged by cursor"""
+    try:
+        return activity_log.timeline(
+            db,
+            block_id=block_id,
+            user_id=user_id,
+            property_id=property_id,
+            activity_types=activity_type,
+            since=since,
+            until=until,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/summary", response_model=ActivitySummary)
+def summarize_activities(
+    block_id: Optional[int] = Query(None),
+    user_id: Optional[int] = Query(None),
+    property_id: Optional[int] = Query(None),
+    since: Optional[date] = Query(None, description="Counted from the start of its month"),
+    until: Optional[date] = Query(None, description="Counted to the end of its month"),
+    db: Session = Depends(deps.get_read_db)
+):
+    """Activity count, cost and labor hours per type"""
+    return activity_log.type_summary(
+        db,
+        block_id=block_id,
+        user_id=user_id,
+        property_id=property_id,
+        since=since,
+        until=until,
+    )
+
+
+@router.post("/batch", response_model=ActivityBatchResponse)
+def log_activity_batch(
+    batch: ActivityBatch,
+    db: Session = Depends(deps.get_db)
+):
+    """Log a batch of activities; resubmitted client keys are reported, not inserted again"""
+    results = activity_log.log_activities(
+        db, [activity.model_dump() for activity in batch.activities]
+    )
+    return {
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "duplicates": sum(1 for r in results if r["status"] == "duplicate"),
+        "rejected": sum(1 for r in results if r["status"] == "rejected"),
+        "results": results,
+    }
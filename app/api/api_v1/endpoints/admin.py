@@ -0,0 +1,112 @@
+"""
+Operational endpoints, guarded by the ADMIN_TOKEN header.
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.db.replicas import replica_router
+from app.middleware.profiling import profile_store
+from app.models.organization import Organization
+from app.services.dashboard import dashboard_aggregator
+from app.services.model_runtime import model_runtime
+from app.services.reference_data import reference_data
+from app.services.shared_geo import shared_geo
+from app.services.tenant_partitions import partition_maintainer, purge_tenant_data
+
+router = APIRouter(dependencies=[Depends(deps.require_admin)])
+
+
+@router.get("/profiles")
+def list_profiles():
+    """List captured request profiles, newest first."""
+    return {"profiles": profile_store.list()}
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """CPU summary and top allocations of one captured profile."""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+
+@router.get("/profiles/{profile_id}/raw")
+def download_profile(profile_id: str):
+    """Raw profile (.prof for pstats/snakeviz, .pyisession for pyinstrument)."""
+    path = profile_store.raw_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(
+        path, media_type="application/octet-stream", filename=path.rsplit("/", 1)[-1]
+    )
+
+
+@router.get("/models/runtime")
+def model_runtime_stats():
+    """Loaded models, memory budget occupancy and load times of this worker."""
+    return model_runtime.stats()
+
+
+@router.get("/reference-data")
+def reference_data_stats():
+    """Version and size of this worker's reference data snapshot."""
+    return reference_data.stats()
+
+
+@router.post("/reference-data/refresh")
+def refresh_reference_data(db: Session = Depends(deps.get_db)):
+    """Reload the spray catalog and crop templates in this worker now."""
+    reference_data.refresh(db)
+    return reference_data.stats()
+
+
+
+@router.get("/replicas")
+def replica_stats():
+    """Health and lag of the read replicas as this worker last saw them."""
+    return replica_router.stats()
+
+
+@router.get("/geo-index")
+def shared_geo_stats():
+    """Generation, age and size of the location data shared by the workers."""
+    return shared_geo.stats()
+
+
+@router.get("/dashboard-aggregates")
+def dashboard_aggregate_stats():
+    """Leadership and last refresh of the dashboard aggregation job."""
+    return dashboard_aggregator.stats()
+
+
+@router.post("/dashboard-aggregates/refresh")
+def refresh_dashboard_aggregates(db: Session = Depends(deps.get_db)):
+    """Recompute every dashboard widget now, whichever worker leads."""
+    dashboard_aggregator.refresh(db)
+    return dashboard_aggregator.stats()
+
+
+@router.get("/partitions")
+def partition_stats():
+    """Leadership and last run of the org partition maintenance job."""
+    return partition_maintainer.stats()
+
+
+@router.post("/partitions/maintain")
+def maintain_partitions(db: Session = Depends(deps.get_db)):
+    """Create missing org partitions now, whichever worker leads."""
+    partition_maintainer.maintain(db)
+    return partition_maintainer.stats()
+
+
+@router.delete("/organizations/{org_id}/data")
+def purge_organization_data(org_id: int, db: Session = Depends(deps.get_db)):
+    """Drop an organization's activities, measurements, transactions and vines."""
+    if db.get(Organization, org_id) is None:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    purged = purge_tenant_data(db, org_id)
+    db.commit()
+    return {"org_id": org_id, "tables": purged}
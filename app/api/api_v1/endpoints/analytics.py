@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.api import deps
+from app.models.block import Block
+from app.schemas.yield_analytics import VineYieldBatch, VineYieldBatchResponse
+from app.services import yield_analytics
+
+router = APIRouter()
+
+SEASON = Query(None, ge=1900, le=2200, description="Harvest year; omit for historical_yield_kg")
+
+
+def _require_block(db: Session, block_id: int) -> None:
+    if db.query(Block.id).filter(Block.id == block_id).first() is None:
+        raise HTTPException(status_code=404, detail="Block not found")
+
+
+@router.get("/blocks/{block_id}/yield")
+def get_block_yield(
+    block_id: int,
+    season: Optional[int] = SEASON,
+    outlier_z: float = Query(yield_analytics.OUTLIER_Z, gt=0, le=20),
+    outlier_limit: int = Query(yield_analytics.OUTLIER_LIMIT, ge=0, le=5000),
+    include_points: bool = Query(False, description="Add per-vine points to the vigor map"),
+    db: Session = Depends(deps.get_read_db)
+):
+    """Row and block yield distributions, outlier vines and vigor map of one season"""
+    _require_block(db, block_id)
+    return yield_analytics.block_yield_report(
+        db, block_id, season, outlier_z, outlier_limit, include_points
+    )
+
+
+@router.get("/blocks/{block_id}/yield/seasons")
+def get_block_yield_seasons(
+    block_id: int,
+    db: Session = Depends(deps.get_read_db)
+):
+    """Seasons with recorded vine yields, newest first"""
+    _require_block(db, block_id)
+    return {"block_id": block_id, "seasons": yield_analytics.block_seasons(db, block_id)}
+
+
+@router.put("/blocks/{block_id}/yield/{season}", response_model=VineYieldBatchResponse)
+def record_block_yield(
+    block_id: int,
+    batch: VineYieldBatch,
+    season: int = Path(..., ge=1900, le=2200),
+    db: Session = Depends(deps.get_db)
+):
+    """Insert or replace vine yields of one season"""
+    _require_block(db, block_id)
+    try:
+        recorded = yield_analytics.record_yields(
+            db, block_id, season, [record.model_dump() for record in batch.records]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return VineYieldBatchResponse(block_id=block_id, season=season, recorded=recorded)
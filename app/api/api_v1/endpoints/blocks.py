@@ -1,20 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
 from app.api import deps
+from app.api.conditional import entity_etag, etag_matches, not_modified, set_etag
 from app.models.block import Block
 from app.models.property import Property
+from app.models.row import Row
+from app.services.geometry import GeometryOptions, geometry_options
+from app.services.hierarchy_service import HierarchyService
+from app.services.polygon import encode_boundary
+from app.services.reference_data import reference_data
 
 router = APIRouter()
 
 @router.get("/{property_id}/blocks")
 def get_blocks(
     property_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db)
 ):
     """Get all blocks for a property"""
-    blocks = db.query(Block).filter(Block.property_id == property_id).all()
-    return blocks
+    etag = entity_etag(
+        db, Block, Block.property_id == property_id, namespace=("block", property_id)
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    return HierarchyService.get_blocks(db, property_id, version=etag)
 
 @router.post("/{property_id}/blocks") 
 def create_block(
@@ -28,6 +40,13 @@ def create_block(
     if not property_obj:
         raise HTTPException(status_code=404, detail="Property not found")
     
+    # Optional polygon boundary as [[lat, lng], ...]
+    if "boundary" in block_data:
+        try:
+            block_data["boundary_polyline"] = encode_boundary(block_data.pop("boundary"))
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    
     db_block = Block(property_id=property_id, **block_data)
     db.add(db_block)
     db.commit()
@@ -50,63 +69,49 @@ def get_block_context(
         raise HTTPException(status_code=404, detail="Block not found")
     
     crop_type = block.crop_type
+    template = reference_data.get(db).crop_template(crop_type)
     
     return {
         "block_id": block_id,
         "block_name": block.block_name,
         "crop_type": crop_type,
         "variety": block.variety,
-        "available_operations": _get_crop_operations(crop_type),
-        "quality_metrics": _get_quality_metrics(crop_type),
-        "activity_templates": _get_activity_templates(crop_type)
+        "available_operations": template.operations,
+        "quality_metrics": template.quality_metrics,
+        "activity_templates": template.activity_templates
     }
 
-def _get_crop_operations(crop_type: str) -> List[str]:
-    """Get operations available for this crop type"""
-    universal_ops = ["irrigation", "observation", "maintenance"]
-    
-    crop_specific = {
-        "coffee": ["cherry_picking", "moisture_testing", "cupping"],
-        "apple": ["maturity_testing", "harvest", "ca_storage_prep"],
-        "grape": ["harvest", "crush", "fermentation_monitoring"]
-    }
-    
-    return universal_ops + crop_specific.get(crop_type, [])
-
-def _get_quality_metrics(crop_type: str) -> List[dict]:
-    """Get quality metrics for this crop"""
-    metrics = {
-        "coffee": [
-            {"name": "cherry_moisture", "unit": "%", "target_range": "18-22"},
-            {"name": "cup_score", "unit": "points", "target_range": "80-100"}
-        ],
-        "apple": [
-            {"name": "firmness", "unit": "lbs", "target_range": "16-18"},
-            {"name": "starch_index", "unit": "scale", "target_range": "1-8"}
-        ],
-        "grape": [
-            {"name": "brix", "unit": "°Bx", "target_range": "20-26"},
-            {"name": "ph", "unit": "pH", "target_range": "3.0-3.6"}
-        ]
-    }
-    
-    return metrics.get(crop_type, [])
-
-def _get_activity_templates(crop_type: str) -> List[dict]:
-    """Get common activity templates for this crop"""
-    templates = {
-        "coffee": [
-            {"name": "Cherry Moisture Check", "frequency": "daily"},
-            {"name": "Cupping Session", "frequency": "weekly"}
-        ],
-        "apple": [
-            {"name": "Maturity Test", "frequency": "weekly"},
-            {"name": "Harvest Planning", "frequency": "seasonal"}
-        ],
-        "grape": [
-            {"name": "Brix Testing", "frequency": "weekly"},
-            {"name": "Harvest Assessment", "frequency": "daily_during_harvest"}
+@router.get("/{property_id}/blocks/{block_id}/rows/geometry")
+def get_row_geometry(
+    property_id: int,
+    block_id: int,
+    request: Request,
+    response: Response,
+    geometry: GeometryOptions = Depends(geometry_options),
+    db: Session = Depends(deps.get_db)
+):
+    """Row centre lines of a block, encoded per the geometry options"""
+    etag = entity_etag(
+        db, Row, Row.block_id == block_id, namespace=("row", block_id)
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    rows = [
+        r for r in HierarchyService.get_rows(db, block_id, version=etag)
+        if None not in (r.start_latitude, r.start_longitude, r.end_latitude, r.end_longitude)
+    ]
+    return {
+        "block_id": block_id,
+        "rows": [
+            {
+                "id": r.id,
+                "row_number": r.row_number,
+                "geometry": geometry.encode([
+                    (r.start_latitude, r.start_longitude),
+                    (r.end_latitude, r.end_longitude)
+                ])
+            }
+            for r in sorted(rows, key=lambda r: r.row_number)
         ]
-    }
-    
-    return templates.get(crop_type, [])
\ No newline at end of file
+    }
\ No newline at end of file
@@ -0,0 +1,80 @@
+import re
+from fastapi import APIRouter, Header, HTTPException, Request
+from typing import Optional
+
+from app.core.config import settings
+from app.services.supabase_data import SupabaseError, supabase_data
+
+router = APIRouter()
+
+TABLES = frozenset(
+    table.strip() for table in settings.SUPABASE_DATA_TABLES.split(",") if table.strip()
+)
+
+
+def _require_table(table: str) -> None:
+    if table not in TABLES:
+        raise HTTPException(status_code=404, detail="Table not found")
+
+
+# Plain columns only (optionally aliased or cast): ``other_table(*)`` would
+# embed a table that is not in TABLES.
+_COLUMN = re.compile(r"\s*(\w+\s*:\s*)?\w+(::\w+)?\s*")
+
+
+def _require_columns(select: str) -> None:
+    if select.strip() == "*":
+        return
+    if not all(_COLUMN.fullmatch(column) for column in select.split(",")):
+        raise HTTPException(
+            status_code=400, detail="select accepts column names of this table only"
+        )
+
+
+def _token(authorization: Optional[str]) -> Optional[str]:
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip() or None
+    return None
+
+
+def _failed(e: SupabaseError) -> HTTPException:
+    # Client errors (bad filter, expired token) are the caller's to fix.
+    status_code = e.status_code if 400 <= e.status_code < 500 else 502
+    return HTTPException(status_code=status_code, detail=e.detail)
+
+
+@router.get("/{table}")
+async def select_rows(
+    table: str, request: Request, authorization: Optional[str] = Header(None)
+):
+    """Rows of a Supabase table; query parameters are PostgREST's (select, order, limit, column=op.value)"""
+    _require_table(table)
+    params = request.query_params.multi_items()
+    for name, value in params:
+        if name == "select":
+            _require_columns(value)
+    try:
+        return await supabase_data.select(table, params, _token(authorization))
+    except SupabaseError as e:
+        raise _failed(e)
+
+
+@router.get("/{table}/{row_id}")
+async def get_row(
+    table: str,
+    row_id: str,
+    select: str = "*",
+    authorization: Optional[str] = Header(None),
+):
+    """One row by id; concurrent lookups are batched into one Supabase request"""
+    _require_table(table)
+    _require_columns(select)
+    try:
+        row = await supabase_data.get(
+            table, row_id, columns=select, token=_token(authorization)
+        )
+    except SupabaseError as e:
+        raise _failed(e)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Row not found")
+    return row
@@ -1,6 +1,12 @@
+from datetime import datetime, timezone
+
 from fastapi import APIRouter
 from sqlalchemy import text
-from app.db.base import get_db
+from app.core.config import settings
+from app.core.metrics import pool_status, uptime_seconds
+from app.db.base import get_db, get_engine
+from app.schemas.common import HealthCheckResponse
+from app.services.cache import query_cache
 
 router = APIRouter()
 
@@ -20,4 +26,35 @@ async def database_health_check():
         db.close()
         return {"status": "healthy", "database": "connected"}
     except Exception as e:
-        return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
\ No newline at end of file
+        return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
+
+
+@router.get("/cache")
+async def cache_stats():
+    """Hit/miss counters of the hierarchy read cache."""
+    return query_cache.stats()
+
+
+@router.get("/detailed", response_model=HealthCheckResponse)
+def detailed_health_check():
+    """Health check with uptime, connection pool state and dependency status."""
+    engine = get_engine()
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        database = "connected"
+    except Exception:
+        database = "disconnected"
+
+    return HealthCheckResponse(
+        status="healthy" if database == "connected" else "degraded",
+        timestamp=datetime.now(timezone.utc).isoformat(),
+        version=settings.VERSION,
+        uptime=round(uptime_seconds(), 3),
+        database=database,
+        external_services={
+            "cache": query_cache.stats()["backend"],
+            "supabase": "configured" if settings.SUPABASE_ANON_KEY else "not_configured",
+        },
+        pool=pool_status(engine),
+    )
\ No newline at end of file
@@ -0,0 +1,123 @@
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import List
+
+from app.core.config import settings
+from app.services.live_events import live_events
+
+router = APIRouter()
+
+TOPIC_QUERY = "Repeat to follow several"
+
+
+def _topics(
+    org_id: List[int], property_id: List[int], block_id: List[int]
+) -> List[str]:
+    return (
+        [f"org:{i}" for i in org_id]
+        + [f"property:{i}" for i in property_id]
+        + [f"block:{i}" for i in block_id]
+    )
+
+
+@router.websocket("/ws")
+async def live_socket(
+    websocket: WebSocket,
+    org_id: List[int] = Query([], description=TOPIC_QUERY),
+    property_id: List[int] = Query([], description=TOPIC_QUERY),
+    block_id: List[int] = Query([], description=TOPIC_QUERY),
+):
+    """Check-ins, activities and inference results for the given org/property/block ids"""
+    topics = _topics(org_id, property_id, block_id)
+    if not topics:
+        await websocket.close(
+            code=1008, reason="Name an org_id, property_id or block_id"
+        )
+        return
+    subscription = live_events.subscribe(topics)
+    if subscription is None:
+        await websocket.close(
+            code=1013, reason="Too many live connections, retry later"
+        )
+        return
+    await websocket.accept()
+    # Nothing is expected from the client; reading only notices it leaving.
+    closed = asyncio.create_task(_until_disconnect(websocket))
+    try:
+        while True:
+            next_event = asyncio.create_task(
+                subscription.get(settings.LIVE_EVENTS_HEARTBEAT_SECONDS)
+            )
+            await asyncio.wait(
+                {next_event, closed}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if closed.done():
+                next_event.cancel()
+                break
+            # A client that stops reading is dropped rather than buffered for.
+            await asyncio.wait_for(
+                websocket.send_text(
+                    json.dumps(next_event.result() or {"type": "heartbeat"})
+                ),
+                settings.LIVE_EVENTS_SEND_TIMEOUT_SECONDS,
+            )
+    except (WebSocketDisconnect, asyncio.TimeoutError):
+        pass
+    finally:
+        live_events.unsubscribe(subscription)
+        if not closed.done():
+            closed.cancel()
+            await _close_quietly(websocket)
+
+
+async def _until_disconnect(websocket: WebSocket) -> None:
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+async def _close_quietly(websocket: WebSocket) -> None:
+    try:
+        await websocket.close()
+    except Exception:
+        pass
+
+
+@router.get("/events")
+async def live_stream(
+    org_id: List[int] = Query([], description=TOPIC_QUERY),
+    property_id: List[int] = Query([], description=TOPIC_QUERY),
+    block_id: List[int] = Query([], description=TOPIC_QUERY),
+):
+    """The WebSocket feed as server-sent events"""
+    topics = _topics(org_id, property_id, block_id)
+    if not topics:
+        raise HTTPException(
+            status_code=400, detail="Name an org_id, property_id or block_id"
+        )
+    subscription = live_events.subscribe(topics)
+    if subscription is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many live connections, retry later",
+            headers={"Retry-After": "5"},
+        )
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                item = await subscription.get(settings.LIVE_EVENTS_HEARTBEAT_SECONDS)
+                if item is None:
+                    yield ": heartbeat\n\n"
+                else:
+                    yield f"event: {item['type']}\ndata: {json.dumps(item)}\n\n"
+        finally:
+            live_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,188 +1,205 @@
 # app/api/api_v1/endpoints/mobile.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from geopy.distance import geodesic
 from typing import Optional
 from pydantic import BaseModel
 from datetime import datetime
-import math
+from starlette.concurrency import run_in_threadpool
 
 from app.api import deps
-from app.models.property import Property
-from app.models.block import Block
-from app.models.row import Row
+from app.api.conditional import etag_matches, make_etag, not_modified, set_etag
+from app.services.live_events import live_events, make_event, property_org
+from app.services.shared_geo import shared_geo
+from app.services.track_ingestion import TrackFix, track_ingestor
 
 router = APIRouter()
 
+
 class GPSLocationRequest(BaseModel):
     latitude: float
     longitude: float
     accuracy_meters: float
     altitude_ft: Optional[float] = None
 
+
 class MobileCheckinRequest(BaseModel):
     gps_location: GPSLocationRequest
     timestamp: datetime
     device_id: str
     app_version: str
 
+
 def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     """Calculate distance between two GPS points in meters"""
+    from geopy.distance import geodesic  # deferred: only the circle fallback needs it
+
     return geodesic((lat1, lng1), (lat2, lng2)).meters
 
-def is_point_in_circle(point_lat: float, point_lng: float, 
-                      center_lat: float, center_lng: float, radius_meters: float) -> bool:
-    """Check if a point is within a circular boundary"""
-    distance = calculate_distance(point_lat, point_lng, center_lat, center_lng)
-    return distance <= radius_meters
 
 @router.post("/detect-location")
 async def detect_location(
-    gps_data: GPSLocationRequest,
-    db: Session = Depends(deps.get_db)
+    gps_data: GPSLocationRequest, db: Session = Depends(deps.get_db)
 ):
     """Auto-detect property, block, row based on GPS coordinates"""
     user_lat = gps_data.latitude
     user_lng = gps_data.longitude
-    
-    # Find closest property
-    properties = db.query(Property).all()
-    detected_property = None
-    min_distance = float('inf')
-    
-    for prop in properties:
-        if prop.latitude and prop.longitude:
-            # Check if user is within property boundary (if defined)
-            if (prop.boundary_center_lat and prop.boundary_center_lng and 
-                prop.boundary_radius_meters):
-                if is_point_in_circle(user_lat, user_lng, 
-                                    float(prop.boundary_center_lat), 
-                                    float(prop.boundary_center_lng),
-                                    float(prop.boundary_radius_meters)):
-                    detected_property = prop
-                    min_distance = calculate_distance(user_lat, user_lng, 
-                                                    float(prop.latitude), float(prop.longitude))
-                    break
-            else:
-                # Fallback to closest property by center point
-                distance = calculate_distance(user_lat, user_lng, 
-                                            float(prop.latitude), float(prop.longitude))
-                if distance < min_distance and distance < 1000:  # Within 1km
-                    min_distance = distance
-                    detected_property = prop
-    
+
+    # Polygon boundary wins, then the circle; properties with neither match
+    # on the closest centre within 1km (blocks: 500m). Attaching (or building
+    # the first generation) does file and database I/O: keep it off the loop.
+    geo = await run_in_threadpool(shared_geo.view, db)
+    detected_property = geo.detect_property(user_lat, user_lng, calculate_distance)
     if not detected_property:
         raise HTTPException(status_code=404, detail="No property found within range")
-    
-    # Find closest block within property
-    blocks = db.query(Block).filter(Block.property_id == detected_property.id).all()
-    detected_block = None
-    min_block_distance = float('inf')
-    
-    for block in blocks:
-        if block.center_latitude and block.center_longitude:
-            # Check if user is within block boundary (if defined)
-            if block.boundary_radius_meters:
-                if is_point_in_circle(user_lat, user_lng,
-                                    float(block.center_latitude),
-                                    float(block.center_longitude),
-                                    float(block.boundary_radius_meters)):
-                    detected_block = block
-                    min_block_distance = calculate_distance(user_lat, user_lng,
-                                                           float(block.center_latitude),
-                                                           float(block.center_longitude))
-                    break
-            else:
-                # Fallback to closest block
-                distance = calculate_distance(user_lat, user_lng,
-                                            float(block.center_latitude),
-                                            float(block.center_longitude))
-                if distance < min_block_distance and distance < 500:  # Within 500m
-                    min_block_distance = distance
-                    detected_block = block
-    
+    property_position, min_distance = detected_property
+    property_id = geo.p_id[property_position]
+
+    detected_block = geo.detect_block(
+        property_id, user_lat, user_lng, calculate_distance
+    )
+    detected_row = detected_vine = None
+    if detected_block:
+        block_position, min_block_distance = detected_block
+        detected_row = geo.detect_row(geo.b_id[block_position], user_lat, user_lng)
+    if detected_row:
+        detected_vine = geo.detect_vine(detected_row[0], user_lat, user_lng)
+
     # Calculate confidence scores
     property_confidence = max(0, 1 - (min_distance / 1000))
     block_confidence = max(0, 1 - (min_block_distance / 500)) if detected_block else 0
-    
+
     return {
         "detected_property": {
-            "id": detected_property.id,
-            "name": detected_property.property_name,
+            "id": property_id,
+            "name": geo.property_name(property_position),
             "confidence": round(property_confidence, 2),
-            "distance_meters": round(min_distance, 1)
+            "distance_meters": round(min_distance, 1),
         },
         "detected_block": {
-            "id": detected_block.id if detected_block else None,
-            "name": detected_block.block_name if detected_block else None,
+            "id": geo.b_id[block_position],
+            "name": geo.block_name(block_position),
             "confidence": round(block_confidence, 2),
-            "distance_meters": round(min_block_distance, 1) if detected_block else None
-        } if detected_block else None,
-        "gps_accuracy": gps_data.accuracy_meters
+            "distance_meters": round(min_block_distance, 1),
+        }
+        if detected_block
+        else None,
+        "detected_row": {
+            "id": geo.r_id[detected_row[0]],
+            "row_number": geo.r_number[detected_row[0]],
+            "distance_meters": round(detected_row[1], 1),
+        }
+        if detected_row
+        else None,
+        "detected_vine": {
+            "id": geo.v_id[detected_vine[0]],
+            "vine_number": geo.v_number[detected_vine[0]],
+            "distance_meters": round(detected_vine[1], 1),
+        }
+        if detected_vine
+        else None,
+        "gps_accuracy": gps_data.accuracy_meters,
     }
 
+
 @router.post("/checkin")
 async def mobile_checkin(
-    checkin_data: MobileCheckinRequest,
-    db: Session = Depends(deps.get_db)
+    checkin_data: MobileCheckinRequest, db: Session = Depends(deps.get_db)
 ):
     """Record mobile check-in with auto-detected location"""
-    location_detection = await detect_location(checkin_data.gps_location, db)
-    
+    gps = checkin_data.gps_location
+    track_ingestor.submit(
+        [
+            TrackFix(
+                device_id=checkin_data.device_id,
+                recorded_at=checkin_data.timestamp,
+                latitude=gps.latitude,
+                longitude=gps.longitude,
+                accuracy_m=gps.accuracy_meters,
+            )
+        ]
+    )
+    location_detection = await detect_location(gps, db)
+    if live_events.wanted:
+        property_id = location_detection["detected_property"]["id"]
+        block = location_detection["detected_block"]
+        row = location_detection["detected_row"]
+        live_events.publish(
+            db,
+            [
+                make_event(
+                    "checkin",
+                    {
+                        "device_id": checkin_data.device_id,
+                        "recorded_at": checkin_data.timestamp,
+                        "latitude": gps.latitude,
+                        "longitude": gps.longitude,
+                        "accuracy_meters": gps.accuracy_meters,
+                        "row_id": row["id"] if row else None,
+                    },
+                    org_id=property_org(db.connection(), property_id),
+                    property_id=property_id,
+                    block_id=block["id"] if block else None,
+                )
+            ],
+        )
+        db.commit()
+
     # For now, just return the detection - you can add ActivityLocation model later
     return {
         "checkin_id": f"checkin_{checkin_data.timestamp.isoformat()}",
         "location_detection": location_detection,
         "timestamp": checkin_data.timestamp,
-        "device_id": checkin_data.device_id
+        "device_id": checkin_data.device_id,
     }
 
+
 @router.get("/nearby-locations")
 async def get_nearby_locations(
     latitude: float,
     longitude: float,
+    request: Request,
+    response: Response,
     radius_meters: float = 1000,
-    db: Session = Depends(deps.get_db)
+    db: Session = Depends(deps.get_read_db),
 ):
     """Get all properties and blocks within radius of user location"""
-    nearby_properties = []
-    nearby_blocks = []
-    
-    # Find nearby properties
-    properties = db.query(Property).all()
-    for prop in properties:
-        if prop.latitude and prop.longitude:
-            distance = calculate_distance(latitude, longitude, 
-                                        float(prop.latitude), float(prop.longitude))
-            if distance <= radius_meters:
-                nearby_properties.append({
-                    "id": prop.id,
-                    "name": prop.property_name,
-                    "distance_meters": round(distance, 1),
-                    "latitude": float(prop.latitude),
-                    "longitude": float(prop.longitude)
-                })
-    
-    # Find nearby blocks
-    blocks = db.query(Block).all()
-    for block in blocks:
-        if block.center_latitude and block.center_longitude:
-            distance = calculate_distance(latitude, longitude,
-                                        float(block.center_latitude),
-                                        float(block.center_longitude))
-            if distance <= radius_meters:
-                nearby_blocks.append({
-                    "id": block.id,
-                    "name": block.block_name,
-                    "property_id": block.property_id,
-                    "distance_meters": round(distance, 1),
-                    "latitude": float(block.center_latitude),
-                    "longitude": float(block.center_longitude)
-                })
-    
+    geo = await run_in_threadpool(shared_geo.view, db)
+    # The answer only changes with the location data generation
+    etag = make_etag("nearby", geo.generation, geo.built_at)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    nearby_properties = [
+        {
+            "id": geo.p_id[position],
+            "name": geo.property_name(position),
+            "distance_meters": round(distance, 1),
+            "latitude": geo.p_lat[position],
+            "longitude": geo.p_lng[position],
+        }
+        for position, distance in geo.within(
+            "p", latitude, longitude, radius_meters, calculate_distance
+        )
+    ]
+    nearby_blocks = [
+        {
+            "id": geo.b_id[position],
+            "name": geo.block_name(position),
+            "property_id": geo.b_property[position],
+            "distance_meters": round(distance, 1),
+            "latitude": geo.b_lat[position],
+            "longitude": geo.b_lng[position],
+        }
+        for position, distance in geo.within(
+            "b", latitude, longitude, radius_meters, calculate_distance
+        )
+    ]
+
     return {
         "user_location": {"latitude": latitude, "longitude": longitude},
         "search_radius_meters": radius_meters,
-        "nearby_properties": sorted(nearby_properties, key=lambda x: x["distance_meters"]),
-        "nearby_blocks": sorted(nearby_blocks, key=lambda x: x["distance_meters"])
-    }
\ No newline at end of file
+        "nearby_properties": sorted(
+            nearby_properties, key=lambda x: x["distance_meters"]
+        ),
+        "nearby_blocks": sorted(nearby_blocks, key=lambda x: x["distance_meters"]),
+    }
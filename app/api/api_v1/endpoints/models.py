@@ -16,6 +16,7 @@ from app.schemas.ai_model import (
     AIModelUpdate,
 )
 from app.schemas.common import APIResponse, SuccessResponse
+from app.services.model_runtime import model_runtime
 
 router = APIRouter()
 
@@ -113,6 +114,9 @@ async def update_model(
     
     db.commit()
     db.refresh(model)
+    # Drop the loaded runtime; it reloads on next use (or stays unloaded if
+    # the model is no longer deployed)
+    model_runtime.evict(model_id)
     
     return APIResponse(
         success=True,
@@ -134,5 +138,6 @@ async def delete_model(
     
     db.delete(model)
     db.commit()
+    model_runtime.evict(model_id)
     
     return SuccessResponse(message="Model deleted successfully")
\ No newline at end of file
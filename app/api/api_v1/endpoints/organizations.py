@@ -1,19 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 from app.api import deps
+from app.api.conditional import entity_etag, etag_matches, not_modified, set_etag
 from app.models.organization import Organization
 from app.schemas.organization import OrganizationCreate, OrganizationResponse
+from app.services.dashboard import org_widgets, read_dashboard
 
 router = APIRouter()
 
 @router.get("/", response_model=List[OrganizationResponse])
 def get_organizations(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(deps.get_db)
 ):
     """Get all organizations"""
+    etag = entity_etag(db, Organization)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     organizations = db.query(Organization).offset(skip).limit(limit).all()
     return organizations
 
@@ -48,9 +56,20 @@ def get_organization_context(
         "org_type": org.org_type,
         "agricultural_profile": agricultural_profile,
         "available_modules": _get_available_modules(agricultural_profile),
-        "dashboard_widgets": _get_dashboard_widgets(agricultural_profile)
+        "dashboard_widgets": org_widgets(agricultural_profile)
     }
 
+@router.get("/{org_id}/dashboard")
+def get_organization_dashboard(
+    org_id: int,
+    db: Session = Depends(deps.get_db)
+):
+    """Organization dashboard widgets with their precomputed data"""
+    dashboard = read_dashboard(db, org_id)
+    if dashboard is None:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    return dashboard
+
 def _get_available_modules(profile: dict) -> List[str]:
     """Determine available modules based on agricultural profile"""
     modules = ["properties", "activities", "weather", "people"]
@@ -64,18 +83,3 @@ def _get_available_modules(profile: dict) -> List[str]:
         modules.extend(["cellar_operations", "barrel_management"])
         
     return modules
-
-def _get_dashboard_widgets(profile: dict) -> List[dict]:
-    """Get contextual dashboard widgets"""
-    widgets = [
-        {"type": "weather", "priority": 1},
-        {"type": "recent_activities", "priority": 2}
-    ]
-    
-    crops = profile.get("crops", [])
-    if "coffee" in crops:
-        widgets.append({"type": "cherry_moisture", "priority": 3})
-    if "apple" in crops:
-        widgets.append({"type": "maturity_tracking", "priority": 3})
-        
-    return widgets
\ No newline at end of file
@@ -1,20 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 from app.api import deps
+from app.api.conditional import entity_etag, etag_matches, not_modified, set_etag
 from app.models.property import Property
 from app.models.organization import Organization
+from app.services.dashboard import property_widgets, read_dashboard
+from app.services.hierarchy_service import HierarchyService
+from app.services.polygon import encode_boundary
 
 router = APIRouter()
 
 @router.get("/{org_id}/properties")
 def get_properties(
     org_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db)
 ):
     """Get all properties for an organization"""
-    properties = db.query(Property).filter(Property.org_id == org_id).all()
-    return properties
+    etag = entity_etag(
+        db, Property, Property.org_id == org_id, namespace=("property", org_id)
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    return HierarchyService.get_properties(db, org_id, version=etag)
 
 @router.post("/{org_id}/properties")
 def create_property(
@@ -28,6 +39,13 @@ def create_property(
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
     
+    # Optional polygon boundary as [[lat, lng], ...]
+    if "boundary" in property_data:
+        try:
+            property_data["boundary_polyline"] = encode_boundary(property_data.pop("boundary"))
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    
     db_property = Property(org_id=org_id, **property_data)
     db.add(db_property)
     db.commit()
@@ -58,9 +76,21 @@ def get_property_context(
         "primary_crops": primary_crops,
         "business_functions": business_functions,
         "available_modules": _get_property_modules(primary_crops, business_functions),
-        "dashboard_widgets": _get_property_widgets(primary_crops)
+        "dashboard_widgets": property_widgets(primary_crops)
     }
 
+@router.get("/{org_id}/properties/{property_id}/dashboard")
+def get_property_dashboard(
+    org_id: int,
+    property_id: int,
+    db: Session = Depends(deps.get_db)
+):
+    """Property dashboard widgets with their precomputed data"""
+    dashboard = read_dashboard(db, org_id, property_id)
+    if dashboard is None:
+        raise HTTPException(status_code=404, detail="Property not found")
+    return dashboard
+
 def _get_property_modules(crops: List[str], functions: List[str]) -> List[str]:
     """Get modules specific to this property"""
     modules = ["blocks", "activities", "weather"]
@@ -73,14 +103,3 @@ def _get_property_modules(crops: List[str], functions: List[str]) -> List[str]:
         modules.extend(["visitor_management", "events"])
         
     return modules
-
-def _get_property_widgets(crops: List[str]) -> List[dict]:
-    """Get widgets specific to this property"""
-    widgets = [{"type": "weather_station", "priority": 1}]
-    
-    if "coffee" in crops:
-        widgets.append({"type": "cherry_moisture_alerts", "priority": 2})
-    if "apple" in crops:
-        widgets.append({"type": "harvest_readiness", "priority": 2})
-        
-    return widgets
\ No newline at end of file
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 from pydantic import BaseModel
 
 from app.api import deps
-from app.models.spray_product import SprayProduct
+from app.services.reference_data import reference_data
 
 router = APIRouter()
 
@@ -22,34 +22,95 @@ class SprayProductResponse(BaseModel):
         from_attributes = True
 
 @router.get("/products/search")
-async def search_spray_products(
+def search_spray_products(
     q: str,
     crop_type: Optional[str] = None,
+    frac_code: Optional[str] = None,
+    ingredient: Optional[str] = None,
+    product_type: Optional[str] = None,
     db: Session = Depends(deps.get_db)
 ):
     """Search spray products with regulatory information"""
-    query = db.query(SprayProduct).filter(SprayProduct.is_active == True)
-    
-    if q:
-        query = query.filter(SprayProduct.product_name.ilike(f"%{q}%"))
-    
-    products = query.limit(20).all()
-    
-    result = []
-    for product in products:
-        result.append({
-            "id": product.id,
-            "name": product.product_name,
-            "manufacturer": product.manufacturer,
-            "active_ingredients": product.active_ingredients,
+    catalog = reference_data.get(db)
+    products = catalog.search(
+        q, limit=20, frac_code=frac_code, ingredient=ingredient, product_type=product_type
+    )
+    return [product.to_search_result() for product in products]
+
+@router.get("/products/{product_id}")
+def get_spray_product(product_id: int, db: Session = Depends(deps.get_db)):
+    """Full catalog entry for one spray product"""
+    product = reference_data.get(db).by_id.get(product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Spray product not found")
+    return product
+
+class PlannedApplication(BaseModel):
+    product_id: int
+    rate_per_acre: Optional[float] = None
+    applied_on: date
+
+class ComplianceCheckRequest(BaseModel):
+    applications: List[PlannedApplication]
+    harvest_date: Optional[date] = None
+    organic: bool = False
+
+@router.post("/compliance/check")
+def check_spray_compliance(
+    request: ComplianceCheckRequest,
+    db: Session = Depends(deps.get_db)
+):
+    """Check a spray program against label rates, PHI, organic status and
+    FRAC rotation"""
+    catalog = reference_data.get(db)
+    results = []
+    previous_frac = None
+    for application in sorted(request.applications, key=lambda a: a.applied_on):
+        product = catalog.by_id.get(application.product_id)
+        issues = []
+        if product is None:
+            results.append({
+                "product_id": application.product_id,
+                "applied_on": application.applied_on,
+                "compliant": False,
+                "issues": ["unknown product"],
+            })
+            previous_frac = None
+            continue
+        if not product.is_active:
+            issues.append("product is no longer active")
+        if request.organic and not product.organic_approved:
+            issues.append("product is not approved for organic production")
+        rate = application.rate_per_acre
+        units = f" {product.rate_units}" if product.rate_units else ""
+        if rate is not None:
+            if product.max_rate_per_acre is not None and rate > product.max_rate_per_acre:
+                issues.append(f"rate exceeds label maximum of {product.max_rate_per_acre}{units}")
+            if product.min_rate_per_acre is not None and rate < product.min_rate_per_acre:
+                issues.append(f"rate below label minimum of {product.min_rate_per_acre}{units}")
+        earliest_harvest = None
+        if product.default_phi_days is not None:
+            phi = product.default_phi_days
+            earliest_harvest = application.applied_on + timedelta(days=phi)
+            if request.harvest_date is not None and request.harvest_date < earliest_harvest:
+                issues.append(f"pre-harvest interval of {phi} days not met")
+        warnings = []
+        if product.frac_code and product.frac_code == previous_frac:
+            warnings.append(f"consecutive application of FRAC group {product.frac_code}")
+        previous_frac = product.frac_code
+        results.append({
+            "product_id": product.id,
+            "product_name": product.product_name,
+            "applied_on": application.applied_on,
             "frac_code": product.frac_code,
-            "restrictions": {
-                "phi_days": product.default_phi_days,
-                "rei_hours": product.default_rei_hours,
-            },
-            "cost_per_unit": product.cost_per_unit
+            "rei_hours": product.default_rei_hours,
+            "earliest_harvest": earliest_harvest,
+            "compliant": not issues,
+            "issues": issues,
+            "warnings": warnings,
         })
-    
-    return result
-
-# Add compliance checking endpoint here...
\ No newline at end of file
+    return {
+        "compliant": all(r["compliant"] for r in results),
+        "catalog_version": catalog.version,
+        "applications": results,
+    }
\ No newline at end of file
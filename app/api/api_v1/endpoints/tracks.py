@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date, datetime, timezone
+
+from app.api import deps
+from app.models.gps_track import BlockVisit, GPSFix
+from app.schemas.track import BlockVisitResponse, TrackBatchRequest, TrackBatchResponse
+from app.services.geometry import GeometryOptions, geometry_options
+from app.services.track_ingestion import TrackFix, track_ingestor
+
+router = APIRouter()
+
+def _utc_day(moment: datetime) -> date:
+    """Partition day of an instant; naive datetimes are taken as UTC"""
+    if moment.tzinfo is None:
+        return moment.date()
+    return moment.astimezone(timezone.utc).date()
+
+@router.post("/fixes", response_model=TrackBatchResponse, status_code=202)
+def submit_fixes(batch: TrackBatchRequest):
+    """Queue a batch of GPS fixes for map-matching and storage"""
+    fixes = [
+        TrackFix(device_id=batch.device_id, org_id=batch.org_id, **fix.model_dump())
+        for fix in batch.fixes
+    ]
+    accepted = track_ingestor.submit(fixes)
+    if accepted == 0:
+        raise HTTPException(
+            status_code=503,
+            detail="Track ingestion buffer is full, retry later",
+            headers={"Retry-After": "1"},
+        )
+    return {
+        "accepted": accepted,
+        "rejected": len(fixes) - accepted,
+        "buffered": track_ingestor.buffered,
+    }
+
+@router.get("/{device_id}/visits", response_model=List[BlockVisitResponse])
+def get_block_visits(
+    device_id: str,
+    since: Optional[datetime] = None,
+    limit: int = 100,
+    db: Session = Depends(deps.get_db)
+):
+    """Most recent block visits of a device"""
+    query = db.query(BlockVisit).filter(BlockVisit.device_id == device_id)
+    if since is not None:
+        query = query.filter(BlockVisit.started_at >= since)
+    return query.order_by(BlockVisit.started_at.desc()).limit(min(limit, 1000)).all()
+
+
+@router.get("/{device_id}/trail")
+def get_trail(
+    device_id: str,
+    start: datetime,
+    end: datetime,
+    geometry: GeometryOptions = Depends(geometry_options),
+    db: Session = Depends(deps.get_db)
+):
+    """GPS trail of a device between two instants, encoded per the geometry options"""
+    if end <= start:
+        raise HTTPException(status_code=422, detail="end must be after start")
+    # recorded_on bounds let Postgres prune to the day partitions involved
+    points = db.query(GPSFix.latitude, GPSFix.longitude).filter(
+        GPSFix.recorded_on >= _utc_day(start),
+        GPSFix.recorded_on <= _utc_day(end),
+        GPSFix.device_id == device_id,
+        GPSFix.recorded_at >= start,
+        GPSFix.recorded_at < end
+    ).order_by(GPSFix.recorded_at).all()
+    return {
+        "device_id": device_id,
+        "start": start,
+        "end": end,
+        "fix_count": len(points),
+        "geometry": geometry.encode(points)
+    }
\ No newline at end of file
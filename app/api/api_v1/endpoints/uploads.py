@@ -0,0 +1,92 @@
+"""
+Streaming upload of inference input files.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+
+from app.services.uploads import SHA256_RE, UploadTooLarge, upload_store
+
+router = APIRouter()
+
+
+def _describe(upload, request: Request) -> dict:
+    return {
+        "sha256": upload.sha256,
+        "size": upload.size,
+        "content_type": upload.content_type,
+        "filename": upload.filename,
+        "input_type": upload.input_type,
+        "deduplicated": upload.deduplicated,
+        "file_url": str(request.url_for("download_upload", sha256=upload.sha256)),
+    }
+
+
+@router.post("/", status_code=201)
+async def upload_file(
+    request: Request,
+    response: Response,
+    filename: Optional[str] = Query(None, max_length=255),
+    content_type: str = Header("application/octet-stream"),
+    content_length: Optional[int] = Header(None),
+    x_content_sha256: Optional[str] = Header(None),
+):
+    """Stream the raw request body to storage; use the returned ``file_url``
+    as an inference request's ``file_url``.
+
+    Send the file as the body (not multipart). If ``X-Content-SHA256`` names
+    content that is already stored, the body is not read at all.
+    """
+    if x_content_sha256 is not None:
+        digest = x_content_sha256.lower()
+        if not SHA256_RE.match(digest):
+            raise HTTPException(status_code=400, detail="Invalid X-Content-SHA256")
+        existing = upload_store.get(digest)
+        if existing is not None:
+            existing.deduplicated = True
+            response.status_code = 200
+            return _describe(existing, request)
+
+    if content_length is not None and content_length > upload_store.max_bytes:
+        raise HTTPException(status_code=413, detail="Upload too large")
+    try:
+        upload = await upload_store.save_stream(
+            request.stream(), content_type=content_type, filename=filename
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if x_content_sha256 is not None and upload.sha256 != x_content_sha256.lower():
+        raise HTTPException(
+            status_code=400, detail="Body does not match X-Content-SHA256"
+        )
+    if upload.deduplicated:
+        response.status_code = 200
+    return _describe(upload, request)
+
+
+@router.get("/{sha256}/meta")
+def get_upload(sha256: str, request: Request):
+    """Metadata of a stored upload."""
+    upload = upload_store.get(sha256) if SHA256_RE.match(sha256) else None
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return _describe(upload, request)
+
+
+@router.get("/{sha256}")
+def download_upload(sha256: str):
+    """File contents, sent with sendfile where available."""
+    upload = upload_store.get(sha256) if SHA256_RE.match(sha256) else None
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return FileResponse(
+        upload_store.path(sha256),
+        media_type=upload.content_type,
+        filename=upload.filename,
+        headers={
+            "etag": f'"{sha256}"',
+            "cache-control": "private, max-age=31536000, immutable",
+        },
+    )
@@ -1,5 +1,13 @@
-from typing import Generator
+import hmac
+from typing import Generator, Optional
+
+from fastapi import Header, HTTPException, Request
+
+from app.core.config import settings
 from app.db.base import SessionLocal
+from app.db.replicas import replica_router
+from app.middleware.read_your_writes import wrote_recently
+
 
 def get_db() -> Generator:
     """Get database session"""
@@ -7,4 +15,23 @@ def get_db() -> Generator:
         db = SessionLocal()
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db(request: Request) -> Generator:
+    """Get a read-only session on a replica (the primary right after a write)"""
+    db = replica_router.session(primary=wrote_recently(request.cookies))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Guard for operational endpoints; disabled unless ADMIN_TOKEN is set"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not x_admin_token or not hmac.compare_digest(
+        x_admin_token, settings.ADMIN_TOKEN
+    ):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
@@ -14,5 +14,119 @@ class Settings:
     SUPABASE_ANON_KEY: str = os.getenv("SUPABASE_ANON_KEY", "")
     SUPABASE_SERVICE_ROLE_KEY: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
 
+    # Tenant reads passed through to Supabase's REST API
+    SUPABASE_DATA_TABLES: str = os.getenv("SUPABASE_DATA_TABLES", "")  # comma-separated; empty disables /data
+    SUPABASE_TIMEOUT_SECONDS: float = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
+    SUPABASE_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+    SUPABASE_KEEPALIVE_SECONDS: float = float(os.getenv("SUPABASE_KEEPALIVE_SECONDS", "60"))
+    SUPABASE_BATCH_WINDOW_MS: float = float(os.getenv("SUPABASE_BATCH_WINDOW_MS", "2"))
+    SUPABASE_BATCH_MAX_IDS: int = int(os.getenv("SUPABASE_BATCH_MAX_IDS", "100"))
+
+    # Read replicas for lag-tolerant reads (comma-separated URLs; empty reads from the primary)
+    DATABASE_REPLICA_URLS: str = os.getenv("DATABASE_REPLICA_URLS", "")
+    REPLICA_HEALTH_CHECK_SECONDS: float = float(os.getenv("REPLICA_HEALTH_CHECK_SECONDS", "5"))
+    REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+    READ_YOUR_WRITES_SECONDS: float = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))  # reads after a write stay on the primary
+
+    # Hierarchy read cache
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+    CACHE_TTL_SECONDS: float = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+    CACHE_SHARED_BACKEND: str = os.getenv("CACHE_SHARED_BACKEND", "")  # "" or "local"
+    CACHE_INVALIDATION_CHANNEL: str = os.getenv("CACHE_INVALIDATION_CHANNEL", "query_cache")  # cross-worker invalidation on PostgreSQL
+
+    # Observability
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+
+    # On-demand request profiling (off unless PROFILING_ENABLED=true)
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_ROUTES: str = os.getenv("PROFILING_ROUTES", "")  # comma-separated path prefixes
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0.01"))
+    PROFILING_HEADER: str = os.getenv("PROFILING_HEADER", "x-profile")
+    PROFILING_DIR: str = os.getenv("PROFILING_DIR", "/tmp/vigneron-profiles")
+    PROFILING_MAX_ENTRIES: int = int(os.getenv("PROFILING_MAX_ENTRIES", "50"))
+
+    # GPS track ingestion
+    TRACK_BATCH_SIZE: int = int(os.getenv("TRACK_BATCH_SIZE", "1000"))
+    TRACK_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("TRACK_FLUSH_INTERVAL_SECONDS", "1.0"))
+    TRACK_MAX_BUFFER: int = int(os.getenv("TRACK_MAX_BUFFER", "50000"))
+    TRACK_VISIT_GAP_SECONDS: float = float(os.getenv("TRACK_VISIT_GAP_SECONDS", "300"))
+    TRACK_ROW_MATCH_METERS: float = float(os.getenv("TRACK_ROW_MATCH_METERS", "4.0"))
+    # Fix times are clamped to [now - max age, now + skew] (bounds daily partitions)
+    TRACK_MAX_FIX_AGE_DAYS: float = float(os.getenv("TRACK_MAX_FIX_AGE_DAYS", "7"))
+    TRACK_MAX_CLOCK_SKEW_SECONDS: float = float(os.getenv("TRACK_MAX_CLOCK_SKEW_SECONDS", "300"))
+
+    # Location lookup data shared between workers (empty dir = /dev/shm/vigneron-geo)
+    SHARED_GEO_DIR: str = os.getenv("SHARED_GEO_DIR", "")
+    SHARED_GEO_TTL_SECONDS: float = float(os.getenv("SHARED_GEO_TTL_SECONDS", "300"))
+    SHARED_GEO_POLL_SECONDS: float = float(os.getenv("SHARED_GEO_POLL_SECONDS", "1"))
+
+    # Webhook (callback_url) delivery; off until an inference runner enqueues callbacks
+    WEBHOOK_ENABLED: bool = os.getenv("WEBHOOK_ENABLED", "false").lower() == "true"
+    WEBHOOK_SIGNING_SECRET: str = os.getenv("WEBHOOK_SIGNING_SECRET", "")
+    WEBHOOK_TIMEOUT_SECONDS: float = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+    WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "100"))
+    WEBHOOK_PER_HOST_CONCURRENCY: int = int(os.getenv("WEBHOOK_PER_HOST_CONCURRENCY", "4"))
+    WEBHOOK_MAX_ATTEMPTS: int = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+    WEBHOOK_BACKOFF_BASE_SECONDS: float = float(os.getenv("WEBHOOK_BACKOFF_BASE_SECONDS", "5"))
+    WEBHOOK_BACKOFF_MAX_SECONDS: float = float(os.getenv("WEBHOOK_BACKOFF_MAX_SECONDS", "3600"))
+    WEBHOOK_POLL_INTERVAL_SECONDS: float = float(os.getenv("WEBHOOK_POLL_INTERVAL_SECONDS", "2"))
+    WEBHOOK_BATCH_SIZE: int = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+
+    # Streaming uploads of inference inputs
+    UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "/tmp/vigneron-uploads")
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", str(2 * 1024**3)))
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024**2)))
+    UPLOAD_MMAP_THRESHOLD_BYTES: int = int(os.getenv("UPLOAD_MMAP_THRESHOLD_BYTES", str(16 * 1024**2)))
+
+    # Model runtime cache
+    MODEL_PRELOAD: bool = os.getenv("MODEL_PRELOAD", "true").lower() == "true"
+    MODEL_CACHE_BUDGET_MB: int = int(os.getenv("MODEL_CACHE_BUDGET_MB", "1024"))
+    MODEL_CACHE_DIR: str = os.getenv("MODEL_CACHE_DIR", "/tmp/vigneron-models")
+
+    # Reference data (spray catalog, crop templates)
+    REFERENCE_DATA_CHANNEL: str = os.getenv("REFERENCE_DATA_CHANNEL", "reference_data")
+    REFERENCE_DATA_POLL_SECONDS: float = float(os.getenv("REFERENCE_DATA_POLL_SECONDS", "30"))
+
+    # Scheduled dashboard aggregates (one leader worker refreshes them)
+    DASHBOARD_AGGREGATES_ENABLED: bool = os.getenv("DASHBOARD_AGGREGATES_ENABLED", "true").lower() == "true"
+    DASHBOARD_REFRESH_SECONDS: float = float(os.getenv("DASHBOARD_REFRESH_SECONDS", "300"))
+    LEADER_LOCK_DIR: str = os.getenv("LEADER_LOCK_DIR", "")  # file locks when not on Postgres
+
+    # Drift repair of the maintained hierarchy counts (one leader worker runs it)
+    HIERARCHY_RECONCILE_ENABLED: bool = os.getenv("HIERARCHY_RECONCILE_ENABLED", "true").lower() == "true"
+    HIERARCHY_RECONCILE_SECONDS: float = float(os.getenv("HIERARCHY_RECONCILE_SECONDS", "3600"))
+
+    # Org partitions of the large tables (Postgres; one leader worker creates missing ones)
+    TENANT_PARTITIONS_ENABLED: bool = os.getenv("TENANT_PARTITIONS_ENABLED", "true").lower() == "true"
+    TENANT_PARTITION_MAINTENANCE_SECONDS: float = float(os.getenv("TENANT_PARTITION_MAINTENANCE_SECONDS", "600"))
+
+    # Idempotency-Key replay for retried POST/PATCH requests
+    IDEMPOTENCY_ENABLED: bool = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+    IDEMPOTENCY_TTL_SECONDS: float = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    IDEMPOTENCY_MAX_ENTRIES: int = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+    IDEMPOTENCY_MAX_BODY_BYTES: int = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", str(1024**2)))
+
+    # Negotiated gzip/br/zstd response compression
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_BYTES: int = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+
+    # Per-tenant rate limits and load shedding (off unless RATE_LIMIT_ENABLED=true)
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "false").lower() == "true"
+    RATE_LIMITS: str = os.getenv("RATE_LIMITS", "interactive=20:60,sync=10:200,bulk=2:20,inference=1:5")  # class=per_second:burst
+    RATE_LIMIT_ORG_MULTIPLIER: float = float(os.getenv("RATE_LIMIT_ORG_MULTIPLIER", "10"))
+    RATE_LIMIT_SHARED_BACKEND: str = os.getenv("RATE_LIMIT_SHARED_BACKEND", "")  # "" or "local"
+    RATE_LIMIT_MAX_IN_FLIGHT: int = int(os.getenv("RATE_LIMIT_MAX_IN_FLIGHT", "64"))
+    RATE_LIMIT_TARGET_LATENCY_SECONDS: float = float(os.getenv("RATE_LIMIT_TARGET_LATENCY_SECONDS", "1.0"))
+    RATE_LIMIT_SHED_RETRY_AFTER_SECONDS: float = float(os.getenv("RATE_LIMIT_SHED_RETRY_AFTER_SECONDS", "5"))
+
+    # Live event feed over WebSocket / server-sent events
+    LIVE_EVENTS_CHANNEL: str = os.getenv("LIVE_EVENTS_CHANNEL", "live_events")
+    LIVE_EVENTS_QUEUE_SIZE: int = int(os.getenv("LIVE_EVENTS_QUEUE_SIZE", "256"))  # per connection
+    LIVE_EVENTS_MAX_SUBSCRIBERS: int = int(os.getenv("LIVE_EVENTS_MAX_SUBSCRIBERS", "2000"))  # per worker
+    LIVE_EVENTS_HEARTBEAT_SECONDS: float = float(os.getenv("LIVE_EVENTS_HEARTBEAT_SECONDS", "15"))
+    LIVE_EVENTS_SEND_TIMEOUT_SECONDS: float = float(os.getenv("LIVE_EVENTS_SEND_TIMEOUT_SECONDS", "10"))
+
 
 settings = Settings()
\ No newline at end of file
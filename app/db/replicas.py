@@ -0,0 +1,192 @@
+"""
+Read-replica routing.
+
+Endpoints whose reads tolerate replication lag (timelines, analytics, nearby
+locations) take ``deps.get_read_db`` instead of ``deps.get_db``. It opens a
+session on the next healthy replica of ``DATABASE_REPLICA_URLS``, in
+round-robin order, and falls back to the primary when no replica is
+configured or healthy. Clients that wrote within the last
+``READ_YOUR_WRITES_SECONDS`` (see ``ReadYourWritesMiddleware``) read from
+the primary so they see their own writes.
+
+A replica is checked before use at most every
+``REPLICA_HEALTH_CHECK_SECONDS``: it must answer and, on Postgres, be no
+more than ``REPLICA_MAX_LAG_SECONDS`` behind. A replica that fails a check
+is skipped until its next check.
+
+Replica sessions refuse to flush, so a write that slips into a read-only
+endpoint fails loudly instead of reaching a replica.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.db.base import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+READ_SESSIONS = registry.counter(
+    "db_read_sessions_total", "Read-only sessions opened by target", ("target",)
+)
+
+# Zero when the replica has replayed everything it received (an idle primary
+# would otherwise look like growing lag).
+_PG_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+ReadSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, info={"read_only": True}
+)
+
+
+def _refuse_writes(session: Session, flush_context: Any, instances: Any) -> None:
+    if session.info.get("read_only") and (
+        session.new or session.dirty or session.deleted
+    ):
+        raise RuntimeError("Read-only session: use deps.get_db for writes")
+
+
+event.listen(Session, "before_flush", _refuse_writes)
+
+
+class Replica:
+    """One replica engine and the outcome of its last health check."""
+
+    def __init__(self, url: str, engine: Optional[Engine] = None) -> None:
+        self.url = url
+        self._engine = engine
+        self.healthy = True
+        self.checked_at = 0.0
+        self.lag_seconds: Optional[float] = None
+        self.failures = 0
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            from sqlalchemy import create_engine
+
+            self._engine = create_engine(self.url, pool_pre_ping=True)
+        return self._engine
+
+
+class ReplicaRouter:
+    """Round-robin choice among the healthy replicas."""
+
+    def __init__(
+        self,
+        replicas: Sequence[Replica],
+        check_interval: float = settings.REPLICA_HEALTH_CHECK_SECONDS,
+        max_lag: float = settings.REPLICA_MAX_LAG_SECONDS,
+        primary: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self.replicas = list(replicas)
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.primary = primary
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_urls(cls, urls: str, **kwargs: Any) -> "ReplicaRouter":
+        """Router over a comma-separated list of database URLs."""
+        return cls(
+            [Replica(url.strip()) for url in urls.split(",") if url.strip()], **kwargs
+        )
+
+    def check(self, replica: Replica) -> bool:
+        """Ping ``replica`` (and read its lag on Postgres); returns its health."""
+        try:
+            with replica.engine.connect() as connection:
+                if connection.dialect.name == "postgresql":
+                    lag = connection.scalar(_PG_LAG)
+                else:
+                    lag = connection.scalar(text("SELECT 0"))
+            replica.lag_seconds = float(lag) if lag is not None else None
+            healthy = (
+                replica.lag_seconds is not None and replica.lag_seconds <= self.max_lag
+            )
+        except Exception:
+            replica.lag_seconds = None
+            healthy = False
+        if healthy != replica.healthy:
+            log = logger.info if healthy else logger.warning
+            log(
+                "Read replica %d is %s (lag %s s)",
+                self.replicas.index(replica),
+                "healthy" if healthy else "unhealthy",
+                replica.lag_seconds,
+            )
+        if not healthy:
+            replica.failures += 1
+        replica.healthy = healthy
+        return healthy
+
+    def _usable(self, replica: Replica) -> bool:
+        with self._lock:
+            due = time.monotonic() - replica.checked_at >= self.check_interval
+            if due:
+                # Claimed under the lock: one request checks, the others go on.
+                replica.checked_at = time.monotonic()
+        return self.check(replica) if due else replica.healthy
+
+    def pick(self) -> Optional[Replica]:
+        """The next healthy replica, or ``None`` to use the primary."""
+        if not self.replicas:
+            return None
+        with self._lock:
+            start = self._next
+            self._next = (start + 1) % len(self.replicas)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if self._usable(replica):
+                return replica
+        return None
+
+    def session(self, primary: bool = False) -> Session:
+        """A session for reads: on a replica unless ``primary`` or none is usable."""
+        replica = None if primary else self.pick()
+        if replica is None:
+            READ_SESSIONS.inc(target="primary")
+            return self.primary()
+        READ_SESSIONS.inc(target="replica")
+        return ReadSessionLocal(bind=replica.engine)
+
+    def stats(self) -> Dict[str, Any]:
+        replicas: List[Dict[str, Any]] = [
+            {
+                "index": index,
+                "healthy": replica.healthy,
+                "lag_seconds": replica.lag_seconds,
+                "failures": replica.failures,
+            }
+            for index, replica in enumerate(self.replicas)
+        ]
+        return {"check_interval_seconds": self.check_interval, "replicas": replicas}
+
+
+replica_router = ReplicaRouter.from_urls(settings.DATABASE_REPLICA_URLS)
+
+
+def _replica_metrics():
+    yield (
+        "db_replica_healthy",
+        "gauge",
+        "1 while a read replica passes its health check",
+        [
+            ("db_replica_healthy", {"replica": str(index)}, int(replica.healthy))
+            for index, replica in enumerate(replica_router.replicas)
+        ],
+    )
+
+
+registry.register_collector(_replica_metrics)
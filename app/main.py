@@ -1,12 +1,83 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from app.api.api_v1.api import api_router
 from app.core.config import settings
+from app.core.metrics import registry
+from app.db.base import get_engine
+from app.middleware.timing import TimingMiddleware
+from app.services.cache import cache_bridge
+from app.services.dashboard import dashboard_aggregator
+from app.services.hierarchy_counts import hierarchy_count_reconciler
+from app.services.live_events import live_events
+from app.services.model_runtime import model_runtime
+from app.services.reference_data import reference_data
+from app.services.shared_geo import shared_geo
+from app.services.tenant_partitions import partition_maintainer
+from app.services.track_ingestion import track_ingestor
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing at import time creates the engine or imports the DB driver;
+    # do it once here so the first request does not pay for it.
+    get_engine()
+    if settings.MODEL_PRELOAD:
+        try:
+            await run_in_threadpool(model_runtime.preload)
+        except Exception:
+            logger.exception("Model preload failed; models will load on first use")
+    try:
+        await run_in_threadpool(reference_data.get)
+    except Exception:
+        logger.exception("Reference data preload failed; it will load on first use")
+    await reference_data.start()
+    # Data left in shared memory by a previous deployment is refreshed by
+    # whichever worker's poller gets the build lock first.
+    shared_geo.request_rebuild()
+    await shared_geo.start()
+    await track_ingestor.start()
+    await live_events.start()
+    await cache_bridge.start()
+    if settings.DASHBOARD_AGGREGATES_ENABLED:
+        await dashboard_aggregator.start()
+    if settings.HIERARCHY_RECONCILE_ENABLED:
+        await hierarchy_count_reconciler.start()
+    if settings.TENANT_PARTITIONS_ENABLED:
+        await partition_maintainer.start()
+    webhook_dispatcher = None
+    if settings.WEBHOOK_ENABLED:
+        from app.services.webhooks import webhook_dispatcher
+
+        await webhook_dispatcher.start()
+    yield
+    if webhook_dispatcher is not None:
+        await webhook_dispatcher.stop()
+    if settings.SUPABASE_DATA_TABLES:
+        from app.services.supabase_data import supabase_data
+
+        await supabase_data.close()
+    await dashboard_aggregator.stop()
+    await hierarchy_count_reconciler.stop()
+    await partition_maintainer.stop()
+    await cache_bridge.stop()
+    await live_events.stop()
+    await track_ingestor.stop()
+    await reference_data.stop()
+    await shared_geo.stop()
+    model_runtime.clear()
+
 
 app = FastAPI(
     title="Vigneron AI Backend",
     description="Backend API for Vigneron AI frontend application",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 
@@ -19,6 +90,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reads right after a client's write stay on the primary
+if settings.DATABASE_REPLICA_URLS:
+    from app.middleware.read_your_writes import ReadYourWritesMiddleware
+
+    app.add_middleware(ReadYourWritesMiddleware)
+
+# Retried writes carrying an Idempotency-Key execute once
+if settings.IDEMPOTENCY_ENABLED:
+    from app.middleware.idempotency import IdempotencyMiddleware
+
+    app.add_middleware(IdempotencyMiddleware)
+
+# Compressed outside the idempotency store, so replays are negotiated afresh
+if settings.COMPRESSION_ENABLED:
+    from app.middleware.compression import CompressionMiddleware
+
+    app.add_middleware(CompressionMiddleware)
+
+# Per-tenant token buckets and priority load shedding
+if settings.RATE_LIMIT_ENABLED:
+    from app.middleware.rate_limit import RateLimitMiddleware
+
+    app.add_middleware(RateLimitMiddleware)
+
+# Per-route latency, DB time and response size metrics
+if settings.METRICS_ENABLED:
+    app.add_middleware(TimingMiddleware)
+
+# Sampled CPU/allocation profiles; not installed at all unless enabled
+if settings.PROFILING_ENABLED:
+    from app.middleware.profiling import ProfilingMiddleware
+
+    app.add_middleware(ProfilingMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
 
@@ -29,4 +134,10 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
\ No newline at end of file
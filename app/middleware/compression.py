@@ -0,0 +1,231 @@
+"""
+Negotiated response compression.
+
+Responses of at least ``COMPRESSION_MIN_BYTES`` with a compressible content
+type are encoded with the best coding the client accepts: zstd and brotli
+when the ``zstandard`` / ``brotli`` packages are installed, gzip always.
+Among codings with the same ``Accept-Encoding`` q-value the server prefers
+zstd, then br, then gzip.
+
+Single-message responses are compressed in one go, with an exact
+``Content-Length``. Streaming responses are compressed chunk by chunk with a
+sync flush per chunk, so nothing is held back from the client. Event
+streams, already encoded responses, 204/304 and ``HEAD`` pass through.
+
+A strong ETag on a compressed response gets the coding appended
+(``"abc"`` -> ``"abc-gzip"``): each encoded representation needs its own
+tag, and ``app.api.conditional.etag_matches`` maps it back.
+"""
+import zlib
+from typing import Dict, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/geo+json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+NEVER_COMPRESS = ("text/event-stream",)
+
+BYTES = registry.counter(
+    "http_compression_bytes_total",
+    "Response bytes before and after compression by coding",
+    ("encoding", "stage"),
+)
+
+
+class _Gzip:
+    name = "gzip"
+
+    def __init__(self, level: int) -> None:
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._z.compress(data) + self._z.flush()
+
+
+class _Brotli:
+    name = "br"
+
+    def __init__(self, level: int) -> None:
+        self._c = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._c.process(data) + self._c.finish()
+
+
+class _Zstd:
+    name = "zstd"
+
+    def __init__(self, level: int) -> None:
+        self._c = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data) + self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._c.compress(data) + self._c.flush()
+
+
+def available_encoders() -> Dict[str, type]:
+    """Codings this process can produce, in server preference order."""
+    encoders: Dict[str, type] = {}
+    if zstandard is not None:
+        encoders["zstd"] = _Zstd
+    if brotli is not None:
+        encoders["br"] = _Brotli
+    encoders["gzip"] = _Gzip
+    return encoders
+
+
+def negotiate(accept_encoding: str, offered: Sequence[str]) -> Optional[str]:
+    """The offered coding with the highest q-value; ties go to offer order."""
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for coding in offered:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "").lower()
+    if "content-encoding" in headers or content_type.startswith(NEVER_COMPRESS):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+
+
+class CompressionMiddleware:
+    """Compress responses with the best coding the client accepts."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = settings.COMPRESSION_MIN_BYTES,
+        level: Optional[int] = None,
+        encoders: Optional[Dict[str, type]] = None,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.encoders = encoders if encoders is not None else available_encoders()
+
+    def _level(self, coding: str) -> int:
+        if self.level is not None:
+            return self.level
+        # Fast settings: the payloads are small and latency matters more.
+        return {"gzip": 6, "br": 4, "zstd": 3}[coding]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate(
+            Headers(scope=scope).get("accept-encoding", ""), list(self.encoders)
+        )
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        encoder = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                headers = Headers(raw=start["headers"])
+                if (
+                    start["status"] in (204, 304)
+                    or not _compressible(headers)
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = self.encoders[coding](self._level(coding))
+                if not more_body:
+                    compressed = encoder.finish(body)
+                    self._encode_headers(start, coding, compressed)
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed})
+                    self._count(coding, len(body), len(compressed))
+                    return
+                self._encode_headers(start, coding, None)
+                await send(start)
+
+            chunk = encoder.compress(body) if more_body else encoder.finish(body)
+            self._count(coding, len(body), len(chunk))
+            await send(
+                {"type": "http.response.body", "body": chunk, "more_body": more_body}
+            )
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _encode_headers(start: Message, coding: str, body: Optional[bytes]) -> None:
+        headers = MutableHeaders(raw=list(start["headers"]))
+        headers["Content-Encoding"] = coding
+        headers.add_vary_header("Accept-Encoding")
+        if body is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(len(body))
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/") and etag.endswith('"'):
+            headers["ETag"] = f'{etag[:-1]}-{coding}"'
+        start["headers"] = headers.raw
+
+    @staticmethod
+    def _count(coding: str, before: int, after: int) -> None:
+        BYTES.inc(before, encoding=coding, stage="in")
+        BYTES.inc(after, encoding=coding, stage="out")
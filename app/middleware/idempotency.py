@@ -0,0 +1,277 @@
+"""
+Idempotency-Key handling for retried writes.
+
+A ``POST`` or ``PATCH`` carrying an ``Idempotency-Key`` header is executed
+once per (caller, method, path, key), the caller being its ``Authorization``
+header or, without one, its device/user/org headers and address, so two
+clients picking the same key never see each other's response. The first
+response is kept in an in-memory store for ``IDEMPOTENCY_TTL_SECONDS`` and
+replayed, with an ``Idempotent-Replayed: true`` header, to every retry. A retry that arrives
+while the first request is still running waits for it instead of executing
+again. Reusing a key for a different request (query string or body) is
+answered with 422.
+
+Only completed responses below 500 (and not 429) are kept; after a server
+error or a dropped request the next retry executes normally. Requests whose
+body exceeds ``IDEMPOTENCY_MAX_BODY_BYTES`` are passed through untouched,
+as are responses larger than that once sent.
+
+The store is per process: retries are coalesced as long as they reach the
+same worker, which is what a client retrying over one keep-alive connection
+does.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+HEADER = b"idempotency-key"
+REPLAYED_HEADER = (b"idempotent-replayed", b"true")
+MAX_KEY_LENGTH = 255
+CALLER_HEADERS = (b"x-device-id", b"x-user-id", b"x-org-id")
+
+REQUESTS = registry.counter(
+    "idempotency_requests_total",
+    "Requests carrying an Idempotency-Key by outcome",
+    ("outcome",),
+)
+
+StoredResponse = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+
+def caller(scope: Scope) -> str:
+    """Who is retrying: a digest of their credentials, else their tenant headers."""
+    headers = dict(scope["headers"])
+    authorization = headers.get(b"authorization")
+    if authorization:
+        return "auth:" + hashlib.sha256(authorization).hexdigest()
+    client = scope.get("client")
+    return ",".join(
+        [headers.get(name, b"").decode("latin-1") for name in CALLER_HEADERS]
+        + [client[0] if client else ""]
+    )
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "done", "response", "expires_at")
+
+    def __init__(self, fingerprint: str, expires_at: float) -> None:
+        self.fingerprint = fingerprint
+        self.done = asyncio.Event()
+        self.response: Optional[StoredResponse] = None
+        self.expires_at = expires_at
+
+
+class IdempotencyStore:
+    """Responses by idempotency key, kept for ``ttl_seconds``."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def begin(self, key: str, fingerprint: str) -> Tuple[str, _Entry]:
+        """Claim ``key``: ``("execute" | "wait" | "replay" | "mismatch", entry)``.
+
+        ``execute`` makes the caller responsible for ``complete`` or
+        ``abandon``; ``wait`` means another request holds the key.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                entry.response is None or entry.expires_at >= now
+            ):
+                if entry.fingerprint != fingerprint:
+                    return "mismatch", entry
+                return ("replay" if entry.response else "wait"), entry
+            self._entries.pop(key, None)
+            self._prune(now)
+            entry = _Entry(fingerprint, now + self.ttl_seconds)
+            self._entries[key] = entry
+            return "execute", entry
+
+    def complete(self, entry: _Entry, response: StoredResponse) -> None:
+        with self._lock:
+            entry.response = response
+            entry.done.set()
+
+    def abandon(self, key: str, entry: _Entry) -> None:
+        """Forget an execution whose response must not be replayed."""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            entry.done.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _prune(self, now: float) -> None:
+        # Entries share one TTL, so insertion order is expiry order.
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            expired = entry.expires_at < now
+            if not expired and len(self._entries) < self.max_entries:
+                break
+            if entry.response is None and not expired:
+                break  # never evict a running request
+            del self._entries[key]
+
+
+idempotency_store = IdempotencyStore(
+    settings.IDEMPOTENCY_TTL_SECONDS, settings.IDEMPOTENCY_MAX_ENTRIES
+)
+
+
+def _idempotency_metrics():
+    yield (
+        "idempotency_store_entries",
+        "gauge",
+        "Idempotency keys currently held by this worker",
+        [("idempotency_store_entries", {}, len(idempotency_store))],
+    )
+
+
+registry.register_collector(_idempotency_metrics)
+
+
+class IdempotencyMiddleware:
+    """Execute each idempotency-keyed write once and replay its response."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: IdempotencyStore = idempotency_store,
+        methods: Tuple[str, ...] = ("POST", "PATCH"),
+        max_body_bytes: int = settings.IDEMPOTENCY_MAX_BODY_BYTES,
+    ) -> None:
+        self.app = app
+        self.store = store
+        self.methods = methods
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            await self.app(scope, receive, send)
+            return
+        key = next((value for name, value in scope["headers"] if name == HEADER), None)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await JSONResponse(
+                {"detail": f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters"},
+                status_code=400,
+            )(scope, receive, send)
+            return
+
+        buffered, body, complete = await self._read_body(receive)
+
+        async def replay_receive() -> Message:
+            if buffered:
+                return buffered.pop(0)
+            return await receive()
+
+        if not complete:
+            REQUESTS.inc(outcome="bypassed")
+            await self.app(scope, replay_receive, send)
+            return
+
+        store_key = (
+            f"{caller(scope)} {scope['method']} {scope['path']} "
+            f"{key.decode('latin-1')}"
+        )
+        fingerprint = hashlib.sha256(
+            scope.get("query_string", b"") + b"?" + body
+        ).hexdigest()
+        waited = False
+        while True:
+            action, entry = self.store.begin(store_key, fingerprint)
+            if action != "wait":
+                break
+            waited = True
+            await entry.done.wait()
+
+        if action == "mismatch":
+            REQUESTS.inc(outcome="mismatch")
+            await JSONResponse(
+                {"detail": "Idempotency-Key was already used for a different request"},
+                status_code=422,
+            )(scope, replay_receive, send)
+            return
+        if action == "replay":
+            REQUESTS.inc(outcome="coalesced" if waited else "replayed")
+            status, headers, stored_body = entry.response
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": status,
+                    "headers": headers + [REPLAYED_HEADER],
+                }
+            )
+            await send({"type": "http.response.body", "body": stored_body})
+            return
+
+        REQUESTS.inc(outcome="executed")
+        await self._execute(scope, replay_receive, send, store_key, entry)
+
+    async def _read_body(self, receive: Receive) -> Tuple[List[Message], bytes, bool]:
+        """Buffer the request up to the body limit; False if it is larger."""
+        messages: List[Message] = []
+        size = 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                return messages, b"", False
+            size += len(message.get("body", b""))
+            if size > self.max_body_bytes:
+                return messages, b"", False
+            if not message.get("more_body", False):
+                body = b"".join(m.get("body", b"") for m in messages)
+                return messages, body, True
+
+    async def _execute(
+        self, scope: Scope, receive: Receive, send: Send, key: str, entry: _Entry
+    ) -> None:
+        status = 500
+        headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+        size = 0
+        finished = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, headers, size, finished
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size <= self.max_body_bytes:
+                    chunks.append(chunk)
+                finished = not message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            self.store.abandon(key, entry)
+            raise
+        if finished and status < 500 and status != 429 and size <= self.max_body_bytes:
+            self.store.complete(entry, (status, headers, b"".join(chunks)))
+        else:
+            self.store.abandon(key, entry)
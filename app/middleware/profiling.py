@@ -0,0 +1,288 @@
+"""
+Opt-in per-request CPU and allocation profiling.
+
+A request is profiled when profiling is enabled and either
+
+* its path starts with one of ``PROFILING_ROUTES`` and it wins the
+  ``PROFILING_SAMPLE_RATE`` draw, or
+* it carries the ``PROFILING_HEADER`` header with the admin token as value.
+
+The CPU profile comes from pyinstrument (statistical, async-aware) when it is
+installed and from cProfile otherwise; cProfile only sees work on the event
+loop thread, so sync endpoints running in the threadpool show up as an await.
+Allocations are captured with tracemalloc. Both are process-wide, so at most
+one request is profiled at a time and concurrent requests skip profiling.
+
+Profiles are written to a bounded on-disk ring buffer (``ProfileStore``) and
+served by the admin endpoints. When profiling is disabled the middleware is
+not installed at all.
+"""
+import cProfile
+import hmac
+import io
+import json
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+try:
+    from pyinstrument import Profiler as _PyinstrumentProfiler
+except ImportError:  # pragma: no cover - optional dependency
+    _PyinstrumentProfiler = None
+
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 25
+TOP_FUNCTIONS = 40
+
+
+class ProfileStore:
+    """Keeps the newest ``max_entries`` profiles in a directory."""
+
+    def __init__(self, directory: str, max_entries: int) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _entries(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        # Ids start with a zero-padded timestamp, so name order is age order.
+        return sorted(
+            name[: -len(".json")]
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        )
+
+    def save(
+        self, profile_id: str, meta: Dict[str, Any], raw: bytes, raw_ext: str
+    ) -> None:
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            meta = {**meta, "raw_file": f"{profile_id}{raw_ext}"}
+            with open(os.path.join(self.directory, meta["raw_file"]), "wb") as f:
+                f.write(raw)
+            # The metadata file is written last and marks the entry complete.
+            tmp = os.path.join(self.directory, f".{profile_id}.json.tmp")
+            with open(tmp, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, os.path.join(self.directory, f"{profile_id}.json"))
+
+            entries = self._entries()
+            for stale in entries[: max(len(entries) - self.max_entries, 0)]:
+                self._remove(stale)
+
+    def _remove(self, profile_id: str) -> None:
+        for name in os.listdir(self.directory):
+            if name.startswith(profile_id):
+                os.remove(os.path.join(self.directory, name))
+
+    def list(self) -> List[Dict[str, Any]]:
+        summaries = []
+        for profile_id in reversed(self._entries()):
+            meta = self.get(profile_id)
+            if meta is not None:
+                meta.pop("cpu_summary", None)
+                meta.pop("top_allocations", None)
+                summaries.append(meta)
+        return summaries
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.directory, f"{os.path.basename(profile_id)}.json")
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def raw_path(self, profile_id: str) -> Optional[str]:
+        meta = self.get(profile_id)
+        if meta is None:
+            return None
+        path = os.path.join(self.directory, meta["raw_file"])
+        return path if os.path.exists(path) else None
+
+
+profile_store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_ENTRIES)
+
+
+class _CPUProfiler:
+    """pyinstrument when available, cProfile otherwise."""
+
+    def __init__(self) -> None:
+        if _PyinstrumentProfiler is not None:
+            self.engine = "pyinstrument"
+            self._profiler = _PyinstrumentProfiler(interval=0.001, async_mode="enabled")
+        else:
+            self.engine = "cprofile"
+            self._profiler = cProfile.Profile()
+
+    def start(self) -> None:
+        if self.engine == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self) -> None:
+        if self.engine == "pyinstrument":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def export(self) -> Tuple[str, bytes, str]:
+        """Return (text summary, raw profile bytes, raw file extension)."""
+        if self.engine == "pyinstrument":
+            session = self._profiler.last_session
+            text = self._profiler.output_text(unicode=True, color=False)
+            return text, json.dumps(session.to_json()).encode(), ".pyisession"
+
+        # Same marshal format as Profile.dump_stats, readable by pstats/snakeviz
+        self._profiler.create_stats()
+        raw = marshal.dumps(self._profiler.stats)
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profiler, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+        return stream.getvalue(), raw, ".prof"
+
+
+class ProfilingMiddleware:
+    """Profile sampled requests and store the result in ``profile_store``."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        routes: Optional[List[str]] = None,
+        sample_rate: float = settings.PROFILING_SAMPLE_RATE,
+        header: str = settings.PROFILING_HEADER,
+        store: ProfileStore = profile_store,
+    ) -> None:
+        self.app = app
+        self.routes = tuple(
+            routes
+            if routes is not None
+            else [r.strip() for r in settings.PROFILING_ROUTES.split(",") if r.strip()]
+        )
+        self.sample_rate = sample_rate
+        self.header = header.lower().encode("latin-1")
+        self.store = store
+        self._busy = threading.Lock()
+
+    def _wants_profile(self, scope: Scope) -> bool:
+        if settings.ADMIN_TOKEN:
+            token = settings.ADMIN_TOKEN.encode("latin-1")
+            for name, value in scope["headers"]:
+                if name == self.header and hmac.compare_digest(value, token):
+                    return True
+        return (
+            bool(self.routes)
+            and scope["path"].startswith(self.routes)
+            and (random.random() < self.sample_rate)
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            self._busy.release()
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profile_id = f"{int(time.time() * 1000):015d}-{uuid.uuid4().hex[:8]}"
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.take_snapshot()
+        profiler = _CPUProfiler()
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            elapsed = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            await run_in_threadpool(
+                self._store,
+                profile_id,
+                scope,
+                status,
+                elapsed,
+                profiler,
+                baseline,
+                snapshot,
+                peak,
+            )
+
+    def _store(
+        self,
+        profile_id: str,
+        scope: Scope,
+        status: int,
+        elapsed: float,
+        profiler: _CPUProfiler,
+        baseline: tracemalloc.Snapshot,
+        snapshot: tracemalloc.Snapshot,
+        peak: int,
+    ) -> None:
+        cpu_summary, raw, raw_ext = profiler.export()
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        diff = snapshot.filter_traces(ignore).compare_to(
+            baseline.filter_traces(ignore), "lineno"
+        )
+        top_allocations = [
+            {
+                "location": str(stat.traceback[0]) if stat.traceback else "?",
+                "size_diff_bytes": stat.size_diff,
+                "count_diff": stat.count_diff,
+            }
+            for stat in diff[:TOP_ALLOCATIONS]
+        ]
+        meta = {
+            "id": profile_id,
+            "captured_at": datetime.now(timezone.utc).isoformat(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "query_string": scope.get("query_string", b"").decode("latin-1"),
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 3),
+            "engine": profiler.engine,
+            "peak_traced_bytes": peak,
+            "allocated_bytes": sum(
+                stat.size_diff for stat in diff if stat.size_diff > 0
+            ),
+            "cpu_summary": cpu_summary,
+            "top_allocations": top_allocations,
+        }
+        self.store.save(profile_id, meta, raw, raw_ext)
@@ -0,0 +1,356 @@
+"""
+Per-tenant rate limiting and priority load shedding.
+
+Every API request is put in a route class - ``interactive`` (the default),
+``sync`` (mobile check-ins, location lookups and live feeds), ``bulk``
+(batch writes, track fixes, yield imports) or ``inference`` (model input
+uploads) - by ``ROUTE_CLASSES``, and charged one token from a token bucket
+per tenant and class. The tenant is the most specific of the
+``X-Device-Id``, ``X-User-Id`` and ``X-Org-Id`` headers, falling back to the
+client address; a request naming an org is also charged to the org's
+bucket, which allows ``RATE_LIMIT_ORG_MULTIPLIER`` times the class rate.
+Rates come from ``RATE_LIMITS`` as ``class=rate:burst`` pairs (tokens per
+second, bucket size). Live feeds are charged once per connection and kept
+out of the load signal below; a WebSocket over its limit is closed with
+1013 (try again later) before it is accepted.
+
+Buckets live in process unless ``RATE_LIMIT_SHARED_BACKEND`` names a shared
+store; ``LocalSharedRateLimitBackend`` is the in-memory stand-in for one.
+
+Independently of the buckets, ``LoadShedder`` rejects lower-priority classes
+while the worker is overloaded. Load is the larger of in-flight requests
+over ``RATE_LIMIT_MAX_IN_FLIGHT`` and the (time-decayed) latency average
+over ``RATE_LIMIT_TARGET_LATENCY_SECONDS``; ``bulk`` is shed first, then
+``inference`` and ``sync``, and ``interactive`` never. Both kinds of
+rejection are 429 with ``Retry-After``.
+"""
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from starlette import status
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.websockets import WebSocketClose
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+INTERACTIVE = "interactive"
+SYNC = "sync"
+BULK = "bulk"
+INFERENCE = "inference"
+
+# (method or None for any, path prefix, class); the first match wins.
+ROUTE_CLASSES: Sequence[Tuple[Optional[str], str, str]] = (
+    ("POST", "/api/v1/activities/batch", BULK),
+    ("POST", "/api/v1/tracks/fixes", BULK),
+    ("PUT", "/api/v1/analytics/", BULK),
+    (None, "/api/v1/uploads", INFERENCE),
+    (None, "/api/v1/mobile/", SYNC),
+    (None, "/api/v1/live/", SYNC),
+)
+
+# Long-lived streams are charged on connect but kept out of the load signal.
+STREAMING_PREFIXES = ("/api/v1/live/",)
+
+# Load at which each class starts to be shed; missing classes never are.
+SHED_THRESHOLDS: Dict[str, float] = {BULK: 0.5, INFERENCE: 0.7, SYNC: 0.85}
+
+TENANT_HEADERS = (
+    (b"x-device-id", "device"),
+    (b"x-user-id", "user"),
+    (b"x-org-id", "org"),
+)
+
+REJECTED = registry.counter(
+    "http_requests_rejected_total",
+    "Requests rejected by rate limiting or load shedding",
+    ("route_class", "reason"),
+)
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """``"bulk=1:10,sync=10:200"`` -> ``{"bulk": (1.0, 10.0), ...}``."""
+    limits = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        rate, _, burst = value.partition(":")
+        limits[name.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+class TokenBuckets:
+    """In-process token buckets; refilled buckets are dropped when full."""
+
+    def __init__(self, max_entries: int = 100_000) -> None:
+        self.max_entries = max_entries
+        # key -> [tokens, updated, when the bucket is full again]
+        self._buckets: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        """Take a token; returns 0 on success, else seconds until one is due."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_entries:
+                    self._drop_full(now)
+                bucket = self._buckets[key] = [burst, now, now]
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate if rate > 0 else math.inf
+            bucket[0] = tokens
+            bucket[1] = now
+            bucket[2] = now + ((burst - tokens) / rate if rate > 0 else math.inf)
+            return wait
+
+    def _drop_full(self, now: float) -> None:
+        # A bucket that has refilled is indistinguishable from a new one.
+        for key, bucket in list(self._buckets.items()):
+            if bucket[2] <= now:
+                del self._buckets[key]
+        if len(self._buckets) >= self.max_entries:
+            self._buckets.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SharedRateLimitBackend:
+    """Interface for token buckets shared between workers."""
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        raise NotImplementedError
+
+
+class LocalSharedRateLimitBackend(SharedRateLimitBackend):
+    """In-memory stand-in for a shared backend (development and tests)."""
+
+    def __init__(self) -> None:
+        self._buckets = TokenBuckets()
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        return self._buckets.take(key, rate, burst)
+
+
+def _build_shared_backend(name: str) -> Optional[SharedRateLimitBackend]:
+    if not name:
+        return None
+    if name == "local":
+        return LocalSharedRateLimitBackend()
+    raise ValueError(f"Unknown RATE_LIMIT_SHARED_BACKEND: {name!r}")
+
+
+class LoadShedder:
+    """Tracks in-flight requests and latency to decide what to shed."""
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        target_latency: float,
+        thresholds: Dict[str, float] = SHED_THRESHOLDS,
+        decay_seconds: float = 5.0,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.target_latency = target_latency
+        self.thresholds = thresholds
+        self.decay_seconds = decay_seconds
+        self.in_flight = 0
+        self._latency = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def latency(self, now: Optional[float] = None) -> float:
+        # Decays while nothing completes, so shedding cannot latch on.
+        elapsed = (now or time.monotonic()) - self._updated
+        return self._latency * math.exp(-elapsed / self.decay_seconds)
+
+    def load(self) -> float:
+        return max(
+            self.in_flight / self.max_in_flight if self.max_in_flight else 0.0,
+            self.latency() / self.target_latency if self.target_latency else 0.0,
+        )
+
+    def should_shed(self, route_class: str) -> bool:
+        threshold = self.thresholds.get(route_class)
+        return threshold is not None and self.load() >= threshold
+
+    def started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, seconds: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            self._latency = 0.8 * self.latency(now) + 0.2 * seconds
+            self._updated = now
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "in_flight": self.in_flight,
+            "latency_seconds": round(self.latency(), 4),
+            "load": round(self.load(), 4),
+        }
+
+
+class RateLimiter:
+    """Token buckets per tenant and route class."""
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, float]],
+        org_multiplier: float = 10.0,
+        shared: Optional[SharedRateLimitBackend] = None,
+    ) -> None:
+        self.limits = limits
+        self.org_multiplier = org_multiplier
+        self.shared = shared
+        self.local = TokenBuckets()
+
+    def take(self, route_class: str, tenants: Sequence[Tuple[str, str]]) -> float:
+        """Charge each tenant's bucket; returns the longest wait, 0 if allowed."""
+        limit = self.limits.get(route_class)
+        if limit is None:
+            return 0.0
+        buckets = self.shared or self.local
+        wait = 0.0
+        for kind, tenant in tenants:
+            rate, burst = limit
+            if kind == "org":
+                rate, burst = rate * self.org_multiplier, burst * self.org_multiplier
+            wait = max(
+                wait, buckets.take(f"{route_class}:{kind}:{tenant}", rate, burst)
+            )
+        return wait
+
+
+rate_limiter = RateLimiter(
+    parse_limits(settings.RATE_LIMITS),
+    settings.RATE_LIMIT_ORG_MULTIPLIER,
+    _build_shared_backend(settings.RATE_LIMIT_SHARED_BACKEND),
+)
+load_shedder = LoadShedder(
+    settings.RATE_LIMIT_MAX_IN_FLIGHT, settings.RATE_LIMIT_TARGET_LATENCY_SECONDS
+)
+
+
+def _rate_limit_metrics():
+    stats = load_shedder.stats()
+    for field, documentation in (
+        ("in_flight", "Requests admitted and not yet finished"),
+        ("latency_seconds", "Decaying average latency of admitted requests"),
+        ("load", "Load used for shedding decisions; 1.0 is capacity"),
+    ):
+        yield (
+            f"load_shedder_{field}",
+            "gauge",
+            documentation,
+            [(f"load_shedder_{field}", {}, stats[field])],
+        )
+    yield (
+        "rate_limit_buckets",
+        "gauge",
+        "Token buckets held in process",
+        [("rate_limit_buckets", {}, len(rate_limiter.local))],
+    )
+
+
+registry.register_collector(_rate_limit_metrics)
+
+
+def route_class(method: str, path: str) -> str:
+    for rule_method, prefix, name in ROUTE_CLASSES:
+        if (rule_method is None or rule_method == method) and path.startswith(prefix):
+            return name
+    return INTERACTIVE
+
+
+def tenants(scope: Scope) -> List[Tuple[str, str]]:
+    """The most specific identity of the caller, plus its org if named."""
+    headers = dict(scope["headers"])
+    found = [
+        (kind, headers[name].decode("latin-1"))
+        for name, kind in TENANT_HEADERS
+        if headers.get(name)
+    ]
+    if not found:
+        client = scope.get("client")
+        return [("ip", client[0] if client else "unknown")]
+    return found[:1] + [t for t in found[1:] if t[0] == "org"]
+
+
+class RateLimitMiddleware:
+    """Reject over-limit tenants and shed low-priority work under overload."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: RateLimiter = rate_limiter,
+        shedder: LoadShedder = load_shedder,
+        prefix: str = settings.API_V1_STR,
+        shed_retry_after: float = settings.RATE_LIMIT_SHED_RETRY_AFTER_SECONDS,
+    ) -> None:
+        self.app = app
+        self.limiter = limiter
+        self.shedder = shedder
+        self.prefix = prefix
+        self.shed_retry_after = shed_retry_after
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        kind = scope["type"]
+        if kind not in ("http", "websocket") or not scope["path"].startswith(
+            self.prefix
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        name = route_class(scope.get("method", "GET"), scope["path"])
+        if self.shedder.should_shed(name):
+            REJECTED.inc(route_class=name, reason="shed")
+            await self._reject(
+                scope, receive, send, self.shed_retry_after, "Server busy, retry later"
+            )
+            return
+        wait = self.limiter.take(name, tenants(scope))
+        if wait > 0:
+            REJECTED.inc(route_class=name, reason="rate_limited")
+            await self._reject(scope, receive, send, wait, "Rate limit exceeded")
+            return
+
+        if kind == "websocket" or scope["path"].startswith(STREAMING_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        self.shedder.started()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.shedder.finished(time.perf_counter() - started)
+
+    async def _reject(
+        self, scope: Scope, receive: Receive, send: Send, wait: float, detail: str
+    ) -> None:
+        retry_after = str(max(1, math.ceil(min(wait, 3600))))
+        if scope["type"] == "websocket":
+            # Closing before accept; the reason carries the Retry-After hint.
+            await WebSocketClose(
+                status.WS_1013_TRY_AGAIN_LATER,
+                f"{detail}, retry after {retry_after}s",
+            )(scope, receive, send)
+            return
+        await JSONResponse(
+            {"detail": detail}, status_code=429, headers={"Retry-After": retry_after}
+        )(scope, receive, send)
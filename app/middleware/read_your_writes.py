@@ -0,0 +1,61 @@
+"""
+Read-your-writes pinning for read-replica routing.
+
+A successful write (any method but ``GET``, ``HEAD`` and ``OPTIONS``,
+answered below 400) sets a short-lived ``db_primary_until`` cookie holding
+the time until which the client's reads should stay on the primary;
+``deps.get_read_db`` honours it. The expiry travels in the cookie itself,
+so it works whichever worker serves the next request, and a client that
+replays the cookie after ``Max-Age`` is simply routed to a replica again.
+"""
+import time
+from http.cookies import SimpleCookie
+from typing import Mapping, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+COOKIE = "db_primary_until"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def wrote_recently(cookies: Mapping[str, str], now: Optional[float] = None) -> bool:
+    """Whether ``cookies`` pin the client to the primary."""
+    try:
+        until = float(cookies.get(COOKIE, ""))
+    except ValueError:
+        return False
+    return until > (time.time() if now is None else now)
+
+
+class ReadYourWritesMiddleware:
+    """Marks clients whose writes succeeded so their next reads use the primary."""
+
+    def __init__(
+        self, app: ASGIApp, window_seconds: float = settings.READ_YOUR_WRITES_SECONDS
+    ) -> None:
+        self.app = app
+        self.window_seconds = window_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_marked(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = SimpleCookie()
+                cookie[COOKIE] = f"{time.time() + self.window_seconds:.3f}"
+                cookie[COOKIE]["max-age"] = int(self.window_seconds) + 1
+                cookie[COOKIE]["path"] = "/"
+                cookie[COOKIE]["httponly"] = True
+                cookie[COOKIE]["samesite"] = "Lax"
+                header = cookie.output(header="").strip().encode("latin-1")
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", []), (b"set-cookie", header)],
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_marked)
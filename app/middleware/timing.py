@@ -0,0 +1,110 @@
+"""
+Request timing middleware.
+
+Records, per route template, latency, in-flight requests, database time and
+query count (via the cursor hooks in ``app.core.metrics``) and response size.
+Written as a plain ASGI middleware so streaming responses are not buffered.
+"""
+import time
+from typing import Any, Callable, Dict
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import (
+    COUNT_BUCKETS,
+    SIZE_BUCKETS,
+    DBStats,
+    current_db_stats,
+    instrument_engines,
+    registry,
+)
+
+REQUESTS = registry.counter(
+    "http_requests_total",
+    "HTTP requests by route and status",
+    ("method", "route", "status"),
+)
+LATENCY = registry.histogram(
+    "http_request_duration_seconds", "Request latency", ("method", "route")
+)
+IN_PROGRESS = registry.gauge(
+    "http_requests_in_progress", "Requests currently being served", ("method",)
+)
+DB_TIME = registry.histogram(
+    "http_request_db_seconds", "Database time spent per request", ("method", "route")
+)
+DB_QUERIES = registry.histogram(
+    "http_request_db_queries",
+    "Queries executed per request",
+    ("method", "route"),
+    buckets=COUNT_BUCKETS,
+)
+RESPONSE_SIZE = registry.histogram(
+    "http_response_size_bytes",
+    "Response body size",
+    ("method", "route"),
+    buckets=SIZE_BUCKETS,
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class TimingMiddleware:
+    """Collect per-route performance metrics for every HTTP request."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._route_paths: Dict[Callable[..., Any], str] = {}
+        instrument_engines()
+
+    def _route_template(self, scope: Scope) -> str:
+        # The router stores the matched endpoint on the (shared) scope dict;
+        # map it back to the declared path so label cardinality stays bounded.
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            app = scope.get("app")
+            for route in getattr(app, "routes", ()):
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = route.path
+                    break
+            else:
+                path = UNMATCHED_ROUTE
+            self._route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        size = 0
+        stats = DBStats()
+        token = current_db_stats.set(stats)
+        IN_PROGRESS.inc(method=method)
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_db_stats.reset(token)
+            IN_PROGRESS.dec(method=method)
+            route = self._route_template(scope)
+            REQUESTS.inc(method=method, route=route, status=str(status))
+            LATENCY.observe(elapsed, method=method, route=route)
+            DB_TIME.observe(stats.seconds, method=method, route=route)
+            DB_QUERIES.observe(stats.queries, method=method, route=route)
+            RESPONSE_SIZE.observe(size, method=method, route=route)
@@ -8,6 +8,11 @@ from .activity import Activity
 from .crop_specific_data import CropSpecificData
 from .spray_product import SprayProduct
 from .financial_transaction import FinancialTransaction
+from .gps_track import GPSFix, BlockVisit
+from .callback_outbox import CallbackOutbox
+from .vine_yield import VineYield
+from .dashboard_aggregate import DashboardAggregate
+from .activity_rollup import ActivityTypeRollup
 
 __all__ = [
     "Organization",
@@ -19,5 +24,11 @@ __all__ = [
     "Activity",
     "CropSpecificData",
     "SprayProduct",
-    "FinancialTransaction"
+    "FinancialTransaction",
+    "GPSFix",
+    "BlockVisit",
+    "CallbackOutbox",
+    "VineYield",
+    "DashboardAggregate",
+    "ActivityTypeRollup"
 ]
\ No newline at end of file
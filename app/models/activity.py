@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Date, Time, DECIMAL, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, Date, Time, DECIMAL, Boolean, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.db.base import Base
@@ -17,10 +17,21 @@ class ActivityTypeEnum(enum.Enum):
 
 class Activity(Base):
     __tablename__ = "activities"
+    # Timelines page newest first on (activity_date, id) within a block or user
+    __table_args__ = (
+        Index("ix_activities_block_id_activity_date", "block_id", "activity_date", "id"),
+        Index("ix_activities_user_id_activity_date", "user_id", "activity_date", "id"),
+        # Retried bulk submissions are deduplicated on the submitter's key
+        # (unique indexes of a partitioned table must hold the partition key)
+        Index("uq_activities_user_id_client_key", "user_id", "client_key", "org_id", unique=True),
+        {"info": {"partition_by": "org_id"}},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     block_id = Column(Integer, ForeignKey("blocks.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    org_id = Column(Integer)  # Partition key, copied from the block's property
+    client_key = Column(String(64))  # Client-supplied idempotency key
     
     activity_type = Column(String(50), nullable=False)  # We'll use string for flexibility
     activity_date = Column(Date, nullable=False)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Date, DECIMAL, Index, PrimaryKeyConstraint
+from app.db.base import Base
+
+
+class ActivityTypeRollup(Base):
+    """Activity count and cost per block, user, type and month.
+
+    Maintained with every activity write (see ``app.services.activity_log``),
+    so type summaries add up a few rollup rows instead of grouping activities.
+    """
+    __tablename__ = "activity_type_rollups"
+    __table_args__ = (
+        PrimaryKeyConstraint("block_id", "month", "user_id", "activity_type"),
+        Index("ix_activity_type_rollups_user_id_month", "user_id", "month"),
+    )
+
+    block_id = Column(Integer, nullable=False)
+    month = Column(Date, nullable=False)  # first day of the month
+    user_id = Column(Integer, nullable=False)
+    activity_type = Column(String(50), nullable=False)
+
+    activity_count = Column(Integer, nullable=False, default=0)
+    total_cost = Column(DECIMAL(14,2), nullable=False, default=0)
+    total_labor_hours = Column(DECIMAL(12,2), nullable=False, default=0)
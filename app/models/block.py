@@ -9,7 +9,7 @@ class Block(Base):
     __tablename__ = "blocks"
     
     id = Column(Integer, primary_key=True, index=True)
-    property_id = Column(Integer, ForeignKey("properties.id"), nullable=False)
+    property_id = Column(Integer, ForeignKey("properties.id"), nullable=False, index=True)
     block_name = Column(String(100), nullable=False)
     
     # Universal crop support
@@ -23,7 +23,7 @@ class Block(Base):
     mixed_genetics = Column(Boolean, default=False)
     
     # Physical layout
-    row_count = Column(Integer)
+    row_count = Column(Integer)  # Planned; row_total counts the Row records
     row_spacing_ft = Column(DECIMAL(5,2))
     vine_spacing_ft = Column(DECIMAL(5,2))
     
@@ -31,6 +31,7 @@ class Block(Base):
     center_latitude = Column(DECIMAL(10,8))
     center_longitude = Column(DECIMAL(11,8))
     boundary_radius_meters = Column(DECIMAL(10,2))  # Radius for circular boundary
+    boundary_polyline = Column(Text)  # Polygon boundary, encoded polyline (precision 6); preferred over the circle
     
     # Planting details (keeping existing fields)
     rootstock = Column(String(50))
@@ -50,6 +51,10 @@ class Block(Base):
     aspect = Column(ENUM('N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW', name='aspect_enum'))
     soil_type = Column(String(100))
     
+    # Counts of child records, maintained by app.services.hierarchy_counts
+    row_total = Column(Integer, nullable=False, default=0, server_default="0")
+    vine_total = Column(Integer, nullable=False, default=0, server_default="0")
+    
     # Status flags
     is_organic = Column(Boolean, default=False)
     is_active = Column(Boolean, default=True)
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, JSON, Index
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class CallbackOutbox(Base):
+    """Webhook deliveries waiting to be sent to a ``callback_url``.
+
+    Rows are written in the same transaction as the result they announce, so
+    a crash can delay a callback but never lose it. ``coalesce_key`` groups
+    payloads (e.g. all items of one inference batch) into a single delivery
+    while the row is still pending.
+    """
+    __tablename__ = "callback_outbox"
+    __table_args__ = (
+        Index("ix_callback_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+        Index("ix_callback_outbox_coalesce_key", "coalesce_key"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    url = Column(String(500), nullable=False)
+    event = Column(String(50), nullable=False)
+    coalesce_key = Column(String(100))
+    payload = Column(JSON, nullable=False)
+
+    # pending -> delivering -> delivered | failed (delivering rows whose lease,
+    # next_attempt_at, has passed are picked up again)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    last_status_code = Column(Integer)
+    last_error = Column(Text)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    delivered_at = Column(DateTime(timezone=True))
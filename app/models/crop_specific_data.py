@@ -14,10 +14,12 @@ class DataTypeEnum(enum.Enum):
 
 class CropSpecificData(Base):
     __tablename__ = "crop_specific_data"
+    __table_args__ = {"info": {"partition_by": "org_id"}}
     
     id = Column(Integer, primary_key=True, index=True)
     block_id = Column(Integer, ForeignKey("blocks.id"))
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    org_id = Column(Integer)  # Partition key, copied from the block's property
     
     data_type = Column(String(50), nullable=False)
     measurement_name = Column(String(100), nullable=False)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, JSON, PrimaryKeyConstraint
+from app.db.base import Base
+
+# property_id of organization-wide widgets (part of the primary key, so not NULL)
+ORG_SCOPE = 0
+
+
+class DashboardAggregate(Base):
+    """Precomputed data of one dashboard widget for an organization or property.
+
+    Rewritten by the dashboard aggregation job; a dashboard is the rows of one
+    ``(org_id, property_id)`` scope, read with a single primary key prefix scan.
+    """
+    __tablename__ = "dashboard_aggregates"
+    __table_args__ = (
+        PrimaryKeyConstraint("org_id", "property_id", "widget"),
+    )
+
+    org_id = Column(Integer, nullable=False)
+    property_id = Column(Integer, nullable=False, default=ORG_SCOPE)
+    widget = Column(String(50), nullable=False)
+    priority = Column(SmallInteger, nullable=False)
+    data = Column(JSON)  # None for widgets fed by the client (weather, ...)
+    computed_at = Column(DateTime(timezone=True), nullable=False)
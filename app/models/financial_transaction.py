@@ -5,6 +5,7 @@ from app.db.base import Base
 
 class FinancialTransaction(Base):
     __tablename__ = "financial_transactions"
+    __table_args__ = {"info": {"partition_by": "org_id"}}
     
     id = Column(Integer, primary_key=True, index=True)
     org_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
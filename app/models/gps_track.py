@@ -0,0 +1,56 @@
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Float, Date, DateTime, Index, PrimaryKeyConstraint
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class GPSFix(Base):
+    """Append-only GPS trail of equipment and workers.
+
+    Kept deliberately narrow: no surrogate key and no foreign keys, so batched
+    inserts stay cheap. ``(recorded_on, device_id, recorded_at)`` is the natural
+    key (retried uploads are dropped on conflict) and, on Postgres, the table is
+    range-partitioned by ``recorded_on`` with one partition per day.
+    """
+    __tablename__ = "gps_fixes"
+    __table_args__ = (
+        PrimaryKeyConstraint("recorded_on", "device_id", "recorded_at"),
+        Index("ix_gps_fixes_block_recorded_at", "block_id", "recorded_at"),
+        {"postgresql_partition_by": "RANGE (recorded_on)"},
+    )
+
+    recorded_on = Column(Date, nullable=False)
+    device_id = Column(String(64), nullable=False)
+    recorded_at = Column(DateTime(timezone=True), nullable=False)
+    org_id = Column(Integer)
+
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    accuracy_m = Column(Float)
+    speed_mps = Column(Float)
+    heading_deg = Column(SmallInteger)
+
+    # Map-matched at ingestion time
+    block_id = Column(Integer)
+    row_id = Column(Integer)
+
+
+class BlockVisit(Base):
+    """Contiguous stay of one device inside one block, derived from GPS fixes."""
+    __tablename__ = "block_visits"
+    __table_args__ = (
+        Index("ix_block_visits_device_started_at", "device_id", "started_at"),
+        Index("ix_block_visits_block_started_at", "block_id", "started_at"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    org_id = Column(Integer)
+    device_id = Column(String(64), nullable=False)
+    block_id = Column(Integer, nullable=False)
+    last_row_id = Column(Integer)
+
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    ended_at = Column(DateTime(timezone=True), nullable=False)
+    fix_count = Column(Integer, nullable=False, default=0)
+    distance_m = Column(Float, nullable=False, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -5,9 +5,11 @@ from app.db.base import Base
 
 class IndividualVine(Base):
     __tablename__ = "individual_vines"
+    __table_args__ = {"info": {"partition_by": "org_id"}}
     
     id = Column(Integer, primary_key=True, index=True)
-    row_id = Column(Integer, ForeignKey("rows.id"), nullable=False)
+    row_id = Column(Integer, ForeignKey("rows.id"), nullable=False, index=True)
+    org_id = Column(Integer)  # Partition key, copied from the row's property
     vine_number = Column(Integer, nullable=False)
     variety = Column(String(50))
     clone = Column(String(50))
@@ -9,7 +9,7 @@ class Property(Base):
     __tablename__ = "properties"
     
     id = Column(Integer, primary_key=True, index=True)
-    org_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
+    org_id = Column(Integer, ForeignKey("organizations.id"), nullable=False, index=True)
     property_name = Column(String(100), nullable=False)
     property_type = Column(ENUM('vineyard', 'orchard', 'ranch', 'farm', 'coffee_estate', name='property_type_enum'), nullable=False)
     
@@ -33,11 +33,18 @@ class Property(Base):
     boundary_center_lat = Column(DECIMAL(10,8))
     boundary_center_lng = Column(DECIMAL(11,8))
     boundary_radius_meters = Column(DECIMAL(10,2))  # Radius for circular boundary
+    boundary_polyline = Column(Text)  # Polygon boundary, encoded polyline (precision 6); preferred over the circle
     
     # Operational data
     total_acres = Column(DECIMAL(8,2))
     planted_acres = Column(DECIMAL(8,2))
     
+    # Counts of child records, maintained by app.services.hierarchy_counts
+    block_count = Column(Integer, nullable=False, default=0, server_default="0")
+    row_total = Column(Integer, nullable=False, default=0, server_default="0")
+    vine_total = Column(Integer, nullable=False, default=0, server_default="0")
+    block_acres = Column(DECIMAL(10,2), nullable=False, default=0, server_default="0")  # Sum of Block.acres
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -7,13 +7,14 @@ class Row(Base):
     __tablename__ = "rows"
     
     id = Column(Integer, primary_key=True, index=True)
-    block_id = Column(Integer, ForeignKey("blocks.id"), nullable=False)
+    block_id = Column(Integer, ForeignKey("blocks.id"), nullable=False, index=True)
     row_number = Column(Integer, nullable=False)
     variety = Column(String(50))
     clone = Column(String(50))
     rootstock = Column(String(50))
     planting_date = Column(DateTime(timezone=True))
-    vine_count = Column(Integer)
+    vine_count = Column(Integer)  # Planned; vine_total counts the IndividualVine records
+    vine_total = Column(Integer, nullable=False, default=0, server_default="0")  # Maintained by app.services.hierarchy_counts
     row_length_ft = Column(DECIMAL(8,2))
     vine_spacing_ft = Column(DECIMAL(5,2))
     
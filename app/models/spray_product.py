@@ -1,5 +1,4 @@
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, DECIMAL, JSON
-from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -40,6 +39,6 @@ class SprayProduct(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
-    # Relationships
-    restrictions = relationship("CropSpecificRestriction", back_populates="spray_product")
-    applications = relationship("SprayApplication", back_populates="spray_product")
\ No newline at end of file
+    # Relationships to crop restrictions and spray applications will be added
+    # with those models; declaring them before the classes exist breaks mapper
+    # configuration for every model.
\ No newline at end of file
@@ -0,0 +1,38 @@
+from sqlalchemy import (
+    DECIMAL,
+    Column,
+    Date,
+    DateTime,
+    Index,
+    Integer,
+    PrimaryKeyConstraint,
+    SmallInteger,
+)
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+
+class VineYield(Base):
+    """Harvested yield of one vine in one season.
+
+    ``IndividualVine.historical_yield_kg`` only holds a single figure; seasons
+    are kept here so yield can be compared season over season. ``season`` is
+    the harvest year.
+    """
+    __tablename__ = "vine_yields"
+    __table_args__ = (
+        PrimaryKeyConstraint("vine_id", "season"),
+        Index("ix_vine_yields_season", "season"),
+    )
+
+    # No foreign key: individual_vines is partitioned by org on Postgres, so
+    # tenant_partitions deletes a vine's yields along with it
+    vine_id = Column(Integer, nullable=False)
+    season = Column(SmallInteger, nullable=False)
+    yield_kg = Column(DECIMAL(6,2), nullable=False)
+    cluster_count = Column(Integer)
+    recorded_on = Column(Date)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,106 @@
+"""
+Activity log schemas.
+"""
+from datetime import date, datetime, time
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from .base import BaseSchema
+
+
+class ActivityResponse(BaseSchema):
+    """One logged field activity."""
+
+    id: int
+    block_id: int
+    user_id: int
+    client_key: Optional[str] = None
+    activity_type: str
+    activity_date: date
+    activity_time: Optional[time] = None
+    title: str
+    description: Optional[str] = None
+    equipment_used: Optional[str] = None
+    cost: Optional[float] = None
+    labor_hours: Optional[float] = None
+    is_completed: Optional[bool] = None
+    weather_conditions: Optional[str] = None
+    notes: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+
+class ActivityIn(BaseModel):
+    """An activity submitted from the field."""
+
+    client_key: str = Field(
+        ...,
+        min_length=1,
+        max_length=64,
+        description="Unique per user; resubmitting it never logs the activity twice",
+    )
+    block_id: int
+    user_id: int
+    activity_type: str = Field(..., min_length=1, max_length=50)
+    activity_date: date
+    activity_time: Optional[time] = None
+    title: str = Field(..., min_length=1, max_length=100)
+    description: Optional[str] = None
+    equipment_used: Optional[str] = Field(None, max_length=255)
+    cost: Optional[float] = Field(None, ge=0, lt=1e8)
+    labor_hours: Optional[float] = Field(None, ge=0, lt=1000)
+    is_completed: bool = True
+    weather_conditions: Optional[str] = Field(None, max_length=100)
+    notes: Optional[str] = None
+    photos: Optional[List[str]] = None
+
+
+class ActivityBatch(BaseModel):
+    """Activities submitted together by a crew lead."""
+
+    activities: List[ActivityIn] = Field(..., min_length=1, max_length=500)
+
+
+class ActivityOutcome(BaseModel):
+    """What became of one submitted activity."""
+
+    index: int = Field(..., description="Position in the submitted batch")
+    client_key: str
+    status: Literal["created", "duplicate", "rejected"]
+    id: Optional[int] = Field(None, description="Stored activity, also for duplicates")
+    detail: Optional[str] = None
+
+
+class ActivityBatchResponse(BaseModel):
+    """Outcome of a batch submission."""
+
+    created: int
+    duplicates: int
+    rejected: int
+    results: List[ActivityOutcome]
+
+
+class ActivityPage(BaseModel):
+    """A page of activities, newest first."""
+
+    items: List[ActivityResponse]
+    next_cursor: Optional[str] = Field(
+        None, description="Pass as cursor for the next page; null on the last page"
+    )
+
+
+class ActivityTypeTotals(BaseModel):
+    """Totals of one activity type."""
+
+    count: int
+    total_cost: float
+    total_labor_hours: float
+
+
+class ActivitySummary(BaseModel):
+    """Activity totals per type over whole months."""
+
+    since_month: Optional[date] = None
+    until_month: Optional[date] = None
+    total: int
+    by_type: Dict[str, ActivityTypeTotals]
@@ -37,6 +37,7 @@ class HealthCheckResponse(BaseModel):
     uptime: float = Field(..., description="Application uptime in seconds")
     database: Optional[str] = Field(None, description="Database connection status")
     external_services: Optional[Dict[str, str]] = Field(None, description="External service statuses")
+    pool: Optional[Dict[str, Any]] = Field(None, description="Database connection pool state")
 
 
 class ErrorResponse(BaseModel):
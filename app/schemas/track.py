@@ -0,0 +1,49 @@
+"""
+GPS track ingestion schemas.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from .base import BaseSchema
+
+
+class TrackFixIn(BaseModel):
+    """A single GPS fix as reported by a device."""
+
+    recorded_at: datetime = Field(..., description="When the fix was taken")
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    accuracy_m: Optional[float] = Field(None, ge=0)
+    speed_mps: Optional[float] = Field(None, ge=0)
+    heading_deg: Optional[int] = Field(None, ge=0, lt=360)
+
+
+class TrackBatchRequest(BaseModel):
+    """A batch of fixes from one device."""
+
+    device_id: str = Field(..., min_length=1, max_length=64)
+    org_id: Optional[int] = Field(None, description="Owning organization")
+    fixes: List[TrackFixIn] = Field(..., min_length=1, max_length=10000)
+
+
+class TrackBatchResponse(BaseModel):
+    """Outcome of a batch submission."""
+
+    accepted: int = Field(..., description="Fixes accepted into the ingestion buffer")
+    rejected: int = Field(..., description="Fixes rejected because the buffer was full")
+    buffered: int = Field(..., description="Fixes currently waiting to be flushed")
+
+
+class BlockVisitResponse(BaseSchema):
+    """A contiguous stay of a device inside a block."""
+
+    id: int
+    device_id: str
+    block_id: int
+    last_row_id: Optional[int] = None
+    started_at: datetime
+    ended_at: datetime
+    fix_count: int
+    distance_m: float
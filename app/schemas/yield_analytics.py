@@ -0,0 +1,30 @@
+"""
+Yield analytics schemas.
+"""
+from datetime import date
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class VineYieldIn(BaseModel):
+    """Harvested yield of one vine."""
+
+    vine_id: int
+    yield_kg: float = Field(..., ge=0, lt=10000)
+    cluster_count: Optional[int] = Field(None, ge=0)
+    recorded_on: Optional[date] = None
+
+
+class VineYieldBatch(BaseModel):
+    """Yields of vines in one block for one season."""
+
+    records: List[VineYieldIn] = Field(..., min_length=1, max_length=50000)
+
+
+class VineYieldBatchResponse(BaseModel):
+    """Outcome of recording a batch of yields."""
+
+    block_id: int
+    season: int
+    recorded: int = Field(..., description="Yield records inserted or replaced")
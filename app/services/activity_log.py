@@ -0,0 +1,481 @@
+"""
+Activity timelines and type summaries.
+
+Timelines are ordered newest first on ``(activity_date, id)`` and paged with
+an opaque keyset cursor (the last item's date and id), so page N costs the
+same as page 1 and rows inserted meanwhile never shift a page. The composite
+indexes ``(block_id, activity_date, id)`` and ``(user_id, activity_date, id)``
+serve the per-block and per-user timelines in index order. Block and
+property timelines also name the org, the partition key of ``activities``.
+
+Crew leads log activities in bulk with ``log_activities``: each item carries
+a client key, so a retried submission inserts nothing twice and reports the
+stored ids instead.
+
+Type summaries read ``ActivityTypeRollup`` (count, cost and labor per block,
+month, user and type) instead of grouping activities. The rollup is kept in
+step inside the writing transaction by mapper events on ``Activity``; Core
+bulk writes must call ``apply_rollup_deltas`` themselves, and
+``rebuild_rollups`` recomputes it from scratch.
+"""
+import base64
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, event, func, inspect, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models.activity import Activity
+from app.models.activity_rollup import ActivityTypeRollup
+from app.models.block import Block
+from app.models.user import User
+from app.services.live_events import property_org, publish_activities
+from app.services.tenant_partitions import block_org, block_orgs, partition_clause
+
+MAX_PAGE_SIZE = 200
+
+_rollups = ActivityTypeRollup.__table__
+RollupKey = Tuple[int, date, int, str]  # block_id, month, user_id, activity_type
+
+
+# Cursors
+# -------
+
+
+def encode_cursor(activity_date: date, activity_id: int) -> str:
+    raw = f"{activity_date.isoformat()}|{activity_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """Raises ``ValueError`` for anything ``encode_cursor`` did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        day, _, activity_id = raw.partition("|")
+        return date.fromisoformat(day), int(activity_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+# Timeline
+# --------
+
+
+def _property_blocks(property_id: int):
+    return select(Block.id).where(Block.property_id == property_id).scalar_subquery()
+
+
+def timeline(
+    db: Session,
+    block_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    property_id: Optional[int] = None,
+    activity_types: Sequence[str] = (),
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> Dict[str, Any]:
+    """One page of activities, newest first, and the cursor of the next."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    org_id = None
+    if block_id is not None:
+        org_id = block_org(db.connection(), block_id)
+    elif property_id is not None:
+        org_id = property_org(db.connection(), property_id)
+    query = select(Activity).where(*partition_clause(Activity, org_id))
+    if block_id is not None:
+        query = query.where(Activity.block_id == block_id)
+    if user_id is not None:
+        query = query.where(Activity.user_id == user_id)
+    if property_id is not None:
+        query = query.where(Activity.block_id.in_(_property_blocks(property_id)))
+    if activity_types:
+        query = query.where(Activity.activity_type.in_(activity_types))
+    if since is not None:
+        query = query.where(Activity.activity_date >= since)
+    if until is not None:
+        query = query.where(Activity.activity_date <= until)
+    if cursor is not None:
+        query = query.where(
+            tuple_(Activity.activity_date, Activity.id) < decode_cursor(cursor)
+        )
+    # One extra row tells whether there is a next page.
+    items = db.scalars(
+        query.order_by(Activity.activity_date.desc(), Activity.id.desc()).limit(
+            limit + 1
+        )
+    ).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].activity_date, items[-1].id)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+# Summaries
+# ---------
+
+
+def _month(day: date) -> date:
+    return day.replace(day=1)
+
+
+def type_summary(
+    db: Session,
+    block_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    property_id: Optional[int] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+) -> Dict[str, Any]:
+    """Activity count, cost and labor per type from the rollup.
+
+    ``since`` and ``until`` select whole months (the rollup's grain).
+    """
+    r = _rollups.c
+    query = select(
+        r.activity_type,
+        func.sum(r.activity_count),
+        func.sum(r.total_cost),
+        func.sum(r.total_labor_hours),
+    ).group_by(r.activity_type)
+    if block_id is not None:
+        query = query.where(r.block_id == block_id)
+    if user_id is not None:
+        query = query.where(r.user_id == user_id)
+    if property_id is not None:
+        query = query.where(r.block_id.in_(_property_blocks(property_id)))
+    if since is not None:
+        query = query.where(r.month >= _month(since))
+    if until is not None:
+        query = query.where(r.month <= _month(until))
+
+    by_type = {}
+    for activity_type, count, cost, hours in db.execute(query):
+        if count:
+            by_type[activity_type] = {
+                "count": int(count),
+                "total_cost": float(cost or 0),
+                "total_labor_hours": float(hours or 0),
+            }
+    return {
+        "since_month": _month(since).isoformat() if since else None,
+        "until_month": _month(until).isoformat() if until else None,
+        "total": sum(item["count"] for item in by_type.values()),
+        "by_type": dict(sorted(by_type.items())),
+    }
+
+
+# Bulk logging
+# ------------
+
+_BULK_FIELDS = (
+    "block_id",
+    "user_id",
+    "client_key",
+    "activity_type",
+    "activity_date",
+    "activity_time",
+    "title",
+    "description",
+    "equipment_used",
+    "cost",
+    "labor_hours",
+    "is_completed",
+    "weather_conditions",
+    "notes",
+    "photos",
+)
+
+ClientKey = Tuple[int, str]  # user_id, client_key
+
+
+def _stored_ids(
+    connection: Connection, keys: Sequence[ClientKey]
+) -> Dict[ClientKey, int]:
+    if not keys:
+        return {}
+    a = Activity.__table__.c
+    rows = connection.execute(
+        select(a.user_id, a.client_key, a.id).where(
+            tuple_(a.user_id, a.client_key).in_(keys)
+        )
+    )
+    return {(user_id, client_key): id_ for user_id, client_key, id_ in rows}
+
+
+def _insert_new(
+    connection: Connection, rows: List[Dict[str, Any]]
+) -> Dict[ClientKey, int]:
+    """Insert ``rows`` whose client key is not stored yet; returns their ids."""
+    table = Activity.__table__
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(table)
+        stmt = (
+            stmt.values(rows)
+            .on_conflict_do_nothing(index_elements=["user_id", "client_key", "org_id"])
+            .returning(table.c.user_id, table.c.client_key, table.c.id)
+        )
+        return {
+            (user_id, client_key): id_
+            for user_id, client_key, id_ in connection.execute(stmt)
+        }
+    stored = _stored_ids(
+        connection, [(row["user_id"], row["client_key"]) for row in rows]
+    )
+    inserted = {}
+    for row in rows:
+        key = (row["user_id"], row["client_key"])
+        if key not in stored:
+            result = connection.execute(table.insert().values(row))
+            inserted[key] = result.inserted_primary_key[0]
+    return inserted
+
+
+def log_activities(
+    db: Session, items: Sequence[Mapping[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Insert a batch of activities once each; returns one outcome per item.
+
+    An item is ``created``, a ``duplicate`` of an activity already stored
+    under its ``(user_id, client_key)`` (a retry, or an earlier item of the
+    same batch), or ``rejected`` for naming an unknown block or user. New
+    items go in with one multi-row ``INSERT ... ON CONFLICT DO NOTHING``, so
+    concurrent retries of the same batch cannot insert twice either.
+    """
+    block_ids = {item["block_id"] for item in items}
+    user_ids = {item["user_id"] for item in items}
+    known_blocks = block_orgs(db.connection(), block_ids)
+    known_users = set(db.scalars(select(User.id).where(User.id.in_(user_ids))))
+
+    outcomes: List[Dict[str, Any]] = []
+    first: Dict[ClientKey, Dict[str, Any]] = {}
+    for index, item in enumerate(items):
+        outcome = {"index": index, "client_key": item["client_key"], "id": None}
+        if item["block_id"] not in known_blocks:
+            outcome.update(
+                status="rejected", detail=f"Unknown block {item['block_id']}"
+            )
+        elif item["user_id"] not in known_users:
+            outcome.update(status="rejected", detail=f"Unknown user {item['user_id']}")
+        elif (item["user_id"], item["client_key"]) in first:
+            outcome.update(status="duplicate", detail=None)
+        else:
+            first[(item["user_id"], item["client_key"])] = item
+            outcome.update(status="created", detail=None)
+        outcomes.append(outcome)
+
+    connection = db.connection()
+    rows = [
+        {
+            **{field: item.get(field) for field in _BULK_FIELDS},
+            "org_id": known_blocks[item["block_id"]],
+        }
+        for item in first.values()
+    ]
+    inserted = _insert_new(connection, rows) if rows else {}
+    # The insert bypasses the mapper events that keep the rollup in step.
+    apply_rollup_deltas(
+        connection,
+        rollup_deltas(
+            row for row in rows if (row["user_id"], row["client_key"]) in inserted
+        ),
+    )
+    publish_activities(
+        db,
+        [
+            {**row, "id": inserted[(row["user_id"], row["client_key"])]}
+            for row in rows
+            if (row["user_id"], row["client_key"]) in inserted
+        ],
+        connection,
+    )
+    ids = {
+        **_stored_ids(connection, [key for key in first if key not in inserted]),
+        **inserted,
+    }
+    db.commit()
+
+    for item, outcome in zip(items, outcomes):
+        if outcome["status"] == "rejected":
+            continue
+        key = (item["user_id"], item["client_key"])
+        outcome["id"] = ids.get(key)
+        if key not in inserted:
+            outcome["status"] = "duplicate"
+    return outcomes
+
+
+# Rollup maintenance
+# ------------------
+
+
+def _key(values: Mapping[str, Any]) -> RollupKey:
+    return (
+        values["block_id"],
+        _month(values["activity_date"]),
+        values["user_id"],
+        values["activity_type"],
+    )
+
+
+def _amount(value: Any) -> Decimal:
+    return Decimal(str(value)) if value is not None else Decimal(0)
+
+
+def rollup_deltas(
+    activities: Iterable[Mapping[str, Any]], sign: int = 1
+) -> Dict[RollupKey, List]:
+    """``{key: [count, cost, labor_hours]}`` for adding (or with ``sign=-1``
+    removing) ``activities``."""
+    deltas: Dict[RollupKey, List] = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for activity in activities:
+        delta = deltas[_key(activity)]
+        delta[0] += sign
+        delta[1] += sign * _amount(activity.get("cost"))
+        delta[2] += sign * _amount(activity.get("labor_hours"))
+    return deltas
+
+
+def apply_rollup_deltas(
+    connection: Connection, deltas: Mapping[RollupKey, List]
+) -> None:
+    """Add ``deltas`` to the rollup in the caller's transaction."""
+    values = [
+        {
+            "block_id": block_id,
+            "month": month,
+            "user_id": user_id,
+            "activity_type": activity_type,
+            "activity_count": count,
+            "total_cost": cost,
+            "total_labor_hours": hours,
+        }
+        for (block_id, month, user_id, activity_type), (count, cost, hours) in (
+            deltas.items()
+        )
+        if count or cost or hours
+    ]
+    if not values:
+        return
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(_rollups)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["block_id", "month", "user_id", "activity_type"],
+            set_={
+                "activity_count": _rollups.c.activity_count
+                + stmt.excluded.activity_count,
+                "total_cost": _rollups.c.total_cost + stmt.excluded.total_cost,
+                "total_labor_hours": _rollups.c.total_labor_hours
+                + stmt.excluded.total_labor_hours,
+            },
+        )
+        connection.execute(stmt, values)
+        return
+    for value in values:
+        r = _rollups.c
+        result = connection.execute(
+            update(_rollups)
+            .where(
+                r.block_id == value["block_id"],
+                r.month == value["month"],
+                r.user_id == value["user_id"],
+                r.activity_type == value["activity_type"],
+            )
+            .values(
+                activity_count=r.activity_count + value["activity_count"],
+                total_cost=r.total_cost + value["total_cost"],
+                total_labor_hours=r.total_labor_hours + value["total_labor_hours"],
+            )
+        )
+        if not result.rowcount:
+            connection.execute(_rollups.insert(), value)
+
+
+def rebuild_rollups(connection: Connection) -> int:
+    """Recompute the whole rollup from ``activities``; returns its row count."""
+    a = Activity.__table__.c
+    daily = connection.execute(
+        select(
+            a.block_id,
+            a.activity_date,
+            a.user_id,
+            a.activity_type,
+            func.count(),
+            func.coalesce(func.sum(a.cost), 0),
+            func.coalesce(func.sum(a.labor_hours), 0),
+        ).group_by(a.block_id, a.activity_date, a.user_id, a.activity_type)
+    )
+    # Days are folded into months here, which keeps the SQL dialect-neutral.
+    deltas: Dict[RollupKey, List] = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for block_id, day, user_id, activity_type, count, cost, hours in daily:
+        delta = deltas[(block_id, _month(day), user_id, activity_type)]
+        delta[0] += count
+        delta[1] += _amount(cost)
+        delta[2] += _amount(hours)
+    connection.execute(delete(_rollups))
+    apply_rollup_deltas(connection, deltas)
+    return len(deltas)
+
+
+_ROLLUP_FIELDS = (
+    "block_id",
+    "user_id",
+    "activity_type",
+    "activity_date",
+    "cost",
+    "labor_hours",
+)
+
+
+def _current(target: Activity) -> Dict[str, Any]:
+    return {name: getattr(target, name) for name in _ROLLUP_FIELDS}
+
+
+def _activity_inserted(mapper, connection, target) -> None:
+    apply_rollup_deltas(connection, rollup_deltas([_current(target)]))
+
+
+def _activity_deleted(mapper, connection, target) -> None:
+    # Deleted as loaded; pending edits to a deleted row never reached the rollup.
+    state = inspect(target)
+    committed = {
+        name: (
+            state.attrs[name].history.deleted[0]
+            if state.attrs[name].history.deleted
+            else getattr(target, name)
+        )
+        for name in _ROLLUP_FIELDS
+    }
+    apply_rollup_deltas(connection, rollup_deltas([committed], sign=-1))
+
+
+def _activity_updated(mapper, connection, target) -> None:
+    state = inspect(target)
+    histories = {name: state.attrs[name].history for name in _ROLLUP_FIELDS}
+    if not any(history.has_changes() for history in histories.values()):
+        return
+    before = {
+        name: history.deleted[0] if history.deleted else getattr(target, name)
+        for name, history in histories.items()
+    }
+    deltas = rollup_deltas([before], sign=-1)
+    for key, (count, cost, hours) in rollup_deltas([_current(target)]).items():
+        delta = deltas[key]
+        delta[0] += count
+        delta[1] += cost
+        delta[2] += hours
+    apply_rollup_deltas(connection, deltas)
+
+
+event.listen(Activity, "after_insert", _activity_inserted)
+event.listen(Activity, "after_update", _activity_updated)
+event.listen(Activity, "after_delete", _activity_deleted)
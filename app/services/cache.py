@@ -0,0 +1,386 @@
+"""
+Read-through cache for slowly changing hierarchy data.
+
+Entries are grouped into namespaces of ``(entity, tenant)`` - for example
+``("block", property_id)``. Each namespace carries a generation number that is
+part of every cache key, so invalidating a namespace is a single counter bump;
+stale entries are never read again and simply age out of the LRU.
+
+The in-process LRU is always used. An optional shared backend (a Redis-like
+key/value store) can be layered underneath so several workers share loaded
+values and, more importantly, generation numbers. ``LocalSharedBackend`` is an
+in-memory stand-in with the same interface for development and tests.
+
+Without a shared backend each worker keeps its own generations. On
+PostgreSQL ``cache_bridge`` then carries invalidations between workers:
+writers ``announce`` the namespaces they touch with ``pg_notify`` in the
+writing transaction, and every worker ``LISTEN``s on
+``CACHE_INVALIDATION_CHANNEL`` and bumps its generations once the write
+commits. Other databases have no such channel; run several workers there
+only with a shared backend or a short ``CACHE_TTL_SECONDS``.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+# NOTIFY payloads must stay below 8000 bytes.
+MAX_NOTIFY_BYTES = 7900
+
+
+class SharedCacheBackend:
+    """Interface for a cache store shared between workers."""
+
+    def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class LocalSharedBackend(SharedCacheBackend):
+    """In-memory stand-in for a shared backend (development and tests)."""
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = int(self._data.get(key, (0, None))[0]) + 1
+            self._data[key] = (value, None)
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int, ttl_seconds: Optional[float] = None) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class QueryCache:
+    """Read-through cache keyed by entity, tenant and query arguments."""
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_seconds: Optional[float] = 300,
+        shared: Optional[SharedCacheBackend] = None,
+        enabled: bool = True,
+    ) -> None:
+        self.enabled = enabled
+        self.local = LRUCache(max_entries, ttl_seconds)
+        self.shared = shared
+        self.ttl_seconds = ttl_seconds
+        self._generations: Dict[Tuple[str, Hashable], int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.invalidations = 0
+
+    def _generation(self, entity: str, tenant: Hashable) -> int:
+        if self.shared is not None:
+            return int(self.shared.get(f"gen:{entity}:{tenant}") or 0)
+        return self._generations.get((entity, tenant), 0)
+
+    def generation(self, entity: str, tenant: Hashable) -> int:
+        """Counter of an ``(entity, tenant)`` namespace, bumped by ``invalidate``."""
+        return self._generation(entity, tenant)
+
+    def get_or_load(
+        self,
+        entity: str,
+        tenant: Hashable,
+        loader: Callable[[], Any],
+        *parts: Hashable,
+        store: bool = True,
+    ) -> Any:
+        """Return the cached value for the key, calling ``loader`` on a miss.
+
+        With ``store=False`` a miss is loaded but not cached, for loaders that
+        may read data older than the last invalidation (a lagging replica).
+        """
+        if not self.enabled:
+            return loader()
+
+        generation = self._generation(entity, tenant)
+        key = (entity, tenant, generation) + parts
+
+        value = self.local.get(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        if self.shared is not None:
+            shared_key = ":".join(str(part) for part in key)
+            value = self.shared.get(shared_key)
+            if value is not None:
+                self.shared_hits += 1
+                self.local.set(key, value)
+                return value
+
+        self.misses += 1
+        value = loader()
+        if not store:
+            return value
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(shared_key, value, self.ttl_seconds)
+        return value
+
+    def invalidate(self, entity: str, tenant: Hashable) -> None:
+        """Drop every entry of one ``(entity, tenant)`` namespace."""
+        self.invalidations += 1
+        if self.shared is not None:
+            self.shared.incr(f"gen:{entity}:{tenant}")
+            return
+        with self._lock:
+            key = (entity, tenant)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self) -> None:
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+        with self._lock:
+            self._generations.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": "shared" if self.shared is not None else "local",
+            "entries": len(self.local),
+            "max_entries": self.local.max_entries,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.local.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": round((self.hits + self.shared_hits) / lookups, 4)
+            if lookups
+            else 0.0,
+        }
+
+
+def _build_shared_backend(name: str) -> Optional[SharedCacheBackend]:
+    if not name:
+        return None
+    if name == "local":
+        return LocalSharedBackend()
+    raise ValueError(f"Unknown CACHE_SHARED_BACKEND: {name!r}")
+
+
+query_cache = QueryCache(
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.CACHE_TTL_SECONDS,
+    shared=_build_shared_backend(settings.CACHE_SHARED_BACKEND),
+    enabled=settings.CACHE_ENABLED,
+)
+
+
+class InvalidationBridge:
+    """Cross-worker invalidation over LISTEN/NOTIFY; see module docstring."""
+
+    def __init__(
+        self, cache: QueryCache, channel: str = settings.CACHE_INVALIDATION_CHANNEL
+    ) -> None:
+        self.cache = cache
+        self.channel = channel
+        self.bridged = False
+        self.received = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def wanted(self) -> bool:
+        # A shared backend already shares the generations.
+        return self.cache.enabled and self.cache.shared is None
+
+    def announce(
+        self, connection: Connection, keys: Iterable[Tuple[str, Hashable]]
+    ) -> None:
+        """Invalidate ``keys`` on every worker when ``connection`` commits."""
+        if not self.wanted or connection.dialect.name != "postgresql":
+            return
+        for payload in self._payloads(keys):
+            connection.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": self.channel, "payload": payload},
+            )
+
+    @staticmethod
+    def _payloads(keys: Iterable[Tuple[str, Hashable]]) -> Iterable[str]:
+        batch: List[str] = []
+        size = 2
+        for key in sorted(keys, key=repr):
+            encoded = json.dumps(list(key))
+            if batch and size + len(encoded) + 1 > MAX_NOTIFY_BYTES:
+                yield f"[{','.join(batch)}]"
+                batch, size = [], 2
+            batch.append(encoded)
+            size += len(encoded) + 1
+        if batch:
+            yield f"[{','.join(batch)}]"
+
+    def receive(self, payload: str) -> None:
+        for entity, tenant in json.loads(payload):
+            self.cache.invalidate(entity, tenant)
+            self.received += 1
+
+    async def start(self) -> None:
+        if self._task is None and self.wanted:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.bridged = False
+
+    async def _watch(self) -> None:
+        from app.db.base import get_engine
+
+        if get_engine().dialect.name != "postgresql":
+            return
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Cache invalidation listener failed; retrying")
+                self.bridged = False
+                await asyncio.sleep(1.0)
+
+    async def _listen(self) -> None:
+        from app.db.base import get_engine
+
+        connection = get_engine().raw_connection()
+        try:
+            raw = connection.driver_connection
+            raw.autocommit = True
+            raw.cursor().execute(f'LISTEN "{self.channel}"')
+            # Invalidations sent while no listener was up are lost.
+            self.cache.local.clear()
+            loop = asyncio.get_running_loop()
+            lost = asyncio.Event()
+
+            def on_readable() -> None:
+                try:
+                    raw.poll()
+                except Exception:
+                    lost.set()
+                    return
+                while raw.notifies:
+                    notify = raw.notifies.pop(0)
+                    try:
+                        self.receive(notify.payload)
+                    except (TypeError, ValueError):
+                        logger.warning("Ignoring malformed cache invalidation")
+
+            loop.add_reader(raw.fileno(), on_readable)
+            self.bridged = True
+            try:
+                await lost.wait()
+                raise ConnectionError("Cache invalidation listener connection lost")
+            finally:
+                self.bridged = False
+                loop.remove_reader(raw.fileno())
+        finally:
+            connection.invalidate()
+
+
+cache_bridge = InvalidationBridge(query_cache)
+
+
+def _cache_metrics():
+    stats = query_cache.stats()
+    for field, kind in (
+        ("hits", "counter"),
+        ("shared_hits", "counter"),
+        ("misses", "counter"),
+        ("evictions", "counter"),
+        ("invalidations", "counter"),
+        ("entries", "gauge"),
+    ):
+        name = f"query_cache_{field}" + ("_total" if kind == "counter" else "")
+        yield name, kind, f"Hierarchy read cache {field}", [(name, {}, stats[field])]
+
+
+registry.register_collector(_cache_metrics)
@@ -0,0 +1,530 @@
+"""
+Scheduled aggregation of dashboard widget data.
+
+Dashboards used to list widget types only; filling them meant aggregating
+activities and measurements on every request. Instead one worker, the holder
+of the ``dashboard-aggregates`` leader lock, recomputes every widget of every
+organization and property each ``DASHBOARD_REFRESH_SECONDS``:
+
+1. load the recent activities and measurements of all scopes in two queries,
+2. group them per ``(org_id, property_id)`` scope (``ORG_SCOPE`` for the
+   organization-wide dashboard),
+3. replace the contents of ``dashboard_aggregates`` in one transaction.
+
+A dashboard read is then the rows of one scope, a primary key prefix scan.
+Widgets without a data source here (weather, ...) are stored with ``data``
+None so the widget list and priorities still come from the same read.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, insert, or_, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.activity import Activity
+from app.models.block import Block
+from app.models.crop_specific_data import CropSpecificData
+from app.models.dashboard_aggregate import ORG_SCOPE, DashboardAggregate
+from app.models.organization import Organization
+from app.models.property import Property
+from app.services.leader_lock import LeaderLock
+from app.services.reference_data import CROP_TEMPLATES
+from app.services.tenant_partitions import partition_clause
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = registry.histogram(
+    "dashboard_refresh_seconds", "Time to recompute all dashboard aggregates"
+)
+
+RECENT_DAYS = 30
+MEASUREMENT_DAYS = 60
+LIST_LIMIT = 10
+
+_aggregates = DashboardAggregate.__table__
+Scope = Tuple[int, int]
+
+
+# Widget lists
+# ------------
+
+
+def org_widgets(profile: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Dashboard widgets of an organization, from its agricultural profile."""
+    widgets = [
+        {"type": "weather", "priority": 1},
+        {"type": "recent_activities", "priority": 2},
+    ]
+    crops = profile.get("crops", [])
+    if "coffee" in crops:
+        widgets.append({"type": "cherry_moisture", "priority": 3})
+    if "apple" in crops:
+        widgets.append({"type": "maturity_tracking", "priority": 3})
+    return widgets
+
+
+def property_widgets(crops: List[str]) -> List[Dict[str, Any]]:
+    """Dashboard widgets of one property, from its primary crops."""
+    widgets = [{"type": "weather_station", "priority": 1}]
+    if "coffee" in crops:
+        widgets.append({"type": "cherry_moisture_alerts", "priority": 2})
+    if "apple" in crops:
+        widgets.append({"type": "harvest_readiness", "priority": 2})
+    return widgets
+
+
+# Facts
+# -----
+
+
+def _target_ranges() -> Dict[str, Tuple[float, float]]:
+    ranges = {}
+    for template in CROP_TEMPLATES.values():
+        for metric in template["quality_metrics"]:
+            low, _, high = metric["target_range"].partition("-")
+            ranges[metric["name"]] = (float(low), float(high))
+    return ranges
+
+
+TARGET_RANGES = _target_ranges()
+
+
+def load_facts(
+    db: Session, today: date, org_id: Optional[int] = None
+) -> Tuple[List[Dict], List[Dict]]:
+    """Recent or open activities and recent measurements of every property
+    (or of one organization's)."""
+    tenant = [] if org_id is None else [Property.org_id == org_id]
+    activities = (
+        db.execute(
+            select(
+                Property.org_id,
+                Block.property_id,
+                Activity.id,
+                Activity.block_id,
+                Activity.activity_type,
+                Activity.activity_date,
+                Activity.title,
+                Activity.is_completed,
+                Activity.cost,
+            )
+            .join(Block, Block.id == Activity.block_id)
+            .join(Property, Property.id == Block.property_id)
+            .where(
+                or_(
+                    Activity.activity_date >= today - timedelta(days=RECENT_DAYS),
+                    Activity.is_completed.is_(False),
+                ),
+                *tenant,
+                *partition_clause(Activity, org_id),
+            )
+        )
+        .mappings()
+        .all()
+    )
+    measurements = (
+        db.execute(
+            select(
+                Property.org_id,
+                Block.property_id,
+                CropSpecificData.id,
+                CropSpecificData.block_id,
+                CropSpecificData.data_type,
+                CropSpecificData.measurement_name,
+                CropSpecificData.measurement_value,
+                CropSpecificData.measurement_units,
+                CropSpecificData.measurement_date,
+            )
+            .join(Block, Block.id == CropSpecificData.block_id)
+            .join(Property, Property.id == Block.property_id)
+            .where(
+                CropSpecificData.measurement_date
+                >= today - timedelta(days=MEASUREMENT_DAYS),
+                *tenant,
+                *partition_clause(CropSpecificData, org_id),
+            )
+        )
+        .mappings()
+        .all()
+    )
+    return activities, measurements
+
+
+def _by_scope(items: Iterable[Dict]) -> Dict[Scope, List[Dict]]:
+    grouped: Dict[Scope, List[Dict]] = defaultdict(list)
+    for item in items:
+        grouped[(item["org_id"], ORG_SCOPE)].append(item)
+        grouped[(item["org_id"], item["property_id"])].append(item)
+    return grouped
+
+
+# Widget builders
+# ---------------
+
+
+def _activity(item: Dict) -> Dict[str, Any]:
+    return {
+        "id": item["id"],
+        "block_id": item["block_id"],
+        "activity_type": item["activity_type"],
+        "activity_date": item["activity_date"].isoformat(),
+        "title": item["title"],
+        "is_completed": item["is_completed"] is not False,
+    }
+
+
+def recent_activities(activities: Sequence[Dict], today: date) -> Dict[str, Any]:
+    since = today - timedelta(days=RECENT_DAYS)
+    recent = [a for a in activities if since <= a["activity_date"] <= today]
+    recent.sort(key=lambda a: (a["activity_date"], a["id"]), reverse=True)
+    return {
+        "items": [_activity(a) for a in recent[:LIST_LIMIT]],
+        "counts_by_type": dict(Counter(a["activity_type"] for a in recent)),
+        "total_cost": round(sum(float(a["cost"] or 0) for a in recent), 2),
+        "open": sum(1 for a in activities if a["is_completed"] is False),
+    }
+
+
+def harvest_schedule(activities: Sequence[Dict], today: date) -> Dict[str, Any]:
+    harvests = [a for a in activities if a["activity_type"] == "harvest"]
+    upcoming = sorted(
+        (a for a in harvests if a["activity_date"] >= today),
+        key=lambda a: (a["activity_date"], a["id"]),
+    )
+    return {
+        "upcoming": [_activity(a) for a in upcoming[:LIST_LIMIT]],
+        "completed_recently": sum(
+            1
+            for a in harvests
+            if a["activity_date"] < today and a["is_completed"] is not False
+        ),
+    }
+
+
+def latest_measurements(
+    measurements: Sequence[Dict], accept: Callable[[Dict], bool]
+) -> List[Dict[str, Any]]:
+    """Newest accepted measurement per block and name, with its change from
+    the one before and whether it is inside the crop template's target."""
+    series: Dict[Tuple[int, str], List[Dict]] = defaultdict(list)
+    for m in measurements:
+        if m["measurement_value"] is not None and accept(m):
+            series[(m["block_id"], m["measurement_name"])].append(m)
+    latest = []
+    for (block_id, name), items in sorted(series.items()):
+        items.sort(key=lambda m: (m["measurement_date"], m["id"]))
+        value = float(items[-1]["measurement_value"])
+        previous = float(items[-2]["measurement_value"]) if len(items) > 1 else None
+        target = TARGET_RANGES.get(name)
+        latest.append(
+            {
+                "block_id": block_id,
+                "measurement_name": name,
+                "value": value,
+                "units": items[-1]["measurement_units"],
+                "measurement_date": items[-1]["measurement_date"].isoformat(),
+                "change": round(value - previous, 4) if previous is not None else None,
+                "target_range": list(target) if target else None,
+                "in_target": target[0] <= value <= target[1] if target else None,
+            }
+        )
+    return latest
+
+
+def _is_maturity(m: Dict) -> bool:
+    return m["data_type"] == "maturity_indicator"
+
+
+def _is_moisture(m: Dict) -> bool:
+    return "moisture" in m["measurement_name"].lower()
+
+
+def maturity_tracking(measurements: Sequence[Dict], today: date) -> Dict[str, Any]:
+    return {"blocks": latest_measurements(measurements, _is_maturity)}
+
+
+def cherry_moisture(measurements: Sequence[Dict], today: date) -> Dict[str, Any]:
+    latest = latest_measurements(measurements, _is_moisture)
+    values = [m["value"] for m in latest]
+    return {
+        "blocks": latest,
+        "mean": round(sum(values) / len(values), 2) if values else None,
+    }
+
+
+def cherry_moisture_alerts(measurements: Sequence[Dict], today: date) -> Dict[str, Any]:
+    latest = latest_measurements(measurements, _is_moisture)
+    return {"alerts": [m for m in latest if m["in_target"] is False]}
+
+
+def harvest_readiness(
+    activities: Sequence[Dict], measurements: Sequence[Dict], today: date
+) -> Dict[str, Any]:
+    blocks: Dict[int, List[Dict]] = defaultdict(list)
+    for m in latest_measurements(measurements, _is_maturity):
+        blocks[m["block_id"]].append(m)
+    return {
+        "blocks": [
+            {
+                "block_id": block_id,
+                "ready": all(m["in_target"] is not False for m in metrics),
+                "metrics": metrics,
+            }
+            for block_id, metrics in sorted(blocks.items())
+        ],
+        "next_harvest": harvest_schedule(activities, today)["upcoming"][:1],
+    }
+
+
+# widget type -> builder(activities, measurements, today) of one scope
+BUILDERS: Dict[str, Callable[[Sequence[Dict], Sequence[Dict], date], Any]] = {
+    "recent_activities": lambda a, m, today: recent_activities(a, today),
+    "harvest_schedule": lambda a, m, today: harvest_schedule(a, today),
+    "maturity_tracking": lambda a, m, today: maturity_tracking(m, today),
+    "cherry_moisture": lambda a, m, today: cherry_moisture(m, today),
+    "cherry_moisture_alerts": lambda a, m, today: cherry_moisture_alerts(m, today),
+    "harvest_readiness": harvest_readiness,
+}
+
+
+# Computation
+# -----------
+
+
+def load_scopes(
+    db: Session, org_id: Optional[int] = None, property_id: Optional[int] = None
+) -> Dict[Scope, List[Dict[str, Any]]]:
+    """Widget list of every organization and property (or of one scope)."""
+    scopes: Dict[Scope, List[Dict[str, Any]]] = {}
+    if property_id in (None, ORG_SCOPE):
+        query = select(Organization.id, Organization.agricultural_profile).where(
+            Organization.deleted_at.is_(None)
+        )
+        if org_id is not None:
+            query = query.where(Organization.id == org_id)
+        for oid, profile in db.execute(query):
+            scopes[(oid, ORG_SCOPE)] = org_widgets(profile or {})
+    if property_id != ORG_SCOPE:
+        query = select(Property.org_id, Property.id, Property.primary_crops)
+        if org_id is not None:
+            query = query.where(Property.org_id == org_id)
+        if property_id is not None:
+            query = query.where(Property.id == property_id)
+        for oid, pid, crops in db.execute(query):
+            scopes[(oid, pid)] = property_widgets(crops or [])
+    return scopes
+
+
+def compute(
+    db: Session,
+    today: Optional[date] = None,
+    scopes: Optional[Dict[Scope, List[Dict[str, Any]]]] = None,
+    org_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """``dashboard_aggregates`` rows for ``scopes`` (default: all of them);
+    ``org_id`` limits the facts loaded to one organization."""
+    today = today or date.today()
+    scopes = load_scopes(db) if scopes is None else scopes
+    activities, measurements = load_facts(db, today, org_id)
+    activities_by_scope = _by_scope(activities)
+    measurements_by_scope = _by_scope(measurements)
+    computed_at = datetime.now(timezone.utc)
+    rows = []
+    for (org_id, property_id), widgets in scopes.items():
+        scope_activities = activities_by_scope.get((org_id, property_id), [])
+        scope_measurements = measurements_by_scope.get((org_id, property_id), [])
+        for widget in widgets:
+            builder = BUILDERS.get(widget["type"])
+            rows.append(
+                {
+                    "org_id": org_id,
+                    "property_id": property_id,
+                    "widget": widget["type"],
+                    "priority": widget["priority"],
+                    "data": builder(scope_activities, scope_measurements, today)
+                    if builder is not None
+                    else None,
+                    "computed_at": computed_at,
+                }
+            )
+    return rows
+
+
+def replace_aggregates(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Swap the whole table for ``rows`` in the caller's transaction."""
+    db.execute(delete(_aggregates))
+    if rows:
+        db.execute(insert(_aggregates), rows)
+
+
+def read_dashboard(
+    db: Session, org_id: int, property_id: int = ORG_SCOPE
+) -> Optional[Dict[str, Any]]:
+    """Widgets of one scope from the aggregate table.
+
+    A scope created since the last refresh is computed on the fly (and not
+    stored; the next refresh picks it up). None if the scope does not exist.
+    """
+    rows = (
+        db.execute(
+            select(
+                _aggregates.c.widget,
+                _aggregates.c.priority,
+                _aggregates.c.data,
+                _aggregates.c.computed_at,
+            )
+            .where(
+                _aggregates.c.org_id == org_id,
+                _aggregates.c.property_id == property_id,
+            )
+            .order_by(_aggregates.c.priority, _aggregates.c.widget)
+        )
+        .mappings()
+        .all()
+    )
+    if not rows:
+        scopes = load_scopes(db, org_id, property_id)
+        if not scopes:
+            return None
+        rows = sorted(
+            compute(db, scopes=scopes, org_id=org_id),
+            key=lambda r: (r["priority"], r["widget"]),
+        )
+    return {
+        "org_id": org_id,
+        "property_id": None if property_id == ORG_SCOPE else property_id,
+        "computed_at": rows[0]["computed_at"].isoformat(),
+        "widgets": [
+            {"type": r["widget"], "priority": r["priority"], "data": r["data"]}
+            for r in rows
+        ],
+    }
+
+
+# Scheduling
+# ----------
+
+
+class DashboardAggregator:
+    """Periodic job: whichever worker holds the leader lock refreshes."""
+
+    def __init__(
+        self,
+        interval: float = settings.DASHBOARD_REFRESH_SECONDS,
+        session_factory: Optional[Callable[[], Session]] = None,
+        lock: Optional[LeaderLock] = None,
+    ) -> None:
+        self.interval = interval
+        self.session_factory = session_factory
+        self.lock = lock or LeaderLock("dashboard-aggregates")
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.failures = 0
+        self.last_refresh_at: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_rows = 0
+
+    def _session(self) -> Session:
+        if self.session_factory is None:
+            from app.db.base import SessionLocal
+
+            return SessionLocal()
+        return self.session_factory()
+
+    def refresh(self, db: Optional[Session] = None) -> int:
+        """Recompute and store every widget now; returns the row count."""
+        started = time.perf_counter()
+        own_session = db is None
+        db = self._session() if own_session else db
+        try:
+            rows = compute(db)
+            replace_aggregates(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self.failures += 1
+            raise
+        finally:
+            if own_session:
+                db.close()
+        self.last_duration = time.perf_counter() - started
+        REFRESH_SECONDS.observe(self.last_duration)
+        self.last_refresh_at = time.time()
+        self.last_rows = len(rows)
+        self.refreshes += 1
+        return len(rows)
+
+    def tick(self) -> bool:
+        """Refresh if this worker is (or just became) the leader."""
+        with self._session() as db:
+            if not self.lock.acquire(db.get_bind()):
+                return False
+            self.refresh(db)
+        return True
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.lock.release()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await run_in_threadpool(self.tick)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Dashboard aggregation failed")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "leader": self.lock.is_leader,
+            "interval_seconds": self.interval,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "rows": self.last_rows,
+            "last_duration_seconds": round(self.last_duration, 4)
+            if self.last_duration is not None
+            else None,
+            "age_seconds": round(time.time() - self.last_refresh_at, 3)
+            if self.last_refresh_at
+            else None,
+        }
+
+
+dashboard_aggregator = DashboardAggregator()
+
+
+def _dashboard_metrics():
+    yield (
+        "dashboard_aggregator_leader",
+        "gauge",
+        "Whether this worker refreshes the dashboard aggregates",
+        [("dashboard_aggregator_leader", {}, int(dashboard_aggregator.lock.is_leader))],
+    )
+    yield (
+        "dashboard_aggregate_rows",
+        "gauge",
+        "Widget rows written by this worker's last refresh",
+        [("dashboard_aggregate_rows", {}, dashboard_aggregator.last_rows)],
+    )
+
+
+registry.register_collector(_dashboard_metrics)
@@ -0,0 +1,171 @@
+"""
+In-memory spatial index over blocks and rows.
+
+Geometry is held in flat columnar arrays (``array('d')`` / ``array('q')``)
+rather than ORM objects, and a uniform lat/lng grid maps each cell to the
+block and row positions whose extent touches it. A lookup therefore touches
+one grid cell and a handful of candidates regardless of estate size.
+
+Distances use a local equirectangular projection, which is accurate to well
+under a metre at vineyard scales and far cheaper than geodesic maths.
+"""
+import math
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.polygon import Polygon, parse_boundary
+
+EARTH_RADIUS_M = 6_371_008.8
+METERS_PER_DEG = math.pi * EARTH_RADIUS_M / 180.0
+CELL_SIZE_DEG = 0.001  # ~111 m north-south
+DEFAULT_BLOCK_RADIUS_M = 75.0
+ROW_MARGIN_M = 10.0  # rows are indexed this far beyond their end points
+
+Cell = Tuple[int, int]
+
+
+def _cell(lat: float, lng: float) -> Cell:
+    return int(math.floor(lat / CELL_SIZE_DEG)), int(math.floor(lng / CELL_SIZE_DEG))
+
+
+def _cells_in_bbox(
+    min_lat: float, min_lng: float, max_lat: float, max_lng: float
+) -> Iterable[Cell]:
+    lo_i, lo_j = _cell(min_lat, min_lng)
+    hi_i, hi_j = _cell(max_lat, max_lng)
+    for i in range(lo_i, hi_i + 1):
+        for j in range(lo_j, hi_j + 1):
+            yield i, j
+
+
+def distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Equirectangular distance in meters; fine below a few kilometres."""
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_M * math.hypot(x, y)
+
+
+def point_segment_distance_m(
+    lat: float, lng: float, lat1: float, lng1: float, lat2: float, lng2: float
+) -> float:
+    """Distance from a point to a segment, projected around the point."""
+    k = math.cos(math.radians(lat)) * METERS_PER_DEG
+    ax, ay = (lng1 - lng) * k, (lat1 - lat) * METERS_PER_DEG
+    bx, by = (lng2 - lng) * k, (lat2 - lat) * METERS_PER_DEG
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    t = 0.0 if length_sq == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / length_sq))
+    return math.hypot(ax + t * dx, ay + t * dy)
+
+
+class GeoIndex:
+    """Columnar block/row geometry with a grid lookup."""
+
+    def __init__(self) -> None:
+        self.block_ids = array("q")
+        self.block_property_ids = array("q")
+        self.block_lat = array("d")
+        self.block_lng = array("d")
+        self.block_radius = array("d")
+        self.block_polygons: List[Optional[Polygon]] = []
+        self.row_ids = array("q")
+        self.row_block_ids = array("q")
+        self.row_lat1 = array("d")
+        self.row_lng1 = array("d")
+        self.row_lat2 = array("d")
+        self.row_lng2 = array("d")
+        self._block_cells: Dict[Cell, List[int]] = {}
+        self._row_cells: Dict[Cell, List[int]] = {}
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(
+        cls,
+        blocks: Iterable[Sequence],
+        rows: Iterable[Tuple[int, int, float, float, float, float]],
+    ) -> "GeoIndex":
+        """Build from ``(id, property_id, lat, lng, radius_m[, boundary_polyline])``
+        block tuples and ``(id, block_id, start_lat, start_lng, end_lat,
+        end_lng)`` row tuples. Blocks with a polygon boundary are matched on
+        the polygon, the others on their circle."""
+        index = cls()
+        for block_id, property_id, lat, lng, radius, *boundary in blocks:
+            lat, lng = float(lat), float(lng)
+            radius = float(radius) if radius else DEFAULT_BLOCK_RADIUS_M
+            polygon = parse_boundary(boundary[0]) if boundary else None
+            position = len(index.block_ids)
+            index.block_ids.append(block_id)
+            index.block_property_ids.append(property_id)
+            index.block_lat.append(lat)
+            index.block_lng.append(lng)
+            index.block_radius.append(radius)
+            index.block_polygons.append(polygon)
+            if polygon is not None:
+                bbox = (
+                    polygon.min_lat,
+                    polygon.min_lng,
+                    polygon.max_lat,
+                    polygon.max_lng,
+                )
+            else:
+                dlat = radius / METERS_PER_DEG
+                dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+                bbox = (lat - dlat, lng - dlng, lat + dlat, lng + dlng)
+            for cell in _cells_in_bbox(*bbox):
+                index._block_cells.setdefault(cell, []).append(position)
+
+        for row_id, block_id, lat1, lng1, lat2, lng2 in rows:
+            lat1, lng1, lat2, lng2 = float(lat1), float(lng1), float(lat2), float(lng2)
+            position = len(index.row_ids)
+            index.row_ids.append(row_id)
+            index.row_block_ids.append(block_id)
+            index.row_lat1.append(lat1)
+            index.row_lng1.append(lng1)
+            index.row_lat2.append(lat2)
+            index.row_lng2.append(lng2)
+            dlat = ROW_MARGIN_M / METERS_PER_DEG
+            dlng = dlat / max(math.cos(math.radians(lat1)), 1e-6)
+            for cell in _cells_in_bbox(
+                min(lat1, lat2) - dlat,
+                min(lng1, lng2) - dlng,
+                max(lat1, lat2) + dlat,
+                max(lng1, lng2) + dlng,
+            ):
+                index._row_cells.setdefault(cell, []).append(position)
+        return index
+
+    def match_block(self, lat: float, lng: float) -> Optional[Tuple[int, float]]:
+        """Nearest block whose boundary contains the point, as (id, distance_m)."""
+        best: Optional[Tuple[int, float]] = None
+        for position in self._block_cells.get(_cell(lat, lng), ()):
+            d = distance_m(lat, lng, self.block_lat[position], self.block_lng[position])
+            polygon = self.block_polygons[position]
+            if polygon is not None:
+                inside = polygon.contains(lat, lng)
+            else:
+                inside = d <= self.block_radius[position]
+            if inside and (best is None or d < best[1]):
+                best = (self.block_ids[position], d)
+        return best
+
+    def match_row(
+        self, lat: float, lng: float, block_id: int, max_distance_m: float
+    ) -> Optional[Tuple[int, float]]:
+        """Nearest row of ``block_id`` within ``max_distance_m`` (at most
+        ``ROW_MARGIN_M``), as (id, distance_m)."""
+        best: Optional[Tuple[int, float]] = None
+        for position in self._row_cells.get(_cell(lat, lng), ()):
+            if self.row_block_ids[position] != block_id:
+                continue
+            d = point_segment_distance_m(
+                lat,
+                lng,
+                self.row_lat1[position],
+                self.row_lng1[position],
+                self.row_lat2[position],
+                self.row_lng2[position],
+            )
+            if d <= max_distance_m and (best is None or d < best[1]):
+                best = (self.row_ids[position], d)
+        return best
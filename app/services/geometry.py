@@ -0,0 +1,264 @@
+"""
+Geometry output layer: simplification and compact encodings.
+
+Lines (GPS trails, row segments, boundaries) are simplified for the zoom level
+the client will draw them at and then encoded in one of three formats:
+
+* ``json``     - ``[{"lat": .., "lng": ..}, ...]`` (the historical shape),
+* ``polyline`` - Google's encoded polyline algorithm format, decodable with
+  ``google.maps.geometry.encoding.decodePath``,
+* ``delta``    - a flat integer array ``[lat0, lng0, dlat1, dlng1, ...]`` of
+  coordinates scaled by ``10**precision``, cheap to decode and to compress.
+
+Simplification tolerance is derived from the Web Mercator ground resolution
+at the requested zoom, so nothing is removed that would move a pixel on
+screen; ``zoom=None`` disables it.
+"""
+import heapq
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query
+
+Point = Tuple[float, float]  # (lat, lng)
+
+FORMATS = ("json", "polyline", "delta")
+SIMPLIFIERS = ("dp", "vw", "none")
+METERS_PER_DEG = 111_320.0
+# Ground resolution of Web Mercator at zoom 0 on the equator (256 px tiles)
+METERS_PER_PIXEL_Z0 = 156_543.03392
+DEFAULT_PIXEL_TOLERANCE = 0.5
+
+
+def tolerance_for_zoom(
+    zoom: Optional[float], latitude: float, pixels: float = DEFAULT_PIXEL_TOLERANCE
+) -> float:
+    """Meters covered by ``pixels`` screen pixels at ``zoom``; 0 disables."""
+    if zoom is None:
+        return 0.0
+    return pixels * METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / 2**zoom
+
+
+def _project(points: Sequence[Point]) -> Tuple[List[float], List[float]]:
+    """Local equirectangular projection to meters around the first point."""
+    k = math.cos(math.radians(points[0][0])) * METERS_PER_DEG
+    xs = [lng * k for _, lng in points]
+    ys = [lat * METERS_PER_DEG for lat, _ in points]
+    return xs, ys
+
+
+def radial_filter(points: Sequence[Point], tolerance_m: float) -> List[Point]:
+    """Drop points within ``tolerance_m`` of the last kept one (O(n) pre-pass)."""
+    if len(points) < 3 or tolerance_m <= 0:
+        return list(points)
+    xs, ys = _project(points)
+    tolerance_sq = tolerance_m * tolerance_m
+    kept = [points[0]]
+    last_x, last_y = xs[0], ys[0]
+    for i in range(1, len(points) - 1):
+        dx, dy = xs[i] - last_x, ys[i] - last_y
+        if dx * dx + dy * dy > tolerance_sq:
+            kept.append(points[i])
+            last_x, last_y = xs[i], ys[i]
+    kept.append(points[-1])
+    return kept
+
+
+def douglas_peucker(points: Sequence[Point], tolerance_m: float) -> List[Point]:
+    """Ramer-Douglas-Peucker with an explicit stack (no recursion limit)."""
+    n = len(points)
+    if n < 3 or tolerance_m <= 0:
+        return list(points)
+    xs, ys = _project(points)
+    keep = bytearray(n)
+    keep[0] = keep[n - 1] = 1
+    tolerance_sq = tolerance_m * tolerance_m
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        length_sq = dx * dx + dy * dy
+        max_sq, index = 0.0, 0
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            if length_sq:
+                t = max(0.0, min(1.0, (px * dx + py * dy) / length_sq))
+                px, py = px - t * dx, py - t * dy
+            d = px * px + py * py
+            if d > max_sq:
+                max_sq, index = d, i
+        if max_sq > tolerance_sq:
+            keep[index] = 1
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def visvalingam(points: Sequence[Point], min_area_m2: float) -> List[Point]:
+    """Visvalingam-Whyatt: drop the smallest effective-area vertex until all
+    remaining triangles are at least ``min_area_m2``."""
+    n = len(points)
+    if n < 3 or min_area_m2 <= 0:
+        return list(points)
+    xs, ys = _project(points)
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    removed = bytearray(n)
+
+    def area(i: int) -> float:
+        a, c = prev[i], nxt[i]
+        return (
+            abs((xs[a] - xs[i]) * (ys[c] - ys[i]) - (xs[c] - xs[i]) * (ys[a] - ys[i]))
+            / 2
+        )
+
+    areas = [0.0] * n
+    heap = []
+    for i in range(1, n - 1):
+        areas[i] = area(i)
+        heap.append((areas[i], i))
+    heapq.heapify(heap)
+    while heap:
+        a, i = heapq.heappop(heap)
+        if removed[i] or a != areas[i]:
+            continue  # stale heap entry
+        if a >= min_area_m2:
+            break
+        removed[i] = 1
+        p, q = prev[i], nxt[i]
+        nxt[p], prev[q] = q, p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                # Never let a neighbour's area drop below the one just removed.
+                areas[j] = max(area(j), a)
+                heapq.heappush(heap, (areas[j], j))
+    return [p for p, r in zip(points, removed) if not r]
+
+
+def simplify(
+    points: Sequence[Point], tolerance_m: float, method: str = "dp"
+) -> List[Point]:
+    if method == "vw":
+        # Triangle with base ~ tolerance and height ~ tolerance
+        return visvalingam(points, tolerance_m * tolerance_m / 2)
+    if method == "dp":
+        # The radial pre-pass removes GPS jitter clusters cheaply, which keeps
+        # Douglas-Peucker far from its quadratic worst case on dense trails.
+        return douglas_peucker(radial_filter(points, tolerance_m), tolerance_m)
+    return list(points)
+
+
+def _encode_value(value: int, out: List[str]) -> None:
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode_polyline(points: Sequence[Point], precision: int = 5) -> str:
+    """Google encoded polyline algorithm format."""
+    factor = 10**precision
+    out: List[str] = []
+    last_lat = last_lng = 0
+    for lat, lng in points:
+        ilat, ilng = round(lat * factor), round(lng * factor)
+        _encode_value(ilat - last_lat, out)
+        _encode_value(ilng - last_lng, out)
+        last_lat, last_lng = ilat, ilng
+    return "".join(out)
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[Point]:
+    factor = 10**precision
+    points: List[Point] = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+
+def delta_encode(points: Sequence[Point], precision: int = 6) -> List[int]:
+    """Flat ``[lat0, lng0, dlat1, dlng1, ...]`` scaled integers."""
+    factor = 10**precision
+    out: List[int] = []
+    last_lat = last_lng = 0
+    for lat, lng in points:
+        ilat, ilng = round(lat * factor), round(lng * factor)
+        out.append(ilat - last_lat)
+        out.append(ilng - last_lng)
+        last_lat, last_lng = ilat, ilng
+    return out
+
+
+def delta_decode(values: Sequence[int], precision: int = 6) -> List[Point]:
+    factor = 10**precision
+    points: List[Point] = []
+    lat = lng = 0
+    for i in range(0, len(values) - 1, 2):
+        lat += values[i]
+        lng += values[i + 1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+
+@dataclass(frozen=True)
+class GeometryOptions:
+    """How geometry should be simplified and encoded in a response."""
+
+    format: str = "json"
+    zoom: Optional[float] = None
+    simplify: str = "dp"
+    precision: int = 5
+
+    def encode(self, points: Sequence[Point]) -> Dict[str, Any]:
+        """Simplify then encode a line; the result always carries ``count``."""
+        points = [(float(lat), float(lng)) for lat, lng in points]
+        if points and self.zoom is not None:
+            tolerance = tolerance_for_zoom(self.zoom, points[0][0])
+            points = simplify(points, tolerance, self.simplify)
+        encoded: Dict[str, Any] = {"encoding": self.format, "count": len(points)}
+        if self.format == "polyline":
+            encoded["precision"] = self.precision
+            encoded["points"] = encode_polyline(points, self.precision)
+        elif self.format == "delta":
+            encoded["precision"] = self.precision
+            encoded["points"] = delta_encode(points, self.precision)
+        else:
+            encoded["points"] = [{"lat": lat, "lng": lng} for lat, lng in points]
+        return encoded
+
+
+def geometry_options(
+    format: str = Query("json", description="json, polyline or delta"),
+    zoom: Optional[float] = Query(
+        None, ge=0, le=24, description="Simplify for this map zoom level"
+    ),
+    simplify: str = Query("dp", description="dp (Douglas-Peucker), vw or none"),
+    precision: int = Query(5, ge=1, le=7, description="Decimal digits kept"),
+) -> GeometryOptions:
+    """FastAPI dependency shared by every geometry-returning endpoint."""
+    if format not in FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {FORMATS}")
+    if simplify not in SIMPLIFIERS:
+        raise HTTPException(
+            status_code=422, detail=f"simplify must be one of {SIMPLIFIERS}"
+        )
+    return GeometryOptions(
+        format=format, zoom=zoom, simplify=simplify, precision=precision
+    )
@@ -0,0 +1,475 @@
+"""
+Child counts kept on the hierarchy: blocks, rows, vines and block acres per
+property, rows and vines per block, vines per row.
+
+``Block.row_count`` and ``Row.vine_count`` are the planned figures entered
+by hand; the maintained ``*_total`` / ``block_count`` / ``block_acres``
+columns count the records actually stored, so hierarchy screens read them
+instead of counting ``rows`` and ``individual_vines``.
+
+ORM writes keep them in step through mapper events: each inserted, deleted
+or re-parented block, row or vine adds a delta to its ancestors, and the
+deltas of a flush are applied in the same transaction as
+``col = col + delta`` - one ``UPDATE`` per table per flush. Moving a block
+or row to another parent recounts the affected properties instead.
+
+Writes that bypass the ORM (bulk loads, SQL consoles) are caught by
+``reconcile_counts``, which recounts in bulk and rewrites only the rows that
+drifted. ``HierarchyCountReconciler`` runs it on the leader worker every
+``HIERARCHY_RECONCILE_SECONDS``.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, event, func, inspect, or_, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.block import Block
+from app.models.individual_vine import IndividualVine
+from app.models.property import Property
+from app.models.row import Row
+from app.services.hierarchy_service import ALL_TENANTS, invalidate_after_commit
+from app.services.leader_lock import LeaderLock
+
+logger = logging.getLogger(__name__)
+
+DRIFT = registry.counter(
+    "hierarchy_count_drift_total",
+    "Hierarchy rows whose maintained counts were found wrong and rewritten",
+    ("table",),
+)
+
+_PENDING = "hierarchy_counts"
+
+_properties = Property.__table__
+_blocks = Block.__table__
+_rows = Row.__table__
+_vines = IndividualVine.__table__
+
+# table -> counter columns, in the order deltas are kept
+COUNTERS = {
+    "properties": ("block_count", "row_total", "vine_total", "block_acres"),
+    "blocks": ("row_total", "vine_total"),
+    "rows": ("vine_total",),
+}
+_TABLES = {"properties": _properties, "blocks": _blocks, "rows": _rows}
+
+
+def _block_count():
+    return (
+        select(func.count())
+        .select_from(_blocks)
+        .where(_blocks.c.property_id == _properties.c.id)
+        .scalar_subquery()
+    )
+
+
+def _row_count(parent):
+    query = select(func.count()).select_from(_rows)
+    if parent is _blocks:
+        return query.where(_rows.c.block_id == _blocks.c.id).scalar_subquery()
+    return (
+        query.join(_blocks, _blocks.c.id == _rows.c.block_id)
+        .where(_blocks.c.property_id == _properties.c.id)
+        .scalar_subquery()
+    )
+
+
+def _vine_count(parent):
+    query = select(func.count()).select_from(_vines)
+    if parent is _rows:
+        return query.where(_vines.c.row_id == _rows.c.id).scalar_subquery()
+    query = query.join(_rows, _rows.c.id == _vines.c.row_id)
+    if parent is _blocks:
+        return query.where(_rows.c.block_id == _blocks.c.id).scalar_subquery()
+    return (
+        query.join(_blocks, _blocks.c.id == _rows.c.block_id)
+        .where(_blocks.c.property_id == _properties.c.id)
+        .scalar_subquery()
+    )
+
+
+def _acre_sum():
+    return (
+        select(func.coalesce(func.sum(_blocks.c.acres), 0))
+        .where(_blocks.c.property_id == _properties.c.id)
+        .scalar_subquery()
+    )
+
+
+# table -> cache namespace of its rows, keyed by the parent column
+_NAMESPACES = {
+    "rows": ("row", "block_id"),
+    "blocks": ("block", "property_id"),
+    "properties": ("property", "org_id"),
+}
+
+
+def reconcile_counts(
+    connection: Connection,
+    property_ids: Optional[Iterable[int]] = None,
+    touched: Optional[Set[Tuple[str, Any]]] = None,
+) -> Dict[str, int]:
+    """Recount (``property_ids`` or everything) and fix drifted rows.
+
+    Returns how many rows of each table were rewritten, and adds the cache
+    namespaces holding them to ``touched`` for the caller to invalidate.
+    """
+    scoped = property_ids is not None
+    property_ids = list(property_ids or ())
+    expected = {
+        "rows": (_rows, {"vine_total": _vine_count(_rows)}),
+        "blocks": (
+            _blocks,
+            {"row_total": _row_count(_blocks), "vine_total": _vine_count(_blocks)},
+        ),
+        "properties": (
+            _properties,
+            {
+                "block_count": _block_count(),
+                "row_total": _row_count(_properties),
+                "vine_total": _vine_count(_properties),
+                "block_acres": _acre_sum(),
+            },
+        ),
+    }
+    scope = {
+        "rows": lambda: _rows.c.block_id.in_(
+            select(_blocks.c.id).where(_blocks.c.property_id.in_(property_ids))
+        ),
+        "blocks": lambda: _blocks.c.property_id.in_(property_ids),
+        "properties": lambda: _properties.c.id.in_(property_ids),
+    }
+    fixed = {}
+    for name, (table, values) in expected.items():
+        statement = (
+            update(table)
+            .where(or_(*(table.c[column] != value for column, value in values.items())))
+            .values(**values)
+        )
+        if scoped:
+            statement = statement.where(scope[name]())
+        entity, parent = _NAMESPACES[name]
+        parents = connection.scalars(statement.returning(table.c[parent])).all()
+        fixed[name] = len(parents)
+        if touched is not None:
+            touched.update((entity, parent_id) for parent_id in parents)
+            if entity == "property" and parents:
+                touched.add((entity, ALL_TENANTS))
+    return fixed
+
+
+# Maintenance on ORM writes
+# -------------------------
+
+
+class _Pending:
+    """Deltas and recounts collected during one flush."""
+
+    def __init__(self) -> None:
+        self.deltas: Dict[str, Dict[int, list]] = {
+            name: defaultdict(lambda n=len(columns): [0] * n)
+            for name, columns in COUNTERS.items()
+        }
+        self.recount: Set[int] = set()
+        # child id -> (parent ids up to the org), looked up once per flush
+        self.row_parents: Dict[int, Tuple[int, int, int]] = {}
+        self.block_parents: Dict[int, Tuple[int, int]] = {}
+        self.invalidate: Set[Tuple[str, Any]] = set()
+
+
+def _pending(target: Any) -> Optional[_Pending]:
+    db = Session.object_session(target)
+    if db is None:
+        return None
+    return db.info.setdefault(_PENDING, _Pending())
+
+
+def _block_parents(
+    connection: Connection, pending: _Pending, block_id: int
+) -> Optional[Tuple[int, int]]:
+    if block_id not in pending.block_parents:
+        row = connection.execute(
+            select(_blocks.c.property_id, _properties.c.org_id)
+            .join(_properties, _properties.c.id == _blocks.c.property_id)
+            .where(_blocks.c.id == block_id)
+        ).first()
+        pending.block_parents[block_id] = tuple(row) if row else None
+    return pending.block_parents[block_id]
+
+
+def _row_parents(
+    connection: Connection, pending: _Pending, row_id: int
+) -> Optional[Tuple[int, int, int]]:
+    if row_id not in pending.row_parents:
+        block_id = connection.scalar(
+            select(_rows.c.block_id).where(_rows.c.id == row_id)
+        )
+        parents = _block_parents(connection, pending, block_id) if block_id else None
+        pending.row_parents[row_id] = (block_id, *parents) if parents else None
+    return pending.row_parents[row_id]
+
+
+def _add(pending: _Pending, name: str, key: int, column: str, delta: Any) -> None:
+    pending.deltas[name][key][COUNTERS[name].index(column)] += delta
+
+
+def _count_vine(connection, pending, row_id, sign) -> None:
+    parents = _row_parents(connection, pending, row_id) if row_id else None
+    if parents is None:
+        return
+    block_id, property_id, org_id = parents
+    _add(pending, "rows", row_id, "vine_total", sign)
+    _add(pending, "blocks", block_id, "vine_total", sign)
+    _add(pending, "properties", property_id, "vine_total", sign)
+    pending.invalidate.update(
+        {("row", block_id), ("block", property_id), ("property", org_id)}
+    )
+
+
+def _count_row(connection, pending, block_id, sign) -> None:
+    parents = _block_parents(connection, pending, block_id) if block_id else None
+    if parents is None:
+        return
+    property_id, org_id = parents
+    _add(pending, "blocks", block_id, "row_total", sign)
+    _add(pending, "properties", property_id, "row_total", sign)
+    pending.invalidate.update({("block", property_id), ("property", org_id)})
+
+
+def _property_changed(connection, pending, property_id) -> None:
+    org_id = connection.scalar(
+        select(_properties.c.org_id).where(_properties.c.id == property_id)
+    )
+    pending.invalidate.add(("property", org_id))
+
+
+def _acres(value: Any) -> Decimal:
+    return Decimal(str(value)) if value is not None else Decimal(0)
+
+
+def _count_block(connection, pending, property_id, acres, sign) -> None:
+    if property_id is None:
+        return
+    _add(pending, "properties", property_id, "block_count", sign)
+    _add(pending, "properties", property_id, "block_acres", sign * _acres(acres))
+    _property_changed(connection, pending, property_id)
+
+
+def _previous(target: Any, attribute: str) -> Optional[Any]:
+    """The value ``attribute`` had before this flush, if it changed."""
+    history = inspect(target).attrs[attribute].history
+    if not history.has_changes():
+        return None
+    return history.deleted[0] if history.deleted else None
+
+
+def _vine_changed(sign):
+    def handler(mapper, connection, target) -> None:
+        pending = _pending(target)
+        if pending is not None:
+            _count_vine(connection, pending, target.row_id, sign)
+
+    return handler
+
+
+def _vine_updated(mapper, connection, target) -> None:
+    pending = _pending(target)
+    previous = _previous(target, "row_id")
+    if pending is None or previous is None:
+        return
+    _count_vine(connection, pending, previous, -1)
+    _count_vine(connection, pending, target.row_id, 1)
+
+
+def _row_changed(sign):
+    def handler(mapper, connection, target) -> None:
+        pending = _pending(target)
+        if pending is not None:
+            _count_row(connection, pending, target.block_id, sign)
+
+    return handler
+
+
+def _row_updated(mapper, connection, target) -> None:
+    # The row takes its vines along; recount both properties.
+    pending = _pending(target)
+    previous = _previous(target, "block_id")
+    if pending is None or previous is None:
+        return
+    for block_id in (previous, target.block_id):
+        parents = _block_parents(connection, pending, block_id)
+        if parents:
+            pending.recount.add(parents[0])
+            pending.invalidate.update(
+                {("row", block_id), ("block", parents[0]), ("property", parents[1])}
+            )
+
+
+def _block_changed(sign):
+    def handler(mapper, connection, target) -> None:
+        pending = _pending(target)
+        if pending is not None:
+            _count_block(connection, pending, target.property_id, target.acres, sign)
+
+    return handler
+
+
+def _block_updated(mapper, connection, target) -> None:
+    pending = _pending(target)
+    if pending is None:
+        return
+    previous = _previous(target, "property_id")
+    if previous is not None:
+        pending.recount.update({previous, target.property_id})
+        for property_id in (previous, target.property_id):
+            _property_changed(connection, pending, property_id)
+        return
+    history = inspect(target).attrs.acres.history
+    if history.has_changes():
+        before = history.deleted[0] if history.deleted else None
+        change = _acres(target.acres) - _acres(before)
+        _add(pending, "properties", target.property_id, "block_acres", change)
+        _property_changed(connection, pending, target.property_id)
+
+
+def _apply_pending(session: Session, flush_context: Any) -> None:
+    pending: Optional[_Pending] = session.info.pop(_PENDING, None)
+    if pending is None:
+        return
+    connection = session.connection()
+    for name, deltas in pending.deltas.items():
+        changed = [
+            {"_id": key, **{f"d_{c}": d for c, d in zip(COUNTERS[name], delta)}}
+            for key, delta in deltas.items()
+            if any(delta)
+        ]
+        if not changed:
+            continue
+        table = _TABLES[name]
+        connection.execute(
+            update(table)
+            .where(table.c.id == bindparam("_id"))
+            .values(**{c: table.c[c] + bindparam(f"d_{c}") for c in COUNTERS[name]}),
+            changed,
+        )
+    if pending.recount:
+        reconcile_counts(connection, pending.recount, pending.invalidate)
+    # Invalidated by hierarchy_service after commit, not now: a concurrent read
+    # would cache the pre-commit counts again for the whole TTL.
+    if any(entity == "property" for entity, _ in pending.invalidate):
+        pending.invalidate.add(("property", ALL_TENANTS))
+    invalidate_after_commit(session, pending.invalidate)
+
+
+def _discard_pending(session: Session, *args: Any) -> None:
+    session.info.pop(_PENDING, None)
+
+
+for _model, _changed, _updated in (
+    (IndividualVine, _vine_changed, _vine_updated),
+    (Row, _row_changed, _row_updated),
+    (Block, _block_changed, _block_updated),
+):
+    event.listen(_model, "after_insert", _changed(1))
+    event.listen(_model, "after_delete", _changed(-1))
+    event.listen(_model, "after_update", _updated)
+event.listen(Session, "after_flush", _apply_pending)
+event.listen(Session, "after_rollback", _discard_pending)
+
+
+# Scheduled reconciliation
+# ------------------------
+
+
+class HierarchyCountReconciler:
+    """Periodic drift repair on whichever worker holds the leader lock."""
+
+    def __init__(
+        self,
+        interval: float = settings.HIERARCHY_RECONCILE_SECONDS,
+        session_factory: Optional[Callable[[], Session]] = None,
+        lock: Optional[LeaderLock] = None,
+    ) -> None:
+        self.interval = interval
+        self.session_factory = session_factory
+        self.lock = lock or LeaderLock("hierarchy-counts")
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.last_fixed: Dict[str, int] = {}
+        self.last_run_at: Optional[float] = None
+
+    def _session(self) -> Session:
+        if self.session_factory is None:
+            from app.db.base import SessionLocal
+
+            return SessionLocal()
+        return self.session_factory()
+
+    def reconcile(self, db: Session) -> Dict[str, int]:
+        touched: Set[Tuple[str, Any]] = set()
+        fixed = reconcile_counts(db.connection(), touched=touched)
+        invalidate_after_commit(db, touched)
+        db.commit()
+        for table, count in fixed.items():
+            if count:
+                DRIFT.inc(count, table=table)
+                logger.warning("Fixed drifted hierarchy counts on %d %s", count, table)
+        self.runs += 1
+        self.last_fixed = fixed
+        self.last_run_at = time.time()
+        return fixed
+
+    def tick(self) -> bool:
+        """Reconcile if this worker is (or just became) the leader."""
+        with self._session() as db:
+            if not self.lock.acquire(db.get_bind()):
+                return False
+            self.reconcile(db)
+        return True
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.lock.release()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await run_in_threadpool(self.tick)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Hierarchy count reconciliation failed")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "leader": self.lock.is_leader,
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "last_fixed": self.last_fixed,
+            "age_seconds": round(time.time() - self.last_run_at, 3)
+            if self.last_run_at
+            else None,
+        }
+
+
+hierarchy_count_reconciler = HierarchyCountReconciler()
@@ -0,0 +1,195 @@
+"""
+Cached reads of the property / block / row / vine hierarchy.
+
+Results are detached snapshots (plain attribute bags built from the mapped
+columns), never live ORM instances, so they are safe to share across sessions
+and requests. Writes to any hierarchy model invalidate the affected cache
+namespaces through SQLAlchemy mapper events, once the write is committed.
+
+Endpoints that serve a snapshot under an ETag pass it as ``version``, which
+becomes part of the cache key: another worker's stale entry for the namespace
+then misses instead of being served under the newer ETag.
+"""
+from types import SimpleNamespace
+from typing import Any, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.models.block import Block
+from app.models.individual_vine import IndividualVine
+from app.models.property import Property
+from app.models.row import Row
+from app.services.cache import cache_bridge, query_cache
+
+ALL_TENANTS = "*"
+
+
+def _version(version: Optional[Hashable]) -> Tuple[Hashable, ...]:
+    return () if version is None else (version,)
+
+
+def snapshot(obj: Any) -> SimpleNamespace:
+    """Copy the mapped column values of an ORM instance."""
+    mapper = inspect(obj).mapper
+    return SimpleNamespace(
+        **{attr.key: getattr(obj, attr.key) for attr in mapper.column_attrs}
+    )
+
+
+class HierarchyService:
+    """Read-through cached lookups for the location hierarchy"""
+
+    @staticmethod
+    def get_properties(
+        db: Session, org_id: int, version: Optional[Hashable] = None
+    ) -> Tuple[SimpleNamespace, ...]:
+        """All properties of one organization"""
+        return query_cache.get_or_load(
+            "property",
+            org_id,
+            lambda: tuple(
+                snapshot(p)
+                for p in db.query(Property).filter(Property.org_id == org_id).all()
+            ),
+            *_version(version),
+        )
+
+    @staticmethod
+    def get_all_properties(db: Session) -> Tuple[SimpleNamespace, ...]:
+        """Every property, used by GPS location detection"""
+        return query_cache.get_or_load(
+            "property",
+            ALL_TENANTS,
+            lambda: tuple(snapshot(p) for p in db.query(Property).all()),
+        )
+
+    @staticmethod
+    def get_blocks(
+        db: Session, property_id: int, version: Optional[Hashable] = None
+    ) -> Tuple[SimpleNamespace, ...]:
+        """All blocks of one property"""
+        return query_cache.get_or_load(
+            "block",
+            property_id,
+            lambda: tuple(
+                snapshot(b)
+                for b in db.query(Block).filter(Block.property_id == property_id).all()
+            ),
+            *_version(version),
+        )
+
+    @staticmethod
+    def get_rows(
+        db: Session, block_id: int, version: Optional[Hashable] = None
+    ) -> Tuple[SimpleNamespace, ...]:
+        """All rows of one block"""
+        return query_cache.get_or_load(
+            "row",
+            block_id,
+            lambda: tuple(
+                snapshot(r)
+                for r in db.query(Row).filter(Row.block_id == block_id).all()
+            ),
+            *_version(version),
+        )
+
+    @staticmethod
+    def get_vines(db: Session, row_id: int) -> Tuple[SimpleNamespace, ...]:
+        """All vines of one row"""
+        return query_cache.get_or_load(
+            "vine",
+            row_id,
+            lambda: tuple(
+                snapshot(v)
+                for v in db.query(IndividualVine)
+                .filter(IndividualVine.row_id == row_id)
+                .all()
+            ),
+        )
+
+
+# Invalidation
+# ------------
+# Each model maps to the namespace of its parent. Updates also invalidate the
+# previous parent so that moving e.g. a block between properties is visible
+# from both sides. Namespaces are collected per session and invalidated after
+# commit, so a concurrent read cannot cache the pre-commit rows again; each
+# flush also announces its new namespaces to the other workers.
+
+_PARENT_KEYS = {
+    Property: ("property", "org_id"),
+    Block: ("block", "property_id"),
+    Row: ("row", "block_id"),
+    IndividualVine: ("vine", "row_id"),
+}
+
+PENDING = "hierarchy_invalidations"
+_ANNOUNCED = "hierarchy_invalidations_announced"
+
+
+def _invalidate(mapper: Any, connection: Any, target: Any) -> None:
+    entity, parent_attr = _PARENT_KEYS[mapper.class_]
+    keys = {(entity, getattr(target, parent_attr))}
+
+    history = inspect(target).attrs[parent_attr].history
+    for previous in history.deleted or ():
+        if previous is not None:
+            keys.add((entity, previous))
+
+    if entity == "property":
+        keys.add((entity, ALL_TENANTS))
+
+    session = object_session(target)
+    if session is None:
+        cache_bridge.announce(connection, keys)
+        for key in keys:
+            query_cache.invalidate(*key)
+    else:
+        session.info.setdefault(PENDING, set()).update(keys)
+
+
+def invalidate_after_commit(db: Session, keys: Iterable[Tuple[str, Hashable]]) -> None:
+    """Invalidate ``keys`` on every worker once ``db`` commits, for writes
+    that bypass the ORM."""
+    keys = set(keys)
+    db.info.setdefault(PENDING, set()).update(keys)
+    db.info.setdefault(_ANNOUNCED, set()).update(keys)
+    cache_bridge.announce(db.connection(), keys)
+
+
+def _after_flush(session: Session, flush_context: Any) -> None:
+    announced = session.info.setdefault(_ANNOUNCED, set())
+    keys = session.info.get(PENDING, set()) - announced
+    if keys:
+        announced.update(keys)
+        cache_bridge.announce(session.connection(), keys)
+
+
+def _after_commit(session: Session) -> None:
+    session.info.pop(_ANNOUNCED, None)
+    for key in session.info.pop(PENDING, ()):
+        query_cache.invalidate(*key)
+
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_ANNOUNCED, None)
+    session.info.pop(PENDING, None)
+
+
+def register_cache_invalidation() -> None:
+    """Attach the invalidation hooks to the hierarchy models (idempotent)."""
+    for model in _PARENT_KEYS:
+        for event_name in ("after_insert", "after_update", "after_delete"):
+            if not event.contains(model, event_name, _invalidate):
+                event.listen(model, event_name, _invalidate)
+    for event_name, listener in (
+        ("after_flush", _after_flush),
+        ("after_commit", _after_commit),
+        ("after_rollback", _after_rollback),
+    ):
+        if not event.contains(Session, event_name, listener):
+            event.listen(Session, event_name, listener)
+
+
+register_cache_invalidation()
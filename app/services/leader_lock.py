@@ -0,0 +1,128 @@
+"""
+Leadership for periodic jobs that only one worker should run.
+
+On Postgres, leadership is a session-level advisory lock held on a
+connection kept out of the pool. That works across hosts, and the lock goes
+away when the leader's connection or process dies. Elsewhere (SQLite in
+development and tests) it is an ``flock`` on a file, which covers the
+workers of one host.
+
+``acquire`` never blocks. Call it on every tick: it returns whether this
+process leads, re-checks a held lock, and picks up leadership left behind by
+a leader that died.
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import threading
+from typing import Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _advisory_key(name: str) -> int:
+    # pg advisory locks take a signed 64-bit key.
+    return struct.unpack(">q", hashlib.sha1(name.encode()).digest()[:8])[0]
+
+
+def _default_lock_dir() -> str:
+    if settings.LEADER_LOCK_DIR:
+        return settings.LEADER_LOCK_DIR
+    from app.db.base import DEFAULT_DATABASE_URL
+
+    url = os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+    suffix = hashlib.sha1(url.encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"vigneron-locks-{suffix}")
+
+
+class LeaderLock:
+    """Non-blocking, process-level leadership named ``name``."""
+
+    def __init__(self, name: str, lock_dir: Optional[str] = None) -> None:
+        self.name = name
+        self.lock_dir = lock_dir
+        self._connection: Optional[Connection] = None
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._connection is not None or self._fd is not None
+
+    def acquire(self, bind: Engine) -> bool:
+        """Take or confirm leadership; False while another process holds it."""
+        with self._lock:
+            if bind.dialect.name == "postgresql":
+                return self._acquire_advisory(bind)
+            return self._acquire_file()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                try:
+                    self._connection.execute(
+                        select(func.pg_advisory_unlock(_advisory_key(self.name)))
+                    )
+                    self._connection.commit()
+                except Exception:
+                    logger.exception("Could not release leader lock %s", self.name)
+                finally:
+                    self._connection.close()
+                    self._connection = None
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
+
+    def _acquire_advisory(self, bind: Engine) -> bool:
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT 1"))
+                # End the probe's implicit transaction so the held connection
+                # does not sit "idle in transaction" between ticks.
+                self._connection.commit()
+                return True
+            except Exception:
+                # The connection, and the lock with it, is gone.
+                logger.warning("Lost leader lock %s", self.name)
+                self._connection.invalidate()
+                self._connection.close()
+                self._connection = None
+        connection = bind.connect()
+        try:
+            held = connection.execute(
+                select(func.pg_try_advisory_lock(_advisory_key(self.name)))
+            ).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not held:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def _acquire_file(self) -> bool:
+        if self._fd is not None:
+            return True
+        directory = self.lock_dir or _default_lock_dir()
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(
+            os.path.join(directory, f"{self.name}.lock"), os.O_RDWR | os.O_CREAT, 0o644
+        )
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
@@ -0,0 +1,453 @@
+"""
+Live events for supervisors: check-ins, new activities and finished
+inference requests, fanned out to WebSocket and server-sent event clients.
+
+An event names the block, property and org it happened in; a client
+subscribes to any mix of ``org:<id>``, ``property:<id>`` and ``block:<id>``
+topics and receives each matching event once. Events are published into the
+producer's session with ``publish`` and only delivered when it commits, so
+a rolled-back write is never announced.
+
+Delivery is in process. On PostgreSQL every worker also ``LISTEN``s on
+``LIVE_EVENTS_CHANNEL`` and publishing becomes a ``pg_notify`` in the
+writing transaction, so a subscriber connected to one uvicorn worker sees
+events committed by any other - including the worker's own, which arrive
+through the same channel.
+
+Each subscription has a bounded queue of ``LIVE_EVENTS_QUEUE_SIZE`` events.
+A consumer that falls behind loses the oldest ones and is told how many with
+a ``lagged`` event (the cue to refetch), so one slow phone cannot grow the
+worker's memory or hold up anyone else.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.activity import Activity
+from app.models.block import Block
+from app.models.inference_request import InferenceRequest
+from app.models.property import Property
+
+logger = logging.getLogger(__name__)
+
+TOPIC_KINDS = ("org", "property", "block")
+# NOTIFY payloads must stay below 8000 bytes.
+MAX_NOTIFY_BYTES = 7900
+_PENDING = "live_events"
+
+PUBLISHED = registry.counter(
+    "live_events_published_total", "Live events published by type", ("type",)
+)
+DROPPED = registry.counter(
+    "live_events_dropped_total", "Live events dropped from full subscriber queues"
+)
+
+
+def make_event(
+    event_type: str,
+    data: Dict[str, Any],
+    org_id: Optional[int] = None,
+    property_id: Optional[int] = None,
+    block_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    return {
+        "type": event_type,
+        "org_id": org_id,
+        "property_id": property_id,
+        "block_id": block_id,
+        "at": datetime.now(timezone.utc).isoformat(),
+        "data": jsonable_encoder(data),
+    }
+
+
+def event_topics(event: Dict[str, Any]) -> List[str]:
+    return [
+        f"{kind}:{event[f'{kind}_id']}"
+        for kind in TOPIC_KINDS
+        if event.get(f"{kind}_id") is not None
+    ]
+
+
+def block_scopes(
+    connection: Connection, block_ids: Iterable[int]
+) -> Dict[int, Tuple[int, int]]:
+    """``{block_id: (property_id, org_id)}`` in one query."""
+    block_ids = set(block_ids)
+    if not block_ids:
+        return {}
+    rows = connection.execute(
+        select(Block.id, Block.property_id, Property.org_id)
+        .join(Property, Property.id == Block.property_id)
+        .where(Block.id.in_(block_ids))
+    )
+    return {block_id: (property_id, org_id) for block_id, property_id, org_id in rows}
+
+
+def property_org(connection: Connection, property_id: int) -> Optional[int]:
+    return connection.scalar(select(Property.org_id).where(Property.id == property_id))
+
+
+class Subscription:
+    """One client's topics and its bounded queue of undelivered events."""
+
+    def __init__(self, topics: Iterable[str], max_queue: int) -> None:
+        self.topics = frozenset(topics)
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        if len(self._queue) >= self.max_queue:
+            self._queue.popleft()
+            self.dropped += 1
+            DROPPED.inc()
+        self._queue.append(event)
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """The next event, or None after ``timeout`` seconds without one."""
+        if not self._queue:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return {"type": "lagged", "dropped": dropped}
+        return self._queue.popleft()
+
+
+class LiveEventBroker:
+    """In-process topic fan-out, bridged between workers on PostgreSQL."""
+
+    def __init__(
+        self,
+        channel: str = settings.LIVE_EVENTS_CHANNEL,
+        queue_size: int = settings.LIVE_EVENTS_QUEUE_SIZE,
+        max_subscribers: int = settings.LIVE_EVENTS_MAX_SUBSCRIBERS,
+    ) -> None:
+        self.channel = channel
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        # Set while this worker LISTENs; publishing then goes through NOTIFY.
+        self.bridged = False
+        self.delivered = 0
+        self._topics: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._subscribers = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def wanted(self) -> bool:
+        """Whether a published event could reach anyone."""
+        return self.bridged or self._subscribers > 0
+
+    # Subscribers (on the event loop) -------------------------------------------
+
+    def subscribe(self, topics: Sequence[str]) -> Optional[Subscription]:
+        """A new subscription, or None when this worker is at capacity."""
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                return None
+            self._loop = asyncio.get_running_loop()
+            subscription = Subscription(topics, self.queue_size)
+            for topic in subscription.topics:
+                self._topics[topic].add(subscription)
+            self._subscribers += 1
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+            self._subscribers -= 1
+
+    # Publishing (any thread) ---------------------------------------------------
+
+    def publish(
+        self,
+        db: Session,
+        events: Sequence[Dict[str, Any]],
+        connection: Optional[Connection] = None,
+    ) -> None:
+        """Deliver ``events`` when ``db`` commits (the caller commits)."""
+        if not events or not self.wanted:
+            return
+        for item in events:
+            PUBLISHED.inc(type=item["type"])
+        if self.bridged:
+            connection = connection if connection is not None else db.connection()
+            for payload in self._payloads(events):
+                connection.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": self.channel, "payload": payload},
+                )
+        else:
+            db.info.setdefault(_PENDING, {}).setdefault(self, []).extend(events)
+
+    @staticmethod
+    def _payloads(events: Sequence[Dict[str, Any]]) -> Iterable[str]:
+        batch: List[str] = []
+        size = 2
+        for item in events:
+            encoded = json.dumps(item)
+            if len(encoded) > MAX_NOTIFY_BYTES // 2:
+                encoded = json.dumps({**item, "data": {"truncated": True}})
+            if batch and size + len(encoded) + 1 > MAX_NOTIFY_BYTES:
+                yield f"[{','.join(batch)}]"
+                batch, size = [], 2
+            batch.append(encoded)
+            size += len(encoded) + 1
+        if batch:
+            yield f"[{','.join(batch)}]"
+
+    def dispatch(self, events: Sequence[Dict[str, Any]]) -> None:
+        """Hand committed events to the subscribers; safe from any thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed() or not self._subscribers:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(events)
+        else:
+            loop.call_soon_threadsafe(self._deliver, list(events))
+
+    def _deliver(self, events: Sequence[Dict[str, Any]]) -> None:
+        for item in events:
+            targets: Set[Subscription] = set()
+            for topic in event_topics(item):
+                targets.update(self._topics.get(topic, ()))
+            for subscription in targets:
+                subscription.offer(item)
+            self.delivered += len(targets)
+
+    # Cross-worker bridge -------------------------------------------------------
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.bridged = False
+
+    async def _watch(self) -> None:
+        from app.db.base import get_engine
+
+        if get_engine().dialect.name != "postgresql":
+            return
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Live event listener failed; retrying")
+                self.bridged = False
+                await asyncio.sleep(1.0)
+
+    async def _listen(self) -> None:
+        from app.db.base import get_engine
+
+        connection = get_engine().raw_connection()
+        try:
+            raw = connection.driver_connection
+            raw.autocommit = True
+            raw.cursor().execute(f'LISTEN "{self.channel}"')
+            loop = asyncio.get_running_loop()
+            lost = asyncio.Event()
+
+            def on_readable() -> None:
+                try:
+                    raw.poll()
+                except Exception:
+                    lost.set()
+                    return
+                while raw.notifies:
+                    notify = raw.notifies.pop(0)
+                    try:
+                        self._deliver(json.loads(notify.payload))
+                    except ValueError:
+                        logger.warning("Ignoring malformed live event payload")
+
+            loop.add_reader(raw.fileno(), on_readable)
+            self.bridged = True
+            try:
+                await lost.wait()
+                raise ConnectionError("Live event listener connection lost")
+            finally:
+                self.bridged = False
+                loop.remove_reader(raw.fileno())
+        finally:
+            connection.invalidate()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bridged": self.bridged,
+            "subscribers": self._subscribers,
+            "topics": len(self._topics),
+            "delivered": self.delivered,
+        }
+
+
+live_events = LiveEventBroker()
+
+
+def _flush_pending(session: Session) -> None:
+    for broker, events in session.info.pop(_PENDING, {}).items():
+        broker.dispatch(events)
+
+
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+event.listen(Session, "after_commit", _flush_pending)
+event.listen(Session, "after_rollback", _discard_pending)
+
+
+# Producers
+# ---------
+
+
+def activity_data(values: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        field: values.get(field)
+        for field in (
+            "id",
+            "block_id",
+            "user_id",
+            "activity_type",
+            "activity_date",
+            "title",
+            "is_completed",
+        )
+    }
+
+
+def publish_activities(
+    db: Session, activities: Sequence[Dict[str, Any]], connection: Connection
+) -> None:
+    """``activity.created`` for each of ``activities`` (column dicts with id)."""
+    if not activities or not live_events.wanted:
+        return
+    scopes = block_scopes(connection, (a["block_id"] for a in activities))
+    events = []
+    for activity in activities:
+        property_id, org_id = scopes.get(activity["block_id"], (None, None))
+        events.append(
+            make_event(
+                "activity.created",
+                activity_data(activity),
+                org_id=org_id,
+                property_id=property_id,
+                block_id=activity["block_id"],
+            )
+        )
+    live_events.publish(db, events, connection)
+
+
+def _activity_inserted(mapper, connection, target) -> None:
+    db = Session.object_session(target)
+    if db is not None:
+        values = {
+            column.key: getattr(target, column.key) for column in mapper.column_attrs
+        }
+        publish_activities(db, [values], connection)
+
+
+def _inference_updated(mapper, connection, target) -> None:
+    # Inference requests are not tied to the hierarchy; callers that want a
+    # live event put block_id / property_id / org_id in request_metadata.
+    if not live_events.wanted or not target.is_completed:
+        return
+    if not inspect(target).attrs.status.history.has_changes():
+        return
+    metadata = target.request_metadata or {}
+    block_id = metadata.get("block_id")
+    property_id = metadata.get("property_id")
+    org_id = metadata.get("org_id")
+    if block_id is not None and property_id is None:
+        property_id, org_id = block_scopes(connection, [block_id]).get(
+            block_id, (None, org_id)
+        )
+    elif property_id is not None and org_id is None:
+        org_id = property_org(connection, property_id)
+    if org_id is None and property_id is None and block_id is None:
+        return
+    db = Session.object_session(target)
+    if db is None:
+        return
+    live_events.publish(
+        db,
+        [
+            make_event(
+                "inference.completed",
+                {
+                    "request_id": target.id,
+                    "model_id": target.model_id,
+                    "status": target.status,
+                    "confidence": target.confidence,
+                    "completed_at": target.completed_at,
+                },
+                org_id=org_id,
+                property_id=property_id,
+                block_id=block_id,
+            )
+        ],
+        connection,
+    )
+
+
+event.listen(Activity, "after_insert", _activity_inserted)
+event.listen(InferenceRequest, "after_update", _inference_updated)
+
+
+def _live_event_metrics():
+    stats = live_events.stats()
+    yield (
+        "live_events_subscribers",
+        "gauge",
+        "Live event connections held by this worker",
+        [("live_events_subscribers", {}, stats["subscribers"])],
+    )
+    yield (
+        "live_events_delivered_total",
+        "counter",
+        "Live events queued to subscribers",
+        [("live_events_delivered_total", {}, stats["delivered"])],
+    )
+
+
+registry.register_collector(_live_event_metrics)
@@ -0,0 +1,384 @@
+"""
+Per-worker runtime cache of loaded AI models.
+
+``AIModel`` rows only describe a model; serving one means fetching and
+loading ``model_url``. This module keeps loaded models in an LRU bounded by
+``MODEL_CACHE_BUDGET_MB`` and preloads every ``status='deployed'`` model at
+startup (most used first) so the first inference does not pay the load.
+
+Weights are shared between uvicorn workers through the page cache: the
+default loader materialises ``model_url`` once into ``MODEL_CACHE_DIR``
+(named by model id and a digest of URL and version, so a version bump that
+keeps the URL downloads again; superseded files of the model are removed)
+and maps it read-only, so N workers serving the same model hold one
+physical copy. Local ``model_url`` paths are only accepted
+inside ``MODEL_CACHE_DIR`` or the upload store. Frameworks that need their
+own object graph register a loader per ``model_type`` with
+``register_loader``; it receives the mapped bytes and should build views on
+them rather than copies.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional
+from urllib.parse import urlsplit
+from urllib.request import url2pathname
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.ai_model import AIModel
+from app.services.uploads import sha256_from_file_url, upload_store
+
+logger = logging.getLogger(__name__)
+
+LOAD_SECONDS = registry.histogram(
+    "model_load_seconds", "Time to fetch and load a model", ("model_type",)
+)
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+@dataclass
+class LoadedModel:
+    model_id: str
+    name: str
+    version: str
+    model_type: str
+    config: Dict[str, Any]
+    weights: Optional[memoryview]
+    runtime: Any = None  # whatever a registered loader built
+    size_bytes: int = 0
+    load_seconds: float = 0.0
+    loaded_at: float = field(default_factory=time.time)
+    _mapping: Optional[mmap.mmap] = None
+
+    def close(self) -> None:
+        if self.weights is not None:
+            self.weights.release()
+            self.weights = None
+        if self._mapping is not None:
+            try:
+                self._mapping.close()
+            except BufferError:
+                # A loader still holds a view; the mapping is freed with it.
+                pass
+            self._mapping = None
+
+
+ModelLoader = Callable[[Mapping[str, Any], Optional[memoryview]], Any]
+_loaders: Dict[str, ModelLoader] = {}
+
+
+def register_loader(model_type: str, loader: ModelLoader) -> None:
+    """Build a runtime object for ``model_type`` from (model row, weights)."""
+    _loaders[model_type] = loader
+
+
+class ModelRuntimeCache:
+    """LRU of ``LoadedModel`` kept under ``budget_bytes``."""
+
+    def __init__(
+        self,
+        budget_bytes: int = settings.MODEL_CACHE_BUDGET_MB * 1024**2,
+        cache_dir: str = settings.MODEL_CACHE_DIR,
+        session_factory: Optional[Callable[[], Session]] = None,
+    ) -> None:
+        self.budget_bytes = budget_bytes
+        self.cache_dir = cache_dir
+        self.session_factory = session_factory
+        self._models: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_failures = 0
+
+    # Lookup -----------------------------------------------------------------
+
+    def get(self, model: Mapping[str, Any]) -> LoadedModel:
+        """Loaded runtime for an ``AIModel`` row (mapping or ORM object)."""
+        model = _as_mapping(model)
+        key = str(model["id"])
+        with self._lock:
+            loaded = self._models.get(key)
+            if loaded is not None and loaded.version == model["version"]:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return loaded
+            self.misses += 1
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        # One load per model at a time; concurrent callers wait for it.
+        with key_lock:
+            with self._lock:
+                loaded = self._models.get(key)
+                if loaded is not None and loaded.version == model["version"]:
+                    self._models.move_to_end(key)
+                    return loaded
+            loaded = self._load(model)
+            with self._lock:
+                previous = self._models.pop(key, None)
+                self._models[key] = loaded
+                self._evict_to_budget(keep=key)
+            if previous is not None:
+                previous.close()
+            return loaded
+
+    def evict(self, model_id: Any) -> bool:
+        with self._lock:
+            loaded = self._models.pop(str(model_id), None)
+        if loaded is None:
+            return False
+        loaded.close()
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            models, self._models = list(self._models.values()), OrderedDict()
+        for loaded in models:
+            loaded.close()
+
+    def _evict_to_budget(self, keep: str) -> None:
+        # Called with the lock held; the newest model stays even if it alone
+        # exceeds the budget.
+        while self.used_bytes > self.budget_bytes and len(self._models) > 1:
+            key, victim = next(iter(self._models.items()))
+            if key == keep:
+                self._models.move_to_end(key)
+                continue
+            del self._models[key]
+            victim.close()
+            self.evictions += 1
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(m.size_bytes for m in self._models.values())
+
+    # Loading ----------------------------------------------------------------
+
+    def _load(self, model: Mapping[str, Any]) -> LoadedModel:
+        started = time.perf_counter()
+        try:
+            mapping = weights = None
+            path = self._materialise(model) if model["model_url"] else None
+            if path is not None and os.path.getsize(path) > 0:
+                with open(path, "rb") as f:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                weights = memoryview(mapping)
+            size = len(weights) if weights is not None else 0
+            loader = _loaders.get(model["model_type"])
+            runtime = loader(model, weights) if loader is not None else None
+            if runtime is not None and hasattr(runtime, "nbytes"):
+                size = max(size, int(runtime.nbytes))
+        except Exception:
+            self.load_failures += 1
+            raise
+        elapsed = time.perf_counter() - started
+        LOAD_SECONDS.observe(elapsed, model_type=model["model_type"])
+        return LoadedModel(
+            model_id=str(model["id"]),
+            name=model["name"],
+            version=model["version"],
+            model_type=model["model_type"],
+            config=dict(model.get("config") or {}),
+            weights=weights,
+            runtime=runtime,
+            size_bytes=size,
+            load_seconds=elapsed,
+            _mapping=mapping,
+        )
+
+    def _materialise(self, model: Mapping[str, Any]) -> str:
+        """Local path holding the artifact, downloading it once if remote."""
+        model_url = model["model_url"]
+        sha256 = sha256_from_file_url(model_url)
+        if sha256 is not None and upload_store.get(sha256) is not None:
+            return upload_store.path(sha256)
+        parts = urlsplit(model_url)
+        if parts.scheme in ("", "file"):
+            return self._local_path(
+                url2pathname(parts.path) if parts.scheme else model_url
+            )
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported model_url scheme: {parts.scheme}")
+
+        import httpx  # only needed for remote artifacts
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        prefix = "model-" + _digest(str(model["id"]))[:16] + "-"
+        target = os.path.join(
+            self.cache_dir, prefix + _digest(f"{model_url}\n{model['version']}")
+        )
+        if os.path.exists(target):
+            return target
+        # Another worker may be downloading the same file; the atomic rename
+        # makes whichever finishes first win and the other copy is dropped.
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=".model-")
+        try:
+            with os.fdopen(fd, "wb") as f, httpx.stream(
+                "GET", model_url, timeout=60, follow_redirects=True
+            ) as response:
+                response.raise_for_status()
+                for chunk in response.iter_bytes(1024**2):
+                    f.write(chunk)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        self._prune(prefix, target)
+        return target
+
+    def _prune(self, prefix: str, keep: str) -> None:
+        """Remove the model's other downloads; mappings of them stay valid
+        until the workers still serving that version let go."""
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(prefix) and path != keep:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def _local_path(self, path: str) -> str:
+        """``path`` if it lies in the model cache or the upload store.
+
+        ``model_url`` is set through the models API, so anything else (say
+        ``/etc/shadow``) must not be mapped into the workers.
+        """
+        resolved = os.path.realpath(path)
+        for root in (self.cache_dir, upload_store.directory):
+            root = os.path.realpath(root)
+            if os.path.commonpath([root, resolved]) == root:
+                return resolved
+        raise ValueError(
+            f"Local model_url must be inside {self.cache_dir} or the upload store"
+        )
+
+    # Startup ----------------------------------------------------------------
+
+    def preload(self, db: Optional[Session] = None) -> List[str]:
+        """Load deployed models, most requested first, while they fit."""
+        own_session = db is None
+        if own_session:
+            if self.session_factory is not None:
+                db = self.session_factory()
+            else:
+                from app.db.base import SessionLocal
+
+                db = SessionLocal()
+        try:
+            table = AIModel.__table__
+            rows = (
+                db.execute(
+                    select(table)
+                    .where(table.c.status == "deployed")
+                    .order_by(table.c.total_requests.desc())
+                )
+                .mappings()
+                .all()
+            )
+        finally:
+            if own_session:
+                db.close()
+        return self.warm(rows)
+
+    def warm(self, models: List[Mapping[str, Any]]) -> List[str]:
+        """Load ``models`` in priority order until the next one no longer fits;
+        a model that fails to load is logged and skipped. Unlike ``get`` this
+        never evicts, so a low-ranked model cannot push out a higher one."""
+        loaded = []
+        for model in models:
+            model = _as_mapping(model)
+            key = str(model["id"])
+            try:
+                runtime = self._load(model)
+            except Exception:
+                logger.exception("Could not preload model %s", key)
+                continue
+            with self._lock:
+                previous = self._models.get(key)
+                used = self.used_bytes - (previous.size_bytes if previous else 0)
+                # An oversized first model is still kept, as in ``get``.
+                fits = used + runtime.size_bytes <= self.budget_bytes or not used
+                if fits:
+                    self._models.pop(key, None)
+                    self._models[key] = runtime
+            if not fits:
+                runtime.close()
+                break
+            if previous is not None:
+                previous.close()
+            loaded.append(key)
+        return loaded
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = [
+                {
+                    "model_id": m.model_id,
+                    "name": m.name,
+                    "version": m.version,
+                    "model_type": m.model_type,
+                    "size_bytes": m.size_bytes,
+                    "load_seconds": round(m.load_seconds, 4),
+                    "memory_mapped": m._mapping is not None,
+                }
+                for m in reversed(self._models.values())
+            ]
+            used = self.used_bytes
+        total = self.hits + self.misses
+        return {
+            "budget_bytes": self.budget_bytes,
+            "used_bytes": used,
+            "entries": len(models),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "load_failures": self.load_failures,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "models": models,
+        }
+
+
+def _as_mapping(model: Any) -> Mapping[str, Any]:
+    if isinstance(model, Mapping):
+        return model
+    return {
+        column.key: getattr(model, column.key) for column in AIModel.__table__.columns
+    }
+
+
+model_runtime = ModelRuntimeCache()
+
+
+def _model_cache_metrics():
+    stats = model_runtime.stats()
+    for field_name, kind in (
+        ("hits", "counter"),
+        ("misses", "counter"),
+        ("evictions", "counter"),
+        ("load_failures", "counter"),
+        ("entries", "gauge"),
+        ("used_bytes", "gauge"),
+        ("budget_bytes", "gauge"),
+    ):
+        name = f"model_cache_{field_name}" + ("_total" if kind == "counter" else "")
+        yield name, kind, f"Model runtime cache {field_name}", [
+            (name, {}, stats[field_name])
+        ]
+
+
+registry.register_collector(_model_cache_metrics)
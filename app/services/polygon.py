@@ -0,0 +1,125 @@
+"""
+Polygon boundaries for blocks and properties.
+
+Boundaries are stored as Google encoded polylines at precision 6 (~0.1 m) in
+``boundary_polyline`` - a few bytes per vertex instead of a JSON list of
+floats. Decoding happens once per distinct boundary (``parse_boundary`` is
+memoised) into a ``Polygon`` whose edges live in flat arrays.
+
+Containment is a bounding-box rejection followed by even-odd ray casting.
+Edges are pre-sorted into horizontal bands, so a lookup only crosses the
+edges overlapping the query latitude; for a polygon with hundreds of
+vertices that is typically a handful of edges, not all of them.
+"""
+from array import array
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+from app.services.geometry import Point, decode_polyline, encode_polyline
+
+BOUNDARY_PRECISION = 6
+MAX_VERTICES = 5000
+EDGES_PER_BAND = 4  # target average; bands = edges / EDGES_PER_BAND
+
+
+class Polygon:
+    """Simple (possibly concave) polygon with banded edge arrays."""
+
+    __slots__ = (
+        "min_lat",
+        "min_lng",
+        "max_lat",
+        "max_lng",
+        "centroid",
+        "vertex_count",
+        "_lat1",
+        "_lng1",
+        "_lat2",
+        "_slope",
+        "_band_height",
+        "_bands",
+    )
+
+    def __init__(self, vertices: Sequence[Point]) -> None:
+        if vertices and vertices[0] == vertices[-1]:
+            vertices = vertices[:-1]
+        if len(vertices) < 3:
+            raise ValueError("A polygon needs at least 3 vertices")
+        lats = [lat for lat, _ in vertices]
+        lngs = [lng for _, lng in vertices]
+        self.min_lat, self.max_lat = min(lats), max(lats)
+        self.min_lng, self.max_lng = min(lngs), max(lngs)
+        self.vertex_count = len(vertices)
+        self.centroid = (sum(lats) / len(lats), sum(lngs) / len(lngs))
+
+        # Edge i runs from vertex i to vertex i+1; horizontal edges never
+        # cross a horizontal ray and are dropped.
+        self._lat1, self._lng1, self._lat2 = array("d"), array("d"), array("d")
+        self._slope = array("d")  # d(lng)/d(lat)
+        n = len(vertices)
+        for i in range(n):
+            (a_lat, a_lng), (b_lat, b_lng) = vertices[i], vertices[(i + 1) % n]
+            if a_lat == b_lat:
+                continue
+            self._lat1.append(a_lat)
+            self._lng1.append(a_lng)
+            self._lat2.append(b_lat)
+            self._slope.append((b_lng - a_lng) / (b_lat - a_lat))
+
+        band_count = max(1, len(self._lat1) // EDGES_PER_BAND)
+        self._band_height = (self.max_lat - self.min_lat) / band_count or 1.0
+        self._bands: List[array] = [array("i") for _ in range(band_count)]
+        for edge in range(len(self._lat1)):
+            lo = min(self._lat1[edge], self._lat2[edge])
+            hi = max(self._lat1[edge], self._lat2[edge])
+            for band in range(self._band(lo), self._band(hi) + 1):
+                self._bands[band].append(edge)
+
+    def _band(self, lat: float) -> int:
+        index = int((lat - self.min_lat) / self._band_height)
+        return min(max(index, 0), len(self._bands) - 1)
+
+    def bbox_contains(self, lat: float, lng: float) -> bool:
+        return (
+            self.min_lat <= lat <= self.max_lat and self.min_lng <= lng <= self.max_lng
+        )
+
+    def contains(self, lat: float, lng: float) -> bool:
+        """Even-odd rule; points exactly on an edge may go either way."""
+        if not self.bbox_contains(lat, lng):
+            return False
+        inside = False
+        lat1, lng1, lat2, slope = self._lat1, self._lng1, self._lat2, self._slope
+        for edge in self._bands[self._band(lat)]:
+            a, b = lat1[edge], lat2[edge]
+            if (a > lat) != (b > lat) and lng < lng1[edge] + (lat - a) * slope[edge]:
+                inside = not inside
+        return inside
+
+
+def encode_boundary(vertices: Sequence[Sequence[float]]) -> str:
+    """Validate ``[[lat, lng], ...]`` and encode it for ``boundary_polyline``."""
+    points: List[Tuple[float, float]] = []
+    for vertex in vertices:
+        if len(vertex) != 2:
+            raise ValueError("Boundary vertices must be [lat, lng] pairs")
+        lat, lng = float(vertex[0]), float(vertex[1])
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError(f"Boundary vertex out of range: {lat}, {lng}")
+        points.append((lat, lng))
+    if points and points[0] == points[-1]:
+        points.pop()
+    if not 3 <= len(points) <= MAX_VERTICES:
+        raise ValueError(f"A boundary needs between 3 and {MAX_VERTICES} vertices")
+    return encode_polyline(points, BOUNDARY_PRECISION)
+
+
+@lru_cache(maxsize=4096)
+def parse_boundary(encoded: Optional[str]) -> Optional[Polygon]:
+    """Decode a stored boundary once; ``None`` for missing or invalid data."""
+    if not encoded:
+        return None
+    try:
+        return Polygon(decode_polyline(encoded, BOUNDARY_PRECISION))
+    except (ValueError, IndexError):
+        return None
@@ -0,0 +1,469 @@
+"""
+In-memory reference data: the spray product catalog and crop templates.
+
+Both change rarely and are read on hot paths (product search, compliance
+checks, block context), so they are loaded once into an immutable
+``ReferenceData`` snapshot with prebuilt indexes - by id, FRAC code, active
+ingredient, product type and crop type - and requests read the snapshot
+without touching the database.
+
+A snapshot is replaced, never mutated. Writes to ``SprayProduct`` mark it
+stale in this process and, on PostgreSQL, send ``NOTIFY`` on
+``REFERENCE_DATA_CHANNEL`` inside the writing transaction; every worker
+``LISTEN``s and reloads on the signal. Other databases fall back to polling
+a cheap version signature (row count and latest ``updated_at``) every
+``REFERENCE_DATA_POLL_SECONDS``.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.spray_product import SprayProduct
+
+logger = logging.getLogger(__name__)
+
+UNIVERSAL_OPERATIONS = ("irrigation", "observation", "maintenance")
+
+# crop_type -> operations, quality metrics and activity templates
+CROP_TEMPLATES: Dict[str, Dict[str, Any]] = {
+    "coffee": {
+        "operations": ["cherry_picking", "moisture_testing", "cupping"],
+        "quality_metrics": [
+            {"name": "cherry_moisture", "unit": "%", "target_range": "18-22"},
+            {"name": "cup_score", "unit": "points", "target_range": "80-100"},
+        ],
+        "activity_templates": [
+            {"name": "Cherry Moisture Check", "frequency": "daily"},
+            {"name": "Cupping Session", "frequency": "weekly"},
+        ],
+    },
+    "apple": {
+        "operations": ["maturity_testing", "harvest", "ca_storage_prep"],
+        "quality_metrics": [
+            {"name": "firmness", "unit": "lbs", "target_range": "16-18"},
+            {"name": "starch_index", "unit": "scale", "target_range": "1-8"},
+        ],
+        "activity_templates": [
+            {"name": "Maturity Test", "frequency": "weekly"},
+            {"name": "Harvest Planning", "frequency": "seasonal"},
+        ],
+    },
+    "grape": {
+        "operations": ["harvest", "crush", "fermentation_monitoring"],
+        "quality_metrics": [
+            {"name": "brix", "unit": "°Bx", "target_range": "20-26"},
+            {"name": "ph", "unit": "pH", "target_range": "3.0-3.6"},
+        ],
+        "activity_templates": [
+            {"name": "Brix Testing", "frequency": "weekly"},
+            {"name": "Harvest Assessment", "frequency": "daily_during_harvest"},
+        ],
+    },
+}
+
+
+@dataclass(frozen=True)
+class QualityMetric:
+    name: str
+    unit: str
+    target_range: str
+
+
+@dataclass(frozen=True)
+class ActivityTemplate:
+    name: str
+    frequency: str
+
+
+@dataclass(frozen=True)
+class CropTemplate:
+    crop_type: str
+    operations: Tuple[str, ...]
+    quality_metrics: Tuple[QualityMetric, ...]
+    activity_templates: Tuple[ActivityTemplate, ...]
+
+
+@dataclass(frozen=True)
+class SprayProductRecord:
+    id: int
+    product_name: str
+    manufacturer: str
+    epa_registration_number: Optional[str]
+    active_ingredients: Any
+    ingredient_names: Tuple[str, ...]
+    product_type: str
+    frac_code: Optional[str]
+    irac_code: Optional[str]
+    hrac_code: Optional[str]
+    resistance_risk: Optional[str]
+    restricted_use_pesticide: bool
+    organic_approved: bool
+    signal_word: Optional[str]
+    min_rate_per_acre: Optional[float]
+    max_rate_per_acre: Optional[float]
+    rate_units: Optional[str]
+    default_rei_hours: Optional[int]
+    default_phi_days: Optional[int]
+    cost_per_unit: Optional[float]
+    is_active: bool
+
+    def to_search_result(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.product_name,
+            "manufacturer": self.manufacturer,
+            "active_ingredients": self.active_ingredients,
+            "frac_code": self.frac_code,
+            "restrictions": {
+                "phi_days": self.default_phi_days,
+                "rei_hours": self.default_rei_hours,
+            },
+            "cost_per_unit": self.cost_per_unit,
+        }
+
+
+def _float(value: Optional[Decimal]) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _ingredient_names(active_ingredients: Any) -> Tuple[str, ...]:
+    """Lower-cased names from ``{"name": pct}`` or ``[{"name": ..}, "name"]``."""
+    if isinstance(active_ingredients, Mapping):
+        names: Iterable[Any] = active_ingredients.keys()
+    elif isinstance(active_ingredients, (list, tuple)):
+        names = (
+            item.get("name") if isinstance(item, Mapping) else item
+            for item in active_ingredients
+        )
+    else:
+        names = ()
+    return tuple(sorted({str(n).strip().lower() for n in names if n}))
+
+
+def _crop_templates() -> Mapping[str, CropTemplate]:
+    templates = {}
+    for crop_type, raw in CROP_TEMPLATES.items():
+        templates[crop_type] = CropTemplate(
+            crop_type=crop_type,
+            operations=UNIVERSAL_OPERATIONS + tuple(raw["operations"]),
+            quality_metrics=tuple(QualityMetric(**m) for m in raw["quality_metrics"]),
+            activity_templates=tuple(
+                ActivityTemplate(**t) for t in raw["activity_templates"]
+            ),
+        )
+    return MappingProxyType(templates)
+
+
+def _freeze_index(index: Dict[str, List[SprayProductRecord]]):
+    return MappingProxyType({key: tuple(value) for key, value in index.items()})
+
+
+class ReferenceData:
+    """Immutable snapshot of the spray catalog and crop templates."""
+
+    def __init__(
+        self,
+        products: Iterable[SprayProductRecord],
+        version: Any = None,
+        crop_templates: Optional[Mapping[str, CropTemplate]] = None,
+    ) -> None:
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.products = tuple(sorted(products, key=lambda p: p.product_name.lower()))
+        self.crop_templates = crop_templates or _crop_templates()
+
+        by_frac: Dict[str, List[SprayProductRecord]] = {}
+        by_ingredient: Dict[str, List[SprayProductRecord]] = {}
+        by_type: Dict[str, List[SprayProductRecord]] = {}
+        for product in self.products:
+            if product.frac_code:
+                by_frac.setdefault(product.frac_code.upper(), []).append(product)
+            for name in product.ingredient_names:
+                by_ingredient.setdefault(name, []).append(product)
+            by_type.setdefault(product.product_type.lower(), []).append(product)
+        self.by_id = MappingProxyType({p.id: p for p in self.products})
+        self.by_frac = _freeze_index(by_frac)
+        self.by_ingredient = _freeze_index(by_ingredient)
+        self.by_type = _freeze_index(by_type)
+        # Lower-cased names aligned with ``products`` for substring search
+        self._search_names = tuple(p.product_name.lower() for p in self.products)
+
+    def search(
+        self,
+        q: str = "",
+        limit: int = 20,
+        frac_code: Optional[str] = None,
+        ingredient: Optional[str] = None,
+        product_type: Optional[str] = None,
+        include_inactive: bool = False,
+    ) -> List[SprayProductRecord]:
+        """Active products whose name contains ``q`` (case-insensitive)."""
+        candidates: Iterable[int] = range(len(self.products))
+        if frac_code or ingredient or product_type:
+            allowed = None
+            for index, key in (
+                (self.by_frac, frac_code and frac_code.upper()),
+                (self.by_ingredient, ingredient and ingredient.strip().lower()),
+                (self.by_type, product_type and product_type.lower()),
+            ):
+                if key:
+                    ids = {p.id for p in index.get(key, ())}
+                    allowed = ids if allowed is None else allowed & ids
+            candidates = (
+                i for i, p in enumerate(self.products) if p.id in (allowed or ())
+            )
+        needle = (q or "").lower()
+        results = []
+        for i in candidates:
+            product = self.products[i]
+            if not include_inactive and not product.is_active:
+                continue
+            if needle and needle not in self._search_names[i]:
+                continue
+            results.append(product)
+            if len(results) >= limit:
+                break
+        return results
+
+    def crop_template(self, crop_type: Optional[str]) -> CropTemplate:
+        template = self.crop_templates.get(crop_type or "")
+        if template is None:
+            return CropTemplate(crop_type or "", UNIVERSAL_OPERATIONS, (), ())
+        return template
+
+
+def load_reference_data(db: Session) -> ReferenceData:
+    table = SprayProduct.__table__
+    rows = db.execute(select(table)).mappings().all()
+    products = [
+        SprayProductRecord(
+            id=row["id"],
+            product_name=row["product_name"],
+            manufacturer=row["manufacturer"],
+            epa_registration_number=row["epa_registration_number"],
+            active_ingredients=row["active_ingredients"],
+            ingredient_names=_ingredient_names(row["active_ingredients"]),
+            product_type=row["product_type"],
+            frac_code=row["frac_code"],
+            irac_code=row["irac_code"],
+            hrac_code=row["hrac_code"],
+            resistance_risk=row["resistance_risk"],
+            restricted_use_pesticide=bool(row["restricted_use_pesticide"]),
+            organic_approved=bool(row["organic_approved"]),
+            signal_word=row["signal_word"],
+            min_rate_per_acre=_float(row["min_rate_per_acre"]),
+            max_rate_per_acre=_float(row["max_rate_per_acre"]),
+            rate_units=row["rate_units"],
+            default_rei_hours=row["default_rei_hours"],
+            default_phi_days=row["default_phi_days"],
+            cost_per_unit=_float(row["cost_per_unit"]),
+            is_active=row["is_active"] is not False,
+        )
+        for row in rows
+    ]
+    return ReferenceData(products, version=catalog_version(db))
+
+
+def catalog_version(db: Session) -> Tuple[int, Optional[str]]:
+    """Cheap signature that changes whenever the catalog does."""
+    count, latest = db.execute(
+        select(func.count(SprayProduct.id), func.max(SprayProduct.updated_at))
+    ).one()
+    return int(count), str(latest) if latest is not None else None
+
+
+_holders: "weakref.WeakSet[ReferenceDataHolder]" = weakref.WeakSet()
+
+
+class ReferenceDataHolder:
+    """Process-wide snapshot, swapped atomically on refresh."""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        poll_interval: float = settings.REFERENCE_DATA_POLL_SECONDS,
+        channel: str = settings.REFERENCE_DATA_CHANNEL,
+    ) -> None:
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.channel = channel
+        self._data: Optional[ReferenceData] = None
+        self._stale = True
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        _holders.add(self)
+
+    def _session(self) -> Session:
+        if self.session_factory is None:
+            from app.db.base import SessionLocal
+
+            return SessionLocal()
+        return self.session_factory()
+
+    def invalidate(self) -> None:
+        self._stale = True
+
+    def get(self, db: Optional[Session] = None) -> ReferenceData:
+        """Current snapshot; reloads only after a change was signalled."""
+        data = self._data
+        if data is not None and not self._stale:
+            return data
+        with self._lock:
+            if self._data is data:
+                # Cleared first so a change signalled during the load is kept.
+                self._stale = False
+                try:
+                    self._data = self._load(db)
+                except Exception:
+                    self._stale = True
+                    raise
+                self.refreshes += 1
+            return self._data
+
+    def refresh(self, db: Optional[Session] = None) -> ReferenceData:
+        self.invalidate()
+        return self.get(db)
+
+    def _load(self, db: Optional[Session]) -> ReferenceData:
+        if db is not None:
+            return load_reference_data(db)
+        with self._session() as session:
+            return load_reference_data(session)
+
+    # Cross-process change signals --------------------------------------------
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                with self._session() as db:
+                    dialect = db.get_bind().dialect.name
+                if dialect == "postgresql":
+                    await self._listen()
+                else:
+                    await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reference data watcher failed; retrying")
+                self.invalidate()
+                await asyncio.sleep(self.poll_interval)
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            data = self._data
+            if data is None:
+                continue
+            version = await run_in_threadpool(self._current_version)
+            if version != data.version:
+                self.invalidate()
+
+    def _current_version(self) -> Tuple[int, Optional[str]]:
+        with self._session() as db:
+            return catalog_version(db)
+
+    async def _listen(self) -> None:
+        from app.db.base import get_engine
+
+        connection = get_engine().raw_connection()
+        try:
+            raw = connection.driver_connection
+            raw.autocommit = True
+            raw.cursor().execute(f'LISTEN "{self.channel}"')
+            # Anything committed before LISTEN took effect would be missed.
+            self.invalidate()
+            loop = asyncio.get_running_loop()
+            lost = asyncio.Event()
+
+            def on_readable() -> None:
+                try:
+                    raw.poll()
+                except Exception:
+                    lost.set()
+                    return
+                if raw.notifies:
+                    raw.notifies.clear()
+                    self.invalidate()
+
+            loop.add_reader(raw.fileno(), on_readable)
+            try:
+                await lost.wait()
+                raise ConnectionError("Reference data listener connection lost")
+            finally:
+                loop.remove_reader(raw.fileno())
+        finally:
+            connection.invalidate()
+
+    def stats(self) -> Dict[str, Any]:
+        data = self._data
+        return {
+            "loaded": data is not None,
+            "stale": self._stale,
+            "version": list(data.version) if data and data.version else None,
+            "products": len(data.products) if data else 0,
+            "crop_templates": len(data.crop_templates) if data else 0,
+            "refreshes": self.refreshes,
+        }
+
+
+reference_data = ReferenceDataHolder()
+
+
+def _catalog_changed(mapper, connection, target) -> None:
+    for holder in list(_holders):
+        holder.invalidate()
+    if connection.dialect.name == "postgresql":
+        # Delivered to every listener when (and only if) the write commits.
+        connection.execute(
+            text("SELECT pg_notify(:channel, 'spray_products')"),
+            {"channel": settings.REFERENCE_DATA_CHANNEL},
+        )
+
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(SprayProduct, _event_name, _catalog_changed)
+
+
+def _reference_data_metrics():
+    stats = reference_data.stats()
+    yield (
+        "reference_data_refreshes_total",
+        "counter",
+        "Reference data snapshot reloads",
+        [("reference_data_refreshes_total", {}, stats["refreshes"])],
+    )
+    yield (
+        "reference_data_products",
+        "gauge",
+        "Spray products in the reference data snapshot",
+        [("reference_data_products", {}, stats["products"])],
+    )
+
+
+registry.register_collector(_reference_data_metrics)
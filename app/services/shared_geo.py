@@ -0,0 +1,861 @@
+"""
+Location lookup data shared by every uvicorn worker of a host.
+
+``make server-prod`` runs four workers; an in-process index of properties,
+blocks, rows and vines would be built and held four times. Instead one worker packs
+the geometry into flat columns (``float64`` coordinates, ``int64`` ids, a
+UTF-8 blob for names and encoded boundaries, and a CSR grid per entity) in a
+file under ``SHARED_GEO_DIR`` - ``/dev/shm`` by default, so it is RAM - and
+every worker maps it read-only. Pages are shared, so the footprint is one
+copy per host, and attaching costs an ``mmap`` rather than a rebuild.
+
+Swaps are atomic through a small control file holding a generation counter:
+the builder writes ``geo-<n+1>.bin`` completely, renames it into place, then
+bumps the generation. Readers compare the generation on each lookup and
+re-attach when it moved; a mapping of an unlinked old file stays valid, so
+in-flight lookups are never torn. ``multiprocessing.shared_memory`` is not
+used because its resource tracker unlinks segments when the creating
+process exits, which would pull the data from under the other workers
+whenever the builder is recycled.
+
+Hierarchy writes bump a ``requested`` counter in the control file after
+commit. Whichever worker's poller takes the (non-blocking) build lock first
+rebuilds; the others just attach the result.
+"""
+import asyncio
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.block import Block
+from app.models.individual_vine import IndividualVine
+from app.models.property import Property
+from app.models.row import Row
+from app.services.geo_index import (
+    CELL_SIZE_DEG,
+    DEFAULT_BLOCK_RADIUS_M,
+    METERS_PER_DEG,
+    distance_m,
+    point_segment_distance_m,
+)
+from app.services.polygon import Polygon, parse_boundary
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"VGEO0001"
+PROPERTY_FALLBACK_M = 1000.0  # nearest property centre without a boundary
+BLOCK_FALLBACK_M = 500.0  # nearest block centre without a boundary
+ROW_MATCH_M = 10.0
+VINE_MATCH_M = 3.0
+
+# Control file: magic, generation, requested, built_requested, built_at
+_CONTROL = struct.Struct("<8sqqqd")
+# Data file header: magic, generation, built_at, section count
+_HEADER = struct.Struct("<8sqdq")
+# Section table entry: name, typecode, offset, item count
+_SECTION = struct.Struct("<24s8sqq")
+
+DistanceFn = Callable[[float, float, float, float], float]
+
+
+def _cell_key(lat_cell: int, lng_cell: int) -> int:
+    return ((lat_cell + (1 << 20)) << 21) | (lng_cell + (1 << 20))
+
+
+def _cell(lat: float, lng: float) -> Tuple[int, int]:
+    return int(math.floor(lat / CELL_SIZE_DEG)), int(math.floor(lng / CELL_SIZE_DEG))
+
+
+def _bbox_around(lat: float, lng: float, radius_m: float) -> Tuple[float, ...]:
+    dlat = radius_m / METERS_PER_DEG
+    dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+def _grid(bboxes: Sequence[Tuple[float, float, float, float]]) -> Tuple[array, ...]:
+    """CSR grid: sorted cell keys, start offsets, item positions (ascending)."""
+    cells: Dict[int, List[int]] = {}
+    for position, (min_lat, min_lng, max_lat, max_lng) in enumerate(bboxes):
+        lat0, lng0 = _cell(min_lat, min_lng)
+        lat1, lng1 = _cell(max_lat, max_lng)
+        for i in range(lat0, lat1 + 1):
+            for j in range(lng0, lng1 + 1):
+                cells.setdefault(_cell_key(i, j), []).append(position)
+    keys, starts, items = array("q"), array("q", [0]), array("q")
+    for key in sorted(cells):
+        keys.append(key)
+        items.extend(cells[key])
+        starts.append(len(items))
+    return keys, starts, items
+
+
+class _Strings:
+    """Appends UTF-8 strings to one blob and records ``n + 1`` offsets."""
+
+    def __init__(self, blob: bytearray) -> None:
+        self.blob = blob
+        self.offsets = array("q", [len(blob)])
+
+    def add(self, value: Optional[str]) -> None:
+        self.blob += (value or "").encode()
+        self.offsets.append(len(self.blob))
+
+    @classmethod
+    def of(cls, blob: bytearray, values: Iterable[Optional[str]]) -> array:
+        strings = cls(blob)
+        for value in values:
+            strings.add(value)
+        return strings.offsets
+
+
+def _float(value) -> float:
+    # Missing and zero coordinates/radii are treated alike, as the endpoints did.
+    return float(value) if value else math.nan
+
+
+def _columns(spec: str) -> Dict[str, array]:
+    """``"q:id,parent d:lat,lng"`` -> empty typed columns."""
+    columns = {}
+    for group in spec.split():
+        typecode, names = group.split(":")
+        for name in names.split(","):
+            columns[name] = array(typecode)
+    return columns
+
+
+def _append(columns: Dict[str, array], values: Sequence) -> None:
+    for column, value in zip(columns.values(), values):
+        column.append(value)
+
+
+def _add_grid(sections: Dict[str, array], kind: str, bboxes) -> None:
+    keys, starts, items = _grid(bboxes)
+    sections[f"{kind}_cell_keys"] = keys
+    sections[f"{kind}_cell_starts"] = starts
+    sections[f"{kind}_cell_items"] = items
+
+
+def pack(
+    properties: Iterable[Sequence],
+    blocks: Iterable[Sequence],
+    rows: Iterable[Sequence],
+    vines: Iterable[Sequence] = (),
+    generation: int = 0,
+) -> bytes:
+    """Serialise location data.
+
+    ``properties``: ``(id, name, lat, lng, circle_lat, circle_lng, radius_m,
+    boundary_polyline)``; ``blocks``: ``(id, property_id, name, lat, lng,
+    radius_m, boundary_polyline)``; ``rows``: ``(id, block_id, row_number,
+    start_lat, start_lng, end_lat, end_lng)``; ``vines``: ``(id, row_id,
+    vine_number, lat, lng)``. Entities without a centre point are skipped.
+    Order is kept: on overlapping boundaries the first one wins. Vines are
+    stored grouped by row (``r_vine_starts``), since they are only ever
+    looked up within a matched row. Property and block centres also get a
+    grid of their own (``pc`` / ``bc``) for radius searches.
+    """
+    blob = bytearray()
+    sections: Dict[str, array] = {}
+
+    columns = _columns("q:p_id d:p_lat,p_lng,p_clat,p_clng,p_radius")
+    names, boundaries, bboxes = _Strings(blob), [], []
+    for pid, name, lat, lng, clat, clng, radius, boundary in properties:
+        if not lat or not lng:
+            continue
+        lat, lng = float(lat), float(lng)
+        clat, clng, radius = _float(clat), _float(clng), _float(radius)
+        _append(columns, (pid, lat, lng, clat, clng, radius))
+        names.add(name)
+        boundaries.append(boundary)
+        polygon = parse_boundary(boundary)
+        if polygon is not None:
+            bboxes.append(_polygon_bbox(polygon))
+        elif not math.isnan(clat + clng + radius):
+            bboxes.append(_bbox_around(clat, clng, radius))
+        else:
+            bboxes.append(_bbox_around(lat, lng, PROPERTY_FALLBACK_M))
+    sections.update(columns)
+    sections["p_name"] = names.offsets
+    sections["p_boundary"] = _Strings.of(blob, boundaries)
+    _add_grid(sections, "p", bboxes)
+    _add_grid(sections, "pc", _points(columns["p_lat"], columns["p_lng"]))
+
+    columns = _columns("q:b_id,b_property d:b_lat,b_lng,b_radius")
+    names, boundaries, bboxes = _Strings(blob), [], []
+    for bid, property_id, name, lat, lng, radius, boundary in blocks:
+        if not lat or not lng:
+            continue
+        lat, lng, radius = float(lat), float(lng), _float(radius)
+        _append(columns, (bid, property_id, lat, lng, radius))
+        names.add(name)
+        boundaries.append(boundary)
+        polygon = parse_boundary(boundary)
+        if polygon is not None:
+            bboxes.append(_polygon_bbox(polygon))
+        else:
+            reach = radius if not math.isnan(radius) else BLOCK_FALLBACK_M
+            bboxes.append(_bbox_around(lat, lng, reach))
+    sections.update(columns)
+    sections["b_name"] = names.offsets
+    sections["b_boundary"] = _Strings.of(blob, boundaries)
+    _add_grid(sections, "b", bboxes)
+    _add_grid(sections, "bc", _points(columns["b_lat"], columns["b_lng"]))
+
+    columns = _columns("q:r_id,r_block,r_number d:r_lat1,r_lng1,r_lat2,r_lng2")
+    bboxes = []
+    for rid, block_id, number, lat1, lng1, lat2, lng2 in rows:
+        if None in (lat1, lng1, lat2, lng2):
+            continue
+        lat1, lng1, lat2, lng2 = float(lat1), float(lng1), float(lat2), float(lng2)
+        _append(columns, (rid, block_id, number, lat1, lng1, lat2, lng2))
+        south, west, _, _ = _bbox_around(min(lat1, lat2), min(lng1, lng2), ROW_MATCH_M)
+        _, _, north, east = _bbox_around(max(lat1, lat2), max(lng1, lng2), ROW_MATCH_M)
+        bboxes.append((south, west, north, east))
+    sections.update(columns)
+    _add_grid(sections, "r", bboxes)
+
+    row_positions = {rid: i for i, rid in enumerate(sections["r_id"])}
+    by_row: List[List[Tuple]] = [[] for _ in row_positions]
+    for vid, row_id, number, lat, lng in vines:
+        position = row_positions.get(row_id)
+        if position is not None and lat is not None and lng is not None:
+            by_row[position].append((vid, number, float(lat), float(lng)))
+    columns = _columns("q:v_id,v_number d:v_lat,v_lng")
+    starts = array("q", [0])
+    for row_vines in by_row:
+        for vine in sorted(row_vines, key=lambda v: v[1]):
+            _append(columns, vine)
+        starts.append(len(columns["v_id"]))
+    sections.update(columns)
+    sections["r_vine_starts"] = starts
+
+    sections["strings"] = array("B", bytes(blob))
+    return _serialise(sections, generation)
+
+
+def _points(lats: array, lngs: array) -> List[Tuple[float, float, float, float]]:
+    return [(lat, lng, lat, lng) for lat, lng in zip(lats, lngs)]
+
+
+def _polygon_bbox(polygon: Polygon) -> Tuple[float, float, float, float]:
+    return polygon.min_lat, polygon.min_lng, polygon.max_lat, polygon.max_lng
+
+
+def _serialise(sections: Dict[str, array], generation: int) -> bytes:
+    table_size = _HEADER.size + _SECTION.size * len(sections)
+    offset = table_size
+    entries, payloads = [], []
+    for name, values in sections.items():
+        offset += -offset % 8  # keep every column 8-byte aligned
+        data = values.tobytes()
+        entries.append((name, values.typecode, offset, len(values)))
+        payloads.append((offset, data))
+        offset += len(data)
+    out = bytearray(offset)
+    _HEADER.pack_into(out, 0, MAGIC, generation, time.time(), len(entries))
+    for i, (name, typecode, start, count) in enumerate(entries):
+        _SECTION.pack_into(
+            out,
+            _HEADER.size + i * _SECTION.size,
+            name.encode(),
+            typecode.encode(),
+            start,
+            count,
+        )
+    for start, data in payloads:
+        out[start : start + len(data)] = data
+    return bytes(out)
+
+
+class SharedGeoView:
+    """Read-only lookups over one packed generation (any buffer)."""
+
+    def __init__(self, buffer) -> None:
+        view = memoryview(buffer)
+        magic, self.generation, self.built_at, count = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a shared geo index file")
+        self._columns: Dict[str, memoryview] = {}
+        for i in range(count):
+            name, typecode, start, items = _SECTION.unpack_from(
+                view, _HEADER.size + i * _SECTION.size
+            )
+            typecode = typecode.rstrip(b"\0").decode()
+            size = array(typecode).itemsize
+            column = view[start : start + items * size]
+            self._columns[name.rstrip(b"\0").decode()] = column.cast(typecode)
+        for name, column in self._columns.items():
+            setattr(self, name, column)
+        self._polygons: Dict[Tuple[str, int], Optional[Polygon]] = {}
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return {
+            "properties": len(self.p_id),
+            "blocks": len(self.b_id),
+            "rows": len(self.r_id),
+            "vines": len(self.v_id),
+        }
+
+    def _string(self, offsets: memoryview, position: int) -> str:
+        return bytes(self.strings[offsets[position] : offsets[position + 1]]).decode()
+
+    def property_name(self, position: int) -> str:
+        return self._string(self.p_name, position)
+
+    def block_name(self, position: int) -> str:
+        return self._string(self.b_name, position)
+
+    def _polygon(self, kind: str, position: int) -> Optional[Polygon]:
+        key = (kind, position)
+        if key not in self._polygons:
+            offsets = self.p_boundary if kind == "p" else self.b_boundary
+            self._polygons[key] = parse_boundary(self._string(offsets, position))
+        return self._polygons[key]
+
+    def _candidates(self, kind: str, lat: float, lng: float) -> memoryview:
+        keys = getattr(self, f"{kind}_cell_keys")
+        key = _cell_key(*_cell(lat, lng))
+        i = bisect_left(keys, key)
+        if i == len(keys) or keys[i] != key:
+            return memoryview(b"").cast("q")
+        starts = getattr(self, f"{kind}_cell_starts")
+        return getattr(self, f"{kind}_cell_items")[starts[i] : starts[i + 1]]
+
+    def detect_property(
+        self, lat: float, lng: float, distance: DistanceFn = distance_m
+    ) -> Optional[Tuple[int, float]]:
+        """``(position, metres to centre)`` of the first property whose polygon
+        or circle contains the point, else the nearest boundary-less property
+        centre within ``PROPERTY_FALLBACK_M``."""
+        nearest: Optional[Tuple[int, float]] = None
+        for position in self._candidates("p", lat, lng):
+            polygon = self._polygon("p", position)
+            centre = (self.p_lat[position], self.p_lng[position])
+            if polygon is not None:
+                if polygon.contains(lat, lng):
+                    return position, distance(lat, lng, *centre)
+                continue
+            clat, clng, radius = (
+                self.p_clat[position],
+                self.p_clng[position],
+                self.p_radius[position],
+            )
+            if not math.isnan(clat + clng + radius):
+                if distance(lat, lng, clat, clng) <= radius:
+                    return position, distance(lat, lng, *centre)
+                continue
+            d = distance(lat, lng, *centre)
+            if d < PROPERTY_FALLBACK_M and (nearest is None or d < nearest[1]):
+                nearest = (position, d)
+        return nearest
+
+    def detect_block(
+        self,
+        property_id: int,
+        lat: float,
+        lng: float,
+        distance: DistanceFn = distance_m,
+    ) -> Optional[Tuple[int, float]]:
+        """Same rules as ``detect_property`` for the blocks of one property,
+        with ``BLOCK_FALLBACK_M``."""
+        nearest: Optional[Tuple[int, float]] = None
+        for position in self._candidates("b", lat, lng):
+            if self.b_property[position] != property_id:
+                continue
+            centre = (self.b_lat[position], self.b_lng[position])
+            polygon = self._polygon("b", position)
+            if polygon is not None:
+                if polygon.contains(lat, lng):
+                    return position, distance(lat, lng, *centre)
+                continue
+            radius = self.b_radius[position]
+            d = distance(lat, lng, *centre)
+            if not math.isnan(radius):
+                if d <= radius:
+                    return position, d
+                continue
+            if d < BLOCK_FALLBACK_M and (nearest is None or d < nearest[1]):
+                nearest = (position, d)
+        return nearest
+
+    def detect_row(
+        self, block_id: int, lat: float, lng: float, max_distance_m: float = ROW_MATCH_M
+    ) -> Optional[Tuple[int, float]]:
+        """``(position, metres)`` of the nearest row of ``block_id``."""
+        best: Optional[Tuple[int, float]] = None
+        for position in self._candidates("r", lat, lng):
+            if self.r_block[position] != block_id:
+                continue
+            d = point_segment_distance_m(
+                lat,
+                lng,
+                self.r_lat1[position],
+                self.r_lng1[position],
+                self.r_lat2[position],
+                self.r_lng2[position],
+            )
+            if d <= max_distance_m and (best is None or d < best[1]):
+                best = (position, d)
+        return best
+
+    def detect_vine(
+        self,
+        row_position: int,
+        lat: float,
+        lng: float,
+        max_distance_m: float = VINE_MATCH_M,
+    ) -> Optional[Tuple[int, float]]:
+        """``(position, metres)`` of the nearest vine of a matched row."""
+        best: Optional[Tuple[int, float]] = None
+        start, end = self.r_vine_starts[row_position : row_position + 2]
+        for position in range(start, end):
+            d = distance_m(lat, lng, self.v_lat[position], self.v_lng[position])
+            if d <= max_distance_m and (best is None or d < best[1]):
+                best = (position, d)
+        return best
+
+    def match_block(self, lat: float, lng: float) -> Optional[Tuple[int, float]]:
+        """``(block id, metres to centre)`` of the nearest block of any
+        property whose polygon, or circle (``DEFAULT_BLOCK_RADIUS_M`` when it
+        has none), contains the point; ``GeoIndex.match_block`` semantics."""
+        best: Optional[Tuple[int, float]] = None
+        for position in self._candidates("b", lat, lng):
+            d = distance_m(lat, lng, self.b_lat[position], self.b_lng[position])
+            polygon = self._polygon("b", position)
+            if polygon is not None:
+                inside = polygon.contains(lat, lng)
+            else:
+                radius = self.b_radius[position]
+                if math.isnan(radius) or not radius:
+                    radius = DEFAULT_BLOCK_RADIUS_M
+                inside = d <= radius
+            if inside and (best is None or d < best[1]):
+                best = (self.b_id[position], d)
+        return best
+
+    def match_row(
+        self, lat: float, lng: float, block_id: int, max_distance_m: float
+    ) -> Optional[Tuple[int, float]]:
+        """``(row id, metres)`` of the nearest row of ``block_id`` within
+        ``max_distance_m`` (at most ``ROW_MATCH_M``)."""
+        row = self.detect_row(block_id, lat, lng, max_distance_m)
+        return (self.r_id[row[0]], row[1]) if row is not None else None
+
+    def within(
+        self,
+        kind: str,
+        lat: float,
+        lng: float,
+        radius_m: float,
+        distance: DistanceFn = distance_m,
+    ) -> Iterator[Tuple[int, float]]:
+        """``(position, metres)`` of every property (``"p"``) or block (``"b"``)
+        centre within ``radius_m``. Candidates come from the centre grid cells
+        covering the radius; ``distance`` decides the rest."""
+        lats, lngs = getattr(self, f"{kind}_lat"), getattr(self, f"{kind}_lng")
+        south, west, north, east = _bbox_around(lat, lng, radius_m * 1.01 + 1)
+        if hasattr(self, f"{kind}c_cell_keys"):
+            positions = self._cell_range(f"{kind}c", south, west, north, east)
+        else:
+            positions = range(len(lats))  # packed before centre grids existed
+        for position in positions:
+            plat, plng = lats[position], lngs[position]
+            if south <= plat <= north and west <= plng <= east:
+                d = distance(lat, lng, plat, plng)
+                if d <= radius_m:
+                    yield position, d
+
+    def _cell_range(
+        self, kind: str, south: float, west: float, north: float, east: float
+    ) -> Iterator[int]:
+        """Items of every occupied grid cell in the box. Keys are ordered by
+        latitude cell first, so each latitude band is one contiguous run."""
+        keys = getattr(self, f"{kind}_cell_keys")
+        starts = getattr(self, f"{kind}_cell_starts")
+        items = getattr(self, f"{kind}_cell_items")
+        lat0, lng0 = _cell(south, west)
+        lat1, lng1 = _cell(north, east)
+        for i in range(lat0, lat1 + 1):
+            last = _cell_key(i, lng1)
+            k = bisect_left(keys, _cell_key(i, lng0))
+            while k < len(keys) and keys[k] <= last:
+                yield from items[starts[k] : starts[k + 1]]
+                k += 1
+
+
+def load_locations(db: Session) -> Tuple[List, List, List, List]:
+    """Property, block, row and vine tuples for ``pack``, ordered by id."""
+    properties = db.execute(
+        select(
+            Property.id,
+            Property.property_name,
+            Property.latitude,
+            Property.longitude,
+            Property.boundary_center_lat,
+            Property.boundary_center_lng,
+            Property.boundary_radius_meters,
+            Property.boundary_polyline,
+        ).order_by(Property.id)
+    ).all()
+    blocks = db.execute(
+        select(
+            Block.id,
+            Block.property_id,
+            Block.block_name,
+            Block.center_latitude,
+            Block.center_longitude,
+            Block.boundary_radius_meters,
+            Block.boundary_polyline,
+        ).order_by(Block.id)
+    ).all()
+    rows = db.execute(
+        select(
+            Row.id,
+            Row.block_id,
+            Row.row_number,
+            Row.start_latitude,
+            Row.start_longitude,
+            Row.end_latitude,
+            Row.end_longitude,
+        ).order_by(Row.id)
+    ).all()
+    vines = db.execute(
+        select(
+            IndividualVine.id,
+            IndividualVine.row_id,
+            IndividualVine.vine_number,
+            IndividualVine.latitude,
+            IndividualVine.longitude,
+        ).where(
+            IndividualVine.latitude.isnot(None), IndividualVine.longitude.isnot(None)
+        )
+    ).all()
+    return properties, blocks, rows, vines
+
+
+def _default_directory() -> str:
+    if settings.SHARED_GEO_DIR:
+        return settings.SHARED_GEO_DIR
+    # One directory per database, so a dev box switching databases never
+    # attaches another database's data.
+    from app.db.base import DEFAULT_DATABASE_URL
+
+    url = os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+    suffix = hashlib.sha1(url.encode()).hexdigest()[:12]
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, f"vigneron-geo-{suffix}")
+
+
+class SharedGeoStore:
+    """Builds, publishes and attaches generations in ``directory``."""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        ttl_seconds: float = settings.SHARED_GEO_TTL_SECONDS,
+        poll_interval: float = settings.SHARED_GEO_POLL_SECONDS,
+        session_factory: Optional[Callable[[], Session]] = None,
+    ) -> None:
+        self.directory = directory or _default_directory()
+        self.ttl_seconds = ttl_seconds
+        self.poll_interval = poll_interval
+        self.session_factory = session_factory
+        self._control: Optional[mmap.mmap] = None
+        self._control_fd: Optional[int] = None
+        self._view: Optional[SharedGeoView] = None
+        self._attach_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.builds = 0
+        self.attaches = 0
+
+    def reset(self, directory: Optional[str] = None) -> None:
+        """Detach and point the store at ``directory`` (benchmarks, tests)."""
+        self._view = None
+        if self._control is not None:
+            self._control.close()
+            os.close(self._control_fd)
+        self._control = self._control_fd = None
+        self.directory = directory or _default_directory()
+
+    # Files -------------------------------------------------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open_control(self) -> mmap.mmap:
+        if self._control is None:
+            os.makedirs(self.directory, exist_ok=True)
+            fd = os.open(self._path("control"), os.O_RDWR | os.O_CREAT, 0o644)
+            with self._flock(fd):
+                if os.fstat(fd).st_size < _CONTROL.size:
+                    os.ftruncate(fd, _CONTROL.size)
+                    os.pwrite(fd, _CONTROL.pack(MAGIC, 0, 0, 0, 0.0), 0)
+            self._control_fd = fd
+            self._control = mmap.mmap(fd, _CONTROL.size)
+        return self._control
+
+    def _read_control(self) -> Tuple[int, int, int, float]:
+        _, generation, requested, built, built_at = _CONTROL.unpack_from(
+            self._open_control(), 0
+        )
+        return generation, requested, built, built_at
+
+    @contextmanager
+    def _flock(self, fd: int, blocking: bool = True):
+        flags = fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(fd, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    # Writers -----------------------------------------------------------------
+
+    def request_rebuild(self) -> None:
+        """Ask whichever worker builds next to pick up a hierarchy change."""
+        control = self._open_control()
+        with self._flock(self._control_fd):
+            generation, requested, built, built_at = self._read_control()
+            _CONTROL.pack_into(
+                control, 0, MAGIC, generation, requested + 1, built, built_at
+            )
+
+    def publish(
+        self,
+        properties: Iterable[Sequence],
+        blocks: Iterable[Sequence],
+        rows: Iterable[Sequence],
+        vines: Iterable[Sequence] = (),
+        requested: Optional[int] = None,
+    ) -> int:
+        """Write a new generation and make it current; returns its number.
+        Call with the build lock held (``rebuild`` does)."""
+        control = self._open_control()
+        generation, current_requested, _, _ = self._read_control()
+        new_generation = generation + 1
+        data = pack(properties, blocks, rows, vines, new_generation)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".geo-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, self._path(f"geo-{new_generation}.bin"))
+        with self._flock(self._control_fd):
+            _, latest_requested, _, _ = self._read_control()
+            _CONTROL.pack_into(
+                control,
+                0,
+                MAGIC,
+                new_generation,
+                latest_requested,
+                current_requested if requested is None else requested,
+                time.time(),
+            )
+        # Readers that still map the old file keep it alive until they move on.
+        try:
+            os.unlink(self._path(f"geo-{generation}.bin"))
+        except FileNotFoundError:
+            pass
+        self.builds += 1
+        return new_generation
+
+    def rebuild(self, db: Optional[Session] = None, blocking: bool = True) -> bool:
+        """Rebuild from the database unless another worker is doing it (in
+        which case, with ``blocking``, wait for it and reuse its result)."""
+        self._open_control()
+        lock_fd = os.open(self._path("build.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with self._flock(lock_fd, blocking) as locked:
+                if not locked:
+                    return False
+                generation, requested, built, built_at = self._read_control()
+                if (
+                    blocking
+                    and generation
+                    and requested == built
+                    and time.time() - built_at < self.ttl_seconds
+                ):
+                    return False  # another worker built it while we waited
+                if db is not None:
+                    locations = load_locations(db)
+                else:
+                    with self._session() as session:
+                        locations = load_locations(session)
+                self.publish(*locations, requested=requested)
+                return True
+        finally:
+            os.close(lock_fd)
+
+    def _session(self) -> Session:
+        if self.session_factory is None:
+            from app.db.base import SessionLocal
+
+            return SessionLocal()
+        return self.session_factory()
+
+    # Readers -----------------------------------------------------------------
+
+    def view(self, db: Optional[Session] = None) -> SharedGeoView:
+        """Current generation, attaching (or building the first) as needed."""
+        generation = self._read_control()[0]
+        current = self._view
+        if current is not None and current.generation == generation:
+            return current
+        with self._attach_lock:
+            if generation == 0:
+                # Every worker attaches to this build; never take it from a
+                # lagging replica session.
+                self.rebuild(
+                    None if db is not None and db.info.get("read_only") else db
+                )
+                generation = self._read_control()[0]
+            if self._view is None or self._view.generation != generation:
+                self._attach(generation)
+            return self._view
+
+    def _attach(self, generation: int) -> None:
+        try:
+            with open(self._path(f"geo-{generation}.bin"), "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            # Superseded between reading the counter and opening; keep the
+            # current view and pick up the newer one on the next lookup.
+            if self._view is not None:
+                return
+            raise
+        # The previous view is simply dropped: lookups still running on it
+        # hold its columns, and the mapping goes away with the last of them.
+        self._view = SharedGeoView(mapping)
+        self.attaches += 1
+
+    def stats(self) -> Dict[str, object]:
+        generation, requested, built, built_at = self._read_control()
+        view = self._view
+        return {
+            "directory": self.directory,
+            "generation": generation,
+            "attached_generation": view.generation if view else None,
+            "pending_changes": requested - built,
+            "age_seconds": round(time.time() - built_at, 3) if built_at else None,
+            "counts": view.counts if view else None,
+            "builds": self.builds,
+            "attaches": self.attaches,
+        }
+
+    # Background refresh ------------------------------------------------------
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                _, requested, built, built_at = self._read_control()
+                if requested != built or time.time() - built_at >= self.ttl_seconds:
+                    await run_in_threadpool(self.rebuild, None, False)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Shared geo index refresh failed")
+            await asyncio.sleep(self.poll_interval)
+
+
+shared_geo = SharedGeoStore()
+
+
+DIRTY = "shared_geo_dirty"
+
+
+def rebuild_after_commit(db: Session) -> None:
+    """Request a rebuild once ``db`` commits, for writes that bypass the ORM."""
+    db.info[DIRTY] = True
+
+
+def _mark_dirty(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is not None:
+        rebuild_after_commit(session)
+
+
+def _mark_vine_dirty(mapper, connection, target) -> None:
+    # Vines are written often (yield, vigor); only position changes matter.
+    state = inspect(target)
+    if any(
+        state.attrs[name].history.has_changes()
+        for name in ("row_id", "vine_number", "latitude", "longitude")
+    ):
+        _mark_dirty(mapper, connection, target)
+
+
+def _after_commit(session: Session) -> None:
+    # Only processes that use the store signal; anything else (scripts,
+    # tests) is caught by the TTL.
+    if session.info.pop(DIRTY, False) and shared_geo._control:
+        try:
+            shared_geo.request_rebuild()
+        except OSError:
+            logger.exception("Could not signal a shared geo index rebuild")
+
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop(DIRTY, None)
+
+
+for _model in (Property, Block, Row):
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event_name, _mark_dirty)
+event.listen(IndividualVine, "after_insert", _mark_dirty)
+event.listen(IndividualVine, "after_delete", _mark_dirty)
+event.listen(IndividualVine, "after_update", _mark_vine_dirty)
+event.listen(Session, "after_commit", _after_commit)
+event.listen(Session, "after_rollback", _after_rollback)
+
+
+def _shared_geo_metrics():
+    view = shared_geo._view
+    yield (
+        "shared_geo_generation",
+        "gauge",
+        "Shared geo index generation attached by this worker",
+        [("shared_geo_generation", {}, view.generation if view else 0)],
+    )
+    yield (
+        "shared_geo_builds_total",
+        "counter",
+        "Shared geo index generations built by this worker",
+        [("shared_geo_builds_total", {}, shared_geo.builds)],
+    )
+
+
+registry.register_collector(_shared_geo_metrics)
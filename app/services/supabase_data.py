@@ -0,0 +1,280 @@
+"""
+Tenant reads served straight from Supabase's REST API (PostgREST).
+
+One ``httpx.AsyncClient`` per worker keeps its connections to Supabase
+alive (``SUPABASE_KEEPALIVE_SECONDS``), and speaks HTTP/2 (``h2`` comes
+with the ``httpx[http2]`` dependency), so requests multiplex over a few
+connections instead of paying a TLS handshake each.
+
+Two things cut the number of requests:
+
+* identical concurrent queries (same table, parameters and caller token)
+  are coalesced: the first one is sent, the others await its result;
+* id lookups made within ``SUPABASE_BATCH_WINDOW_MS`` of each other for the
+  same table and columns are merged into one ``<column>=in.(...)`` request
+  of at most ``SUPABASE_BATCH_MAX_IDS`` ids, and each caller gets its rows.
+
+Requests carry the caller's bearer token when there is one, so Supabase's
+row-level security decides what a tenant sees; otherwise the anon key.
+"""
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+except ImportError:  # pragma: no cover - optional dependency
+    h2 = None
+
+REQUESTS = registry.counter(
+    "supabase_requests_total", "Requests sent to the Supabase REST API", ("outcome",)
+)
+COALESCED = registry.counter(
+    "supabase_coalesced_total", "Queries answered by an identical request in flight"
+)
+BATCHED = registry.counter(
+    "supabase_batched_lookups_total", "Id lookups merged into a batched request"
+)
+
+Params = Tuple[Tuple[str, str], ...]
+
+# Characters that make PostgREST read a list value as several, or as syntax.
+_RESERVED = frozenset(',.:()" \\')
+
+
+class SupabaseError(Exception):
+    """A failed Supabase request; ``status_code`` is 502 when it never got an answer."""
+
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _literal(value: Any) -> str:
+    text = str(value)
+    if any(c in _RESERVED for c in text):
+        return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return text
+
+
+def in_filter(values: Iterable[Any]) -> str:
+    """PostgREST ``in.(...)`` operand for ``values``."""
+    return "in.(" + ",".join(_literal(v) for v in values) + ")"
+
+
+def _with_column(columns: str, column: str) -> str:
+    if columns == "*" or column in (c.strip() for c in columns.split(",")):
+        return columns
+    return f"{columns},{column}"
+
+
+class _Batch:
+    """Ids waiting to go out in one ``in.(...)`` request."""
+
+    __slots__ = ("ids", "future", "sent")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.ids: Dict[str, Any] = {}
+        self.future: asyncio.Future = loop.create_future()
+        self.sent = False
+
+
+class SupabaseDataClient:
+    """Pooled, coalescing and batching reader of Supabase tables."""
+
+    def __init__(
+        self,
+        url: str = settings.SUPABASE_URL,
+        api_key: str = settings.SUPABASE_ANON_KEY,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        timeout: float = settings.SUPABASE_TIMEOUT_SECONDS,
+        max_connections: int = settings.SUPABASE_MAX_CONNECTIONS,
+        keepalive_seconds: float = settings.SUPABASE_KEEPALIVE_SECONDS,
+        batch_window: float = settings.SUPABASE_BATCH_WINDOW_MS / 1000,
+        batch_max_ids: int = settings.SUPABASE_BATCH_MAX_IDS,
+    ) -> None:
+        self.base_url = f"{url.rstrip('/')}/rest/v1"
+        self.api_key = api_key
+        self.transport = transport
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.keepalive_seconds = keepalive_seconds
+        self.batch_window = batch_window
+        self.batch_max_ids = batch_max_ids
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[Tuple[str, Params, Optional[str]], asyncio.Future] = {}
+        self._batches: Dict[Tuple[str, str, str, Optional[str]], _Batch] = {}
+        self.requests = 0
+        self.coalesced = 0
+        self.batched = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                transport=self.transport,
+                http2=h2 is not None,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_seconds,
+                ),
+                headers={
+                    "apikey": self.api_key,
+                    "accept": "application/json",
+                    "user-agent": f"{settings.PROJECT_NAME} data",
+                },
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get(
+        self, table: str, params: Params, token: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        self.requests += 1
+        try:
+            response = await self.client.get(
+                f"/{table}",
+                params=list(params),
+                headers={"authorization": f"Bearer {token or self.api_key}"},
+            )
+        except httpx.HTTPError as e:
+            REQUESTS.inc(outcome="error")
+            raise SupabaseError(502, f"Supabase unreachable: {e}") from e
+        if response.status_code >= 400:
+            REQUESTS.inc(outcome="rejected")
+            try:
+                detail = response.json().get("message") or response.text
+            except ValueError:
+                detail = response.text
+            raise SupabaseError(response.status_code, detail)
+        REQUESTS.inc(outcome="ok")
+        return response.json()
+
+    async def select(
+        self,
+        table: str,
+        params: Iterable[Tuple[str, str]] = (),
+        token: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Rows of ``table`` for PostgREST query ``params`` (``select``,
+        ``order``, ``limit``, ``<column>=<op>.<value>`` filters)."""
+        key = (table, tuple(sorted(params)), token)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            COALESCED.inc()
+            return await asyncio.shield(pending)
+        future = asyncio.ensure_future(self._get(*key))
+        self._inflight[key] = future
+        future.add_done_callback(lambda done: self._settled(key, done))
+        # Shielded: a caller that goes away does not cancel the others' answer.
+        return await asyncio.shield(future)
+
+    def _settled(self, key: Tuple, future: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not future.cancelled():
+            future.exception()  # retrieved here even if every caller left
+
+    async def get_many(
+        self,
+        table: str,
+        ids: Iterable[Any],
+        column: str = "id",
+        columns: str = "*",
+        token: Optional[str] = None,
+    ) -> Dict[Any, Dict[str, Any]]:
+        """Rows of ``table`` whose ``column`` is one of ``ids``, by id.
+
+        Ids missing from the table (or hidden by row-level security) are
+        absent from the result.
+        """
+        wanted = {str(i): i for i in ids}
+        if not wanted:
+            return {}
+        key = (table, column, _with_column(columns, column), token)
+        batch = self._batches.get(key)
+        if batch is None:
+            loop = asyncio.get_running_loop()
+            batch = self._batches[key] = _Batch(loop)
+            loop.call_later(self.batch_window, self._send, key, batch)
+        elif wanted.keys() - batch.ids.keys():
+            self.batched += 1
+            BATCHED.inc()
+        batch.ids.update(wanted)
+        if len(batch.ids) >= self.batch_max_ids:
+            self._send(key, batch)
+        rows = await asyncio.shield(batch.future)
+        return {wanted[k]: row for k, row in rows.items() if k in wanted}
+
+    async def get(
+        self,
+        table: str,
+        row_id: Any,
+        column: str = "id",
+        columns: str = "*",
+        token: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """One row by id, looked up in the current batch."""
+        rows = await self.get_many(table, [row_id], column, columns, token)
+        return rows.get(row_id)
+
+    def _send(self, key: Tuple[str, str, str, Optional[str]], batch: _Batch) -> None:
+        if batch.sent:
+            return
+        batch.sent = True
+        if self._batches.get(key) is batch:
+            del self._batches[key]
+        asyncio.ensure_future(self._fetch(key, batch))
+
+    async def _fetch(
+        self, key: Tuple[str, str, str, Optional[str]], batch: _Batch
+    ) -> None:
+        table, column, columns, token = key
+        ids = sorted(batch.ids)
+        chunks: Sequence[List[str]] = [
+            ids[i : i + self.batch_max_ids]
+            for i in range(0, len(ids), self.batch_max_ids)
+        ]
+        try:
+            results = await asyncio.gather(
+                *(
+                    self.select(
+                        table,
+                        (("select", columns), (column, in_filter(chunk))),
+                        token,
+                    )
+                    for chunk in chunks
+                )
+            )
+        except Exception as e:
+            batch.future.set_exception(e)
+            batch.future.exception()  # the callers may all have gone
+            return
+        batch.future.set_result(
+            {str(row[column]): row for rows in results for row in rows}
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "http2": h2 is not None,
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "batched_lookups": self.batched,
+            "in_flight": len(self._inflight),
+        }
+
+
+supabase_data = SupabaseDataClient()
@@ -0,0 +1,476 @@
+"""
+Org partitioning of the tables that grow with every tenant's data:
+``activities``, ``crop_specific_data``, ``financial_transactions`` and
+``individual_vines`` (the models mark them with
+``info={"partition_by": "org_id"}``).
+
+On Postgres the migration turns each into a ``LIST (org_id)`` partitioned
+table with one partition per organization, ``<table>_org_<id>``, and a
+``<table>_default`` partition for orgs that have none yet. The models keep
+their single-column primary key, so ``create_all`` (SQLite, scripts) builds
+plain tables; every helper here checks the catalog and falls back to plain
+statements there.
+
+- ``org_id`` is copied onto rows that only reach their org through a block
+  or row. ORM writes fill it in through mapper events (and follow rows and
+  blocks moved to another org); bulk paths set it themselves.
+- Queries add ``partition_clause`` so the planner prunes to one partition.
+- ``ensure_org_partitions`` creates missing partitions, moving rows already
+  in the default partition. It runs when an organization is inserted and on
+  the leader worker every ``TENANT_PARTITION_MAINTENANCE_SECONDS``.
+- ``purge_tenant_data`` detaches and drops an org's partitions instead of
+  deleting its rows one by one.
+- ``vine_yields`` cannot keep a foreign key to the partitioned
+  ``individual_vines``; a vine's yields are deleted with it instead.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Union
+
+from sqlalchemy import Table, delete, event, func, inspect, select, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.db.base import Base
+from app.models.activity import Activity
+from app.models.activity_rollup import ActivityTypeRollup
+from app.models.block import Block
+from app.models.crop_specific_data import CropSpecificData
+from app.models.individual_vine import IndividualVine
+from app.models.organization import Organization
+from app.models.property import Property
+from app.models.row import Row
+from app.models.user import User
+from app.models.vine_yield import VineYield
+from app.services.hierarchy_counts import reconcile_counts
+from app.services.hierarchy_service import ALL_TENANTS, invalidate_after_commit
+from app.services.leader_lock import LeaderLock
+from app.services.shared_geo import rebuild_after_commit
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS_CREATED = registry.counter(
+    "tenant_partitions_created_total", "Org partitions created", ("table",)
+)
+TENANTS_PURGED = registry.counter(
+    "tenant_partitions_purged_total", "Organizations whose partitioned data was purged"
+)
+
+PARTITION_KEY = "org_id"
+# Serializes partition DDL between the org insert hook and the job.
+_DDL_LOCK_KEY = 7_246_001
+
+_ORGS = "tenant_partition_orgs"
+
+
+def partitioned_tables() -> List[Table]:
+    """The tables declared partitioned by org, in dependency order."""
+    return [
+        table
+        for table in Base.metadata.sorted_tables
+        if table.info.get("partition_by") == PARTITION_KEY
+    ]
+
+
+def partition_name(table: str, org_id: int) -> str:
+    return f"{table}_org_{int(org_id)}"
+
+
+def partition_clause(model: Any, org_id: Optional[int]) -> List[Any]:
+    """``[model.org_id == org_id]``, or nothing when the org is not known."""
+    return [] if org_id is None else [model.org_id == org_id]
+
+
+# Partition keys of parents
+# -------------------------
+
+
+def block_orgs(connection: Connection, block_ids: Iterable[int]) -> Dict[int, int]:
+    """``{block_id: org_id}`` in one query."""
+    block_ids = set(block_ids)
+    if not block_ids:
+        return {}
+    return dict(
+        connection.execute(
+            select(Block.id, Property.org_id)
+            .join(Property, Property.id == Block.property_id)
+            .where(Block.id.in_(block_ids))
+        ).all()
+    )
+
+
+def block_org(connection: Connection, block_id: int) -> Optional[int]:
+    return block_orgs(connection, [block_id]).get(block_id)
+
+
+def row_org(connection: Connection, row_id: int) -> Optional[int]:
+    return connection.scalar(
+        select(Property.org_id)
+        .join(Block, Block.property_id == Property.id)
+        .join(Row, Row.block_id == Block.id)
+        .where(Row.id == row_id)
+    )
+
+
+def user_org(connection: Connection, user_id: int) -> Optional[int]:
+    return connection.scalar(select(User.org_id).where(User.id == user_id))
+
+
+# Catalog
+# -------
+
+
+def partitioned_in_database(connection: Connection) -> Set[str]:
+    """Names of the declared tables that are actually partitioned."""
+    if connection.dialect.name != "postgresql":
+        return set()
+    names = {table.name for table in partitioned_tables()}
+    found = connection.scalars(
+        text(
+            "SELECT c.relname FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE pg_table_is_visible(c.oid)"
+        )
+    )
+    return names.intersection(found)
+
+
+def org_partitions(connection: Connection, table: str) -> Set[int]:
+    """Org ids that have their own partition of ``table``."""
+    prefix = f"{table}_org_"
+    names = connection.scalars(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:table AS regclass)"
+        ),
+        {"table": table},
+    )
+    return {
+        int(name[len(prefix) :])
+        for name in names
+        if name.startswith(prefix) and name[len(prefix) :].isdigit()
+    }
+
+
+def default_partition_rows(connection: Connection) -> Dict[str, int]:
+    """Rows per table waiting in the default partition for an org partition."""
+    return {
+        table: connection.scalar(text(f"SELECT count(*) FROM {table}_default"))
+        for table in sorted(partitioned_in_database(connection))
+    }
+
+
+# Partition maintenance
+# ---------------------
+
+
+def _create_partition(connection: Connection, table: str, org_id: int) -> None:
+    name = partition_name(table, org_id)
+    connection.execute(
+        text(
+            f"CREATE TABLE {name} "
+            f"(LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+    )
+    # Attaching fails while the default partition holds rows of this org.
+    connection.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {table}_default WHERE org_id = :org_id "
+            f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+        ),
+        {"org_id": org_id},
+    )
+    connection.execute(
+        text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES IN ({org_id})")
+    )
+    PARTITIONS_CREATED.inc(table=table)
+    logger.info("Created partition %s", name)
+
+
+def ensure_org_partitions(
+    connection: Connection, org_ids: Optional[Iterable[int]] = None
+) -> int:
+    """Create the missing partitions of ``org_ids`` (default: every org).
+
+    Returns how many were created; nothing happens on unpartitioned tables.
+    """
+    tables = partitioned_in_database(connection)
+    if not tables:
+        return 0
+    connection.execute(select(func.pg_advisory_xact_lock(_DDL_LOCK_KEY)))
+    if org_ids is None:
+        org_ids = connection.scalars(select(Organization.id))
+    wanted = {int(org_id) for org_id in org_ids}
+    created = 0
+    for table in sorted(tables):
+        for org_id in sorted(wanted - org_partitions(connection, table)):
+            _create_partition(connection, table, org_id)
+            created += 1
+    return created
+
+
+def purge_tenant_data(db: Session, org_id: int) -> Dict[str, Union[str, int]]:
+    """Remove every row of ``org_id`` from the partitioned tables.
+
+    An org partition is detached and dropped (``"dropped"``); unpartitioned
+    tables fall back to ``DELETE`` and report the rows deleted. Yields and
+    activity rollups of the org's vines and blocks go too, and the hierarchy
+    counts are recounted. The organization and its properties, blocks and
+    rows are left to the caller, who commits; the hierarchy cache and the
+    shared geo index follow once that commit lands.
+    """
+    connection = db.connection()
+    vines = IndividualVine.__table__
+    property_ids = list(
+        connection.scalars(select(Property.id).where(Property.org_id == org_id))
+    )
+    org_blocks = select(Block.id).where(Block.property_id.in_(property_ids))
+    # Neither is partitioned, and on Postgres no foreign key cascades to them.
+    connection.execute(
+        delete(VineYield).where(
+            VineYield.vine_id.in_(select(vines.c.id).where(vines.c.org_id == org_id))
+        )
+    )
+    connection.execute(
+        delete(ActivityTypeRollup).where(ActivityTypeRollup.block_id.in_(org_blocks))
+    )
+
+    partitioned = partitioned_in_database(connection)
+    if partitioned:
+        connection.execute(select(func.pg_advisory_xact_lock(_DDL_LOCK_KEY)))
+    purged: Dict[str, Union[str, int]] = {}
+    for table in reversed(partitioned_tables()):
+        name = partition_name(table.name, org_id)
+        if table.name in partitioned and org_id in org_partitions(
+            connection, table.name
+        ):
+            connection.execute(
+                text(f"ALTER TABLE {table.name} DETACH PARTITION {name}")
+            )
+            connection.execute(text(f"DROP TABLE {name}"))
+            purged[table.name] = "dropped"
+        else:
+            purged[table.name] = connection.execute(
+                delete(table).where(table.c.org_id == org_id)
+            ).rowcount
+
+    touched = {("property", org_id), ("property", ALL_TENANTS)}
+    touched.update(("block", property_id) for property_id in property_ids)
+    for block_id in connection.scalars(org_blocks):
+        touched.update({("row", block_id), ("yield", block_id)})
+    touched.update(
+        ("vine", row_id)
+        for row_id in connection.scalars(
+            select(Row.id).where(Row.block_id.in_(org_blocks))
+        )
+    )
+    reconcile_counts(connection, property_ids, touched)
+    invalidate_after_commit(db, touched)
+    rebuild_after_commit(db)
+    TENANTS_PURGED.inc()
+    logger.warning("Purged partitioned data of organization %d: %s", org_id, purged)
+    return purged
+
+
+# Partition keys on ORM writes
+# ----------------------------
+
+
+def _cached(target: Any, key: tuple, lookup: Callable[[], Optional[int]]):
+    db = Session.object_session(target)
+    orgs = db.info.setdefault(_ORGS, {}) if db is not None else {}
+    if key not in orgs:
+        orgs[key] = lookup()
+    return orgs[key]
+
+
+def _block_or_user_org(connection: Connection, target: Any) -> Optional[int]:
+    # Measurements need not name a block; the recording user's org stands in.
+    if target.block_id is not None:
+        org_id = _cached(
+            target,
+            ("block", target.block_id),
+            lambda: block_org(connection, target.block_id),
+        )
+        if org_id is not None:
+            return org_id
+    return _cached(
+        target, ("user", target.user_id), lambda: user_org(connection, target.user_id)
+    )
+
+
+def _vine_org(connection: Connection, target: Any) -> Optional[int]:
+    return _cached(
+        target, ("row", target.row_id), lambda: row_org(connection, target.row_id)
+    )
+
+
+def _key_filler(parent: str, resolve: Callable[[Connection, Any], Optional[int]]):
+    def before_insert(mapper, connection, target) -> None:
+        if target.org_id is None:
+            target.org_id = resolve(connection, target)
+
+    def before_update(mapper, connection, target) -> None:
+        if inspect(target).attrs[parent].history.has_changes():
+            target.org_id = resolve(connection, target)
+
+    return before_insert, before_update
+
+
+def _row_moved(mapper, connection, target) -> None:
+    if not inspect(target).attrs.block_id.history.has_changes():
+        return
+    org_id = block_org(connection, target.block_id)
+    vines = IndividualVine.__table__
+    connection.execute(
+        update(vines)
+        .where(vines.c.row_id == target.id, vines.c.org_id.is_distinct_from(org_id))
+        .values(org_id=org_id)
+    )
+
+
+def _block_moved(mapper, connection, target) -> None:
+    if not inspect(target).attrs.property_id.history.has_changes():
+        return
+    org_id = connection.scalar(
+        select(Property.org_id).where(Property.id == target.property_id)
+    )
+    vines = IndividualVine.__table__
+    block_rows = select(Row.id).where(Row.block_id == target.id)
+    for table, clause in (
+        (Activity.__table__, Activity.__table__.c.block_id == target.id),
+        (
+            CropSpecificData.__table__,
+            CropSpecificData.__table__.c.block_id == target.id,
+        ),
+        (vines, vines.c.row_id.in_(block_rows)),
+    ):
+        connection.execute(
+            update(table)
+            .where(clause, table.c.org_id.is_distinct_from(org_id))
+            .values(org_id=org_id)
+        )
+
+
+def _vine_deleted(mapper, connection, target) -> None:
+    # vine_yields has no foreign key to cascade from the partitioned table.
+    connection.execute(delete(VineYield).where(VineYield.vine_id == target.id))
+
+
+def _org_inserted(mapper, connection, target) -> None:
+    ensure_org_partitions(connection, [target.id])
+
+
+def _forget_orgs(session: Session, *args: Any) -> None:
+    session.info.pop(_ORGS, None)
+
+
+for _model, _parent, _resolve in (
+    (Activity, "block_id", _block_or_user_org),
+    (CropSpecificData, "block_id", _block_or_user_org),
+    (IndividualVine, "row_id", _vine_org),
+):
+    _before_insert, _before_update = _key_filler(_parent, _resolve)
+    event.listen(_model, "before_insert", _before_insert)
+    event.listen(_model, "before_update", _before_update)
+event.listen(Row, "after_update", _row_moved)
+event.listen(Block, "after_update", _block_moved)
+event.listen(IndividualVine, "after_delete", _vine_deleted)
+event.listen(Organization, "after_insert", _org_inserted)
+event.listen(Session, "after_flush", _forget_orgs)
+event.listen(Session, "after_rollback", _forget_orgs)
+
+
+# Scheduled maintenance
+# ---------------------
+
+
+class PartitionMaintainer:
+    """Creates missing org partitions on whichever worker holds the leader lock."""
+
+    def __init__(
+        self,
+        interval: float = settings.TENANT_PARTITION_MAINTENANCE_SECONDS,
+        session_factory: Optional[Callable[[], Session]] = None,
+        lock: Optional[LeaderLock] = None,
+    ) -> None:
+        self.interval = interval
+        self.session_factory = session_factory
+        self.lock = lock or LeaderLock("tenant-partitions")
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.last_created = 0
+        self.default_rows: Dict[str, int] = {}
+        self.last_run_at: Optional[float] = None
+
+    def _session(self) -> Session:
+        if self.session_factory is None:
+            from app.db.base import SessionLocal
+
+            return SessionLocal()
+        return self.session_factory()
+
+    def maintain(self, db: Session) -> int:
+        connection = db.connection()
+        created = ensure_org_partitions(connection)
+        self.default_rows = default_partition_rows(connection)
+        db.commit()
+        for table, count in self.default_rows.items():
+            if count:
+                logger.warning("%d rows of %s have no org partition", count, table)
+        self.runs += 1
+        self.last_created = created
+        self.last_run_at = time.time()
+        return created
+
+    def tick(self) -> bool:
+        """Maintain if this worker is (or just became) the leader."""
+        with self._session() as db:
+            if not self.lock.acquire(db.get_bind()):
+                return False
+            self.maintain(db)
+        return True
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.lock.release()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await run_in_threadpool(self.tick)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Tenant partition maintenance failed")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "leader": self.lock.is_leader,
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "last_created": self.last_created,
+            "default_partition_rows": self.default_rows,
+            "age_seconds": round(time.time() - self.last_run_at, 3)
+            if self.last_run_at
+            else None,
+        }
+
+
+partition_maintainer = PartitionMaintainer()
@@ -0,0 +1,396 @@
+"""
+High-throughput GPS track ingestion.
+
+Fixes are appended to an in-memory buffer by the API and written by a single
+background flusher, either when ``batch_size`` fixes are waiting or every
+``flush_interval`` seconds. Each flush, off the event loop:
+
+1. clamps fix times to ``TRACK_MAX_FIX_AGE_DAYS`` back and
+   ``TRACK_MAX_CLOCK_SKEW_SECONDS`` ahead, so a device with a bad clock
+   cannot create a daily partition per day it reports,
+2. map-matches every fix to a block and row through the host-wide
+   ``shared_geo`` index,
+3. advances per-device block-visit sessions incrementally,
+4. bulk-inserts the batch with one multi-row statement, ignoring duplicates,
+5. upserts the visits that changed.
+
+Visit state lives in the worker that receives a device's fixes, so devices
+should be routed to the same worker (or visits may be split at worker
+boundaries).
+"""
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import bindparam, insert, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.gps_track import BlockVisit, GPSFix
+from app.services.geo_index import distance_m
+from app.services.shared_geo import SharedGeoStore, SharedGeoView, shared_geo
+
+# Core tables: the ORM bulk paths add per-row bookkeeping we do not need here.
+_fixes = GPSFix.__table__
+_visits = BlockVisit.__table__
+
+logger = logging.getLogger(__name__)
+
+FIXES_RECEIVED = registry.counter("track_fixes_received_total", "GPS fixes accepted")
+FIXES_WRITTEN = registry.counter("track_fixes_written_total", "GPS fixes flushed")
+FIXES_DROPPED = registry.counter(
+    "track_fixes_dropped_total", "GPS fixes rejected because the buffer was full"
+)
+FLUSH_SECONDS = registry.histogram("track_flush_seconds", "Duration of one flush")
+BUFFERED = registry.gauge("track_fixes_buffered", "GPS fixes waiting to be flushed")
+FIXES_CLAMPED = registry.counter(
+    "track_fixes_clamped_total", "GPS fixes whose time was outside the accepted window"
+)
+
+
+@dataclass
+class TrackFix:
+    device_id: str
+    recorded_at: datetime
+    latitude: float
+    longitude: float
+    accuracy_m: Optional[float] = None
+    speed_mps: Optional[float] = None
+    heading_deg: Optional[int] = None
+    org_id: Optional[int] = None
+
+
+@dataclass
+class _Visit:
+    device_id: str
+    org_id: Optional[int]
+    block_id: int
+    started_at: datetime
+    ended_at: datetime
+    last_row_id: Optional[int] = None
+    fix_count: int = 0
+    distance_m: float = 0.0
+    last_lat: float = 0.0
+    last_lng: float = 0.0
+    id: Optional[int] = None
+
+
+class VisitTracker:
+    """Incremental block-visit sessions per device."""
+
+    def __init__(self, gap_seconds: float) -> None:
+        self.gap = timedelta(seconds=gap_seconds)
+        self.open: Dict[str, _Visit] = {}
+        self._touched: Dict[str, float] = {}
+
+    def observe(
+        self, fix: TrackFix, block_id: Optional[int], row_id: Optional[int]
+    ) -> List[_Visit]:
+        """Feed one (time-ordered) fix; return visits that changed."""
+        self._touched[fix.device_id] = time.monotonic()
+        visit = self.open.get(fix.device_id)
+        changed: List[_Visit] = []
+
+        if visit is not None and fix.recorded_at <= visit.ended_at:
+            return changed  # duplicate or late fix, already accounted for
+        if (
+            visit is not None
+            and visit.block_id == block_id
+            and fix.recorded_at - visit.ended_at <= self.gap
+        ):
+            visit.distance_m += distance_m(
+                visit.last_lat, visit.last_lng, fix.latitude, fix.longitude
+            )
+            visit.ended_at = fix.recorded_at
+            visit.fix_count += 1
+            visit.last_lat, visit.last_lng = fix.latitude, fix.longitude
+            visit.last_row_id = row_id or visit.last_row_id
+            changed.append(visit)
+            return changed
+
+        if visit is not None:
+            del self.open[fix.device_id]
+        if block_id is not None:
+            visit = _Visit(
+                device_id=fix.device_id,
+                org_id=fix.org_id,
+                block_id=block_id,
+                started_at=fix.recorded_at,
+                ended_at=fix.recorded_at,
+                last_row_id=row_id,
+                fix_count=1,
+                last_lat=fix.latitude,
+                last_lng=fix.longitude,
+            )
+            self.open[fix.device_id] = visit
+            changed.append(visit)
+        return changed
+
+    def snapshot(self) -> Dict[str, _Visit]:
+        """Copy of the open visits, for ``restore`` if a flush is rolled back."""
+        return {device_id: replace(v) for device_id, v in self.open.items()}
+
+    def restore(self, snapshot: Dict[str, _Visit]) -> None:
+        self.open = snapshot
+
+    def evict_idle(self, idle_seconds: float) -> None:
+        cutoff = time.monotonic() - idle_seconds
+        for device_id in [d for d, t in self._touched.items() if t < cutoff]:
+            self._touched.pop(device_id, None)
+            self.open.pop(device_id, None)
+
+
+class TrackIngestor:
+    """Buffers fixes and flushes them in batches from a background task."""
+
+    def __init__(
+        self,
+        batch_size: int = settings.TRACK_BATCH_SIZE,
+        flush_interval: float = settings.TRACK_FLUSH_INTERVAL_SECONDS,
+        max_buffer: int = settings.TRACK_MAX_BUFFER,
+        visit_gap_seconds: float = settings.TRACK_VISIT_GAP_SECONDS,
+        row_match_meters: float = settings.TRACK_ROW_MATCH_METERS,
+        max_fix_age_days: float = settings.TRACK_MAX_FIX_AGE_DAYS,
+        max_clock_skew_seconds: float = settings.TRACK_MAX_CLOCK_SKEW_SECONDS,
+        session_factory: Optional[Callable[[], Session]] = None,
+        geo: SharedGeoStore = shared_geo,
+    ) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.row_match_meters = row_match_meters
+        self.max_fix_age = timedelta(days=max_fix_age_days)
+        self.max_clock_skew = timedelta(seconds=max_clock_skew_seconds)
+        self.session_factory = session_factory
+        self.geo = geo
+        self.visits = VisitTracker(visit_gap_seconds)
+        self._buffer: List[TrackFix] = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._partitions: Set[date] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # Producer side ---------------------------------------------------------
+
+    def submit(self, fixes: List[TrackFix]) -> int:
+        """Buffer fixes; returns how many were accepted (0 when full)."""
+        with self._buffer_lock:
+            room = self.max_buffer - len(self._buffer)
+            accepted = fixes[: max(room, 0)]
+            self._buffer.extend(accepted)
+            size = len(self._buffer)
+        FIXES_RECEIVED.inc(len(accepted))
+        if len(accepted) < len(fixes):
+            FIXES_DROPPED.inc(len(fixes) - len(accepted))
+        BUFFERED.set(size)
+        if size >= self.batch_size and self._loop is not None:
+            # May be called from threadpool endpoints, so hop onto the loop.
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return len(accepted)
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    # Flusher side ----------------------------------------------------------
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = None
+        if self._buffer:
+            try:
+                await run_in_threadpool(self.flush)
+            except Exception:
+                logger.exception("Final GPS track flush failed")
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self._buffer:
+                continue
+            try:
+                await run_in_threadpool(self.flush)
+            except Exception:
+                logger.exception("GPS track flush failed")
+
+    def _session(self) -> Session:
+        if self.session_factory is None:
+            from app.db.base import SessionLocal
+
+            return SessionLocal()
+        return self.session_factory()
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of fixes."""
+        with self._flush_lock:
+            with self._buffer_lock:
+                batch, self._buffer = self._buffer, []
+            BUFFERED.set(len(self._buffer))
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            db = self._session()
+            visits_before = self.visits.snapshot()
+            try:
+                index = self.geo.view(db)
+                rows, changed = self._match(index, batch)
+                new_days = self._write_fixes(db, rows)
+                self._write_visits(db, changed)
+                db.commit()
+            except Exception:
+                db.rollback()
+                # Rewind the visits (and the ids of ones inserted by the rolled
+                # back transaction) and put the batch back, so the retry sees
+                # these fixes as new instead of dropping them as late.
+                self.visits.restore(visits_before)
+                with self._buffer_lock:
+                    room = max(self.max_buffer - len(self._buffer), 0)
+                    self._buffer[:0] = batch[:room]
+                if len(batch) > room:
+                    FIXES_DROPPED.inc(len(batch) - room)
+                raise
+            finally:
+                db.close()
+            # Only now: the partitions were created in the committed transaction.
+            self._partitions.update(new_days)
+            self.visits.evict_idle(self.visits.gap.total_seconds() * 2)
+            FIXES_WRITTEN.inc(len(rows))
+            FLUSH_SECONDS.observe(time.perf_counter() - started)
+            return len(rows)
+
+    def _match(self, index: SharedGeoView, batch: List[TrackFix]):
+        rows = []
+        changed: Dict[int, _Visit] = {}
+        now = datetime.now(timezone.utc)
+        earliest, latest = now - self.max_fix_age, now + self.max_clock_skew
+        for fix in batch:
+            if fix.recorded_at.tzinfo is None:
+                fix.recorded_at = fix.recorded_at.replace(tzinfo=timezone.utc)
+            if not earliest <= fix.recorded_at <= latest:
+                FIXES_CLAMPED.inc()
+                fix.recorded_at = min(max(fix.recorded_at, earliest), latest)
+        batch.sort(key=lambda f: (f.device_id, f.recorded_at))
+        for fix in batch:
+            recorded_at = fix.recorded_at
+            block_id = row_id = None
+            block = index.match_block(fix.latitude, fix.longitude)
+            if block is not None:
+                block_id = block[0]
+                row = index.match_row(
+                    fix.latitude, fix.longitude, block_id, self.row_match_meters
+                )
+                row_id = row[0] if row is not None else None
+            for visit in self.visits.observe(fix, block_id, row_id):
+                changed[id(visit)] = visit
+            rows.append(
+                {
+                    "recorded_on": recorded_at.astimezone(timezone.utc).date(),
+                    "device_id": fix.device_id,
+                    "recorded_at": recorded_at,
+                    "org_id": fix.org_id,
+                    "latitude": fix.latitude,
+                    "longitude": fix.longitude,
+                    "accuracy_m": fix.accuracy_m,
+                    "speed_mps": fix.speed_mps,
+                    "heading_deg": fix.heading_deg,
+                    "block_id": block_id,
+                    "row_id": row_id,
+                }
+            )
+        return rows, list(changed.values())
+
+    def _write_fixes(self, db: Session, rows: List[Dict]) -> Set[date]:
+        """Insert ``rows``; returns the days whose partitions this created."""
+        new_days: Set[date] = set()
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            new_days = self._ensure_partitions(db, {row["recorded_on"] for row in rows})
+            stmt = pg_insert(_fixes).on_conflict_do_nothing()
+        elif dialect == "sqlite":
+            stmt = insert(_fixes).prefix_with("OR IGNORE")
+        else:
+            stmt = insert(_fixes)
+        db.execute(stmt, rows)
+        return new_days
+
+    def _ensure_partitions(self, db: Session, days: Set[date]) -> Set[date]:
+        # Not recorded in self._partitions here: a rollback drops the tables.
+        new_days = days - self._partitions
+        for day in sorted(new_days):
+            db.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS gps_fixes_{day:%Y%m%d} "
+                    f"PARTITION OF gps_fixes FOR VALUES FROM ('{day}') "
+                    f"TO ('{day + timedelta(days=1)}')"
+                )
+            )
+        return new_days
+
+    def _write_visits(self, db: Session, visits: List[_Visit]) -> None:
+        existing = [v for v in visits if v.id is not None]
+        for visit in visits:
+            if visit.id is None:
+                result = db.execute(
+                    insert(_visits).values(
+                        org_id=visit.org_id,
+                        device_id=visit.device_id,
+                        block_id=visit.block_id,
+                        last_row_id=visit.last_row_id,
+                        started_at=visit.started_at,
+                        ended_at=visit.ended_at,
+                        fix_count=visit.fix_count,
+                        distance_m=visit.distance_m,
+                    )
+                )
+                visit.id = result.inserted_primary_key[0]
+        if existing:
+            db.execute(
+                update(_visits)
+                .where(_visits.c.id == bindparam("visit_id"))
+                .values(
+                    ended_at=bindparam("ended_at"),
+                    fix_count=bindparam("fix_count"),
+                    distance_m=bindparam("distance_m"),
+                    last_row_id=bindparam("last_row_id"),
+                ),
+                [
+                    {
+                        "visit_id": v.id,
+                        "ended_at": v.ended_at,
+                        "fix_count": v.fix_count,
+                        "distance_m": v.distance_m,
+                        "last_row_id": v.last_row_id,
+                    }
+                    for v in existing
+                ],
+            )
+
+
+track_ingestor = TrackIngestor()
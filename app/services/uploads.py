@@ -0,0 +1,228 @@
+"""
+Content-addressed storage for inference input files.
+
+Uploads are streamed straight from the request body to a temporary file in
+``UPLOAD_DIR``: chunks are coalesced into ``UPLOAD_CHUNK_SIZE`` writes, and
+each write and SHA-256 update runs in the threadpool, so neither memory nor
+the event loop scales with file size. The finished file is renamed to its
+digest, which makes a second upload of the same content a no-op (dedup).
+
+Readers get either a row-chunk generator (CSV) or a read-only ``mmap`` view
+(everything else above ``UPLOAD_MMAP_THRESHOLD_BYTES``), so local models can
+consume hundreds of MB without copying it into the Python heap.
+"""
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Union
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Content type prefix -> InferenceInputType value
+INPUT_TYPES = {
+    "image/": "image",
+    "audio/": "audio",
+    "video/": "video",
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/json": "json",
+    "text/plain": "text",
+}
+
+
+class UploadTooLarge(Exception):
+    """Raised when a stream exceeds the configured maximum size."""
+
+
+def input_type_for(content_type: str) -> Optional[str]:
+    content_type = content_type.split(";", 1)[0].strip().lower()
+    for prefix, input_type in INPUT_TYPES.items():
+        if content_type.startswith(prefix):
+            return input_type
+    return None
+
+
+@dataclass
+class StoredUpload:
+    sha256: str
+    size: int
+    content_type: str
+    filename: Optional[str]
+    input_type: Optional[str]
+    created_at: str
+    deduplicated: bool = False
+
+
+class UploadStore:
+    """Files live at ``<directory>/<sha[:2]>/<sha>`` with a ``.json`` sidecar."""
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = settings.UPLOAD_MAX_BYTES,
+        chunk_size: int = settings.UPLOAD_CHUNK_SIZE,
+        mmap_threshold: int = settings.UPLOAD_MMAP_THRESHOLD_BYTES,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.mmap_threshold = mmap_threshold
+
+    def path(self, sha256: str) -> str:
+        if not SHA256_RE.match(sha256):
+            raise ValueError("Not a SHA-256 hex digest")
+        return os.path.join(self.directory, sha256[:2], sha256)
+
+    def get(self, sha256: str) -> Optional[StoredUpload]:
+        try:
+            with open(self.path(sha256) + ".json") as f:
+                return StoredUpload(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    async def save_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        content_type: str = "application/octet-stream",
+        filename: Optional[str] = None,
+    ) -> StoredUpload:
+        """Write ``chunks`` to disk while hashing; never holds more than one
+        ``chunk_size`` buffer in memory."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".upload-")
+        digest = hashlib.sha256()
+        size = 0
+
+        f = os.fdopen(fd, "wb", buffering=0)
+        try:
+            pending = bytearray()
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+                pending += chunk
+                if len(pending) >= self.chunk_size:
+                    data, pending = bytes(pending), bytearray()
+                    await run_in_threadpool(_write, f, digest, data)
+            if pending:
+                await run_in_threadpool(_write, f, digest, bytes(pending))
+            await run_in_threadpool(os.fsync, f.fileno())
+        except BaseException:
+            f.close()
+            os.unlink(tmp_path)
+            raise
+        f.close()
+        return await run_in_threadpool(
+            self._commit, tmp_path, digest.hexdigest(), size, content_type, filename
+        )
+
+    def _commit(
+        self,
+        tmp_path: str,
+        sha256: str,
+        size: int,
+        content_type: str,
+        filename: Optional[str],
+    ) -> StoredUpload:
+        existing = self.get(sha256)
+        if existing is not None:
+            os.unlink(tmp_path)
+            existing.deduplicated = True
+            return existing
+
+        final = self.path(sha256)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, final)
+        upload = StoredUpload(
+            sha256=sha256,
+            size=size,
+            content_type=content_type,
+            filename=filename,
+            input_type=input_type_for(content_type),
+            created_at=datetime.now(timezone.utc).isoformat(),
+        )
+        # The sidecar is written last and marks the upload complete.
+        meta = asdict(upload)
+        meta.pop("deduplicated")
+        sidecar_tmp = final + ".json.tmp"
+        with open(sidecar_tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(sidecar_tmp, final + ".json")
+        return upload
+
+    @contextmanager
+    def open_view(self, sha256: str) -> Iterator[Union[memoryview, bytes]]:
+        """Read-only contents: an mmap-backed memoryview for large files
+        (zero-copy, pages shared by every process reading it), bytes otherwise."""
+        path = self.path(sha256)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self.mmap_threshold or size == 0:
+                yield f.read()
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+            try:
+                yield view
+            finally:
+                view.release()
+                mapped.close()
+
+    def iter_csv_chunks(
+        self, sha256: str, chunk_rows: int = 1000, encoding: str = "utf-8-sig"
+    ) -> Iterator[List[Dict[str, str]]]:
+        """Yield lists of up to ``chunk_rows`` rows keyed by the header row."""
+        with open(self.path(sha256), newline="", encoding=encoding) as f:
+            reader = csv.DictReader(f)
+            chunk: List[Dict[str, str]] = []
+            for row in reader:
+                chunk.append(row)
+                if len(chunk) >= chunk_rows:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+
+def _write(f: io.RawIOBase, digest: "hashlib._Hash", data: bytes) -> None:
+    # hashlib and file writes release the GIL for large buffers
+    digest.update(data)
+    view = memoryview(data)
+    while view:
+        written = f.write(view)
+        view = view[written:]
+
+
+upload_store = UploadStore(settings.UPLOAD_DIR)
+
+
+def sha256_from_file_url(file_url: Optional[str]) -> Optional[str]:
+    """Digest of a ``file_url`` that points at this API's upload storage."""
+    if not file_url:
+        return None
+    match = re.search(r"/uploads/([0-9a-f]{64})/?$", str(file_url))
+    return match.group(1) if match else None
+
+
+def open_inference_input(file_url: str, input_type: str, chunk_rows: int = 1000):
+    """CSV inputs as a row-chunk generator, other inputs as an ``open_view``
+    context manager; ``None`` if the file is not in local storage."""
+    sha256 = sha256_from_file_url(file_url)
+    if sha256 is None or upload_store.get(sha256) is None:
+        return None
+    if input_type == "csv":
+        return upload_store.iter_csv_chunks(sha256, chunk_rows)
+    return upload_store.open_view(sha256)
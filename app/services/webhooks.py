@@ -0,0 +1,479 @@
+"""
+Delivery of ``callback_url`` webhooks through a transactional outbox.
+
+Producers call ``enqueue_callback`` (or the inference helpers) inside the
+transaction that stores the result, which writes a ``callback_outbox`` row.
+A single ``WebhookDispatcher`` per worker then:
+
+* claims due rows while fewer than ``batch_size`` are in flight, leasing
+  them by pushing ``next_attempt_at`` forward (``SKIP LOCKED`` on Postgres,
+  so several workers can share the table); a crash simply lets the lease
+  expire,
+* POSTs each row from its own task through one pooled ``httpx.AsyncClient``
+  with a semaphore per destination host, so one slow receiver cannot take
+  every connection or hold up the next claim,
+* records each outcome as soon as its request finishes: delivered, retried
+  with exponential backoff and jitter (honouring ``Retry-After``), or failed
+  after ``max_attempts`` or on a non-retryable 4xx.
+
+A request takes at most ``timeout`` seconds, so a row's lease covers the
+requests queued ahead of it on its host's semaphore plus its own, and a
+margin; it cannot expire while the row is still waiting or in flight.
+
+Payloads enqueued with the same ``coalesce_key`` (e.g. every item of an
+inference batch) are merged into one pending row; a short
+``delay_seconds`` gives siblings time to join before the first attempt.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import math
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import bindparam, or_, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.callback_outbox import CallbackOutbox
+
+logger = logging.getLogger(__name__)
+
+DELIVERIES = registry.counter(
+    "webhook_deliveries_total", "Webhook delivery attempts", ("outcome",)
+)
+DELIVERY_SECONDS = registry.histogram(
+    "webhook_delivery_seconds", "Webhook request duration"
+)
+
+# Client errors worth retrying; any other 4xx is the receiver's final word.
+RETRYABLE_4XX = {408, 409, 425, 429}
+# Added to the time a claimed row may spend queued and in flight.
+LEASE_MARGIN_SECONDS = 30.0
+
+_outbox = CallbackOutbox.__table__
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def enqueue_callback(
+    db: Session,
+    url: str,
+    event: str,
+    payload: Dict[str, Any],
+    coalesce_key: Optional[str] = None,
+    merge_field: str = "results",
+    delay_seconds: float = 0.0,
+) -> CallbackOutbox:
+    """Add a delivery to the caller's transaction (the caller commits).
+
+    With ``coalesce_key``, ``payload[merge_field]`` is appended to a pending
+    row with the same key and URL instead of creating a new one.
+    """
+    payload = jsonable_encoder(payload)
+    if coalesce_key is not None:
+        query = db.query(CallbackOutbox).filter(
+            CallbackOutbox.coalesce_key == coalesce_key,
+            CallbackOutbox.url == url,
+            CallbackOutbox.status == "pending",
+            CallbackOutbox.attempts == 0,
+        )
+        if db.get_bind().dialect.name == "postgresql":
+            query = query.with_for_update(skip_locked=True)
+        existing = query.first()
+        if existing is not None:
+            merged = dict(existing.payload)
+            merged[merge_field] = list(merged.get(merge_field, [])) + list(
+                payload.get(merge_field, [])
+            )
+            existing.payload = merged
+            return existing
+
+    row = CallbackOutbox(
+        url=url,
+        event=event,
+        coalesce_key=coalesce_key,
+        payload=payload,
+        status="pending",
+        attempts=0,
+        next_attempt_at=_utcnow() + timedelta(seconds=delay_seconds),
+    )
+    db.add(row)
+    return row
+
+
+def _inference_result(request: Any) -> Dict[str, Any]:
+    return {
+        "request_id": request.id,
+        "model_id": request.model_id,
+        "status": request.status,
+        "output": request.output,
+        "confidence": request.confidence,
+        "processing_time_ms": request.processing_time_ms,
+        "error_code": request.error_code,
+        "error_message": request.error_message,
+        "completed_at": request.completed_at,
+    }
+
+
+def enqueue_inference_callback(db: Session, request: Any) -> Optional[CallbackOutbox]:
+    """Queue the result of a finished ``InferenceRequest`` for its callback_url.
+
+    Requests carrying ``request_metadata["batch_id"]`` are coalesced into one
+    ``inference.batch`` delivery per batch.
+    """
+    if not request.callback_url:
+        return None
+    batch_id = (request.request_metadata or {}).get("batch_id")
+    result = _inference_result(request)
+    if batch_id is None:
+        return enqueue_callback(db, request.callback_url, "inference.completed", result)
+    return enqueue_callback(
+        db,
+        request.callback_url,
+        "inference.batch",
+        {"batch_id": batch_id, "results": [result]},
+        coalesce_key=f"batch:{batch_id}",
+        delay_seconds=settings.WEBHOOK_POLL_INTERVAL_SECONDS,
+    )
+
+
+@dataclass
+class _Delivery:
+    id: int
+    url: str
+    event: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+@dataclass
+class _Outcome:
+    delivery: _Delivery
+    status_code: Optional[int]
+    error: Optional[str] = None
+    retry_after: Optional[float] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code is not None and 200 <= self.status_code < 300
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - _utcnow()).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc
+
+
+def sign(body: bytes, secret: str) -> str:
+    """``X-Vigneron-Signature`` value receivers can verify with the shared secret."""
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class WebhookDispatcher:
+    """Claims due outbox rows and delivers them from a background task."""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        per_host_concurrency: int = settings.WEBHOOK_PER_HOST_CONCURRENCY,
+        max_attempts: int = settings.WEBHOOK_MAX_ATTEMPTS,
+        backoff_base: float = settings.WEBHOOK_BACKOFF_BASE_SECONDS,
+        backoff_max: float = settings.WEBHOOK_BACKOFF_MAX_SECONDS,
+        batch_size: int = settings.WEBHOOK_BATCH_SIZE,
+        poll_interval: float = settings.WEBHOOK_POLL_INTERVAL_SECONDS,
+        signing_secret: str = settings.WEBHOOK_SIGNING_SECRET,
+        timeout: float = settings.WEBHOOK_TIMEOUT_SECONDS,
+    ) -> None:
+        self.session_factory = session_factory
+        self.transport = transport
+        self.per_host_concurrency = per_host_concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.signing_secret = signing_secret
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self._inflight_ids: Set[int] = set()
+        # host -> claimed rows not yet recorded
+        self._queued: Dict[str, int] = {}
+
+    def _session(self) -> Session:
+        if self.session_factory is None:
+            from app.db.base import SessionLocal
+
+            return SessionLocal()
+        return self.session_factory()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=self.transport,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.WEBHOOK_MAX_CONNECTIONS // 2,
+                ),
+                follow_redirects=False,
+                headers={"user-agent": f"{settings.PROJECT_NAME} webhooks"},
+            )
+        return self._client
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Cancelled rows are retried once their leases expire.
+        for task in list(self._inflight):
+            task.cancel()
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.dispatch()
+            except Exception:
+                logger.exception("Webhook dispatch failed")
+            if len(self._inflight) >= self.batch_size:
+                # Claim again as soon as any delivery frees a slot.
+                await asyncio.wait(
+                    set(self._inflight),
+                    timeout=self.poll_interval,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            else:
+                await asyncio.sleep(self.poll_interval)
+
+    async def dispatch(self) -> int:
+        """Claim due deliveries up to the free capacity and start sending
+        each; returns how many were claimed."""
+        room = self.batch_size - len(self._inflight)
+        if room <= 0:
+            return 0
+        claimed = await run_in_threadpool(
+            self._claim, room, dict(self._queued), set(self._inflight_ids)
+        )
+        for delivery in claimed:
+            host = _host(delivery.url)
+            self._queued[host] = self._queued.get(host, 0) + 1
+            self._inflight_ids.add(delivery.id)
+            task = asyncio.create_task(self._send(delivery))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+        return len(claimed)
+
+    async def run_once(self) -> int:
+        """Claim one batch of due deliveries and wait until every outcome is
+        recorded."""
+        claimed = await self.dispatch()
+        await asyncio.gather(*self._inflight)
+        return claimed
+
+    async def _send(self, delivery: _Delivery) -> None:
+        try:
+            outcome = await self._deliver(delivery)
+            await run_in_threadpool(self._record, [outcome])
+        except Exception:
+            logger.exception("Recording webhook delivery %d failed", delivery.id)
+        finally:
+            host = _host(delivery.url)
+            self._queued[host] -= 1
+            if not self._queued[host]:
+                del self._queued[host]
+            self._inflight_ids.discard(delivery.id)
+
+    def lease(self, position: int) -> float:
+        """Lease of a row with ``position - 1`` others queued on its host."""
+        rounds = math.ceil(position / self.per_host_concurrency)
+        return rounds * self.timeout + LEASE_MARGIN_SECONDS
+
+    def _claim(
+        self, limit: int, queued: Dict[str, int], inflight_ids: Set[int]
+    ) -> List[_Delivery]:
+        now = _utcnow()
+        db = self._session()
+        try:
+            query = (
+                select(
+                    _outbox.c.id,
+                    _outbox.c.url,
+                    _outbox.c.event,
+                    _outbox.c.payload,
+                    _outbox.c.attempts,
+                )
+                .where(
+                    or_(
+                        _outbox.c.status == "pending",
+                        _outbox.c.status == "delivering",
+                    ),
+                    _outbox.c.next_attempt_at <= now,
+                )
+                .order_by(_outbox.c.next_attempt_at)
+                .limit(limit)
+            )
+            if inflight_ids:
+                query = query.where(_outbox.c.id.not_in(inflight_ids))
+            if db.get_bind().dialect.name == "postgresql":
+                query = query.with_for_update(skip_locked=True)
+            rows = db.execute(query).all()
+            if rows:
+                leases = []
+                for row in rows:
+                    host = _host(row.url)
+                    queued[host] = queued.get(host, 0) + 1
+                    leases.append(
+                        {
+                            "row_id": row.id,
+                            "lease_until": now
+                            + timedelta(seconds=self.lease(queued[host])),
+                        }
+                    )
+                db.execute(
+                    update(_outbox)
+                    .where(_outbox.c.id == bindparam("row_id"))
+                    .values(
+                        status="delivering", next_attempt_at=bindparam("lease_until")
+                    ),
+                    leases,
+                )
+            db.commit()
+            return [_Delivery(*row) for row in rows]
+        finally:
+            db.close()
+
+    async def _deliver(self, delivery: _Delivery) -> _Outcome:
+        host = _host(delivery.url)
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.per_host_concurrency)
+        body = json.dumps(delivery.payload, separators=(",", ":")).encode()
+        headers = {
+            "content-type": "application/json",
+            "x-vigneron-event": delivery.event,
+            "x-vigneron-delivery": str(delivery.id),
+            "x-vigneron-attempt": str(delivery.attempts + 1),
+        }
+        if self.signing_secret:
+            headers["x-vigneron-signature"] = sign(body, self.signing_secret)
+
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                # Bounds the whole request, which the lease relies on; httpx
+                # timeouts apply per connect / read / write.
+                response = await asyncio.wait_for(
+                    self.client.post(delivery.url, content=body, headers=headers),
+                    self.timeout,
+                )
+            except asyncio.TimeoutError:
+                return _Outcome(delivery, None, f"No response within {self.timeout}s")
+            except httpx.HTTPError as e:
+                return _Outcome(delivery, None, f"{type(e).__name__}: {e}")
+            finally:
+                DELIVERY_SECONDS.observe(time.perf_counter() - started)
+        outcome = _Outcome(delivery, response.status_code)
+        if not outcome.ok:
+            outcome.error = response.text[:500]
+            outcome.retry_after = _retry_after(response)
+        return outcome
+
+    def backoff(self, attempts: int, retry_after: Optional[float] = None) -> float:
+        """Seconds before attempt ``attempts + 1``: full-jitter exponential."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        delay = random.uniform(delay / 2, delay)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _record(self, outcomes: List[_Outcome]) -> None:
+        now = _utcnow()
+        params = []
+        for outcome in outcomes:
+            attempts = outcome.delivery.attempts + 1
+            code = outcome.status_code
+            if outcome.ok:
+                status, next_at, label = "delivered", now, "delivered"
+            elif (
+                code is not None and 400 <= code < 500 and code not in RETRYABLE_4XX
+            ) or attempts >= self.max_attempts:
+                status, next_at, label = "failed", now, "failed"
+            else:
+                delay = self.backoff(attempts, outcome.retry_after)
+                status, next_at = "pending", now + timedelta(seconds=delay)
+                label = "retry"
+            DELIVERIES.inc(outcome=label)
+            params.append(
+                {
+                    "row_id": outcome.delivery.id,
+                    "status": status,
+                    "attempts": attempts,
+                    "next_attempt_at": next_at,
+                    "last_status_code": code,
+                    "last_error": outcome.error,
+                    "delivered_at": now if outcome.ok else None,
+                }
+            )
+        db = self._session()
+        try:
+            db.execute(
+                update(_outbox)
+                .where(_outbox.c.id == bindparam("row_id"))
+                .values(
+                    status=bindparam("status"),
+                    attempts=bindparam("attempts"),
+                    next_attempt_at=bindparam("next_attempt_at"),
+                    last_status_code=bindparam("last_status_code"),
+                    last_error=bindparam("last_error"),
+                    delivered_at=bindparam("delivered_at"),
+                ),
+                params,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+webhook_dispatcher = WebhookDispatcher()
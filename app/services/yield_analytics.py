@@ -0,0 +1,557 @@
+"""
+Season-over-season yield analytics per block.
+
+Building ORM objects for every vine of a large block is what made this slow,
+so the vines of a block are streamed as plain column tuples, ``BATCH_SIZE``
+rows at a time, into typed ``array`` columns (``BlockColumns``). Vines come
+ordered by row, so each row is a contiguous slice and every statistic is a
+pass over one slice:
+
+- yield distribution per row and for the block (quantiles, mean, spread),
+  with the change against the previous season;
+- outlier vines by robust z-score (median / MAD) against the block;
+- a vigor map: vine counts and mean yield per ``canopy_vigor`` class, per row
+  and for the block, plus optional per-vine points for map layers.
+
+Seasons come from ``VineYield``; without a season the vines'
+``historical_yield_kg`` is used. Reports are cached in the hierarchy query
+cache under ``("yield", block_id)`` and invalidated after commit by writes to
+the block's rows, vines or yield records.
+"""
+import math
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set
+
+from sqlalchemy import Float, and_, cast, event, func, inspect, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, aliased, object_session
+
+from app.models.individual_vine import IndividualVine
+from app.models.row import Row
+from app.models.vine_yield import VineYield
+from app.services.cache import query_cache
+from app.services.hierarchy_service import invalidate_after_commit
+from app.services.tenant_partitions import block_org, partition_clause
+
+BATCH_SIZE = 5_000
+OUTLIER_Z = 3.5
+OUTLIER_LIMIT = 100
+# MAD * 1/0.6745 estimates the standard deviation of normal data; with a zero
+# MAD the mean absolute deviation * 1.2533 is used instead.
+MAD_SCALE = 0.6745
+MEAN_AD_SCALE = 1.2533
+# Keeps IN lists under SQLite's bound parameter limit.
+IN_CHUNK = 10_000
+NAN = float("nan")
+
+
+@dataclass
+class BlockColumns:
+    """Vines of one block as parallel columns, ordered by row then vine."""
+
+    block_id: int
+    season: Optional[int]
+    row_ids: List[int] = field(default_factory=list)
+    row_numbers: List[int] = field(default_factory=list)
+    row_vine_counts: List[Optional[int]] = field(default_factory=list)
+    # Vines of row ``i`` are ``row_starts[i]:row_starts[i + 1]``.
+    row_starts: array = field(default_factory=lambda: array("q", [0]))
+    vine_id: array = field(default_factory=lambda: array("q"))
+    vine_number: array = field(default_factory=lambda: array("q"))
+    # Missing values are NaN.
+    yield_kg: array = field(default_factory=lambda: array("d"))
+    previous_kg: array = field(default_factory=lambda: array("d"))
+    trunk_mm: array = field(default_factory=lambda: array("d"))
+    latitude: array = field(default_factory=lambda: array("d"))
+    longitude: array = field(default_factory=lambda: array("d"))
+    # Index into ``vigor_classes``; -1 when not recorded.
+    vigor: array = field(default_factory=lambda: array("h"))
+    vigor_classes: List[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.vine_id)
+
+
+def load_block_columns(
+    db: Session, block_id: int, season: Optional[int] = None
+) -> BlockColumns:
+    """Stream the active vines of ``block_id`` into ``BlockColumns``."""
+    columns = BlockColumns(block_id=block_id, season=season)
+    row_order = (Row.row_number, Row.id)
+    for row_id, row_number, vine_count in db.execute(
+        select(Row.id, Row.row_number, Row.vine_count)
+        .where(Row.block_id == block_id)
+        .order_by(*row_order)
+    ):
+        columns.row_ids.append(row_id)
+        columns.row_numbers.append(row_number)
+        columns.row_vine_counts.append(vine_count)
+
+    # Casting in SQL skips building a Decimal per value.
+    vine = IndividualVine
+    if season is None:
+        current = vine.historical_yield_kg
+        previous = literal(None)
+    else:
+        this_season = aliased(VineYield)
+        last_season = aliased(VineYield)
+        current = this_season.yield_kg
+        previous = last_season.yield_kg
+    query = select(
+        vine.row_id,
+        vine.id,
+        vine.vine_number,
+        cast(current, Float).label("yield_kg"),
+        cast(previous, Float).label("previous_kg"),
+        cast(vine.trunk_diameter_mm, Float).label("trunk_mm"),
+        vine.canopy_vigor,
+        cast(vine.latitude, Float).label("latitude"),
+        cast(vine.longitude, Float).label("longitude"),
+    ).join(Row, Row.id == vine.row_id)
+    if season is not None:
+        query = query.outerjoin(
+            this_season,
+            and_(this_season.vine_id == vine.id, this_season.season == season),
+        ).outerjoin(
+            last_season,
+            and_(last_season.vine_id == vine.id, last_season.season == season - 1),
+        )
+    query = query.where(
+        Row.block_id == block_id,
+        vine.is_active.isnot(False),
+        *partition_clause(vine, block_org(db.connection(), block_id)),
+    ).order_by(*row_order, vine.vine_number, vine.id)
+
+    counts = dict.fromkeys(columns.row_ids, 0)
+    vigor_codes: Dict[Optional[str], int] = {None: -1}
+    # Core execution: the ORM result layer adds per-row overhead for nothing.
+    result = db.connection().execute(query.execution_options(yield_per=BATCH_SIZE))
+    for batch in result.partitions():
+        # One extend per column and batch instead of one append per value.
+        row_id, vine_id, number, kg, prev, trunk, vigor, lat, lng = zip(*batch)
+        for value in row_id:
+            counts[value] += 1
+        columns.vine_id.extend(vine_id)
+        columns.vine_number.extend(number)
+        for target, values in (
+            (columns.yield_kg, kg),
+            (columns.previous_kg, prev),
+            (columns.trunk_mm, trunk),
+            (columns.latitude, lat),
+            (columns.longitude, lng),
+        ):
+            target.extend([NAN if v is None else v for v in values])
+        codes = []
+        for label in vigor:
+            code = vigor_codes.get(label)
+            if code is None:
+                normalised = label.strip().lower() or None
+                code = vigor_codes.get(normalised)
+                if code is None:
+                    code = vigor_codes[normalised] = len(columns.vigor_classes)
+                    columns.vigor_classes.append(normalised)
+                vigor_codes[label] = code
+            codes.append(code)
+        columns.vigor.extend(codes)
+
+    for count in counts.values():
+        columns.row_starts.append(columns.row_starts[-1] + count)
+    return columns
+
+
+# Statistics
+# ----------
+
+
+def _quantile(ordered: Sequence[float], q: float) -> float:
+    """Linearly interpolated quantile of an ascending, non-empty sequence."""
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _round(value: Optional[float], digits: int = 3) -> Optional[float]:
+    return None if value is None or value != value else round(value, digits)
+
+
+def distribution(values: Iterable[float]) -> Dict[str, Any]:
+    """Count, total, mean, spread and quantiles of the non-NaN ``values``."""
+    measured = sorted(v for v in values if v == v)
+    n = len(measured)
+    if not n:
+        return {"measured": 0, "total_kg": 0.0}
+    total = math.fsum(measured)
+    mean = total / n
+    stdev = (
+        math.sqrt(math.fsum((v - mean) ** 2 for v in measured) / (n - 1))
+        if n > 1
+        else 0.0
+    )
+    return {
+        "measured": n,
+        "total_kg": _round(total, 2),
+        "mean_kg": _round(mean),
+        "stdev_kg": _round(stdev),
+        "cv": _round(stdev / mean) if mean else None,
+        "min_kg": measured[0],
+        "p10_kg": _round(_quantile(measured, 0.10)),
+        "p25_kg": _round(_quantile(measured, 0.25)),
+        "median_kg": _round(_quantile(measured, 0.50)),
+        "p75_kg": _round(_quantile(measured, 0.75)),
+        "p90_kg": _round(_quantile(measured, 0.90)),
+        "max_kg": measured[-1],
+    }
+
+
+def _change_pct(current: Dict[str, Any], previous: Dict[str, Any]) -> Optional[float]:
+    # Compared per measured vine, so partial sampling in either season does
+    # not read as a yield change.
+    if not current.get("mean_kg") or not previous.get("mean_kg"):
+        return None
+    return _round((current["mean_kg"] / previous["mean_kg"] - 1) * 100, 1)
+
+
+def _vigor_classes(columns: BlockColumns) -> Dict[str, Any]:
+    n = len(columns.vigor_classes)
+    vines = [0] * n
+    yield_sum = [0.0] * n
+    yield_n = [0] * n
+    trunk_sum = [0.0] * n
+    trunk_n = [0] * n
+    unrecorded = 0
+    vigor, kg, trunk = columns.vigor, columns.yield_kg, columns.trunk_mm
+    for i, code in enumerate(vigor):
+        if code < 0:
+            unrecorded += 1
+            continue
+        vines[code] += 1
+        if kg[i] == kg[i]:
+            yield_sum[code] += kg[i]
+            yield_n[code] += 1
+        if trunk[i] == trunk[i]:
+            trunk_sum[code] += trunk[i]
+            trunk_n[code] += 1
+    classes = {
+        label: {
+            "vines": vines[code],
+            "mean_yield_kg": _round(yield_sum[code] / yield_n[code])
+            if yield_n[code]
+            else None,
+            "mean_trunk_diameter_mm": _round(trunk_sum[code] / trunk_n[code], 1)
+            if trunk_n[code]
+            else None,
+        }
+        for code, label in enumerate(columns.vigor_classes)
+        if vines[code]
+    }
+    return {"classes": classes, "unrecorded": unrecorded}
+
+
+def find_outliers(
+    columns: BlockColumns, threshold: float = OUTLIER_Z, limit: int = OUTLIER_LIMIT
+) -> Dict[str, Any]:
+    """Vines whose yield is more than ``threshold`` robust z-scores from the
+    block median, most extreme first."""
+    kg = columns.yield_kg
+    measured = sorted(v for v in kg if v == v)
+    found: List[Dict[str, Any]] = []
+    if len(measured) >= 3:
+        median = _quantile(measured, 0.5)
+        deviations = sorted(abs(v - median) for v in measured)
+        mad = _quantile(deviations, 0.5)
+        if mad:
+            scale = MAD_SCALE / mad
+        else:
+            mean_ad = math.fsum(deviations) / len(deviations)
+            scale = 1 / (MEAN_AD_SCALE * mean_ad) if mean_ad else 0.0
+        if scale:
+            row_of = _row_positions(columns)
+            for i, value in enumerate(kg):
+                if value != value:
+                    continue
+                z = (value - median) * scale
+                if abs(z) > threshold:
+                    previous = columns.previous_kg[i]
+                    found.append(
+                        {
+                            "vine_id": columns.vine_id[i],
+                            "row_id": columns.row_ids[row_of[i]],
+                            "row_number": columns.row_numbers[row_of[i]],
+                            "vine_number": columns.vine_number[i],
+                            "yield_kg": value,
+                            "previous_kg": _round(previous, 2),
+                            "z": _round(z, 2),
+                            "direction": "high" if z > 0 else "low",
+                            "latitude": _round(columns.latitude[i], 8),
+                            "longitude": _round(columns.longitude[i], 8),
+                        }
+                    )
+            found.sort(key=lambda o: -abs(o["z"]))
+    return {"threshold_z": threshold, "count": len(found), "vines": found[:limit]}
+
+
+def _row_positions(columns: BlockColumns) -> array:
+    positions = array("l", bytes(len(columns) * array("l").itemsize))
+    starts = columns.row_starts
+    for r in range(len(columns.row_ids)):
+        for i in range(starts[r], starts[r + 1]):
+            positions[i] = r
+    return positions
+
+
+def _points(columns: BlockColumns) -> List[List[Any]]:
+    classes = columns.vigor_classes
+    return [
+        [
+            columns.vine_id[i],
+            round(columns.latitude[i], 8),
+            round(columns.longitude[i], 8),
+            classes[columns.vigor[i]] if columns.vigor[i] >= 0 else None,
+            _round(columns.yield_kg[i], 2),
+        ]
+        for i in range(len(columns))
+        if columns.latitude[i] == columns.latitude[i]
+        and columns.longitude[i] == columns.longitude[i]
+    ]
+
+
+def analyse(
+    columns: BlockColumns,
+    outlier_z: float = OUTLIER_Z,
+    outlier_limit: int = OUTLIER_LIMIT,
+    include_points: bool = False,
+) -> Dict[str, Any]:
+    """Yield report of one block from its columns."""
+    starts = columns.row_starts
+    rows = []
+    for r, row_id in enumerate(columns.row_ids):
+        start, end = starts[r], starts[r + 1]
+        current = distribution(columns.yield_kg[start:end])
+        previous = distribution(columns.previous_kg[start:end])
+        vigor = Counter(columns.vigor[start:end])
+        rows.append(
+            {
+                "row_id": row_id,
+                "row_number": columns.row_numbers[r],
+                "vines": end - start,
+                "expected_vines": columns.row_vine_counts[r],
+                "yield": current,
+                "previous_total_kg": previous["total_kg"],
+                "change_pct": _change_pct(current, previous),
+                "vigor": {
+                    label: vigor[code]
+                    for code, label in enumerate(columns.vigor_classes)
+                    if vigor[code]
+                },
+            }
+        )
+
+    current = distribution(columns.yield_kg)
+    previous = distribution(columns.previous_kg)
+    expected = [n for n in columns.row_vine_counts if n is not None]
+    vigor_map = _vigor_classes(columns)
+    if include_points:
+        vigor_map["points"] = _points(columns)
+    return {
+        "block_id": columns.block_id,
+        "season": columns.season,
+        "previous_season": columns.season - 1 if columns.season is not None else None,
+        "source": "historical_yield_kg" if columns.season is None else "vine_yields",
+        "vines": len(columns),
+        "expected_vines": sum(expected) if expected else None,
+        "yield": current,
+        "previous_yield": previous,
+        "change_pct": _change_pct(current, previous),
+        "rows": rows,
+        "outliers": find_outliers(columns, outlier_z, outlier_limit),
+        "vigor_map": vigor_map,
+    }
+
+
+# Cached entry points
+# -------------------
+# Replica sessions (``deps.get_read_db``) use what the primary cached but do
+# not cache their own loads: a lagging replica could otherwise put the report
+# from before ``record_yields`` back under the new generation for the TTL.
+
+
+def _from_primary(db: Session) -> bool:
+    return not db.info.get("read_only")
+
+
+def block_yield_report(
+    db: Session,
+    block_id: int,
+    season: Optional[int] = None,
+    outlier_z: float = OUTLIER_Z,
+    outlier_limit: int = OUTLIER_LIMIT,
+    include_points: bool = False,
+) -> Dict[str, Any]:
+    """Cached ``analyse`` of one block and season."""
+    return query_cache.get_or_load(
+        "yield",
+        block_id,
+        lambda: analyse(
+            load_block_columns(db, block_id, season),
+            outlier_z,
+            outlier_limit,
+            include_points,
+        ),
+        season,
+        outlier_z,
+        outlier_limit,
+        include_points,
+        store=_from_primary(db),
+    )
+
+
+def block_seasons(db: Session, block_id: int) -> List[int]:
+    """Seasons with yield records in ``block_id``, newest first."""
+    return query_cache.get_or_load(
+        "yield",
+        block_id,
+        lambda: list(
+            db.scalars(
+                select(VineYield.season)
+                .join(IndividualVine, IndividualVine.id == VineYield.vine_id)
+                .join(Row, Row.id == IndividualVine.row_id)
+                .where(
+                    Row.block_id == block_id,
+                    *partition_clause(
+                        IndividualVine, block_org(db.connection(), block_id)
+                    ),
+                )
+                .group_by(VineYield.season)
+                .order_by(VineYield.season.desc())
+            )
+        ),
+        "seasons",
+        store=_from_primary(db),
+    )
+
+
+def record_yields(
+    db: Session, block_id: int, season: int, records: Sequence[Mapping[str, Any]]
+) -> int:
+    """Insert or replace the ``season`` yields of vines in ``block_id``.
+
+    Raises ``ValueError`` naming any vine that is not in the block.
+    """
+    vine_ids = {record["vine_id"] for record in records}
+    in_partition = partition_clause(
+        IndividualVine, block_org(db.connection(), block_id)
+    )
+    known: Set[int] = set()
+    for chunk in _chunks(sorted(vine_ids)):
+        known.update(
+            db.scalars(
+                select(IndividualVine.id)
+                .join(Row, Row.id == IndividualVine.row_id)
+                .where(
+                    Row.block_id == block_id,
+                    IndividualVine.id.in_(chunk),
+                    *in_partition,
+                )
+            )
+        )
+    unknown = vine_ids - known
+    if unknown:
+        raise ValueError(f"Vines not in block {block_id}: {sorted(unknown)[:20]}")
+
+    values = [
+        {
+            "vine_id": record["vine_id"],
+            "season": season,
+            "yield_kg": record["yield_kg"],
+            "cluster_count": record.get("cluster_count"),
+            "recorded_on": record.get("recorded_on"),
+        }
+        for record in records
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(VineYield)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["vine_id", "season"],
+            set_={
+                "yield_kg": stmt.excluded.yield_kg,
+                "cluster_count": stmt.excluded.cluster_count,
+                "recorded_on": stmt.excluded.recorded_on,
+                "updated_at": func.now(),
+            },
+        )
+        db.execute(stmt, values)
+    else:
+        for value in values:
+            db.merge(VineYield(**value))
+    # Bulk statements bypass the mapper events below.
+    invalidate_after_commit(db, {("yield", block_id)})
+    db.commit()
+    return len(values)
+
+
+def _chunks(values: Sequence[Any], size: int = IN_CHUNK) -> Iterable[Sequence[Any]]:
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
+
+
+# Invalidation
+# ------------
+# Writes are collected per session; vines and yield records are resolved to
+# their block once per flush, and the blocks are invalidated on every worker
+# after commit so a concurrent read cannot cache the pre-commit state again.
+
+
+def _mark(target: Any, key: str, attr: str) -> None:
+    session = object_session(target)
+    if session is None:
+        return
+    marked = session.info.setdefault(key, set())
+    marked.add(getattr(target, attr))
+    for previous in inspect(target).attrs[attr].history.deleted or ():
+        if previous is not None:
+            marked.add(previous)
+
+
+def _row_changed(mapper, connection, target) -> None:
+    _mark(target, "yield_blocks", "block_id")
+
+
+def _vine_changed(mapper, connection, target) -> None:
+    _mark(target, "yield_rows", "row_id")
+
+
+def _vine_yield_changed(mapper, connection, target) -> None:
+    _mark(target, "yield_vines", "vine_id")
+
+
+def _after_flush(session: Session, flush_context) -> None:
+    vines = session.info.pop("yield_vines", None)
+    rows = session.info.pop("yield_rows", None) or set()
+    blocks = session.info.pop("yield_blocks", None) or set()
+    if not vines and not rows and not blocks:
+        return
+    connection = session.connection()
+    for chunk in _chunks(sorted(vines or ())):
+        rows.update(
+            connection.scalars(
+                select(IndividualVine.row_id).where(IndividualVine.id.in_(chunk))
+            )
+        )
+    for chunk in _chunks(sorted(rows)):
+        blocks.update(connection.scalars(select(Row.block_id).where(Row.id.in_(chunk))))
+    invalidate_after_commit(session, {("yield", block_id) for block_id in blocks})
+
+
+for _model, _listener in (
+    (Row, _row_changed),
+    (IndividualVine, _vine_changed),
+    (VineYield, _vine_yield_changed),
+):
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event_name, _listener)
+event.listen(Session, "after_flush", _after_flush)
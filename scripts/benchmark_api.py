@@ -0,0 +1,370 @@
+"""
+In-process API benchmark against a seeded synthetic estate.
+
+Seeds a fresh database (SQLite by default, Postgres via --database-url or
+BENCH_DATABASE_URL), then drives the location, listing, context, dashboard and analytics endpoints
+through the ASGI app with httpx - no network, no server process - and writes
+p50/p95/p99 latency and throughput per endpoint as JSON. With --wire-bytes
+each GET endpoint also reports the bytes on the wire of one response per
+content coding, and of its 304 revalidation.
+
+    python scripts/benchmark_api.py --scale 1k --requests 200 --output bench.json
+    python scripts/benchmark_api.py --scale 1k --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.api import deps  # noqa: E402
+from app.db import base as db_base  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.compression import available_encoders  # noqa: E402
+from app.services.cache import query_cache  # noqa: E402
+from app.services.dashboard import dashboard_aggregator  # noqa: E402
+from app.services.shared_geo import shared_geo  # noqa: E402
+from scripts.synthetic_estate import (  # noqa: E402
+    SCALES,
+    YIELD_SEASONS,
+    EstateGenerator,
+    seed,
+)
+
+# (HTTP method, httpx request kwargs)
+RequestSpec = Tuple[str, Dict]
+Scenario = Callable[[random.Random], RequestSpec]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def build_scenarios(generator: EstateGenerator) -> Dict[str, Scenario]:
+    """Request factories per endpoint, drawing targets from the seeded estate."""
+    properties = generator.properties
+    blocks = generator.blocks
+
+    def jitter(rng: random.Random, lat: float, lng: float) -> Tuple[float, float]:
+        return lat + rng.uniform(-0.0003, 0.0003), lng + rng.uniform(-0.0003, 0.0003)
+
+    def detect_location(rng):
+        block = rng.choice(blocks)
+        lat, lng = jitter(rng, block["center_latitude"], block["center_longitude"])
+        return "POST", {
+            "url": "/api/v1/mobile/detect-location",
+            "json": {"latitude": lat, "longitude": lng, "accuracy_meters": 5},
+        }
+
+    def nearby_locations(rng):
+        block = rng.choice(blocks)
+        lat, lng = jitter(rng, block["center_latitude"], block["center_longitude"])
+        return "GET", {
+            "url": "/api/v1/mobile/nearby-locations",
+            "params": {"latitude": lat, "longitude": lng, "radius_meters": 1000},
+        }
+
+    def list_properties(rng):
+        return "GET", {
+            "url": f"/api/v1/properties/{rng.choice(properties)['org_id']}/properties"
+        }
+
+    def list_blocks(rng):
+        return "GET", {"url": f"/api/v1/blocks/{rng.choice(properties)['id']}/blocks"}
+
+    def list_organizations(rng):
+        return "GET", {"url": "/api/v1/organizations/"}
+
+    def organization_context(rng):
+        return "GET", {
+            "url": f"/api/v1/organizations/{rng.choice(properties)['org_id']}/context"
+        }
+
+    def property_context(rng):
+        prop = rng.choice(properties)
+        return "GET", {
+            "url": f"/api/v1/properties/{prop['org_id']}/properties/{prop['id']}/context"
+        }
+
+    def block_context(rng):
+        block = rng.choice(blocks)
+        return "GET", {
+            "url": f"/api/v1/blocks/{block['property_id']}/blocks/{block['id']}/context"
+        }
+
+    def block_yield(rng):
+        block = rng.choice(blocks)
+        season = rng.choice([None, *YIELD_SEASONS])
+        return "GET", {
+            "url": f"/api/v1/analytics/blocks/{block['id']}/yield",
+            "params": {"season": season} if season else {},
+        }
+
+    def organization_dashboard(rng):
+        return "GET", {
+            "url": f"/api/v1/organizations/{rng.choice(properties)['org_id']}/dashboard"
+        }
+
+    def block_activities(rng):
+        return "GET", {
+            "url": "/api/v1/activities/",
+            "params": {"block_id": rng.choice(blocks)["id"], "limit": 20},
+        }
+
+    def property_activity_summary(rng):
+        return "GET", {
+            "url": "/api/v1/activities/summary",
+            "params": {"property_id": rng.choice(properties)["id"]},
+        }
+
+    return {
+        "detect_location": detect_location,
+        "nearby_locations": nearby_locations,
+        "list_properties": list_properties,
+        "list_blocks": list_blocks,
+        "list_organizations": list_organizations,
+        "organization_context": organization_context,
+        "property_context": property_context,
+        "block_context": block_context,
+        "block_yield": block_yield,
+        "organization_dashboard": organization_dashboard,
+        "block_activities": block_activities,
+        "property_activity_summary": property_activity_summary,
+    }
+
+
+def bind_app(engine: Engine) -> None:
+    """Point every database dependency of the app at the benchmark engine."""
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[deps.get_db] = get_db
+    app.dependency_overrides[deps.get_read_db] = get_db
+    app.dependency_overrides[db_base.get_db] = get_db
+    # Fresh location data and dashboard aggregates for the seeded database
+    shared_geo.reset(tempfile.mkdtemp(prefix="bench-geo-"))
+    with session_factory() as db:
+        dashboard_aggregator.refresh(db)
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    seed: int,
+) -> Dict:
+    rng = random.Random(seed)
+    specs = [scenario(rng) for _ in range(warmup + requests)]
+    for method, kwargs in specs[:warmup]:
+        await client.request(method, **kwargs)
+
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(method: str, kwargs: Dict) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400 and response.status_code != 404:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(method, kwargs) for method, kwargs in specs[warmup:]))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "throughput_rps": round(requests / wall, 1) if wall else 0.0,
+    }
+
+
+async def measure_wire_bytes(
+    client: httpx.AsyncClient, scenario: Scenario, seed: int
+) -> Dict[str, int]:
+    """Bytes downloaded for one request, uncompressed, per coding and as a 304."""
+    method, kwargs = scenario(random.Random(seed))
+    sizes: Dict[str, int] = {}
+    etag = None
+    for coding in ["identity", *available_encoders()]:
+        response = await client.request(
+            method, **kwargs, headers={"Accept-Encoding": coding}
+        )
+        sizes[coding] = response.num_bytes_downloaded
+        etag = etag or response.headers.get("etag")
+    if etag:
+        response = await client.request(
+            method, **kwargs, headers={"If-None-Match": etag}
+        )
+        if response.status_code == 304:
+            sizes["not_modified"] = response.num_bytes_downloaded
+    return sizes
+
+
+async def run_benchmark(
+    engine: Engine,
+    scale_name: str,
+    requests: int = 100,
+    concurrency: int = 1,
+    warmup: int = 10,
+    seed_value: int = 42,
+    endpoints: Optional[List[str]] = None,
+    wire_bytes: bool = False,
+) -> Dict:
+    """Seed ``engine`` at ``scale_name`` and benchmark the selected endpoints."""
+    scale = SCALES[scale_name]
+    db_base.Base.metadata.drop_all(bind=engine)
+    db_base.Base.metadata.create_all(bind=engine)
+    seed_started = time.perf_counter()
+    counts = seed(engine, scale, seed_value)
+    seed_seconds = time.perf_counter() - seed_started
+
+    # Rebuild the generator to get the same coordinates without re-querying.
+    generator = EstateGenerator(scale, seed_value)
+    for _ in generator.property_rows():
+        pass
+    for _ in generator.block_rows():
+        pass
+
+    bind_app(engine)
+    query_cache.clear()
+    scenarios = build_scenarios(generator)
+    selected = endpoints or list(scenarios)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for name in selected:
+            results[name] = await run_scenario(
+                client, scenarios[name], requests, concurrency, warmup, seed_value
+            )
+            if wire_bytes and scenarios[name](random.Random(seed_value))[0] == "GET":
+                results[name]["wire_bytes"] = await measure_wire_bytes(
+                    client, scenarios[name], seed_value
+                )
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "scale": scale_name,
+            "seed": seed_value,
+            "database": engine.dialect.name,
+            "requests_per_endpoint": requests,
+            "concurrency": concurrency,
+            "cache_enabled": query_cache.enabled,
+            "python": platform.python_version(),
+            "seed_seconds": round(seed_seconds, 2),
+            "rows": counts,
+        },
+        "endpoints": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Endpoints whose p95 regressed by more than ``tolerance`` (a ratio)."""
+    regressions = []
+    for name, stats in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before or not before["p95_ms"]:
+            continue
+        ratio = stats["p95_ms"] / before["p95_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']}ms -> {stats['p95_ms']}ms ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="In-process API benchmark")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--endpoint", action="append", dest="endpoints")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"))
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--wire-bytes", action="store_true", help="also measure response sizes"
+    )
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix="vigneron-bench-"), "bench.db")
+        engine = create_engine(
+            f"sqlite:///{path}", connect_args={"check_same_thread": False}
+        )
+    query_cache.enabled = not args.no_cache
+
+    report = asyncio.run(
+        run_benchmark(
+            engine,
+            args.scale,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            warmup=args.warmup,
+            seed_value=args.seed,
+            endpoints=args.endpoints,
+            wire_bytes=args.wire_bytes,
+        )
+    )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Payload size and encode time of the geometry output formats.
+
+Generates synthetic tractor-style GPS tracks (back-and-forth passes along
+vine rows with GPS jitter), then times simplification + encoding for each
+format and zoom level and reports raw and gzip'd JSON payload sizes.
+
+    python scripts/benchmark_geometry.py --points 10000 --output geometry.json
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from app.services.geometry import GeometryOptions, Point  # noqa: E402
+from scripts.synthetic_estate import METERS_PER_DEG_LAT, ORIGIN  # noqa: E402
+
+ZOOMS: List[Optional[float]] = [None, 20, 17, 14]
+
+
+def synthetic_track(points: int, seed: int = 42) -> List[Point]:
+    """Rows 100 m long, 2.5 m apart, one fix every ~0.5 m with ~0.3 m noise."""
+    rng = random.Random(seed)
+    lat0, lng0 = ORIGIN
+    meters_per_deg_lng = METERS_PER_DEG_LAT * math.cos(math.radians(lat0))
+    per_pass = 200
+    track = []
+    for i in range(points):
+        row, step = divmod(i, per_pass)
+        east = step * 0.5 if row % 2 == 0 else (per_pass - step) * 0.5
+        north = row * 2.5
+        track.append(
+            (
+                lat0 + (north + rng.gauss(0, 0.3)) / METERS_PER_DEG_LAT,
+                lng0 + (east + rng.gauss(0, 0.3)) / meters_per_deg_lng,
+            )
+        )
+    return track
+
+
+def measure(track: List[Point], options: GeometryOptions, repeat: int) -> Dict:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        encoded = options.encode(track)
+    elapsed = (time.perf_counter() - started) / repeat
+    body = json.dumps(encoded, separators=(",", ":")).encode()
+    return {
+        "format": options.format,
+        "simplify": options.simplify if options.zoom is not None else "none",
+        "zoom": options.zoom,
+        "points_out": encoded["count"],
+        "bytes": len(body),
+        "gzip_bytes": len(gzip.compress(body)),
+        "encode_ms": round(elapsed * 1000, 3),
+    }
+
+
+def run(points: int, repeat: int, seed: int) -> Dict:
+    track = synthetic_track(points, seed)
+    results = []
+    for simplifier in ("dp", "vw"):
+        for zoom in ZOOMS:
+            if zoom is None and simplifier == "vw":
+                continue
+            for fmt in ("json", "polyline", "delta"):
+                options = GeometryOptions(format=fmt, zoom=zoom, simplify=simplifier)
+                results.append(measure(track, options, repeat))
+    return {"points_in": points, "seed": seed, "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Geometry encoding benchmark")
+    parser.add_argument("--points", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    report = run(args.points, args.repeat, args.seed)
+    print(
+        f"{'format':<9}{'simplify':<9}{'zoom':>5}{'points':>8}"
+        f"{'bytes':>10}{'gzip':>9}{'ms':>9}"
+    )
+    for r in report["results"]:
+        print(
+            f"{r['format']:<9}{r['simplify']:<9}{str(r['zoom']):>5}"
+            f"{r['points_out']:>8}{r['bytes']:>10}{r['gzip_bytes']:>9}"
+            f"{r['encode_ms']:>9}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
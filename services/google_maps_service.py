@@ -2,6 +2,8 @@
 from typing import Dict, List, Optional, Tuple
 import math
 
+from app.services.geometry import GeometryOptions
+
 class GoogleMapsService:
     """Helper service for Google Maps integration"""
     
@@ -64,9 +66,17 @@ class GoogleMapsService:
             return 18
     
     @staticmethod
-    def format_for_google_maps_js(properties: list, blocks: list) -> Dict:
-        """Format property and block data for Google Maps JavaScript API"""
+    def format_for_google_maps_js(properties: list, blocks: list,
+                                  tracks: Optional[Dict[str, List[Tuple[float, float]]]] = None,
+                                  geometry: Optional[GeometryOptions] = None) -> Dict:
+        """Format property and block data for Google Maps JavaScript API
+
+        Track lines are simplified and encoded per ``geometry`` (an encoded
+        polyline by default, which ``google.maps.geometry.encoding.decodePath``
+        reads directly).
+        """
         markers = []
+        geometry = geometry or GeometryOptions(format="polyline")
         
         # Add property markers
         for prop in properties:
@@ -134,6 +144,18 @@ class GoogleMapsService:
                         }
                     })
         
+        # Add GPS trails as polylines
+        for track_id, points in (tracks or {}).items():
+            if len(points) > 1:
+                markers.append({
+                    "id": f"track_{track_id}",
+                    "type": "track",
+                    "path": geometry.encode(points),
+                    "strokeColor": "#2196F3",
+                    "strokeOpacity": 0.9,
+                    "strokeWeight": 3
+                })
+        
         # Calculate bounds for all markers
         positions = [marker["position"] for marker in markers if "position" in marker]
         bounds = GoogleMapsService.bounds_for_locations(
@@ -55,6 +55,34 @@ def db_session(db_engine):
     connection.close()
 
 
+@pytest.fixture
+def sqlite_session_factory():
+    """Build in-memory SQLite databases for unit tests.
+
+    Call the fixture with the models whose tables to create and an optional
+    ``seed(db)`` that adds rows; the seed is committed and a ``sessionmaker``
+    bound to the database is returned.
+    """
+    engines = []
+
+    def make(models, seed=None):
+        engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        engines.append(engine)
+        Base.metadata.create_all(engine, tables=[model.__table__ for model in models])
+        session_factory = sessionmaker(bind=engine)
+        if seed is not None:
+            with session_factory() as db:
+                seed(db)
+                db.commit()
+        return session_factory
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
 @pytest.fixture(scope="module")
 def client():
     """Create test client."""
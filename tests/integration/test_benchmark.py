@@ -0,0 +1,41 @@
+"""
+Smoke test for the in-process API benchmark harness.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from app.main import app
+from scripts.benchmark_api import percentile, run_benchmark
+
+
+def test_percentile_nearest_rank():
+    """Test nearest-rank percentiles."""
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 50) == 0.0
+
+
+@pytest.mark.slow
+@pytest.mark.integration
+def test_benchmark_runs_against_sqlite():
+    """Test that the smallest scale seeds and every endpoint succeeds."""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    overrides = dict(app.dependency_overrides)
+    try:
+        report = asyncio.run(run_benchmark(engine, "10", requests=3, warmup=1))
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(overrides)
+
+    assert report["meta"]["rows"]["vines"] == 10
+    for name, stats in report["endpoints"].items():
+        assert stats["errors"] == 0, name
+        assert stats["p50_ms"] <= stats["p99_ms"]
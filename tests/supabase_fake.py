@@ -0,0 +1,105 @@
+"""
+Local stand-in for Supabase's REST API in data client tests.
+
+An ASGI app serving ``GET /rest/v1/<table>`` from in-memory rows with the
+subset of PostgREST the client uses: ``select``, ``eq.`` and ``in.(...)``
+filters, ``order`` and ``limit``. It records every request and can hold
+each one for a while, so tests can see how many requests concurrent
+callers produced.
+"""
+import asyncio
+import json
+from typing import Any, Dict, List
+from urllib.parse import parse_qsl
+
+import httpx
+
+
+def _in_values(operand: str) -> List[str]:
+    """Values of an ``(a,"b,c",d)`` list."""
+    values, current, quoted, escaped = [], "", False, False
+    for char in operand[1:-1]:
+        if escaped:
+            current += char
+            escaped = False
+        elif char == "\\" and quoted:
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == "," and not quoted:
+            values.append(current)
+            current = ""
+        else:
+            current += char
+    values.append(current)
+    return values
+
+
+class FakeSupabase:
+    """In-memory PostgREST tables; see module docstring."""
+
+    def __init__(self, tables: Dict[str, List[Dict[str, Any]]], delay: float = 0.0):
+        self.tables = tables
+        self.delay = delay
+        self.requests: List[Dict[str, Any]] = []
+
+    @property
+    def transport(self) -> httpx.ASGITransport:
+        return httpx.ASGITransport(app=self)
+
+    def _rows(self, table: str, params: List) -> List[Dict[str, Any]]:
+        rows = self.tables[table]
+        columns, order, limit = None, None, None
+        for name, value in params:
+            if name == "select":
+                columns = None if value == "*" else value.split(",")
+            elif name == "order":
+                order = value
+            elif name == "limit":
+                limit = int(value)
+            else:
+                op, _, operand = value.partition(".")
+                if op == "eq":
+                    rows = [r for r in rows if str(r.get(name)) == operand]
+                elif op == "in":
+                    allowed = set(_in_values(operand))
+                    rows = [r for r in rows if str(r.get(name)) in allowed]
+                else:
+                    raise ValueError(f"unsupported operator {op}")
+        if order:
+            column, _, direction = order.partition(".")
+            rows = sorted(rows, key=lambda r: r[column], reverse=direction == "desc")
+        if limit is not None:
+            rows = rows[:limit]
+        if columns:
+            rows = [{c: r.get(c) for c in columns} for r in rows]
+        return rows
+
+    async def __call__(self, scope, receive, send) -> None:
+        assert scope["type"] == "http"
+        headers = {k.decode(): v.decode() for k, v in scope["headers"]}
+        params = parse_qsl(scope["query_string"].decode(), keep_blank_values=True)
+        table = scope["path"].rsplit("/", 1)[-1]
+        self.requests.append(
+            {"path": scope["path"], "params": params, "headers": headers}
+        )
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        if "apikey" not in headers:
+            status, body = 401, {"message": "No API key found in request"}
+        elif table not in self.tables:
+            status, body = 404, {"message": f'relation "{table}" does not exist'}
+        else:
+            try:
+                status, body = 200, self._rows(table, params)
+            except (KeyError, ValueError) as e:
+                status, body = 400, {"message": str(e)}
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": json.dumps(body).encode()})
@@ -0,0 +1,199 @@
+"""
+Unit tests for activity timelines and type summaries.
+"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.models import Activity, ActivityTypeRollup, Block, Property, User
+from app.services import activity_log
+
+START = date(2025, 3, 30)
+
+
+MODELS = (Property, Block, User, Activity, ActivityTypeRollup)
+
+
+def _seed(db):
+    db.add_all(
+        [
+            Property(id=1, org_id=1, property_name="Upper", property_type="farm"),
+            Property(id=2, org_id=1, property_name="Lower", property_type="farm"),
+            Block(id=10, property_id=1, block_name="A", crop_type="grape"),
+            Block(id=11, property_id=1, block_name="B", crop_type="grape"),
+            Block(id=20, property_id=2, block_name="C", crop_type="grape"),
+            User(id=1, org_id=1, email="a@x.test", first_name="A", last_name="A"),
+            User(id=2, org_id=1, email="b@x.test", first_name="B", last_name="B"),
+        ]
+    )
+    # Three activities a day (same date, different ids) across a month end.
+    for i in range(1, 13):
+        db.add(
+            Activity(
+                id=i,
+                block_id=(10, 11, 20)[i % 3],
+                user_id=1 + i % 2,
+                activity_type=("pruning", "spraying")[i % 2],
+                activity_date=START + timedelta(days=(i - 1) // 3),
+                title=f"Activity {i}",
+                cost=10,
+                labor_hours=1.5,
+            )
+        )
+
+
+@pytest.fixture
+def session_factory(sqlite_session_factory):
+    return sqlite_session_factory(MODELS, _seed)
+
+
+def _rollups(db):
+    return {
+        (r.block_id, r.month, r.user_id, r.activity_type): (
+            r.activity_count,
+            float(r.total_cost),
+            float(r.total_labor_hours),
+        )
+        for r in db.scalars(select(ActivityTypeRollup))
+        if r.activity_count
+    }
+
+
+class TestActivityLog:
+    """Test activity log functions."""
+
+    def test_cursor_pages_cover_timeline_once(self, session_factory):
+        """Test that cursor pages are newest first, without gaps or overlap across equal dates."""
+        with session_factory() as db:
+            seen, cursor = [], None
+            while True:
+                page = activity_log.timeline(db, cursor=cursor, limit=5)
+                seen.extend(page["items"])
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+
+        assert [a.id for a in seen] == list(range(12, 0, -1))
+        assert len(set(a.id for a in seen)) == 12
+
+    def test_timeline_filters(self, session_factory):
+        """Test that block, user, property, type and date filters narrow the timeline."""
+        with session_factory() as db:
+            by_block = activity_log.timeline(db, block_id=10)["items"]
+            by_property = activity_log.timeline(db, property_id=1)["items"]
+            narrowed = activity_log.timeline(
+                db,
+                user_id=2,
+                activity_types=["spraying"],
+                since=START + timedelta(days=1),
+                until=START + timedelta(days=2),
+            )
+
+        assert [a.id for a in by_block] == [12, 9, 6, 3]
+        assert {a.block_id for a in by_property} == {10, 11}
+        assert len(by_property) == 8
+        assert [a.id for a in narrowed["items"]] == [9, 7, 5]
+        assert narrowed["next_cursor"] is None
+
+    def test_invalid_cursor(self, session_factory):
+        """Test that a cursor not produced by the service raises ValueError."""
+        with session_factory() as db:
+            with pytest.raises(ValueError):
+                activity_log.timeline(db, cursor="not-a-cursor")
+
+    def test_summary_by_month(self, session_factory):
+        """Test that type summaries come from the rollup and select whole months."""
+        with session_factory() as db:
+            everything = activity_log.type_summary(db)
+            april = activity_log.type_summary(db, since=date(2025, 4, 20))
+            block = activity_log.type_summary(db, block_id=20, user_id=2)
+
+        assert everything["total"] == 12
+        assert everything["by_type"]["pruning"] == {
+            "count": 6,
+            "total_cost": 60.0,
+            "total_labor_hours": 9.0,
+        }
+        # Days 1-2 fall in March (ids 1-6), the rest in April.
+        assert april["since_month"] == "2025-04-01"
+        assert april["total"] == 6
+        assert block["by_type"] == {
+            "spraying": {"count": 2, "total_cost": 20.0, "total_labor_hours": 3.0}
+        }
+
+    def test_rollup_follows_orm_writes(self, session_factory):
+        """Test that inserts, updates and deletes keep the rollup equal to a rebuild."""
+        with session_factory() as db:
+            moved = db.get(Activity, 1)
+            moved.activity_type = "harvest"
+            moved.activity_date = date(2025, 5, 2)
+            db.get(Activity, 2).cost = 25
+            db.delete(db.get(Activity, 3))
+            db.add(
+                Activity(
+                    id=13,
+                    block_id=10,
+                    user_id=1,
+                    activity_type="harvest",
+                    activity_date=date(2025, 5, 3),
+                    title="Pick",
+                )
+            )
+            db.commit()
+            maintained = _rollups(db)
+            summary = activity_log.type_summary(db, since=date(2025, 5, 1))
+
+            assert activity_log.rebuild_rollups(db.connection()) == len(maintained)
+            db.commit()
+            assert _rollups(db) == maintained
+
+        assert summary["by_type"]["harvest"]["count"] == 2
+        assert maintained[(10, date(2025, 5, 1), 1, "harvest")] == (1, 0.0, 0.0)
+
+    def test_bulk_log_deduplicates_retries(self, session_factory):
+        """Test that a retried batch inserts nothing twice and reports the stored ids."""
+
+        def item(key, block_id=10, user_id=1):
+            return {
+                "client_key": key,
+                "block_id": block_id,
+                "user_id": user_id,
+                "activity_type": "harvest",
+                "activity_date": date(2025, 9, 1),
+                "title": "Pick",
+                "cost": 5,
+                "labor_hours": 2,
+            }
+
+        batch = [item("k1"), item("k2"), item("k1"), item("k3", block_id=99)]
+        with session_factory() as db:
+            first = activity_log.log_activities(db, batch)
+            retry = activity_log.log_activities(db, batch + [item("k1", user_id=2)])
+            stored = db.scalars(
+                select(Activity.client_key).where(Activity.client_key.is_not(None))
+            ).all()
+            summary = activity_log.type_summary(db, since=date(2025, 9, 1))
+
+        assert [r["status"] for r in first] == [
+            "created",
+            "created",
+            "duplicate",
+            "rejected",
+        ]
+        assert first[2]["id"] == first[0]["id"]
+        assert "99" in first[3]["detail"]
+        assert [r["status"] for r in retry] == [
+            "duplicate",
+            "duplicate",
+            "duplicate",
+            "rejected",
+            "created",
+        ]
+        assert [r["id"] for r in retry[:2]] == [r["id"] for r in first[:2]]
+        assert sorted(stored) == ["k1", "k1", "k2"]
+        assert summary["by_type"]["harvest"] == {
+            "count": 3,
+            "total_cost": 15.0,
+            "total_labor_hours": 6.0,
+        }
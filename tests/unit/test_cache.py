@@ -0,0 +1,132 @@
+"""
+Unit tests for the hierarchy read cache.
+"""
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models import Property
+from app.services.cache import (
+    MAX_NOTIFY_BYTES,
+    InvalidationBridge,
+    LocalSharedBackend,
+    LRUCache,
+    QueryCache,
+)
+from app.services.hierarchy_service import PENDING, HierarchyService
+
+
+class TestLRUCache:
+    """Test LRUCache class."""
+
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest untouched entry is evicted first."""
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert len(cache) == 2
+        assert cache.evictions == 1
+
+
+class TestQueryCache:
+    """Test QueryCache class."""
+
+    def test_read_through_counts_hits_and_misses(self):
+        """Test that the loader only runs on a miss."""
+        cache = QueryCache(max_entries=10)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return ("p1", "p2")
+
+        assert cache.get_or_load("property", 1, loader) == ("p1", "p2")
+        assert cache.get_or_load("property", 1, loader) == ("p1", "p2")
+        assert len(calls) == 1
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_invalidate_is_scoped_to_tenant(self):
+        """Test that invalidation only affects one (entity, tenant) namespace."""
+        cache = QueryCache(max_entries=10)
+        cache.get_or_load("block", 1, lambda: "old-1")
+        cache.get_or_load("block", 2, lambda: "old-2")
+
+        cache.invalidate("block", 1)
+
+        assert cache.get_or_load("block", 1, lambda: "new-1") == "new-1"
+        assert cache.get_or_load("block", 2, lambda: "new-2") == "old-2"
+
+    def test_disabled_cache_always_loads(self):
+        """Test that a disabled cache is a pass-through."""
+        cache = QueryCache(enabled=False)
+        cache.get_or_load("row", 1, lambda: 1)
+        assert cache.get_or_load("row", 1, lambda: 2) == 2
+
+    def test_shared_backend_propagates_invalidation(self):
+        """Test that two workers sharing a backend see each other's invalidations."""
+        shared = LocalSharedBackend()
+        worker_a = QueryCache(shared=shared)
+        worker_b = QueryCache(shared=shared)
+
+        worker_a.get_or_load("property", 7, lambda: "v1")
+        assert worker_b.get_or_load("property", 7, lambda: "unused") == "v1"
+        assert worker_b.stats()["shared_hits"] == 1
+
+        worker_b.invalidate("property", 7)
+        assert worker_a.get_or_load("property", 7, lambda: "v2") == "v2"
+
+    def test_bridge_carries_invalidations_between_workers(self):
+        """Test that announced namespaces invalidate another worker's cache."""
+        worker_b = QueryCache()
+        bridge = InvalidationBridge(worker_b)
+        keys = {("block", n) for n in range(2000)} | {("property", "*")}
+
+        payloads = list(bridge._payloads(keys))
+        for payload in payloads:
+            bridge.receive(payload)
+
+        assert len(payloads) > 1
+        assert all(len(payload) <= MAX_NOTIFY_BYTES for payload in payloads)
+        assert worker_b.generation("block", 1999) == 1
+        assert worker_b.generation("property", "*") == 1
+        assert bridge.received == len(keys)
+        assert not InvalidationBridge(QueryCache(shared=LocalSharedBackend())).wanted
+
+
+class TestHierarchyInvalidation:
+    """Test invalidation of cached hierarchy reads by ORM writes."""
+
+    def test_reads_are_refreshed_after_commit(self, tmp_path):
+        """Test that a read racing an uncommitted write does not outlive the commit."""
+        engine = create_engine(f"sqlite:///{tmp_path / 'hierarchy.db'}")
+        Base.metadata.create_all(engine, tables=[Property.__table__])
+        session_factory = sessionmaker(bind=engine)
+        org_id = 9001
+
+        def names():
+            with session_factory() as reader:
+                properties = HierarchyService.get_properties(reader, org_id)
+                return [p.property_name for p in properties]
+
+        with session_factory() as writer:
+            writer.add(
+                Property(org_id=org_id, property_name="Upper", property_type="farm")
+            )
+            writer.flush()
+            assert names() == []
+            writer.commit()
+            assert names() == ["Upper"]
+
+            writer.add(
+                Property(org_id=org_id, property_name="Lower", property_type="farm")
+            )
+            writer.flush()
+            writer.rollback()
+            assert PENDING not in writer.info
+        assert names() == ["Upper"]
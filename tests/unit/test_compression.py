@@ -0,0 +1,202 @@
+"""
+Unit tests for response compression and conditional GET.
+"""
+import gzip
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, delete, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.api.conditional import (
+    entity_etag,
+    etag_matches,
+    make_etag,
+    not_modified,
+    set_etag,
+)
+from app.middleware.compression import CompressionMiddleware, negotiate
+from app.models import Property
+from app.services.cache import query_cache
+from app.services.hierarchy_service import HierarchyService
+
+PAYLOAD = {"rows": [{"id": i, "name": f"Row {i}"} for i in range(200)]}
+ETAG = make_etag("rows", 1)
+
+
+def _client(**options):
+    app = FastAPI()
+
+    @app.get("/rows")
+    def rows(request: Request, response: Response):
+        if etag_matches(request, ETAG):
+            return not_modified(ETAG)
+        set_etag(response, ETAG)
+        return PAYLOAD
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(
+            (f"line {i}\n" * 50 for i in range(5)), media_type="text/plain"
+        )
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(
+            iter(["data: x\n\n" * 200]), media_type="text/event-stream"
+        )
+
+    app.add_middleware(CompressionMiddleware, **options)
+    return TestClient(app)
+
+
+class TestNegotiate:
+    """Test content coding negotiation."""
+
+    def test_q_values_and_server_preference(self):
+        """Test that the highest q-value wins and ties go to the server order."""
+        offered = ["zstd", "br", "gzip"]
+        assert negotiate("gzip, br", offered) == "br"
+        assert negotiate("br;q=0.5, gzip", offered) == "gzip"
+        assert negotiate("*;q=0.1, gzip;q=0", offered) == "zstd"
+        assert negotiate("identity", offered) is None
+        assert negotiate("", offered) is None
+
+
+class TestCompressionMiddleware:
+    """Test CompressionMiddleware class."""
+
+    def test_large_json_is_gzipped_with_coded_etag(self):
+        """Test that a large JSON body is gzipped and its ETag marks the coding."""
+        client = _client(minimum_size=500)
+        response = client.get("/rows", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert response.headers["etag"] == ETAG[:-1] + '-gzip"'
+        assert int(response.headers["content-length"]) == response.num_bytes_downloaded
+        assert response.num_bytes_downloaded < len(response.content) / 4
+        assert response.json() == PAYLOAD
+
+    def test_small_and_unaccepted_responses_pass_through(self):
+        """Test that small bodies and identity-only clients are not compressed."""
+        client = _client(minimum_size=500)
+
+        small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+        identity = client.get("/rows", headers={"Accept-Encoding": "identity"})
+
+        assert "content-encoding" not in small.headers
+        assert "content-encoding" not in identity.headers
+        assert identity.headers["etag"] == ETAG
+
+    def test_streaming_is_compressed_per_chunk(self):
+        """Test that streamed bodies are compressed without a Content-Length."""
+        client = _client(minimum_size=500)
+        response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert response.text == "".join(f"line {i}\n" * 50 for i in range(5))
+
+    def test_event_streams_are_never_compressed(self):
+        """Test that server-sent events pass through unencoded."""
+        client = _client(minimum_size=10)
+        response = client.get("/events", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+
+
+class TestConditionalGet:
+    """Test ETag revalidation."""
+
+    def test_matching_etag_gets_304(self):
+        """Test that plain, coded and weak forms of the ETag all revalidate."""
+        client = _client(minimum_size=500)
+        coded = client.get("/rows", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+
+        for tag in (ETAG, coded, f"W/{coded}", f'"other", {ETAG}'):
+            response = client.get("/rows", headers={"If-None-Match": tag})
+            assert response.status_code == 304
+            assert response.content == b""
+        assert client.get("/rows", headers={"If-None-Match": '"other"'}).json() == (
+            PAYLOAD
+        )
+
+    def test_entity_etag_changes_within_one_timestamp_tick(self, tmp_path):
+        """Test that writes keeping max(updated_at) and the count still change the ETag."""
+        engine = create_engine(f"sqlite:///{tmp_path / 'etag.db'}")
+        Property.__table__.create(engine)
+        tick = datetime(2024, 6, 1, 8, 0, tzinfo=timezone.utc)
+        row = {"org_id": 7, "property_type": "farm", "updated_at": tick}
+
+        with sessionmaker(bind=engine)() as db:
+
+            def etag():
+                return entity_etag(
+                    db, Property, Property.org_id == 7, namespace=("property", 7)
+                )
+
+            db.add_all([Property(id=i, property_name=f"P{i}", **row) for i in (1, 2)])
+            db.commit()
+            first = etag()
+            assert etag() == first
+
+            # An update that does not move max(updated_at).
+            renamed = db.get(Property, 1)
+            renamed.property_name = "Renamed"
+            renamed.updated_at = tick - timedelta(seconds=1)
+            db.commit()
+            second = etag()
+
+            # Outside the ORM: no cache invalidation, same count and timestamp.
+            db.execute(delete(Property.__table__).where(Property.id == 2))
+            db.execute(
+                insert(Property.__table__).values(id=3, property_name="P3", **row)
+            )
+            db.commit()
+
+            assert len({first, second, etag()}) == 3
+
+    def test_cached_body_follows_the_etag(self, tmp_path):
+        """Test that a write the local cache missed is not served under the new ETag."""
+        engine = create_engine(f"sqlite:///{tmp_path / 'etag.db'}")
+        Property.__table__.create(engine)
+        row = {"org_id": 7, "property_type": "farm"}
+
+        with sessionmaker(bind=engine)() as db:
+
+            def read():
+                etag = entity_etag(
+                    db, Property, Property.org_id == 7, namespace=("property", 7)
+                )
+                properties = HierarchyService.get_properties(db, 7, version=etag)
+                return sorted(p.property_name for p in properties)
+
+            db.add(Property(id=1, property_name="P1", **row))
+            db.commit()
+            try:
+                assert read() == ["P1"]
+                # Another worker's write: this worker's cache is not invalidated.
+                db.execute(
+                    insert(Property.__table__).values(id=2, property_name="P2", **row)
+                )
+                db.commit()
+                assert read() == ["P1", "P2"]
+            finally:
+                query_cache.clear()
+
+    def test_gzip_body_decodes(self):
+        """Test that the compressed body is a valid gzip member."""
+        client = _client(minimum_size=500)
+        with client.stream(
+            "GET", "/rows", headers={"Accept-Encoding": "gzip"}
+        ) as response:
+            raw = b"".join(response.iter_raw())
+
+        assert gzip.decompress(raw).startswith(b'{"rows":')
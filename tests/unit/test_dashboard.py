@@ -0,0 +1,180 @@
+"""
+Unit tests for the scheduled dashboard aggregates.
+"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models import (
+    Activity,
+    ActivityTypeRollup,
+    Block,
+    CropSpecificData,
+    DashboardAggregate,
+    Organization,
+    Property,
+)
+from app.services.dashboard import DashboardAggregator, compute, read_dashboard
+from app.services.leader_lock import LeaderLock
+
+TODAY = date.today()
+
+
+MODELS = (
+    Organization,
+    Property,
+    Block,
+    Activity,
+    ActivityTypeRollup,
+    CropSpecificData,
+    DashboardAggregate,
+)
+
+
+def _seed(db):
+    db.add_all(
+        [
+            Organization(
+                id=1,
+                org_name="Finca",
+                org_type="coffee_estate",
+                agricultural_profile={"crops": ["coffee"]},
+            ),
+            Organization(id=2, org_name="Orchard", org_type="orchard"),
+            Property(
+                id=10,
+                org_id=1,
+                property_name="Upper",
+                property_type="coffee_estate",
+                primary_crops=["coffee"],
+            ),
+            Property(id=11, org_id=1, property_name="Lower", property_type="farm"),
+            Block(id=100, property_id=10, block_name="A", crop_type="coffee"),
+            Block(id=101, property_id=11, block_name="B", crop_type="coffee"),
+        ]
+    )
+    for i, (block_id, kind, days_ago, done) in enumerate(
+        [
+            (100, "harvest", 1, True),
+            (100, "pruning", 2, True),
+            (101, "harvest", -5, False),
+            (101, "pruning", 90, True),  # outside the window
+            (100, "spraying", 120, False),  # old but still open
+        ],
+        start=1,
+    ):
+        db.add(
+            Activity(
+                id=i,
+                block_id=block_id,
+                user_id=1,
+                activity_type=kind,
+                activity_date=TODAY - timedelta(days=days_ago),
+                title=kind.title(),
+                is_completed=done,
+                cost=10,
+            )
+        )
+    for i, (block_id, value, days_ago) in enumerate(
+        [(100, 25.0, 1), (100, 30.0, 3), (101, 20.0, 1)], start=1
+    ):
+        db.add(
+            CropSpecificData(
+                id=i,
+                block_id=block_id,
+                user_id=1,
+                data_type="quality_metric",
+                measurement_name="cherry_moisture",
+                measurement_value=value,
+                measurement_units="%",
+                measurement_date=TODAY - timedelta(days=days_ago),
+            )
+        )
+
+
+@pytest.fixture
+def session_factory(sqlite_session_factory):
+    return sqlite_session_factory(MODELS, _seed)
+
+
+def _widgets(dashboard):
+    return {widget["type"]: widget["data"] for widget in dashboard["widgets"]}
+
+
+class TestDashboardAggregates:
+    """Test dashboard aggregation functions."""
+
+    def test_compute_per_scope(self, session_factory):
+        """Test that widgets are computed for organizations and properties from their own facts."""
+        with session_factory() as db:
+            rows = compute(db, TODAY)
+
+        by_scope = {(r["org_id"], r["property_id"], r["widget"]): r for r in rows}
+        assert set(by_scope) == {
+            (1, 0, "weather"),
+            (1, 0, "recent_activities"),
+            (1, 0, "cherry_moisture"),
+            (2, 0, "weather"),
+            (2, 0, "recent_activities"),
+            (1, 10, "weather_station"),
+            (1, 10, "cherry_moisture_alerts"),
+            (1, 11, "weather_station"),
+        }
+        recent = by_scope[(1, 0, "recent_activities")]["data"]
+        assert [item["id"] for item in recent["items"]] == [1, 2]
+        assert recent["counts_by_type"] == {"harvest": 1, "pruning": 1}
+        assert recent["open"] == 2
+        assert by_scope[(1, 0, "weather")]["data"] is None
+
+        moisture = by_scope[(1, 0, "cherry_moisture")]["data"]
+        assert [(m["block_id"], m["value"]) for m in moisture["blocks"]] == [
+            (100, 25.0),
+            (101, 20.0),
+        ]
+        assert moisture["blocks"][0]["change"] == -5.0
+        alerts = by_scope[(1, 10, "cherry_moisture_alerts")]["data"]["alerts"]
+        assert [(a["block_id"], a["in_target"]) for a in alerts] == [(100, False)]
+
+    def test_read_dashboard_from_table(self, session_factory):
+        """Test that a stored scope is read back in priority order."""
+        aggregator = DashboardAggregator(session_factory=session_factory)
+        assert aggregator.refresh() == 8
+
+        with session_factory() as db:
+            dashboard = read_dashboard(db, 1, 10)
+            missing = read_dashboard(db, 1, 999)
+
+        assert [w["type"] for w in dashboard["widgets"]] == [
+            "weather_station",
+            "cherry_moisture_alerts",
+        ]
+        assert dashboard["property_id"] == 10
+        assert missing is None
+
+    def test_read_dashboard_computes_new_scope(self, session_factory):
+        """Test that a scope added since the last refresh is computed on the fly."""
+        with session_factory() as db:
+            dashboard = read_dashboard(db, 1)
+            stored = db.scalar(select(func.count()).select_from(DashboardAggregate))
+
+        assert stored == 0
+        assert _widgets(dashboard)["recent_activities"]["open"] == 2
+
+    def test_only_leader_refreshes(self, tmp_path, session_factory):
+        """Test that of two aggregators sharing a lock only one refreshes, until it stops."""
+        first = DashboardAggregator(
+            session_factory=session_factory, lock=LeaderLock("dash", str(tmp_path))
+        )
+        second = DashboardAggregator(
+            session_factory=session_factory, lock=LeaderLock("dash", str(tmp_path))
+        )
+
+        assert first.tick() is True
+        assert second.tick() is False
+        assert first.tick() is True
+        assert (first.refreshes, second.refreshes) == (2, 0)
+
+        first.lock.release()
+        assert second.tick() is True
+        assert second.stats()["leader"] is True
@@ -0,0 +1,60 @@
+"""
+Unit tests for geometry simplification and encoding.
+"""
+from app.services.geometry import (
+    GeometryOptions,
+    decode_polyline,
+    delta_decode,
+    delta_encode,
+    douglas_peucker,
+    encode_polyline,
+    tolerance_for_zoom,
+    visvalingam,
+)
+from scripts.benchmark_geometry import synthetic_track
+
+# Example from Google's polyline algorithm documentation
+GOOGLE_POINTS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+GOOGLE_ENCODED = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+class TestEncoding:
+    """Test polyline and delta encodings."""
+
+    def test_polyline_matches_reference(self):
+        """Test that encoding reproduces the documented example and round-trips."""
+        assert encode_polyline(GOOGLE_POINTS) == GOOGLE_ENCODED
+        assert decode_polyline(GOOGLE_ENCODED) == GOOGLE_POINTS
+
+    def test_delta_round_trip(self):
+        """Test that delta encoding is lossless at its precision."""
+        track = synthetic_track(500)
+        decoded = delta_decode(delta_encode(track, 6), 6)
+        assert len(decoded) == len(track)
+        assert all(
+            abs(a[0] - b[0]) <= 5e-7 and abs(a[1] - b[1]) <= 5e-7
+            for a, b in zip(track, decoded)
+        )
+
+
+class TestSimplification:
+    """Test line simplification."""
+
+    def test_collinear_points_collapse_to_end_points(self):
+        """Test that both algorithms drop points lying on a straight line."""
+        line = [(38.0 + i * 1e-5, -122.0) for i in range(100)]
+        assert douglas_peucker(line, 0.1) == [line[0], line[-1]]
+        assert visvalingam(line, 0.01) == [line[0], line[-1]]
+
+    def test_lower_zoom_keeps_fewer_points(self):
+        """Test that tolerance grows as the map zooms out."""
+        track = synthetic_track(2000)
+        assert tolerance_for_zoom(14, 38.3) > tolerance_for_zoom(18, 38.3)
+        close = GeometryOptions(format="polyline", zoom=18).encode(track)
+        far = GeometryOptions(format="polyline", zoom=14).encode(track)
+        assert far["count"] < close["count"] < len(track)
+
+    def test_no_zoom_keeps_every_point(self):
+        """Test that simplification is off without a zoom level."""
+        track = synthetic_track(300)
+        assert GeometryOptions().encode(track)["count"] == 300
@@ -0,0 +1,133 @@
+"""
+Unit tests for the maintained hierarchy counts.
+"""
+import pytest
+from sqlalchemy import update
+
+from app.models import Block, IndividualVine, Property, Row, VineYield
+from app.services.cache import query_cache
+from app.services.hierarchy_counts import HierarchyCountReconciler, reconcile_counts
+from app.services.hierarchy_service import HierarchyService
+
+MODELS = (Property, Block, Row, IndividualVine, VineYield)
+
+
+def _seed(db):
+    db.add_all(
+        [
+            Property(id=1, org_id=1, property_name="Upper", property_type="farm"),
+            Property(id=2, org_id=1, property_name="Lower", property_type="farm"),
+        ]
+    )
+    db.commit()
+    db.add_all(
+        [
+            Block(id=10, property_id=1, block_name="A", crop_type="grape", acres=2.5),
+            Block(id=20, property_id=2, block_name="B", crop_type="grape", acres=1),
+        ]
+    )
+    db.flush()
+    db.add_all(
+        [
+            Row(id=100, block_id=10, row_number=1),
+            Row(id=101, block_id=10, row_number=2),
+        ]
+    )
+    db.flush()
+    db.add_all(
+        [IndividualVine(row_id=100, vine_number=n) for n in range(1, 4)]
+        + [IndividualVine(row_id=101, vine_number=1)]
+    )
+
+
+@pytest.fixture
+def session_factory(sqlite_session_factory):
+    return sqlite_session_factory(MODELS, _seed)
+
+
+def _counts(db):
+    db.expire_all()
+    return {
+        "properties": {
+            p.id: (p.block_count, p.row_total, p.vine_total, float(p.block_acres))
+            for p in db.query(Property)
+        },
+        "blocks": {b.id: (b.row_total, b.vine_total) for b in db.query(Block)},
+        "rows": {r.id: r.vine_total for r in db.query(Row)},
+    }
+
+
+class TestHierarchyCounts:
+    """Test hierarchy count maintenance."""
+
+    def test_orm_writes_maintain_counts(self, session_factory):
+        """Test that inserts and deletes update every ancestor's counts."""
+        with session_factory() as db:
+            assert _counts(db) == {
+                "properties": {1: (1, 2, 4, 2.5), 2: (1, 0, 0, 1.0)},
+                "blocks": {10: (2, 4), 20: (0, 0)},
+                "rows": {100: 3, 101: 1},
+            }
+
+            db.delete(db.query(IndividualVine).filter_by(row_id=101).one())
+            db.query(Block).get(20).acres = 4
+            db.commit()
+
+            counts = _counts(db)
+            assert counts["properties"] == {1: (1, 2, 3, 2.5), 2: (1, 0, 0, 4.0)}
+            assert counts["rows"] == {100: 3, 101: 0}
+
+    def test_moving_a_row_recounts_both_properties(self, session_factory):
+        """Test that a row moved to another property takes its vines along."""
+        with session_factory() as db:
+            db.query(Row).get(100).block_id = 20
+            db.commit()
+
+            counts = _counts(db)
+            assert counts["properties"] == {1: (1, 1, 1, 2.5), 2: (1, 1, 3, 1.0)}
+            assert counts["blocks"] == {10: (1, 1), 20: (1, 3)}
+
+    def test_reconcile_fixes_only_drifted_rows(self, session_factory):
+        """Test that drift from writes outside the ORM is found and repaired."""
+        with session_factory() as db:
+            expected = _counts(db)
+            db.execute(update(Row).where(Row.id == 100).values(vine_total=99))
+            db.execute(update(Property).where(Property.id == 2).values(block_count=0))
+            db.commit()
+
+            fixed = reconcile_counts(db.connection())
+            db.commit()
+
+            assert fixed == {"rows": 1, "blocks": 0, "properties": 1}
+            assert _counts(db) == expected
+            assert reconcile_counts(db.connection()) == {
+                "rows": 0,
+                "blocks": 0,
+                "properties": 0,
+            }
+
+    def test_cached_listings_see_new_counts(self, session_factory):
+        """Test that counter updates invalidate the cached property listing on commit."""
+        query_cache.clear()
+        with session_factory() as db:
+            before = HierarchyService.get_properties(db, 1)
+            db.add(IndividualVine(row_id=101, vine_number=2))
+            db.flush()
+            uncommitted = HierarchyService.get_properties(db, 1)
+            db.commit()
+            after = HierarchyService.get_properties(db, 1)
+
+        assert before[0].vine_total == uncommitted[0].vine_total == 4
+        assert after[0].vine_total == 5
+
+    def test_reconciler_invalidates_cached_listings(self, session_factory):
+        """Test that counts repaired outside the ORM are not hidden by the cache."""
+        query_cache.clear()
+        with session_factory() as db:
+            db.execute(update(Property).where(Property.id == 2).values(block_count=0))
+            db.commit()
+            assert HierarchyService.get_properties(db, 1)[1].block_count == 0
+
+            HierarchyCountReconciler().reconcile(db)
+
+            assert HierarchyService.get_properties(db, 1)[1].block_count == 1
@@ -0,0 +1,146 @@
+"""
+Unit tests for the Idempotency-Key middleware and its store.
+"""
+import asyncio
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.middleware.idempotency import IdempotencyMiddleware, IdempotencyStore
+
+
+def _app(store, delay=0.0):
+    app = FastAPI()
+    calls = {"create": 0, "fail": 0}
+
+    @app.post("/items")
+    async def create(payload: dict):
+        calls["create"] += 1
+        await asyncio.sleep(delay)
+        return {"id": calls["create"], **payload}
+
+    @app.post("/fail")
+    async def fail():
+        calls["fail"] += 1
+        raise HTTPException(status_code=503, detail="busy")
+
+    app.add_middleware(IdempotencyMiddleware, store=store, max_body_bytes=1024)
+    return app, calls
+
+
+class TestIdempotencyStore:
+    """Test IdempotencyStore class."""
+
+    def test_expired_and_excess_entries_are_dropped(self):
+        """Test that completed entries expire and the oldest go beyond capacity."""
+        store = IdempotencyStore(ttl_seconds=60, max_entries=2)
+        for key in ("a", "b", "c"):
+            action, entry = store.begin(key, "f")
+            assert action == "execute"
+            store.complete(entry, (200, [], b"{}"))
+
+        assert len(store) == 2
+        assert store.begin("a", "f")[0] == "execute"
+        assert store.begin("c", "f")[0] == "replay"
+        assert store.begin("c", "other")[0] == "mismatch"
+
+        expired = IdempotencyStore(ttl_seconds=-1, max_entries=10)
+        _, entry = expired.begin("a", "f")
+        expired.complete(entry, (200, [], b"{}"))
+        assert expired.begin("a", "f")[0] == "execute"
+
+
+class TestIdempotencyMiddleware:
+    """Test IdempotencyMiddleware class."""
+
+    def test_retry_replays_first_response(self):
+        """Test that a retried POST is answered from the store without executing."""
+        app, calls = _app(IdempotencyStore(60, 100))
+        client = TestClient(app)
+        headers = {"Idempotency-Key": "abc"}
+
+        first = client.post("/items", json={"name": "a"}, headers=headers)
+        retry = client.post("/items", json={"name": "a"}, headers=headers)
+        unkeyed = client.post("/items", json={"name": "a"})
+
+        assert calls["create"] == 2
+        assert retry.json() == first.json() == {"id": 1, "name": "a"}
+        assert retry.headers["idempotent-replayed"] == "true"
+        assert "idempotent-replayed" not in first.headers
+        assert unkeyed.json()["id"] == 2
+
+    def test_key_reused_for_other_request(self):
+        """Test that a key sent with a different body is rejected with 422."""
+        app, calls = _app(IdempotencyStore(60, 100))
+        client = TestClient(app)
+        headers = {"Idempotency-Key": "abc"}
+
+        client.post("/items", json={"name": "a"}, headers=headers)
+        response = client.post("/items", json={"name": "b"}, headers=headers)
+
+        assert response.status_code == 422
+        assert calls["create"] == 1
+
+    def test_callers_sharing_a_key_do_not_share_responses(self):
+        """Test that the same key from different callers executes for each."""
+        app, calls = _app(IdempotencyStore(60, 100))
+        client = TestClient(app)
+
+        def post(**headers):
+            return client.post(
+                "/items",
+                json={"name": "a"},
+                headers={"Idempotency-Key": "abc", **headers},
+            )
+
+        alice = post(Authorization="Bearer alice")
+        bob = post(Authorization="Bearer bob")
+        device = post(**{"X-Device-Id": "d1"})
+        alice_retry = post(Authorization="Bearer alice")
+
+        assert calls["create"] == 3
+        assert [r.json()["id"] for r in (alice, bob, device)] == [1, 2, 3]
+        assert "idempotent-replayed" not in bob.headers
+        assert alice_retry.json() == alice.json()
+        assert alice_retry.headers["idempotent-replayed"] == "true"
+
+    def test_server_errors_and_large_bodies_are_not_stored(self):
+        """Test that 5xx responses are re-executed and oversized requests pass through."""
+        app, calls = _app(IdempotencyStore(60, 100))
+        client = TestClient(app)
+        headers = {"Idempotency-Key": "abc"}
+
+        assert client.post("/fail", headers=headers).status_code == 503
+        assert client.post("/fail", headers=headers).status_code == 503
+        big = {"name": "x" * 2000}
+        client.post("/items", json=big, headers=headers)
+        client.post("/items", json=big, headers=headers)
+
+        assert calls == {"create": 2, "fail": 2}
+
+    def test_concurrent_duplicates_execute_once(self):
+        """Test that duplicates arriving while the first is running wait and replay it."""
+        app, calls = _app(IdempotencyStore(60, 100), delay=0.05)
+
+        async def submit():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                return await asyncio.gather(
+                    *(
+                        client.post(
+                            "/items",
+                            json={"name": "a"},
+                            headers={"Idempotency-Key": "k"},
+                        )
+                        for _ in range(5)
+                    )
+                )
+
+        responses = asyncio.run(submit())
+
+        assert calls["create"] == 1
+        assert {r.json()["id"] for r in responses} == {1}
+        assert sum("idempotent-replayed" in r.headers for r in responses) == 4
@@ -0,0 +1,137 @@
+"""
+Unit tests for the live event feed.
+"""
+import asyncio
+import json
+from datetime import date
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.api_v1.endpoints import live
+from app.models import Activity, ActivityTypeRollup, Block, Property, User
+from app.services import activity_log
+from app.services.live_events import (
+    MAX_NOTIFY_BYTES,
+    LiveEventBroker,
+    Subscription,
+    live_events,
+    make_event,
+)
+
+MODELS = (Property, Block, User, Activity, ActivityTypeRollup)
+
+
+def _seed(db):
+    db.add_all(
+        [
+            Property(id=1, org_id=7, property_name="Upper", property_type="farm"),
+            Block(id=10, property_id=1, block_name="A", crop_type="grape"),
+            User(id=1, org_id=7, email="a@x.test", first_name="A", last_name="A"),
+        ]
+    )
+
+
+@pytest.fixture
+def session_factory(sqlite_session_factory):
+    return sqlite_session_factory(MODELS, _seed)
+
+
+class TestSubscription:
+    """Test Subscription class."""
+
+    def test_full_queue_drops_oldest_and_reports_lag(self):
+        """Test that a slow consumer loses the oldest events and is told how many."""
+
+        async def scenario():
+            subscription = Subscription(["block:1"], max_queue=2)
+            for i in range(5):
+                subscription.offer({"type": "checkin", "n": i})
+            return [await subscription.get(0.1) for _ in range(4)]
+
+        lagged, first, second, idle = asyncio.run(scenario())
+
+        assert lagged == {"type": "lagged", "dropped": 3}
+        assert [first["n"], second["n"]] == [3, 4]
+        assert idle is None
+
+
+class TestLiveEventBroker:
+    """Test LiveEventBroker class."""
+
+    def test_events_are_delivered_on_commit_by_topic(self, session_factory):
+        """Test that events wait for commit, reach each matching subscriber once, and vanish on rollback."""
+
+        async def scenario():
+            broker = LiveEventBroker(queue_size=10, max_subscribers=2)
+            org = broker.subscribe(["org:7", "block:10"])
+            other = broker.subscribe(["block:99"])
+            assert broker.subscribe(["org:7"]) is None
+
+            with session_factory() as db:
+                broker.publish(db, [make_event("checkin", {}, 7, 1, 10)])
+                assert len(org) == 0
+                db.commit()
+                broker.publish(db, [make_event("checkin", {"n": 2}, 7, 1, 10)])
+                db.rollback()
+            broker.unsubscribe(other)
+            return len(org), len(other), broker.stats()["subscribers"]
+
+        assert asyncio.run(scenario()) == (1, 0, 1)
+
+    def test_notify_payloads_stay_under_limit(self):
+        """Test that NOTIFY batches are split and oversized data is truncated."""
+        events = [make_event("checkin", {"pad": "x" * 1000}, 1) for _ in range(20)]
+        events.append(make_event("checkin", {"pad": "x" * 9000}, 1))
+
+        payloads = list(LiveEventBroker._payloads(events))
+        decoded = [item for payload in payloads for item in json.loads(payload)]
+
+        assert len(payloads) > 1
+        assert all(len(payload) <= MAX_NOTIFY_BYTES for payload in payloads)
+        assert len(decoded) == 21
+        assert decoded[-1]["data"] == {"truncated": True}
+
+
+class TestLiveFeed:
+    """Test the live feed endpoints."""
+
+    def test_websocket_receives_bulk_logged_activity(self, session_factory):
+        """Test that an activity logged in bulk reaches a socket following its org."""
+        app = FastAPI()
+        app.include_router(live.router, prefix="/live")
+        client = TestClient(app)
+
+        with client.websocket_connect("/live/ws?org_id=7") as websocket:
+            with session_factory() as db:
+                activity_log.log_activities(
+                    db,
+                    [
+                        {
+                            "client_key": "k1",
+                            "block_id": 10,
+                            "user_id": 1,
+                            "activity_type": "pruning",
+                            "activity_date": date(2025, 4, 1),
+                            "title": "Pruned",
+                        }
+                    ],
+                )
+            message = websocket.receive_json()
+
+        assert message["type"] == "activity.created"
+        assert (message["org_id"], message["property_id"], message["block_id"]) == (
+            7,
+            1,
+            10,
+        )
+        assert message["data"]["title"] == "Pruned"
+        assert live_events.stats()["subscribers"] == 0
+
+    def test_requests_without_topics_are_refused(self):
+        """Test that the SSE feed needs at least one topic."""
+        app = FastAPI()
+        app.include_router(live.router, prefix="/live")
+
+        assert TestClient(app).get("/live/events").status_code == 400
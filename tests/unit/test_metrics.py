@@ -0,0 +1,39 @@
+"""
+Unit tests for the metrics registry.
+"""
+from app.core.metrics import MetricsRegistry
+
+
+class TestMetricsRegistry:
+    """Test MetricsRegistry class."""
+
+    def test_counter_renders_prometheus_text(self):
+        """Test counter exposition with labels."""
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests", ("route",))
+        requests.inc(route="/a")
+        requests.inc(2, route="/a")
+
+        output = registry.render()
+        assert "# TYPE requests_total counter" in output
+        assert 'requests_total{route="/a"} 3' in output
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test histogram bucket, count and sum samples."""
+        registry = MetricsRegistry()
+        latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(5)
+
+        output = registry.render()
+        assert 'latency_seconds_bucket{le="0.1"} 1' in output
+        assert 'latency_seconds_bucket{le="1"} 2' in output
+        assert 'latency_seconds_bucket{le="+Inf"} 3' in output
+        assert "latency_seconds_count 3" in output
+        assert "latency_seconds_sum 5.55" in output
+
+    def test_registering_twice_returns_same_metric(self):
+        """Test that metric registration is idempotent."""
+        registry = MetricsRegistry()
+        assert registry.gauge("g", "G") is registry.gauge("g", "G")
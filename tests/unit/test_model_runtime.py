@@ -0,0 +1,129 @@
+"""
+Unit tests for the model runtime cache.
+"""
+import os
+import uuid
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.services.model_runtime import ModelRuntimeCache, register_loader
+
+
+def _model(path, size=None, version="1.0", model_type="test-weights", **extra):
+    return {
+        "id": uuid.uuid4(),
+        "name": f"model-{path.name}",
+        "version": version,
+        "model_type": model_type,
+        "config": {},
+        "model_url": f"file://{path}",
+        **extra,
+    }
+
+
+def _weights(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"\x07" * size)
+    return path
+
+
+class TestModelRuntimeCache:
+    """Test ModelRuntimeCache class."""
+
+    def test_loads_once_as_read_only_mapping(self, tmp_path):
+        """Test that weights are mmap'd read-only and reused on later calls."""
+        cache = ModelRuntimeCache(budget_bytes=10_000, cache_dir=str(tmp_path))
+        model = _model(_weights(tmp_path, "a.bin", 1000))
+
+        first = cache.get(model)
+        assert cache.get(model) is first
+        assert first.weights.readonly
+        assert first.weights[0] == 7
+        assert first.size_bytes == 1000
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["used_bytes"]) == (1, 1, 1000)
+
+    def test_evicts_least_recently_used_over_budget(self, tmp_path):
+        """Test that the memory budget evicts in LRU order."""
+        cache = ModelRuntimeCache(budget_bytes=2500, cache_dir=str(tmp_path))
+        a, b, c = (_model(_weights(tmp_path, f"{name}.bin", 1000)) for name in "abc")
+        cache.get(a)
+        cache.get(b)
+        cache.get(a)
+        cache.get(c)
+
+        loaded = {m["model_id"] for m in cache.stats()["models"]}
+        assert loaded == {str(a["id"]), str(c["id"])}
+        assert cache.evictions == 1
+
+    def test_version_change_reloads(self, tmp_path):
+        """Test that a new version of the same model replaces the old runtime."""
+        cache = ModelRuntimeCache(budget_bytes=10_000, cache_dir=str(tmp_path))
+        model = _model(_weights(tmp_path, "a.bin", 10))
+        old = cache.get(model)
+        new = cache.get({**model, "version": "2.0"})
+        assert new is not old and old.weights is None
+        assert cache.stats()["entries"] == 1
+
+    def test_registered_loader_builds_runtime(self, tmp_path):
+        """Test that a per-type loader receives the mapped weights."""
+        register_loader("byte-sum", lambda model, weights: sum(weights))
+        cache = ModelRuntimeCache(budget_bytes=10_000, cache_dir=str(tmp_path))
+        loaded = cache.get(
+            _model(_weights(tmp_path, "s.bin", 6), model_type="byte-sum")
+        )
+        assert loaded.runtime == 42
+
+    def test_warm_stops_at_budget_and_skips_failures(self, tmp_path):
+        """Test that warming loads in order, skips broken models and stops when full."""
+        cache = ModelRuntimeCache(budget_bytes=1500, cache_dir=str(tmp_path))
+        first = _model(_weights(tmp_path, "a.bin", 1000))
+        broken = _model(tmp_path / "missing.bin")
+        second = _model(_weights(tmp_path, "b.bin", 1000))
+        third = _model(_weights(tmp_path, "c.bin", 1000))
+
+        loaded = cache.warm([first, broken, second, third])
+
+        assert loaded == [str(first["id"])]
+        assert cache.load_failures == 1
+        assert [m["model_id"] for m in cache.stats()["models"]] == [str(first["id"])]
+
+    def test_local_paths_outside_the_cache_are_refused(self, tmp_path):
+        """Test that a file model_url outside the model cache and upload store raises."""
+        cache = ModelRuntimeCache(
+            budget_bytes=10_000, cache_dir=str(tmp_path / "cache")
+        )
+        outside = _weights(tmp_path, "outside.bin", 10)
+        (tmp_path / "cache").mkdir()
+
+        for url in (
+            f"file://{outside}",
+            str(outside),
+            f"{tmp_path}/cache/../outside.bin",
+        ):
+            with pytest.raises(ValueError, match="must be inside"):
+                cache.get({**_model(outside), "model_url": url})
+        assert cache.stats()["entries"] == 0
+
+    def test_remote_download_is_keyed_on_version(self, tmp_path, monkeypatch):
+        """Test that a version bump with the same URL downloads again and prunes."""
+        served = {"body": b"\x01" * 10}
+
+        @contextmanager
+        def stream(method, url, **kwargs):
+            body = served["body"]
+            yield SimpleNamespace(
+                raise_for_status=lambda: None, iter_bytes=lambda size: [body]
+            )
+
+        monkeypatch.setattr(httpx, "stream", stream)
+        cache = ModelRuntimeCache(budget_bytes=10_000, cache_dir=str(tmp_path))
+        model = {**_model(tmp_path / "w.bin"), "model_url": "https://models.test/w"}
+
+        assert bytes(cache.get(model).weights) == b"\x01" * 10
+        served["body"] = b"\x02" * 10
+        assert bytes(cache.get({**model, "version": "2.0"}).weights) == b"\x02" * 10
+        assert len(os.listdir(tmp_path)) == 1
@@ -0,0 +1,81 @@
+"""
+Unit tests for polygon boundaries.
+"""
+import math
+
+import pytest
+
+from app.services.geo_index import GeoIndex
+from app.services.polygon import Polygon, encode_boundary, parse_boundary
+
+# An L-shaped (concave) block: the north-east quadrant is cut out.
+L_SHAPE = [
+    (38.300, -122.300),
+    (38.300, -122.298),
+    (38.301, -122.298),
+    (38.301, -122.299),
+    (38.302, -122.299),
+    (38.302, -122.300),
+]
+
+
+def _circle(vertices: int, radius_deg: float = 0.001):
+    return [
+        (
+            38.3 + radius_deg * math.sin(2 * math.pi * i / vertices),
+            -122.3 + radius_deg * math.cos(2 * math.pi * i / vertices),
+        )
+        for i in range(vertices)
+    ]
+
+
+class TestPolygon:
+    """Test Polygon class."""
+
+    def test_concave_polygon_containment(self):
+        """Test that points in the cut-out corner are outside despite the bbox."""
+        polygon = Polygon(L_SHAPE)
+        assert polygon.contains(38.3005, -122.2985)
+        assert polygon.contains(38.3015, -122.2995)
+        assert polygon.bbox_contains(38.3015, -122.2985)
+        assert not polygon.contains(38.3015, -122.2985)
+        assert not polygon.contains(38.303, -122.2995)
+
+    def test_lookup_touches_few_edges(self):
+        """Test that banding bounds the edges crossed for large polygons."""
+        polygon = Polygon(_circle(800))
+        assert polygon.contains(38.3, -122.3)
+        assert not polygon.contains(38.3, -122.2985)
+        assert max(len(band) for band in polygon._bands) < 40
+
+    def test_rejects_degenerate_polygons(self):
+        """Test that fewer than three distinct vertices are refused."""
+        with pytest.raises(ValueError):
+            Polygon([(38.3, -122.3), (38.31, -122.3), (38.3, -122.3)])
+
+
+class TestBoundaryEncoding:
+    """Test boundary encoding and parsing."""
+
+    def test_round_trip_through_parse(self):
+        """Test that an encoded boundary parses back into an equivalent polygon."""
+        encoded = encode_boundary([list(p) for p in L_SHAPE] + [list(L_SHAPE[0])])
+        polygon = parse_boundary(encoded)
+        assert polygon.vertex_count == len(L_SHAPE)
+        assert len(encoded) < len(str(L_SHAPE)) / 2
+
+    def test_invalid_input(self):
+        """Test that bad boundaries raise and bad stored data parses to None."""
+        with pytest.raises(ValueError):
+            encode_boundary([[38.3, -122.3], [38.4, -122.3]])
+        with pytest.raises(ValueError):
+            encode_boundary([[95, 0], [38.4, -122.3], [38.4, -122.2]])
+        assert parse_boundary(None) is None
+        assert parse_boundary("_p~iF") is None
+
+    def test_geo_index_prefers_polygon_over_circle(self):
+        """Test that map-matching uses the polygon when a block has one."""
+        encoded = encode_boundary(L_SHAPE)
+        index = GeoIndex.build(blocks=[(1, 1, 38.301, -122.299, 500, encoded)], rows=[])
+        assert index.match_block(38.3005, -122.2985)[0] == 1
+        assert index.match_block(38.3015, -122.2985) is None
@@ -0,0 +1,60 @@
+"""
+Unit tests for the request profiling middleware and its ring buffer.
+"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware.profiling import ProfileStore, ProfilingMiddleware
+
+
+class TestProfileStore:
+    """Test ProfileStore class."""
+
+    def test_keeps_only_newest_entries(self, tmp_path):
+        """Test that the store behaves as a bounded ring buffer."""
+        store = ProfileStore(str(tmp_path), max_entries=2)
+        for index in range(3):
+            store.save(
+                f"{index:015d}-abc", {"id": f"{index:015d}-abc"}, b"raw", ".prof"
+            )
+
+        ids = [meta["id"] for meta in store.list()]
+        assert ids == ["000000000000002-abc", "000000000000001-abc"]
+        assert store.get("000000000000000-abc") is None
+        assert store.raw_path("000000000000002-abc").endswith(".prof")
+
+
+class TestProfilingMiddleware:
+    """Test ProfilingMiddleware class."""
+
+    def _client(self, tmp_path, routes, sample_rate):
+        app = FastAPI()
+
+        @app.get("/slow")
+        async def slow():
+            return {"values": [str(i) for i in range(1000)]}
+
+        store = ProfileStore(str(tmp_path), max_entries=5)
+        app.add_middleware(
+            ProfilingMiddleware, routes=routes, sample_rate=sample_rate, store=store
+        )
+        return TestClient(app), store
+
+    def test_profiles_sampled_route(self, tmp_path):
+        """Test that a matching route is profiled and the id is returned."""
+        client, store = self._client(tmp_path, ["/slow"], 1.0)
+        response = client.get("/slow")
+
+        profile = store.get(response.headers["x-profile-id"])
+        assert profile["path"] == "/slow"
+        assert profile["status"] == 200
+        assert profile["cpu_summary"]
+        assert profile["top_allocations"]
+
+    def test_unsampled_route_is_untouched(self, tmp_path):
+        """Test that requests outside the sampled routes are not profiled."""
+        client, store = self._client(tmp_path, ["/other"], 1.0)
+        response = client.get("/slow")
+
+        assert "x-profile-id" not in response.headers
+        assert store.list() == []
@@ -0,0 +1,152 @@
+"""
+Unit tests for per-tenant rate limiting and load shedding.
+"""
+import time
+
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.middleware.rate_limit import (
+    BULK,
+    INTERACTIVE,
+    SYNC,
+    LoadShedder,
+    LocalSharedRateLimitBackend,
+    RateLimiter,
+    RateLimitMiddleware,
+    TokenBuckets,
+    parse_limits,
+    route_class,
+)
+
+
+def _client(limiter, shedder):
+    app = FastAPI()
+
+    @app.get("/api/v1/organizations/")
+    def organizations():
+        return []
+
+    @app.post("/api/v1/activities/batch")
+    def batch():
+        return {}
+
+    @app.websocket("/api/v1/live/ws")
+    async def live(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_json({"connected": True})
+        await websocket.close()
+
+    app.add_middleware(RateLimitMiddleware, limiter=limiter, shedder=shedder)
+    return TestClient(app)
+
+
+class TestTokenBuckets:
+    """Test TokenBuckets class."""
+
+    def test_burst_then_refill_wait(self):
+        """Test that a bucket allows its burst and then reports the wait for a token."""
+        buckets = TokenBuckets()
+        assert [buckets.take("k", 2.0, 3) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert 0.4 < buckets.take("k", 2.0, 3) <= 0.5
+        assert buckets.take("other", 2.0, 3) == 0.0
+
+    def test_full_buckets_are_dropped_at_capacity(self):
+        """Test that refilled buckets make room for new keys."""
+        buckets = TokenBuckets(max_entries=2)
+        buckets.take("a", 1000.0, 1)
+        buckets.take("b", 0.001, 5)
+        time.sleep(0.01)
+        buckets.take("c", 1.0, 1)
+
+        assert len(buckets) == 2
+
+
+class TestRateLimiter:
+    """Test RateLimiter and route classification."""
+
+    def test_parse_limits_and_route_classes(self):
+        """Test the RATE_LIMITS format and the route class rules."""
+        assert parse_limits("bulk=1:10, sync=5") == {
+            "bulk": (1.0, 10.0),
+            "sync": (5.0, 5.0),
+        }
+        assert route_class("POST", "/api/v1/activities/batch") == BULK
+        assert route_class("GET", "/api/v1/activities/") == INTERACTIVE
+        assert route_class("POST", "/api/v1/mobile/checkin") == SYNC
+
+    def test_org_bucket_is_shared_by_its_devices(self):
+        """Test that devices have their own buckets and the org a larger shared one."""
+        limiter = RateLimiter(
+            {BULK: (0.001, 2)},
+            org_multiplier=2,
+            shared=LocalSharedRateLimitBackend(),
+        )
+        waits = [
+            limiter.take(BULK, [("device", device), ("org", "1")])
+            for device in ("a", "a", "a", "b", "b")
+        ]
+
+        assert [w == 0 for w in waits] == [True, True, False, True, False]
+        assert limiter.take(INTERACTIVE, [("device", "a")]) == 0
+
+
+class TestRateLimitMiddleware:
+    """Test RateLimitMiddleware class."""
+
+    def test_over_limit_tenant_gets_429(self):
+        """Test that one tenant is limited while another is not."""
+        client = _client(
+            RateLimiter({INTERACTIVE: (0.001, 2)}, org_multiplier=1),
+            LoadShedder(100, 10.0),
+        )
+        statuses = [
+            client.get("/api/v1/organizations/", headers={"X-Org-Id": "1"}).status_code
+            for _ in range(3)
+        ]
+        other = client.get("/api/v1/organizations/", headers={"X-Org-Id": "2"})
+        limited = client.get("/api/v1/organizations/", headers={"X-Org-Id": "1"})
+
+        assert statuses == [200, 200, 429]
+        assert other.status_code == 200
+        assert int(limited.headers["retry-after"]) >= 1
+
+    def test_websocket_over_limit_is_closed_before_accept(self):
+        """Test that live WebSocket connections are charged to the sync bucket."""
+        client = _client(RateLimiter({SYNC: (0.001, 1)}), LoadShedder(100, 10.0))
+        headers = {"X-Device-Id": "d1"}
+
+        with client.websocket_connect("/api/v1/live/ws", headers=headers) as ws:
+            assert ws.receive_json() == {"connected": True}
+        with pytest.raises(WebSocketDisconnect) as rejected:
+            with client.websocket_connect("/api/v1/live/ws", headers=headers) as ws:
+                ws.receive_json()
+
+        assert rejected.value.code == 1013
+        assert "retry after" in rejected.value.reason
+
+    def test_bulk_is_shed_first_under_load(self):
+        """Test that overload sheds bulk routes but still serves interactive ones."""
+        shedder = LoadShedder(max_in_flight=10, target_latency=10.0)
+        client = _client(RateLimiter({}), shedder)
+        shedder.in_flight = 6
+
+        bulk = client.post("/api/v1/activities/batch")
+        interactive = client.get("/api/v1/organizations/")
+
+        assert bulk.status_code == 429
+        assert bulk.headers["retry-after"] == "5"
+        assert interactive.status_code == 200
+        assert shedder.in_flight == 6
+
+    def test_latency_signal_decays(self):
+        """Test that slow requests raise the load, which decays once they stop."""
+        shedder = LoadShedder(max_in_flight=100, target_latency=1.0, decay_seconds=5)
+        shedder.started()
+        shedder.finished(10.0)
+
+        assert shedder.should_shed(BULK) is True
+        assert shedder.should_shed(INTERACTIVE) is False
+        assert shedder.latency(time.monotonic() + 30) < 0.01
@@ -0,0 +1,203 @@
+"""
+Unit tests for the in-memory reference data snapshot.
+"""
+import asyncio
+import socket
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.spray_product import SprayProduct
+from app.services.reference_data import (
+    UNIVERSAL_OPERATIONS,
+    ReferenceDataHolder,
+    catalog_version,
+)
+
+MODELS = (SprayProduct,)
+
+
+def _seed(db):
+    db.add_all(
+        [
+            SprayProduct(
+                product_name="Pristine",
+                manufacturer="BASF",
+                active_ingredients={"Boscalid": 25.2, "Pyraclostrobin": 12.8},
+                product_type="fungicide",
+                frac_code="7",
+                organic_approved=False,
+                max_rate_per_acre=Decimal("23.0"),
+                default_phi_days=14,
+            ),
+            SprayProduct(
+                product_name="Endura",
+                manufacturer="BASF",
+                active_ingredients=[{"name": "boscalid", "percent": 70}],
+                product_type="fungicide",
+                frac_code="7",
+            ),
+            SprayProduct(
+                product_name="Kumulus DF",
+                manufacturer="Loveland",
+                active_ingredients=["Sulfur"],
+                product_type="Fungicide",
+                frac_code="M2",
+                organic_approved=True,
+            ),
+            SprayProduct(
+                product_name="Retired Product",
+                manufacturer="Acme",
+                active_ingredients={},
+                product_type="insecticide",
+                is_active=False,
+            ),
+        ]
+    )
+
+
+@pytest.fixture
+def session_factory(sqlite_session_factory):
+    return sqlite_session_factory(MODELS, _seed)
+
+
+class _DroppedConnection:
+    """LISTEN connection whose socket turns readable and whose poll fails."""
+
+    def __init__(self) -> None:
+        self.reader, self.writer = socket.socketpair()
+        self.writer.send(b"x")
+        self.driver_connection = self
+        self.notifies = []
+        self.invalidated = False
+
+    def cursor(self):
+        return SimpleNamespace(execute=lambda sql: None)
+
+    def fileno(self) -> int:
+        return self.reader.fileno()
+
+    def poll(self) -> None:
+        raise OSError("server closed the connection unexpectedly")
+
+    def invalidate(self) -> None:
+        self.invalidated = True
+        self.reader.close()
+        self.writer.close()
+
+
+class TestReferenceData:
+    """Test ReferenceData class."""
+
+    def test_indexes_catalog(self, session_factory):
+        """Test that products are indexed by id, FRAC code, ingredient and type."""
+        holder = ReferenceDataHolder(session_factory)
+        data = holder.get()
+
+        assert [p.product_name for p in data.by_frac["7"]] == ["Endura", "Pristine"]
+        assert {p.product_name for p in data.by_ingredient["boscalid"]} == {
+            "Endura",
+            "Pristine",
+        }
+        assert [p.product_name for p in data.by_type["fungicide"]] == [
+            "Endura",
+            "Kumulus DF",
+            "Pristine",
+        ]
+        pristine = data.by_frac["7"][1]
+        assert data.by_id[pristine.id] is pristine
+        assert pristine.max_rate_per_acre == 23.0
+
+    def test_search_filters_in_memory(self, session_factory):
+        """Test that search matches names and skips inactive products."""
+        data = ReferenceDataHolder(session_factory).get()
+
+        assert [p.product_name for p in data.search("")] == [
+            "Endura",
+            "Kumulus DF",
+            "Pristine",
+        ]
+        assert [p.product_name for p in data.search("PRIS")] == ["Pristine"]
+        assert [p.product_name for p in data.search("", ingredient="Sulfur")] == [
+            "Kumulus DF"
+        ]
+        assert data.search("", frac_code="7", ingredient="sulfur") == []
+        assert data.search("retired") == []
+
+    def test_crop_templates(self, session_factory):
+        """Test that crop templates include universal operations and fall back."""
+        data = ReferenceDataHolder(session_factory).get()
+
+        grape = data.crop_template("grape")
+        assert grape.operations[: len(UNIVERSAL_OPERATIONS)] == UNIVERSAL_OPERATIONS
+        assert "crush" in grape.operations
+        assert grape.quality_metrics[0].name == "brix"
+        other = data.crop_template("avocado")
+        assert other.operations == UNIVERSAL_OPERATIONS
+        assert other.quality_metrics == ()
+
+
+class TestReferenceDataHolder:
+    """Test ReferenceDataHolder class."""
+
+    def test_snapshot_reused_until_catalog_write(self, session_factory):
+        """Test that the snapshot is shared until a write marks it stale."""
+        holder = ReferenceDataHolder(session_factory)
+        first = holder.get()
+        assert holder.get() is first
+
+        with session_factory() as db:
+            product = db.query(SprayProduct).filter_by(product_name="Endura").one()
+            product.frac_code = "11"
+            db.commit()
+
+        second = holder.get()
+        assert second is not first
+        assert [p.product_name for p in second.by_frac["11"]] == ["Endura"]
+        assert holder.refreshes == 2
+
+    def test_failed_reload_stays_stale(self, session_factory):
+        """Test that a reload error keeps the snapshot stale so the next read retries."""
+        holder = ReferenceDataHolder(session_factory)
+        first = holder.get()
+        holder.invalidate()
+
+        def unavailable():
+            raise ConnectionError("database unavailable")
+
+        holder.session_factory = unavailable
+        with pytest.raises(ConnectionError):
+            holder.get()
+        holder.session_factory = session_factory
+
+        assert holder.get() is not first
+        assert holder.refreshes == 2
+
+    def test_version_changes_with_catalog(self, session_factory):
+        """Test that the polled version signature detects other writers."""
+        holder = ReferenceDataHolder(session_factory)
+        data = holder.get()
+        with session_factory() as db:
+            assert catalog_version(db) == data.version
+            db.execute(SprayProduct.__table__.delete())
+            db.commit()
+            assert catalog_version(db) != data.version
+
+    def test_lost_listener_connection_raises_to_reconnect(
+        self, monkeypatch, session_factory
+    ):
+        """Test that a failing LISTEN connection ends _listen instead of hanging."""
+        connection = _DroppedConnection()
+        monkeypatch.setattr(
+            "app.db.base.get_engine",
+            lambda: SimpleNamespace(raw_connection=lambda: connection),
+        )
+        holder = ReferenceDataHolder(session_factory)
+        holder.get()
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(asyncio.wait_for(holder._listen(), timeout=2))
+
+        assert connection.invalidated
+        assert holder._stale
@@ -0,0 +1,111 @@
+"""
+Unit tests for read-replica routing.
+"""
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.api import deps
+from app.db.replicas import Replica, ReplicaRouter
+from app.middleware.read_your_writes import ReadYourWritesMiddleware
+from app.models import Property
+
+
+def _database(tmp_path, name):
+    url = f"sqlite:///{tmp_path / name}.db"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE IF NOT EXISTS whoami (name TEXT)"))
+        connection.execute(text("DELETE FROM whoami"))
+        connection.execute(text("INSERT INTO whoami VALUES (:name)"), {"name": name})
+    return url, engine
+
+
+def _router(tmp_path, *names, check_interval=60):
+    _, primary = _database(tmp_path, "primary")
+    replicas = []
+    for name in names:
+        url = (
+            f"sqlite:///{tmp_path / 'missing' / name}.db"
+            if name.startswith("down")
+            else _database(tmp_path, name)[0]
+        )
+        replicas.append(Replica(url))
+    return ReplicaRouter(
+        replicas,
+        check_interval=check_interval,
+        max_lag=10,
+        primary=sessionmaker(bind=primary),
+    )
+
+
+def _whoami(session):
+    with session as db:
+        return db.scalar(text("SELECT name FROM whoami"))
+
+
+class TestReplicaRouter:
+    """Test ReplicaRouter class."""
+
+    def test_round_robin_skips_unhealthy_replicas(self, tmp_path):
+        """Test that reads rotate over healthy replicas and fall back to the primary."""
+        router = _router(tmp_path, "replica-a", "down-b", "replica-c")
+
+        assert [_whoami(router.session()) for _ in range(4)] == [
+            "replica-a",
+            "replica-c",
+            "replica-c",
+            "replica-a",
+        ]
+        assert [r["healthy"] for r in router.stats()["replicas"]] == [
+            True,
+            False,
+            True,
+        ]
+        assert _whoami(router.session(primary=True)) == "primary"
+        assert _whoami(_router(tmp_path, "down-d").session()) == "primary"
+
+    def test_replica_sessions_refuse_writes(self, tmp_path):
+        """Test that flushing a change on a replica session raises."""
+        router = _router(tmp_path, "replica-a")
+
+        with router.session() as db:
+            db.add(Property(org_id=1, property_name="X", property_type="farm"))
+            with pytest.raises(RuntimeError, match="Read-only session"):
+                db.flush()
+
+
+class TestReadYourWrites:
+    """Test ReadYourWritesMiddleware class."""
+
+    def test_reads_after_a_write_stay_on_the_primary(self, tmp_path, monkeypatch):
+        """Test that a successful write pins the client's reads to the primary."""
+        monkeypatch.setattr(deps, "replica_router", _router(tmp_path, "replica-a"))
+        app = FastAPI()
+        app.add_middleware(ReadYourWritesMiddleware, window_seconds=30)
+
+        @app.get("/read")
+        def read(db=Depends(deps.get_read_db)):
+            return {"database": db.scalar(text("SELECT name FROM whoami"))}
+
+        @app.post("/write")
+        def write():
+            return {}
+
+        @app.post("/rejected")
+        def rejected():
+            return JSONResponse({}, status_code=422)
+
+        client = TestClient(app)
+        assert client.get("/read").json() == {"database": "replica-a"}
+        assert "set-cookie" not in client.post("/rejected").headers
+        assert client.get("/read").json() == {"database": "replica-a"}
+
+        assert "db_primary_until" in client.post("/write").headers["set-cookie"]
+        assert client.get("/read").json() == {"database": "primary"}
+
+        client.cookies.set("db_primary_until", "1")
+        assert client.get("/read").json() == {"database": "replica-a"}
@@ -0,0 +1,188 @@
+"""
+Unit tests for the location data shared between workers.
+"""
+import fcntl
+import os
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.services.geo_index import METERS_PER_DEG, distance_m
+from app.services.polygon import encode_boundary
+from app.services.shared_geo import (
+    DIRTY,
+    SharedGeoStore,
+    SharedGeoView,
+    pack,
+    rebuild_after_commit,
+)
+
+LAT, LNG = 38.3, -122.3
+SQUARE = encode_boundary(
+    [
+        (LAT - 0.002, LNG - 0.002),
+        (LAT - 0.002, LNG + 0.002),
+        (LAT + 0.002, LNG + 0.002),
+        (LAT + 0.002, LNG - 0.002),
+    ]
+)
+
+
+def _offset(meters_north: float, lat: float = LAT, lng: float = LNG):
+    return lat + meters_north / METERS_PER_DEG, lng
+
+
+def _data():
+    properties = [
+        # id, name, lat, lng, circle lat, circle lng, radius, boundary
+        (1, "Polygon Ranch", LAT, LNG, None, None, None, SQUARE),
+        (2, "Circle Farm", LAT + 0.01, LNG, LAT + 0.01, LNG, 300, None),
+        (3, "Open Field", LAT + 0.02, LNG, None, None, None, None),
+        (4, "No Coordinates", None, None, None, None, None, None),
+    ]
+    blocks = [
+        # id, property_id, name, lat, lng, radius, boundary
+        (10, 1, "North", LAT + 0.001, LNG, 80, None),
+        (11, 1, "South", LAT - 0.001, LNG, None, None),
+        (12, 2, "Other property", LAT + 0.001, LNG, 80, None),
+    ]
+    rows = [
+        # id, block_id, row_number, start lat, start lng, end lat, end lng
+        (100, 10, 1, LAT + 0.001, LNG - 0.0005, LAT + 0.001, LNG + 0.0005),
+        (101, 10, 2, LAT + 0.00103, LNG - 0.0005, LAT + 0.00103, LNG + 0.0005),
+    ]
+    vines = [
+        # id, row_id, vine_number, lat, lng
+        (1001, 100, 2, LAT + 0.001, LNG + 0.00005),
+        (1000, 100, 1, LAT + 0.001, LNG),
+        (1002, 101, 1, LAT + 0.00103, LNG),
+        (1003, 999, 1, LAT + 0.001, LNG),  # row without geometry
+    ]
+    return properties, blocks, rows, vines
+
+
+class TestSharedGeoView:
+    """Test SharedGeoView class."""
+
+    def test_columns_round_trip(self):
+        """Test that packed columns and strings read back unchanged."""
+        view = SharedGeoView(pack(*_data(), generation=7))
+
+        assert view.generation == 7
+        assert list(view.p_id) == [1, 2, 3]
+        assert view.property_name(1) == "Circle Farm"
+        assert view.block_name(2) == "Other property"
+        assert view.counts == {"properties": 3, "blocks": 3, "rows": 2, "vines": 3}
+
+    def test_detect_property_boundary_rules(self):
+        """Test polygon, circle and nearest-centre fallback in that order."""
+        view = SharedGeoView(pack(*_data()))
+
+        position, distance = view.detect_property(*_offset(100))
+        assert view.p_id[position] == 1 and 95 < distance < 105
+        position, _ = view.detect_property(*_offset(250, lat=LAT + 0.01))
+        assert view.p_id[position] == 2
+        # Outside the circle: circle properties are not a fallback
+        assert view.detect_property(*_offset(-350, lat=LAT + 0.01)) is None
+        position, distance = view.detect_property(*_offset(900, lat=LAT + 0.02))
+        assert view.p_id[position] == 3 and distance < 1000
+        assert view.detect_property(*_offset(1100, lat=LAT + 0.02)) is None
+
+    def test_detect_block_and_row(self):
+        """Test that blocks are limited to the property and rows to the block."""
+        view = SharedGeoView(pack(*_data()))
+        lat, lng = _offset(111.32 * 1.01)
+
+        position, _ = view.detect_block(1, lat, lng)
+        assert view.b_id[position] == 10
+        position, _ = view.detect_block(2, lat, lng)
+        assert view.b_id[position] == 12
+        row, distance = view.detect_row(10, lat, lng)
+        assert view.r_id[row] == 100 and distance < 2
+        vine, distance = view.detect_vine(row, lat, lng)
+        assert view.v_id[vine] == 1000 and distance < 2
+        assert [
+            view.v_number[v] for v in range(*view.r_vine_starts[row : row + 2])
+        ] == [1, 2]
+        assert view.detect_row(11, lat, lng) is None
+        # Radius-less block: nearest centre within 500 m
+        position, _ = view.detect_block(1, *_offset(-300))
+        assert view.b_id[position] == 11
+
+    def test_within_radius(self):
+        """Test that radius search returns every centre inside the radius."""
+        view = SharedGeoView(pack(*_data()))
+
+        found = {view.p_id[p] for p, _ in view.within("p", LAT, LNG, 1200)}
+        assert found == {1, 2}
+        found = {view.b_id[p] for p, _ in view.within("b", LAT, LNG, 50)}
+        assert found == set()
+
+    def test_within_reads_only_covering_cells(self):
+        """Test that grid radius search finds what a full scan finds."""
+        blocks = [
+            (i, 1, f"B{i}", LAT + (i % 40) * 0.0007, LNG + (i // 40) * 0.0009, 50, None)
+            for i in range(1600)
+        ]
+        view = SharedGeoView(pack([], blocks, []))
+        lat, lng = LAT + 0.013, LNG + 0.017
+
+        for radius in (0, 90, 400, 2500):
+            expected = {
+                b[0] for b in blocks if distance_m(lat, lng, b[3], b[4]) <= radius
+            }
+            found = {view.b_id[p] for p, _ in view.within("b", lat, lng, radius)}
+            assert found == expected
+
+    def test_match_block_and_row(self):
+        """Test map matching against block circles and row segments."""
+        view = SharedGeoView(pack(*_data()))
+
+        block_id, distance = view.match_block(*_offset(3, LAT + 0.001))
+        assert block_id in (10, 12) and distance < 4
+        assert view.match_row(*_offset(3, LAT + 0.001), 10, 4.0)[0] == 101
+        # Block 11 has no radius and falls back to DEFAULT_BLOCK_RADIUS_M
+        assert view.match_block(*_offset(-150))[0] == 11
+        assert view.match_block(*_offset(-300)) is None
+
+
+class TestSharedGeoStore:
+    """Test SharedGeoStore class."""
+
+    def test_generation_swap_between_stores(self, tmp_path):
+        """Test that a second attached store follows published generations."""
+        builder = SharedGeoStore(str(tmp_path))
+        reader = SharedGeoStore(str(tmp_path))
+        properties, blocks, rows, vines = _data()
+
+        assert builder.publish(properties, blocks, rows, vines) == 1
+        first = reader.view()
+        assert first.generation == 1 and first.counts["properties"] == 3
+
+        assert builder.publish(properties[:1], blocks, rows) == 2
+        second = reader.view()
+        assert second.generation == 2 and second.counts["properties"] == 1
+        assert sorted(os.listdir(tmp_path)) == ["control", "geo-2.bin"]
+        # The superseded mapping stays readable for in-flight lookups
+        assert first.property_name(2) == "Open Field"
+
+    def test_rebuild_requests_and_single_builder(self, tmp_path):
+        """Test the change counter and that a held build lock skips the build."""
+        store = SharedGeoStore(str(tmp_path))
+        store.publish(*_data())
+        store.request_rebuild()
+        store.request_rebuild()
+        assert store.stats()["pending_changes"] == 2
+
+        with open(tmp_path / "build.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            assert store.rebuild(blocking=False) is False
+        assert store.stats()["generation"] == 1
+
+    def test_rollback_drops_the_rebuild_request(self):
+        """Test that a rolled-back write does not trigger the next commit's rebuild."""
+        with Session(create_engine("sqlite://")) as db:
+            db.execute(text("SELECT 1"))
+            rebuild_after_commit(db)
+            db.rollback()
+            assert DIRTY not in db.info
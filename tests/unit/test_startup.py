@@ -0,0 +1,87 @@
+"""
+Import-time budget for the application module.
+
+Runs ``python -X importtime -c "import app.main"`` in a fresh interpreter so
+the numbers are not skewed by modules this test session already imported.
+Set ``STARTUP_IMPORT_BUDGET_MS`` to tighten or relax the budget on a given
+machine.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "2500"))
+
+# Imported on demand: by the lifespan (DB driver), by the subsystem that
+# needs them, or only when the subsystem is enabled.
+DEFERRED_MODULES = (
+    "psycopg2",
+    "httpx",
+    "geopy",
+    "app.services.webhooks",
+    "app.middleware.profiling",
+    "app.middleware.rate_limit",
+)
+
+
+def _import_app():
+    env = {
+        **os.environ,
+        "ADMIN_TOKEN": "",
+        "PROFILING_ENABLED": "false",
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import app.main, app.db.base as b; print(b._engine is None)",
+        ],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, module = line.split("|")
+        if cumulative_us.strip().isdigit():
+            cumulative[module.strip()] = int(cumulative_us) / 1000
+    return result.stdout.strip(), cumulative
+
+
+@pytest.fixture(scope="module")
+def app_import():
+    return _import_app()
+
+
+class TestStartup:
+    """Test application import cost."""
+
+    def test_engine_not_created_at_import(self, app_import):
+        """Test that importing the app does not create the database engine."""
+        engine_deferred, _ = app_import
+        assert engine_deferred == "True"
+
+    def test_heavy_modules_deferred(self, app_import):
+        """Test that optional and heavy dependencies are not imported eagerly."""
+        _, cumulative = app_import
+        assert [m for m in DEFERRED_MODULES if m in cumulative] == []
+
+    def test_import_within_budget(self, app_import):
+        """Test that importing app.main stays within the startup budget."""
+        _, cumulative = app_import
+        assert cumulative["app.main"] < IMPORT_BUDGET_MS, sorted(
+            ((ms, m) for m, ms in cumulative.items() if m.startswith("app.")),
+            reverse=True,
+        )[:10]
@@ -0,0 +1,156 @@
+"""
+Unit tests for the Supabase data client.
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.api_v1.endpoints import data
+from app.services.supabase_data import SupabaseDataClient, SupabaseError, in_filter
+from tests.supabase_fake import FakeSupabase
+
+BLOCKS = [
+    {"id": i, "org_id": 1 + i % 2, "block_name": f"Block {i}", "variety": "Syrah"}
+    for i in range(1, 11)
+]
+
+
+def _client(fake, **kwargs):
+    return SupabaseDataClient(
+        "http://supabase.test", "anon", fake.transport, batch_window=0.01, **kwargs
+    )
+
+
+class TestSupabaseDataClient:
+    """Test SupabaseDataClient class."""
+
+    def test_concurrent_lookups_share_one_in_request(self):
+        """Test that id lookups made together go out as one in.(...) request."""
+        fake = FakeSupabase({"blocks": BLOCKS})
+
+        async def scenario():
+            client = _client(fake)
+            results = await asyncio.gather(
+                client.get("blocks", 3),
+                client.get_many("blocks", [1, 2, 99]),
+                client.get("blocks", 3),
+            )
+            await client.close()
+            return results, client.stats()
+
+        (three, many, again), stats = asyncio.run(scenario())
+
+        [request] = fake.requests
+        assert dict(request["params"])["id"] == "in.(1,2,3,99)"
+        assert three == again == BLOCKS[2]
+        assert many == {1: BLOCKS[0], 2: BLOCKS[1]}
+        assert stats["batched_lookups"] == 1
+
+    def test_large_batches_are_split(self):
+        """Test that a batch over batch_max_ids is sent as several requests."""
+        fake = FakeSupabase({"blocks": BLOCKS})
+
+        async def scenario():
+            client = _client(fake, batch_max_ids=4)
+            rows = await client.get_many("blocks", range(1, 11))
+            await client.close()
+            return rows
+
+        assert sorted(asyncio.run(scenario())) == list(range(1, 11))
+        assert len(fake.requests) == 3
+
+    def test_identical_queries_in_flight_are_coalesced(self):
+        """Test that identical concurrent queries are sent once per caller token."""
+        fake = FakeSupabase({"blocks": BLOCKS}, delay=0.02)
+        query = [("org_id", "eq.1"), ("order", "id.desc")]
+
+        async def scenario():
+            client = _client(fake)
+            results = await asyncio.gather(
+                client.select("blocks", query),
+                client.select("blocks", list(reversed(query))),
+                client.select("blocks", query, token="user-jwt"),
+            )
+            await client.close()
+            return results
+
+        first, second, other_user = asyncio.run(scenario())
+
+        assert first == second == other_user
+        assert [row["id"] for row in first] == [10, 8, 6, 4, 2]
+        assert sorted(r["headers"]["authorization"] for r in fake.requests) == [
+            "Bearer anon",
+            "Bearer user-jwt",
+        ]
+
+    def test_errors_reach_every_caller(self):
+        """Test that a rejected query raises SupabaseError with the API's status."""
+        fake = FakeSupabase({"blocks": BLOCKS})
+
+        async def scenario():
+            client = _client(fake)
+            results = await asyncio.gather(
+                client.select("blocks", [("id", "like.1*")]),
+                client.get("vines", 1),
+                return_exceptions=True,
+            )
+            await client.close()
+            return results
+
+        bad_filter, missing = asyncio.run(scenario())
+
+        assert isinstance(bad_filter, SupabaseError)
+        assert bad_filter.status_code == 400
+        assert isinstance(missing, SupabaseError)
+        assert missing.status_code == 404
+
+    def test_in_filter_quotes_reserved_characters(self):
+        """Test that list values holding PostgREST syntax are quoted."""
+        assert in_filter([1, "a,b", 'say "hi"']) == 'in.(1,"a,b","say \\"hi\\"")'
+
+
+class TestDataEndpoints:
+    """Test the Supabase passthrough endpoints."""
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        fake = FakeSupabase({"blocks": BLOCKS, "users": []})
+        monkeypatch.setattr(data, "TABLES", frozenset({"blocks"}))
+        monkeypatch.setattr(data, "supabase_data", _client(fake))
+        app = FastAPI()
+        app.include_router(data.router, prefix="/data")
+        return TestClient(app), fake
+
+    def test_passthrough_forwards_query_and_token(self, client):
+        """Test that PostgREST parameters and the caller's token are forwarded."""
+        client, fake = client
+
+        response = client.get(
+            "/data/blocks?select=id&org_id=eq.2&limit=2",
+            headers={"Authorization": "Bearer user-jwt"},
+        )
+
+        assert response.json() == [{"id": 1}, {"id": 3}]
+        assert fake.requests[0]["headers"]["authorization"] == "Bearer user-jwt"
+        assert client.get("/data/blocks/7").json()["block_name"] == "Block 7"
+        assert client.get("/data/blocks/70").status_code == 404
+
+    def test_only_allowed_tables_are_served(self, client):
+        """Test that tables outside SUPABASE_DATA_TABLES are not reachable."""
+        client, fake = client
+
+        assert client.get("/data/users").status_code == 404
+        assert fake.requests == []
+
+    def test_select_cannot_embed_other_tables(self, client):
+        """Test that select is limited to plain columns of the requested table."""
+        client, fake = client
+
+        assert client.get("/data/blocks?select=*,users(*)").status_code == 400
+        assert client.get("/data/blocks?select=id,u:users!inner(*)").status_code == 400
+        assert client.get("/data/blocks/7?select=users(*)").status_code == 400
+        assert fake.requests == []
+        response = client.get("/data/blocks?select=id,block_name&id=eq.7")
+        assert response.json() == [{"id": 7, "block_name": "Block 7"}]
@@ -0,0 +1,160 @@
+"""
+Unit tests for the org partitioning of the large tables.
+"""
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models import (
+    Activity,
+    ActivityTypeRollup,
+    Block,
+    CropSpecificData,
+    FinancialTransaction,
+    IndividualVine,
+    Organization,
+    Property,
+    Row,
+    User,
+    VineYield,
+)
+from app.services.cache import query_cache
+from app.services.hierarchy_service import HierarchyService
+from app.services.shared_geo import DIRTY
+from app.services.tenant_partitions import (
+    ensure_org_partitions,
+    partitioned_tables,
+    purge_tenant_data,
+)
+
+MODELS = (
+    Organization,
+    User,
+    Property,
+    Block,
+    Row,
+    IndividualVine,
+    VineYield,
+    Activity,
+    ActivityTypeRollup,
+    CropSpecificData,
+    FinancialTransaction,
+)
+
+
+def _seed(db):
+    for org_id in (1, 2):
+        db.add_all(
+            [
+                Organization(id=org_id, org_name=f"Org {org_id}", org_type="farm"),
+                User(
+                    id=org_id,
+                    org_id=org_id,
+                    email=f"{org_id}@x.test",
+                    first_name="A",
+                    last_name="B",
+                ),
+                Property(
+                    id=org_id,
+                    org_id=org_id,
+                    property_name=f"Estate {org_id}",
+                    property_type="farm",
+                ),
+                Block(
+                    id=10 * org_id,
+                    property_id=org_id,
+                    block_name="A",
+                    crop_type="grape",
+                ),
+                Row(id=100 * org_id, block_id=10 * org_id, row_number=1),
+            ]
+        )
+    db.flush()
+    for org_id in (1, 2):
+        vines = [IndividualVine(row_id=100 * org_id, vine_number=n) for n in (1, 2)]
+        db.add_all(vines)
+        db.flush()
+        db.add_all(
+            [VineYield(vine_id=v.id, season=2024, yield_kg=3) for v in vines]
+            + [
+                Activity(
+                    block_id=10 * org_id,
+                    user_id=org_id,
+                    activity_type="pruning",
+                    activity_date=date(2025, 1, 10),
+                    title="Pruned",
+                ),
+                CropSpecificData(
+                    user_id=org_id,
+                    data_type="quality_metric",
+                    measurement_name="brix",
+                    measurement_date=date(2025, 8, 1),
+                ),
+                FinancialTransaction(
+                    org_id=org_id,
+                    transaction_date=date(2025, 1, 31),
+                    transaction_type="expense",
+                    description="Labor",
+                    amount=100,
+                    created_by_id=org_id,
+                ),
+            ]
+        )
+
+
+@pytest.fixture
+def session_factory(sqlite_session_factory):
+    return sqlite_session_factory(MODELS, _seed)
+
+
+def _orgs(db, model):
+    return sorted(db.scalars(select(model.org_id)))
+
+
+class TestTenantPartitions:
+    """Test the org partition key and tenant purge."""
+
+    def test_orm_writes_fill_and_follow_the_partition_key(self, session_factory):
+        """Test that inserts copy the org from the block, row or user, and moves follow it."""
+        with session_factory() as db:
+            assert _orgs(db, Activity) == [1, 2]
+            assert _orgs(db, CropSpecificData) == [1, 2]
+            assert _orgs(db, IndividualVine) == [1, 1, 2, 2]
+
+            db.get(Row, 100).block_id = 20
+            db.commit()
+
+            assert _orgs(db, IndividualVine) == [2, 2, 2, 2]
+
+    def test_purge_without_partitions_deletes_one_org(self, session_factory):
+        """Test that a purge on plain tables deletes the org's rows and recounts."""
+        query_cache.clear()
+        with session_factory() as db:
+            assert ensure_org_partitions(db.connection()) == 0
+            assert HierarchyService.get_properties(db, 1)[0].vine_total == 2
+
+            purged = purge_tenant_data(db, 1)
+            assert db.info[DIRTY]
+            assert HierarchyService.get_properties(db, 1)[0].vine_total == 2
+            db.commit()
+
+            assert purged == {table.name: 1 for table in partitioned_tables()} | {
+                "individual_vines": 2
+            }
+            for model in (Activity, CropSpecificData, FinancialTransaction):
+                assert _orgs(db, model) == [2]
+            assert db.scalar(select(func.count()).select_from(VineYield)) == 2
+            assert [r.block_id for r in db.scalars(select(ActivityTypeRollup))] == [20]
+            assert db.get(Property, 1).vine_total == 0
+            assert db.get(Property, 2).vine_total == 2
+            assert HierarchyService.get_properties(db, 1)[0].vine_total == 0
+
+    def test_deleting_a_vine_deletes_its_yields(self, session_factory):
+        """Test that yields follow their vine without a foreign key."""
+        with session_factory() as db:
+            vine = db.scalars(select(IndividualVine).filter_by(org_id=2)).first()
+            db.delete(vine)
+            db.commit()
+
+            assert sorted(db.scalars(select(VineYield.vine_id))) == [1, 2, 4]
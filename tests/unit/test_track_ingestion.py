@@ -0,0 +1,205 @@
+"""
+Unit tests for GPS map-matching and track ingestion.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, select
+
+from app.models.gps_track import BlockVisit, GPSFix
+from app.services.geo_index import METERS_PER_DEG, GeoIndex
+from app.services.shared_geo import SharedGeoStore
+from app.services.track_ingestion import TrackFix, TrackIngestor, VisitTracker
+
+LAT, LNG = 38.3, -122.3
+# Recent enough to be inside the accepted fix time window.
+T0 = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=1)
+
+
+EAST = 100 / (METERS_PER_DEG * 0.785)
+BLOCKS = [(1, 10, LAT, LNG, 60), (2, 10, LAT, LNG + 0.01, 60)]
+ROWS = [
+    (100, 1, LAT, LNG - EAST / 2, LAT, LNG + EAST / 2),
+    (
+        101,
+        1,
+        LAT + 2.5 / METERS_PER_DEG,
+        LNG - EAST / 2,
+        LAT + 2.5 / METERS_PER_DEG,
+        LNG + EAST / 2,
+    ),
+]
+
+
+def _index() -> GeoIndex:
+    return GeoIndex.build(blocks=BLOCKS, rows=ROWS)
+
+
+def _store(directory) -> SharedGeoStore:
+    store = SharedGeoStore(str(directory))
+    store.publish(
+        properties=[],
+        blocks=[(b[0], b[1], f"Block {b[0]}", *b[2:], None) for b in BLOCKS],
+        rows=[(r[0], r[1], i + 1, *r[2:]) for i, r in enumerate(ROWS)],
+    )
+    return store
+
+
+def _failing(session, before_commit):
+    event.listen(session, "before_commit", before_commit)
+    return session
+
+
+class TestGeoIndex:
+    """Test GeoIndex class."""
+
+    def test_matches_block_and_nearest_row(self):
+        """Test that a point resolves to its block and the closest row."""
+        index = _index()
+        block_id, distance = index.match_block(LAT + 2.0 / METERS_PER_DEG, LNG)
+        assert block_id == 1
+        assert distance < 3
+        row_id, _ = index.match_row(LAT + 2.0 / METERS_PER_DEG, LNG, 1, 4.0)
+        assert row_id == 101
+
+    def test_point_outside_every_block(self):
+        """Test that a point away from all blocks does not match."""
+        assert _index().match_block(LAT + 0.005, LNG) is None
+
+
+class TestVisitTracker:
+    """Test VisitTracker class."""
+
+    def _fix(self, seconds: int) -> TrackFix:
+        return TrackFix("d1", T0 + timedelta(seconds=seconds), LAT, LNG)
+
+    def test_extends_then_splits_on_gap_and_block_change(self):
+        """Test that visits grow per fix and close on a gap or a new block."""
+        tracker = VisitTracker(gap_seconds=60)
+        first = tracker.observe(self._fix(0), 1, 100)[0]
+        assert tracker.observe(self._fix(30), 1, None) == [first]
+        assert first.fix_count == 2 and first.last_row_id == 100
+
+        after_gap = tracker.observe(self._fix(200), 1, 100)[0]
+        assert after_gap is not first
+        assert tracker.observe(self._fix(210), None, None) == []
+        assert "d1" not in tracker.open
+
+
+class TestTrackIngestor:
+    """Test TrackIngestor class."""
+
+    @pytest.fixture(autouse=True)
+    def _stores(self, tmp_path, sqlite_session_factory):
+        self.geo = _store(tmp_path)
+        self.session_factory = sqlite_session_factory((GPSFix, BlockVisit))
+
+    def _ingestor(self, **kwargs):
+        ingestor = TrackIngestor(
+            session_factory=self.session_factory,
+            geo=self.geo,
+            visit_gap_seconds=60,
+            **kwargs,
+        )
+        return ingestor, self.session_factory
+
+    def test_flush_writes_fixes_and_visits(self):
+        """Test that a flush stores matched fixes, drops duplicates and updates visits."""
+        ingestor, session_factory = self._ingestor()
+        fixes = [TrackFix("d1", T0 + timedelta(seconds=i), LAT, LNG) for i in range(5)]
+        assert ingestor.submit(fixes + fixes[:2]) == 7
+        assert ingestor.flush() == 7
+        ingestor.submit([TrackFix("d1", T0 + timedelta(seconds=10), LAT, LNG)])
+        ingestor.flush()
+
+        with session_factory() as db:
+            stored = db.execute(select(GPSFix)).scalars().all()
+            visits = db.execute(select(BlockVisit)).scalars().all()
+        assert len(stored) == 6
+        assert {fix.block_id for fix in stored} == {1}
+        assert len(visits) == 1
+        assert visits[0].fix_count == 6
+        assert visits[0].last_row_id == 100
+
+    def test_failed_flush_is_retried_without_losing_visits(self):
+        """Test that fixes and visits of a rolled-back flush are written by the next one."""
+        ingestor, session_factory = self._ingestor()
+        ingestor.submit([TrackFix("d1", T0, LAT, LNG)])
+        ingestor.flush()
+        failures = [RuntimeError("connection lost")]
+
+        def fail_once(session):
+            if failures:
+                raise failures.pop()
+
+        failing_factory = ingestor.session_factory
+        ingestor.session_factory = lambda: _failing(failing_factory(), fail_once)
+        ingestor.submit(
+            [
+                TrackFix("d1", T0 + timedelta(seconds=5), LAT, LNG),
+                TrackFix("d2", T0, LAT, LNG + 0.01),
+            ]
+        )
+        with pytest.raises(RuntimeError):
+            ingestor.flush()
+        assert ingestor.buffered == 2
+        ingestor.submit([TrackFix("d2", T0 + timedelta(seconds=5), LAT, LNG + 0.01)])
+        assert ingestor.flush() == 3
+
+        with session_factory() as db:
+            visits = db.execute(select(BlockVisit).order_by("device_id")).scalars()
+            counts = [(v.device_id, v.block_id, v.fix_count) for v in visits]
+        assert counts == [("d1", 1, 2), ("d2", 2, 2)]
+
+    def test_fix_times_are_clamped_to_the_window(self):
+        """Test that fixes from a bad device clock land at the window edges."""
+        ingestor, session_factory = self._ingestor(
+            max_fix_age_days=1, max_clock_skew_seconds=60
+        )
+        ingestor.submit(
+            [
+                TrackFix("d1", T0 - timedelta(days=400), LAT, LNG),
+                TrackFix("d2", T0 + timedelta(days=400), LAT, LNG),
+                TrackFix("d3", T0, LAT, LNG),
+            ]
+        )
+        ingestor.flush()
+
+        with session_factory() as db:
+            stored = {
+                f.device_id: f.recorded_at.replace(tzinfo=timezone.utc)
+                for f in db.execute(select(GPSFix)).scalars()
+            }
+        now = datetime.now(timezone.utc)
+        earliest, latest = now - timedelta(days=1), now + timedelta(seconds=60)
+        assert abs(stored["d1"] - earliest) < timedelta(minutes=1)
+        assert abs(stored["d2"] - latest) < timedelta(minutes=1)
+        assert stored["d3"] == T0
+
+    def test_requeued_batch_respects_the_buffer_limit(self):
+        """Test that a failed flush puts back only what fits beside newer fixes."""
+        ingestor, _ = self._ingestor(max_buffer=4)
+        ingestor.submit(
+            [TrackFix("d1", T0 + timedelta(seconds=i), LAT, LNG) for i in range(3)]
+        )
+
+        def refill_then_fail(session):
+            ingestor.submit(
+                [TrackFix("d2", T0 + timedelta(seconds=i), LAT, LNG) for i in range(3)]
+            )
+            raise RuntimeError("connection lost")
+
+        factory = ingestor.session_factory
+        ingestor.session_factory = lambda: _failing(factory(), refill_then_fail)
+        with pytest.raises(RuntimeError):
+            ingestor.flush()
+
+        assert ingestor.buffered == 4
+
+    def test_submit_applies_backpressure(self):
+        """Test that fixes beyond the buffer limit are rejected."""
+        ingestor, _ = self._ingestor(max_buffer=3)
+        fixes = [TrackFix("d1", T0 + timedelta(seconds=i), LAT, LNG) for i in range(5)]
+        assert ingestor.submit(fixes) == 3
+        assert ingestor.submit(fixes) == 0
+        assert ingestor.buffered == 3
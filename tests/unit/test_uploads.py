@@ -0,0 +1,101 @@
+"""
+Unit tests for streaming uploads.
+"""
+import asyncio
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.api_v1.endpoints import uploads as uploads_endpoint
+from app.services.uploads import UploadStore, UploadTooLarge
+
+
+async def _chunks(data: bytes, size: int = 1000):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+class TestUploadStore:
+    """Test UploadStore class."""
+
+    def test_stream_is_hashed_and_deduplicated(self, tmp_path):
+        """Test that identical content is stored once under its digest."""
+        store = UploadStore(str(tmp_path), chunk_size=4096)
+        data = bytes(range(256)) * 100
+
+        first = asyncio.run(store.save_stream(_chunks(data), "image/tiff", "a.tif"))
+        second = asyncio.run(store.save_stream(_chunks(data), "image/tiff", "b.tif"))
+
+        assert first.sha256 == hashlib.sha256(data).hexdigest()
+        assert first.input_type == "image"
+        assert not first.deduplicated and second.deduplicated
+        assert second.filename == "a.tif"
+        with open(store.path(first.sha256), "rb") as f:
+            assert f.read() == data
+        assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".")] == []
+
+    def test_oversized_stream_is_rejected(self, tmp_path):
+        """Test that the size limit aborts the upload and cleans up."""
+        store = UploadStore(str(tmp_path), max_bytes=1500)
+        with pytest.raises(UploadTooLarge):
+            asyncio.run(store.save_stream(_chunks(b"x" * 3000)))
+        assert list(tmp_path.iterdir()) == []
+
+    def test_large_files_are_memory_mapped(self, tmp_path):
+        """Test that views above the threshold are mmap-backed and read-only."""
+        store = UploadStore(str(tmp_path), mmap_threshold=1024)
+        data = b"\x01" * 4096
+        upload = asyncio.run(store.save_stream(_chunks(data)))
+        with store.open_view(upload.sha256) as view:
+            assert isinstance(view, memoryview)
+            assert view.readonly
+            assert view[:4].tobytes() == b"\x01" * 4
+
+    def test_csv_is_read_in_row_chunks(self, tmp_path):
+        """Test that CSV inputs come back as bounded row chunks."""
+        store = UploadStore(str(tmp_path))
+        lines = ["vine_id,brix"] + [f"{i},{20 + i % 5}" for i in range(25)]
+        upload = asyncio.run(
+            store.save_stream(_chunks("\n".join(lines).encode(), 7), "text/csv")
+        )
+        chunks = list(store.iter_csv_chunks(upload.sha256, chunk_rows=10))
+        assert [len(c) for c in chunks] == [10, 10, 5]
+        assert chunks[0][0] == {"vine_id": "0", "brix": "20"}
+
+
+class TestUploadEndpoint:
+    """Test the upload endpoints."""
+
+    def test_upload_then_skip_known_digest(self, tmp_path, monkeypatch):
+        """Test that a known X-Content-SHA256 short-circuits the body."""
+        monkeypatch.setattr(
+            uploads_endpoint, "upload_store", UploadStore(str(tmp_path))
+        )
+        app = FastAPI()
+        app.include_router(uploads_endpoint.router, prefix="/uploads")
+        client = TestClient(app)
+        data = b"a,b\n1,2\n"
+        digest = hashlib.sha256(data).hexdigest()
+
+        created = client.post(
+            "/uploads/?filename=s.csv",
+            content=_sync_chunks(data),
+            headers={"content-type": "text/csv"},
+        )
+        assert created.status_code == 201
+        assert created.json()["sha256"] == digest
+        assert created.json()["file_url"].endswith(f"/uploads/{digest}")
+
+        again = client.post(
+            "/uploads/", content=b"", headers={"x-content-sha256": digest}
+        )
+        assert again.status_code == 200
+        assert again.json()["deduplicated"] is True
+        assert client.get(f"/uploads/{digest}").content == data
+
+
+def _sync_chunks(data: bytes):
+    yield data[:3]
+    yield data[3:]
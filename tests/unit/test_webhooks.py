@@ -0,0 +1,193 @@
+"""
+Unit tests for webhook delivery through the callback outbox.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import update
+
+from app.models.callback_outbox import CallbackOutbox
+from app.services.webhooks import (
+    WebhookDispatcher,
+    enqueue_callback,
+    enqueue_inference_callback,
+    sign,
+)
+from tests.webhook_receiver import WebhookReceiver
+
+MODELS = (CallbackOutbox,)
+
+
+@pytest.fixture
+def session_factory(sqlite_session_factory):
+    return sqlite_session_factory(MODELS)
+
+
+def _make_due(session_factory):
+    with session_factory() as db:
+        db.execute(
+            update(CallbackOutbox).values(
+                next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1)
+            )
+        )
+        db.commit()
+
+
+def _rows(session_factory):
+    with session_factory() as db:
+        return db.query(CallbackOutbox).order_by(CallbackOutbox.id).all()
+
+
+class TestWebhookDispatcher:
+    """Test WebhookDispatcher class."""
+
+    def test_delivers_signed_payload(self, session_factory):
+        """Test that a pending callback is posted once and marked delivered."""
+        receiver = WebhookReceiver()
+        with session_factory() as db:
+            enqueue_callback(db, "http://hooks.test/cb", "ping", {"hello": "world"})
+            db.commit()
+        dispatcher = WebhookDispatcher(
+            session_factory, receiver.transport, signing_secret="s3cret"
+        )
+
+        assert asyncio.run(dispatcher.run_once()) == 1
+
+        [call] = receiver.received
+        assert call["body"] == {"hello": "world"}
+        assert call["headers"]["x-vigneron-event"] == "ping"
+        assert call["headers"]["x-vigneron-signature"] == sign(call["raw"], "s3cret")
+        [row] = _rows(session_factory)
+        assert row.status == "delivered"
+        assert row.attempts == 1
+
+    def test_retries_with_backoff_then_fails(self, session_factory):
+        """Test that 5xx responses are retried later and give up at max_attempts."""
+        receiver = WebhookReceiver(fail_first=10, retry_after="120")
+        with session_factory() as db:
+            enqueue_callback(db, "http://hooks.test/cb", "ping", {})
+            db.commit()
+        dispatcher = WebhookDispatcher(
+            session_factory, receiver.transport, max_attempts=2, backoff_max=3600
+        )
+
+        asyncio.run(dispatcher.run_once())
+        [row] = _rows(session_factory)
+        assert row.status == "pending"
+        assert row.last_status_code == 503
+        wait = row.next_attempt_at.replace(tzinfo=timezone.utc) - datetime.now(
+            timezone.utc
+        )
+        assert wait > timedelta(seconds=100)  # Retry-After honoured
+        assert asyncio.run(dispatcher.run_once()) == 0  # not due yet
+
+        _make_due(session_factory)
+        asyncio.run(dispatcher.run_once())
+        [row] = _rows(session_factory)
+        assert row.status == "failed"
+        assert row.attempts == 2
+
+    def test_client_errors_are_not_retried(self, session_factory):
+        """Test that a non-retryable 4xx fails the delivery immediately."""
+        receiver = WebhookReceiver(fail_first=1, fail_status=410)
+        with session_factory() as db:
+            enqueue_callback(db, "http://hooks.test/cb", "ping", {})
+            db.commit()
+        asyncio.run(WebhookDispatcher(session_factory, receiver.transport).run_once())
+        assert _rows(session_factory)[0].status == "failed"
+
+    def test_per_host_concurrency_is_bounded(self, session_factory):
+        """Test that deliveries to one host never exceed the host semaphore."""
+        receiver = WebhookReceiver(delay=0.02)
+        with session_factory() as db:
+            for i in range(12):
+                host = "slow.test" if i % 2 else "fast.test"
+                enqueue_callback(db, f"http://{host}/cb", "ping", {"i": i})
+            db.commit()
+        dispatcher = WebhookDispatcher(
+            session_factory, receiver.transport, per_host_concurrency=2
+        )
+
+        assert asyncio.run(dispatcher.run_once()) == 12
+        assert len(receiver.received) == 12
+        assert max(receiver.max_in_flight.values()) == 2
+
+    def test_slow_host_does_not_hold_up_others(self, session_factory):
+        """Test that each outcome is recorded as soon as its request finishes."""
+        receiver = WebhookReceiver(host_delays={"slow.test": 0.5})
+        with session_factory() as db:
+            for host in ("slow.test", "fast.test"):
+                enqueue_callback(db, f"http://{host}/cb", "ping", {})
+            db.commit()
+        dispatcher = WebhookDispatcher(session_factory, receiver.transport)
+
+        async def scenario():
+            assert await dispatcher.dispatch() == 2
+            await asyncio.sleep(0.2)
+            statuses = [row.status for row in _rows(session_factory)]
+            await dispatcher.stop()
+            return statuses
+
+        assert asyncio.run(scenario()) == ["delivering", "delivered"]
+
+    def test_leases_cover_the_host_queue(self, session_factory):
+        """Test that rows queued behind others on a host get longer leases."""
+        with session_factory() as db:
+            for i in range(5):
+                host = "busy.test" if i < 4 else "idle.test"
+                enqueue_callback(db, f"http://{host}/cb", "ping", {"i": i})
+            db.commit()
+        dispatcher = WebhookDispatcher(
+            session_factory, per_host_concurrency=2, timeout=10
+        )
+        now = datetime.now(timezone.utc)
+
+        dispatcher._claim(10, {"busy.test": 1}, set())
+
+        leases = [
+            (row.next_attempt_at.replace(tzinfo=timezone.utc) - now).total_seconds()
+            for row in _rows(session_factory)
+        ]
+        expected = [40, 50, 50, 60, 40]
+        assert all(abs(a - b) < 1 for a, b in zip(leases, expected))
+        _make_due(session_factory)
+        [unclaimed] = dispatcher._claim(10, {}, {1, 2, 3, 4})
+        assert unclaimed.id == 5
+
+
+class TestEnqueue:
+    """Test outbox enqueue helpers."""
+
+    def test_batch_results_are_coalesced(self, session_factory):
+        """Test that results of one batch merge into a single delivery."""
+        with session_factory() as db:
+            for i in range(3):
+                request = SimpleNamespace(
+                    id=f"req-{i}",
+                    model_id="m1",
+                    status="completed",
+                    output={"label": i},
+                    confidence="0.9",
+                    processing_time_ms=12,
+                    error_code=None,
+                    error_message=None,
+                    completed_at=datetime(2024, 5, 1, tzinfo=timezone.utc),
+                    callback_url="http://hooks.test/batch",
+                    request_metadata={"batch_id": "b1"},
+                )
+                enqueue_inference_callback(db, request)
+                db.commit()
+            enqueue_inference_callback(
+                db, SimpleNamespace(callback_url=None, request_metadata={})
+            )
+
+        [row] = _rows(session_factory)
+        assert row.event == "inference.batch"
+        assert row.payload["batch_id"] == "b1"
+        assert [r["request_id"] for r in row.payload["results"]] == [
+            "req-0",
+            "req-1",
+            "req-2",
+        ]
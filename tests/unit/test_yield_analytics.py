@@ -0,0 +1,157 @@
+"""
+Unit tests for block yield analytics.
+"""
+import pytest
+
+from app.models.block import Block
+from app.models.individual_vine import IndividualVine
+from app.models.property import Property
+from app.models.row import Row
+from app.models.vine_yield import VineYield
+from app.services import yield_analytics
+from app.services.cache import query_cache
+
+MODELS = (Property, Block, Row, IndividualVine, VineYield)
+
+
+def _seed(db):
+    db.add_all(
+        [
+            Row(id=1, block_id=10, row_number=2, vine_count=4),
+            Row(id=2, block_id=10, row_number=1, vine_count=6),
+            Row(id=3, block_id=11, row_number=1, vine_count=1),
+        ]
+    )
+    vines = []
+    vine_id = 0
+    for row_id, yields in ((2, [4.0, 4.2, 3.8, 4.1, 4.0]), (1, [4.1, 3.9, 12.0])):
+        for number, kg in enumerate(yields, start=1):
+            vine_id += 1
+            vines.append(
+                IndividualVine(
+                    id=vine_id,
+                    row_id=row_id,
+                    vine_number=number,
+                    historical_yield_kg=kg,
+                    canopy_vigor=("High" if kg > 10 else "medium"),
+                    trunk_diameter_mm=50,
+                    latitude=38.3 + vine_id * 1e-5,
+                    longitude=-122.3,
+                )
+            )
+    vines.append(IndividualVine(id=99, row_id=1, vine_number=9, is_active=False))
+    vines.append(IndividualVine(id=100, row_id=3, vine_number=1))
+    db.add_all(vines)
+    db.flush()
+    db.add_all(
+        [VineYield(vine_id=v.id, season=2024, yield_kg=2.0) for v in vines[:8]]
+        + [VineYield(vine_id=v.id, season=2025, yield_kg=3.0) for v in vines[:4]]
+    )
+
+
+@pytest.fixture
+def session_factory(sqlite_session_factory):
+    return sqlite_session_factory(MODELS, _seed)
+
+
+class TestYieldAnalytics:
+    """Test yield analytics functions."""
+
+    def setup_method(self):
+        query_cache.clear()
+
+    def test_columns_follow_row_order(self, session_factory):
+        """Test that vines load as row slices ordered by row number, skipping inactive vines."""
+        with session_factory() as db:
+            columns = yield_analytics.load_block_columns(db, 10)
+
+        assert columns.row_numbers == [1, 2]
+        assert list(columns.row_starts) == [0, 5, 8]
+        assert list(columns.vine_id) == [1, 2, 3, 4, 5, 6, 7, 8]
+        assert columns.vigor_classes == ["medium", "high"]
+        assert list(columns.vigor)[-1] == 1
+
+    def test_report_distributions_and_outliers(self, session_factory):
+        """Test that row and block distributions, outliers and vigor classes are reported."""
+        with session_factory() as db:
+            report = yield_analytics.block_yield_report(db, 10)
+
+        assert report["vines"] == 8
+        assert report["expected_vines"] == 10
+        first, second = report["rows"]
+        assert first["row_number"] == 1
+        assert first["yield"]["measured"] == 5
+        assert first["yield"]["median_kg"] == 4.0
+        assert first["yield"]["min_kg"] == 3.8
+        assert second["yield"]["total_kg"] == 20.0
+        assert second["vigor"] == {"medium": 2, "high": 1}
+        assert report["outliers"]["count"] == 1
+        outlier = report["outliers"]["vines"][0]
+        assert (outlier["vine_id"], outlier["direction"]) == (8, "high")
+        assert outlier["row_number"] == 2
+        assert report["vigor_map"]["classes"]["high"]["mean_yield_kg"] == 12.0
+        assert "points" not in report["vigor_map"]
+
+    def test_season_over_season(self, session_factory):
+        """Test that a season is compared with the previous one per measured vine."""
+        with session_factory() as db:
+            report = yield_analytics.block_yield_report(
+                db, 10, season=2025, include_points=True
+            )
+            seasons = yield_analytics.block_seasons(db, 10)
+
+        assert seasons == [2025, 2024]
+        assert report["yield"]["measured"] == 4
+        assert report["previous_yield"]["measured"] == 8
+        assert report["change_pct"] == 50.0
+        assert report["rows"][1]["change_pct"] is None
+        assert len(report["vigor_map"]["points"]) == 8
+
+    def test_writes_invalidate_cached_reports(self, session_factory):
+        """Test that ORM writes and recorded yields refresh the cached report after commit."""
+        with session_factory() as db:
+            assert yield_analytics.block_yield_report(db, 10)["vines"] == 8
+            assert (
+                yield_analytics.block_yield_report(db, 10, 2025)["yield"]["measured"]
+                == 4
+            )
+
+            db.get(IndividualVine, 1).historical_yield_kg = 40
+            db.flush()
+            assert yield_analytics.block_yield_report(db, 10)["yield"]["max_kg"] == 12.0
+            db.commit()
+            assert yield_analytics.block_yield_report(db, 10)["yield"]["max_kg"] == 40.0
+
+            recorded = yield_analytics.record_yields(
+                db,
+                10,
+                2025,
+                [{"vine_id": 5, "yield_kg": 3.0}, {"vine_id": 1, "yield_kg": 6.0}],
+            )
+            report = yield_analytics.block_yield_report(db, 10, 2025)
+
+        assert recorded == 2
+        assert report["yield"]["measured"] == 5
+        assert report["yield"]["max_kg"] == 6.0
+
+    def test_replica_reads_do_not_fill_the_cache(self, session_factory):
+        """Test that a read-only replica session uses cached reports but never stores one."""
+        before = query_cache.stats()
+        with session_factory(info={"read_only": True}) as replica:
+            with session_factory() as primary:
+                assert yield_analytics.block_seasons(replica, 10) == [2025, 2024]
+                assert yield_analytics.block_seasons(replica, 10) == [2025, 2024]
+                yield_analytics.block_seasons(primary, 10)
+                yield_analytics.block_seasons(replica, 10)
+        after = query_cache.stats()
+
+        assert after["misses"] - before["misses"] == 3
+        assert after["hits"] - before["hits"] == 1
+
+    def test_record_rejects_vines_of_other_blocks(self, session_factory):
+        """Test that recording a yield for a vine outside the block raises ValueError."""
+        with session_factory() as db:
+            with pytest.raises(ValueError, match="100"):
+                yield_analytics.record_yields(
+                    db, 10, 2025, [{"vine_id": 100, "yield_kg": 1}]
+                )
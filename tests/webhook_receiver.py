@@ -0,0 +1,90 @@
+"""
+Local stub receiver for webhook delivery tests.
+
+An ASGI app that records every callback it receives. It can be told to fail
+the first N requests (with a status code and optional Retry-After) and to
+hold each request (or those to given hosts) for a while, which lets tests
+observe retries and per-host concurrency without any network.
+"""
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+class WebhookReceiver:
+    """Records received callbacks; see module docstring for knobs."""
+
+    def __init__(
+        self,
+        fail_first: int = 0,
+        fail_status: int = 503,
+        retry_after: Optional[str] = None,
+        delay: float = 0.0,
+        host_delays: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.delay = delay
+        self.host_delays = host_delays or {}
+        self.received: List[Dict[str, Any]] = []
+        self.in_flight: Dict[str, int] = {}
+        self.max_in_flight: Dict[str, int] = {}
+        self.calls = 0
+
+    @property
+    def transport(self) -> httpx.ASGITransport:
+        return httpx.ASGITransport(app=self)
+
+    async def __call__(self, scope, receive, send) -> None:
+        assert scope["type"] == "http"
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        headers = {k.decode(): v.decode() for k, v in scope["headers"]}
+        host = headers.get("host", "")
+
+        self.calls += 1
+        self.in_flight[host] = self.in_flight.get(host, 0) + 1
+        self.max_in_flight[host] = max(
+            self.max_in_flight.get(host, 0), self.in_flight[host]
+        )
+        try:
+            delay = self.host_delays.get(host, self.delay)
+            if delay:
+                await asyncio.sleep(delay)
+        finally:
+            self.in_flight[host] -= 1
+
+        if self.calls <= self.fail_first:
+            status = self.fail_status
+            response_headers = [(b"content-type", b"text/plain")]
+            if self.retry_after is not None:
+                response_headers.append((b"retry-after", self.retry_after.encode()))
+            payload = b"unavailable"
+        else:
+            status = 204
+            response_headers = []
+            payload = b""
+            self.received.append(
+                {
+                    "host": host,
+                    "path": scope["path"],
+                    "headers": headers,
+                    "body": json.loads(body) if body else None,
+                    "raw": body,
+                }
+            )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": response_headers,
+            }
+        )
+        await send({"type": "http.response.body", "body": payload})